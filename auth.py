@@ -13,7 +13,7 @@ import hmac
 import json
 import base64
 
-from database import get_db, User, UserSite, Site
+from database import get_read_db, User, UserSite, Site
 
 # ============================================
 # CONFIG
@@ -92,12 +92,19 @@ def decode_token(token: str) -> Optional[dict]:
 
 def get_current_user(
     credentials: Optional[HTTPAuthorizationCredentials] = Depends(security),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ) -> User:
     """Require valid JWT token, return User object"""
     if not credentials:
         raise HTTPException(status.HTTP_401_UNAUTHORIZED, "Token requerido")
-    data = decode_token(credentials.credentials)
+    return user_from_token(credentials.credentials, db)
+
+
+def user_from_token(token: Optional[str], db: Session) -> User:
+    """Resolve a raw JWT to an active User (raises 401)."""
+    if not token:
+        raise HTTPException(status.HTTP_401_UNAUTHORIZED, "Token requerido")
+    data = decode_token(token)
     if not data:
         raise HTTPException(status.HTTP_401_UNAUTHORIZED, "Token inválido o expirado")
     user = db.query(User).get(data["sub"])
@@ -116,8 +123,8 @@ def require_admin(user: User = Depends(get_current_user)) -> User:
 def get_user_site_ids(user: User, db: Session) -> list:
     """Get list of site IDs the user can access"""
     if user.role == "admin":
-        return [s.id for s in db.query(Site).all()]
-    return [us.site_id for us in db.query(UserSite).filter_by(user_id=user.id).all()]
+        return [sid for (sid,) in db.query(Site.id)]
+    return [sid for (sid,) in db.query(UserSite.site_id).filter_by(user_id=user.id)]
 
 
 def check_site_access(user: User, site_id: int, db: Session):
@@ -0,0 +1,113 @@
+"""
+Benchmark: ORM camera upsert (pre-bulk sync_site path) vs Core bulk upsert.
+
+Simulates the write phase of a hybrid sync on a 256-channel recorder:
+every run changes status/last_seen for all cameras and inventory for a few.
+
+Usage:
+    python benchmarks/bench_camera_upsert.py [channels] [runs]
+"""
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+from database import Base, Site, Recorder, Camera
+from camera_upsert import load_existing, upsert_cameras, INVENTORY_FIELDS
+
+
+def _make_db():
+    path = os.path.join(tempfile.mkdtemp(), "bench.db")
+    engine = create_engine(f"sqlite:///{path}")
+
+    @event.listens_for(engine, "connect")
+    def _pragma(dbapi_connection, connection_record):
+        dbapi_connection.execute("PRAGMA journal_mode=WAL")
+
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    db.add(Site(id=1, name="bench"))
+    db.add(Recorder(id=1, site_id=1, name="NVR", channels=256))
+    db.commit()
+    return db
+
+
+def _nvr_inventory(channels: int, run: int):
+    return [{
+        "channel": ch,
+        "name": f"CAM-{ch}" if ch % 50 else f"CAM-{ch}-r{run}",
+        "ip": f"10.1.{ch // 250}.{ch % 250 + 1}",
+        "mac": f"AA:BB:CC:00:{ch // 256:02X}:{ch % 256:02X}",
+        "model": "DH-IPC-HFW2441S-S",
+        "serial": f"SN{ch:05d}",
+    } for ch in range(1, channels + 1)]
+
+
+def orm_path(db, nvr_cameras, now):
+    """The original per-object path: load ORM rows, setattr, add new ones."""
+    existing = db.query(Camera).filter_by(site_id=1, recorder_id=1).all()
+    by_ch = {c.channel: c for c in existing if c.channel}
+    for nc in nvr_cameras:
+        match = by_ch.get(nc["channel"])
+        if match:
+            for f in INVENTORY_FIELDS:
+                if nc.get(f):
+                    setattr(match, f, nc[f])
+            match.configured = True
+            match.status_config = "enabled"
+            match.offline_streak = 0
+            match.last_seen_at = now
+            match.status_real = "online"
+            match.status = "online"
+            match.updated_at = now
+        else:
+            db.add(Camera(site_id=1, recorder_id=1, channel=nc["channel"],
+                          cam_type="ip-net", status_real="online", last_seen_at=now,
+                          **{f: nc[f] for f in INVENTORY_FIELDS}))
+    db.commit()
+
+
+def bulk_path(db, nvr_cameras, now):
+    """Core path: plain-row SELECT + one INSERT ... ON CONFLICT statement."""
+    existing = {c["channel"]: c for c in load_existing(db, 1, 1)}
+    rows = []
+    for nc in nvr_cameras:
+        old = existing.get(nc["channel"], {})
+        rows.append({
+            "site_id": 1, "recorder_id": 1, "channel": nc["channel"], "cam_type": "ip-net",
+            **{f: nc.get(f) or old.get(f) for f in INVENTORY_FIELDS},
+            "configured": True, "status_config": "enabled",
+            "status_real": "online", "status": "online",
+            "last_seen_at": now, "offline_streak": 0, "updated_at": now,
+        })
+    upsert_cameras(db, rows)
+    db.commit()
+
+
+def bench(fn, channels: int, runs: int) -> float:
+    db = _make_db()
+    times = []
+    for run in range(runs):
+        inv = _nvr_inventory(channels, run)
+        t0 = time.perf_counter()
+        fn(db, inv, datetime.utcnow())
+        times.append(time.perf_counter() - t0)
+        db.expunge_all()
+    db.close()
+    # first run is the initial insert — report steady-state separately
+    return times[0] * 1000, sum(times[1:]) / max(1, len(times) - 1) * 1000
+
+
+if __name__ == "__main__":
+    channels = int(sys.argv[1]) if len(sys.argv) > 1 else 256
+    runs = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    print(f"channels={channels} runs={runs}")
+    for label, fn in (("orm", orm_path), ("bulk", bulk_path)):
+        first, steady = bench(fn, channels, runs)
+        print(f"  {label:5s} initial insert {first:8.2f} ms   steady-state run {steady:8.2f} ms")
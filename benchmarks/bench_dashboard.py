@@ -0,0 +1,133 @@
+"""
+Benchmark: site dashboard latency vs cameras per site.
+
+For each size a fresh file database gets one site with N cameras spread
+over 16 recorders (8 disks, 2 NICs each) and 10 racks, plus a second site
+of the same size. Timed per size:
+
+    legacy — the previous get_dashboard: load every camera / recorder / rack
+             of the site, count in Python (O(racks x cameras)), five count()
+             round trips for the other device types
+    sql    — main.get_dashboard: site_counters rows + a disk SUM / COUNT
+             and the recorder / rack names
+
+Both must return the same DashboardStats.
+
+Usage:
+    python benchmarks/bench_dashboard.py [sizes...] [--runs N]
+"""
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+import main
+from database import (
+    Base, Site, Building, Rack, Router, Switch, Recorder, RecorderDisk, RecorderNic, PatchPanel, Camera, User,
+    apply_sqlite_pragmas,
+)
+from schemas import DashboardStats
+
+RECORDERS = 16
+RACKS = 10
+
+
+def _make_db(cameras: int):
+    eng = create_engine(f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}")
+    event.listen(eng, "connect", lambda c, r: apply_sqlite_pragmas(c))
+    Base.metadata.create_all(bind=eng)
+    with eng.begin() as conn:
+        conn.execute(User.__table__.insert(), {"id": 1, "username": "admin", "password_hash": "x", "role": "admin"})
+        for sid in (1, 2):
+            conn.execute(Site.__table__.insert(), {"id": sid, "name": f"S{sid}"})
+            rec_ids = [sid * 100 + i for i in range(RECORDERS)]
+            rack_ids = [sid * 100 + i for i in range(RACKS)]
+            conn.execute(Rack.__table__.insert(), [{"id": r, "site_id": sid, "name": f"R{r}"} for r in rack_ids])
+            conn.execute(Recorder.__table__.insert(), [
+                {"id": r, "site_id": sid, "name": f"NVR{r}", "type": ("NVR", "DVR")[r % 2], "channels": 256}
+                for r in rec_ids])
+            conn.execute(RecorderDisk.__table__.insert(), [
+                {"recorder_id": r, "size": "4TB", "capacity_gb": 4000.0, "status": "degraded" if d == 0 else "ok"}
+                for r in rec_ids for d in range(8)])
+            conn.execute(RecorderNic.__table__.insert(), [
+                {"recorder_id": r, "label": f"NIC{n}", "ip": f"10.{sid}.{n}.{r % 250}"} for r in rec_ids for n in (1, 2)])
+            conn.execute(Switch.__table__.insert(), [{"site_id": sid, "name": f"SW{i}"} for i in range(20)])
+            conn.execute(Building.__table__.insert(), [{"site_id": sid, "name": "B"}])
+            conn.execute(Camera.__table__.insert(), [
+                {"site_id": sid, "recorder_id": rec_ids[i % RECORDERS], "rack_id": rack_ids[i % RACKS],
+                 "channel": i // RECORDERS + 1, "name": f"CAM{i}", "ip": f"10.{sid}.{i // 250}.{i % 250}",
+                 "status": "offline" if i % 7 == 0 else "online", "status_real": "online"}
+                for i in range(cameras)])
+    return eng
+
+
+def legacy_dashboard(db, site_id: int) -> DashboardStats:
+    cams = db.query(Camera).filter_by(site_id=site_id).all()
+    recs = db.query(Recorder).filter_by(site_id=site_id).all()
+    racks = db.query(Rack).filter_by(site_id=site_id).all()
+    online = sum(1 for c in cams if c.status != "offline")
+    total_gb = sum(d.capacity_gb or 0 for r in recs for d in r.disks)
+    rec_types = {}
+    for r in recs:
+        rec_types[r.type or "NVR"] = rec_types.get(r.type or "NVR", 0) + 1
+    return DashboardStats(
+        cameras=len(cams), cameras_online=online, cameras_offline=len(cams) - online,
+        recorders=len(recs), racks=len(racks),
+        switches=db.query(Switch).filter_by(site_id=site_id).count(),
+        routers=db.query(Router).filter_by(site_id=site_id).count(),
+        patch_panels=db.query(PatchPanel).filter_by(site_id=site_id).count(),
+        buildings=db.query(Building).filter_by(site_id=site_id).count(),
+        total_storage_tb=round(total_gb / 1000, 3),
+        disks_degraded=sum(1 for r in recs for d in r.disks if d.status != "ok"),
+        recorders_by_type=rec_types,
+        cameras_by_rack={k.name: sum(1 for c in cams if c.rack_id == k.id) for k in racks},
+        cameras_by_recorder={r.name: sum(1 for c in cams if c.recorder_id == r.id) for r in recs},
+    )
+
+
+def _timed(fn, runs: int) -> float:
+    fn()                                            # warm the page cache
+    t0 = time.perf_counter()
+    for _ in range(runs):
+        fn()
+    return (time.perf_counter() - t0) / runs * 1000
+
+
+def run(cameras: int, runs: int) -> dict:
+    eng = _make_db(cameras)
+    db = sessionmaker(bind=eng)()
+    admin = db.get(User, 1)
+
+    def sql():
+        db.expire_all()
+        return main.get_dashboard(1, admin, db)
+
+    def legacy():
+        db.expire_all()
+        return legacy_dashboard(db, 1)
+
+    assert sql() == legacy(), "dashboards differ"
+    r = {"sql_ms": _timed(sql, runs), "legacy_ms": _timed(legacy, max(1, runs // 10))}
+    db.close()
+    eng.dispose()
+    return r
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    runs = 50
+    if "--runs" in args:
+        i = args.index("--runs")
+        runs = int(args[i + 1])
+        del args[i:i + 2]
+    sizes = [int(a) for a in args] or [100, 1_000, 10_000, 50_000]
+    print(f"recorders={RECORDERS} racks={RACKS} runs={runs}")
+    print(f"  {'cameras':>8s} {'legacy':>11s} {'sql':>9s}")
+    for n in sizes:
+        r = run(n, runs)
+        print(f"  {n:8d} {r['legacy_ms']:9.2f}ms {r['sql_ms']:7.2f}ms")
@@ -0,0 +1,125 @@
+"""
+Benchmark: SQLite storage profiles (database.SQLITE_PROFILES) on NetManager workloads.
+
+Per profile, on a fresh file database:
+    api writes   — single-row camera inserts, one commit each (CRUD)
+    sync commits — 256-channel recorder bulk UPDATE + event rows, one commit each
+    event reads  — 24h windowed event counts per site over the events table
+    site reads   — camera listing + status aggregate per site
+    wal growth   — WAL size after the sync workload with a reader pinned,
+                   then after db_maintenance-style PASSIVE / TRUNCATE checkpoints
+
+Usage:
+    python benchmarks/bench_sqlite_profiles.py [events] [sites] [ops]
+"""
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, event, func, select, update
+
+from database import (
+    Base, Site, Recorder, Camera, CameraEvent, SQLITE_PROFILES, apply_sqlite_pragmas, sqlite_profile,
+)
+
+CHANNELS = 256
+
+
+def _make_db(profile: str, events: int, sites: int):
+    path = os.path.join(tempfile.mkdtemp(), "bench.db")
+    eng = create_engine(f"sqlite:///{path}")
+    pragmas = sqlite_profile(profile)
+    event.listen(eng, "connect", lambda c, r: apply_sqlite_pragmas(c, pragmas))
+    Base.metadata.create_all(bind=eng)
+    now = datetime.utcnow()
+    with eng.begin() as conn:
+        conn.execute(Site.__table__.insert(), [{"id": s, "name": f"S{s}"} for s in range(1, sites + 1)])
+        conn.execute(Recorder.__table__.insert(), [
+            {"id": s, "site_id": s, "name": "NVR", "channels": CHANNELS} for s in range(1, sites + 1)])
+        conn.execute(Camera.__table__.insert(), [
+            {"site_id": s, "recorder_id": s, "channel": ch, "name": f"CAM{ch}", "status_real": "online"}
+            for s in range(1, sites + 1) for ch in range(1, CHANNELS + 1)])
+        for start in range(0, events, 10000):
+            conn.execute(CameraEvent.__table__.insert(), [
+                {"site_id": i % sites + 1, "event_type": "status_change",
+                 "severity": ("info", "warn", "crit")[i % 3], "message": "camera went offline",
+                 "created_at": now - timedelta(seconds=i * 30)}
+                for i in range(start, min(events, start + 10000))])
+    return eng, path
+
+
+def _timed(fn, n):
+    t0 = time.perf_counter()
+    for i in range(n):
+        fn(i)
+    return (time.perf_counter() - t0) / n * 1000
+
+
+def run(profile: str, events: int, sites: int, ops: int) -> dict:
+    eng, path = _make_db(profile, events, sites)
+    since = datetime.utcnow() - timedelta(hours=24)
+    r = {}
+
+    def api_write(i):
+        with eng.begin() as conn:
+            conn.execute(Camera.__table__.insert(), {"site_id": 1, "channel": 10000 + i, "name": f"API{i}"})
+
+    def sync_commit(i):
+        with eng.begin() as conn:
+            conn.execute(update(Camera).where(Camera.recorder_id == i % sites + 1).values(
+                offline_streak=i % 3, status_real="online" if i % 2 else "offline"))
+            conn.execute(CameraEvent.__table__.insert(), [
+                {"site_id": i % sites + 1, "event_type": "status_change", "severity": "warn"}
+                for _ in range(20)])
+
+    def event_read(i):
+        with eng.connect() as conn:
+            conn.execute(select(CameraEvent.severity, func.count()).where(
+                CameraEvent.site_id == i % sites + 1, CameraEvent.created_at >= since,
+            ).group_by(CameraEvent.severity)).all()
+
+    def site_read(i):
+        with eng.connect() as conn:
+            sid = i % sites + 1
+            conn.execute(select(Camera).where(Camera.site_id == sid).order_by(Camera.channel)).all()
+            conn.execute(select(Camera.status_real, func.count()).where(
+                Camera.site_id == sid).group_by(Camera.status_real)).all()
+
+    r["api_ms"] = _timed(api_write, ops)
+    r["event_read_ms"] = _timed(event_read, ops)
+    r["site_read_ms"] = _timed(site_read, ops)
+
+    # sync commits with a long-lived reader pinning an old snapshot (read pool)
+    reader = sqlite3.connect(path, isolation_level=None)
+    reader.execute("BEGIN")
+    reader.execute("SELECT COUNT(*) FROM cameras").fetchone()
+    r["sync_ms"] = _timed(sync_commit, ops)
+    r["wal_pinned_mb"] = os.path.getsize(path + "-wal") / 1e6
+    reader.execute("COMMIT")
+    reader.close()
+    with eng.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.exec_driver_sql("PRAGMA wal_checkpoint(PASSIVE)")
+        r["wal_passive_mb"] = os.path.getsize(path + "-wal") / 1e6
+        conn.exec_driver_sql("PRAGMA wal_checkpoint(TRUNCATE)")
+        r["wal_truncate_mb"] = os.path.getsize(path + "-wal") / 1e6
+    eng.dispose()
+    return r
+
+
+if __name__ == "__main__":
+    events = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    sites = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    ops = int(sys.argv[3]) if len(sys.argv) > 3 else 300
+    print(f"events={events} sites={sites} cameras={sites * CHANNELS} ops={ops}")
+    print(f"  {'profile':9s} {'api write':>10s} {'sync commit':>12s} {'event read':>11s} {'site read':>10s}"
+          f"   {'WAL pinned / passive / truncate (MB)'}")
+    for profile in SQLITE_PROFILES:
+        r = run(profile, events, sites, ops)
+        print(f"  {profile:9s} {r['api_ms']:8.3f}ms {r['sync_ms']:10.3f}ms {r['event_read_ms']:9.3f}ms "
+              f"{r['site_read_ms']:8.3f}ms   {r['wal_pinned_mb']:.1f} / {r['wal_passive_mb']:.1f} / "
+              f"{r['wal_truncate_mb']:.1f}")
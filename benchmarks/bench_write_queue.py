@@ -0,0 +1,175 @@
+"""
+Benchmark: concurrent SQLite writers — per-request connections vs the single
+writer queue (db_writer).
+
+API clients each write one camera row per request at a paced target rate while
+a "sync" thread rewrites a 256-channel recorder every 200 ms (bulk UPDATE +
+commit), i.e. CRUD traffic during hybrid syncs. Reported per mode: requests
+done, achieved rate, latency percentiles and "database is locked" errors.
+
+    direct — each request opens a session on a pooled engine and commits
+             (what the API did before); the sync commits on its own engine
+    queue  — requests go through WriteQueue (group commit); the sync commit
+             holds the writer lock via serialized()
+
+Usage:
+    python benchmarks/bench_write_queue.py [clients] [rate_per_s] [seconds] [busy_timeout_s]
+"""
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, event, update
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+
+from database import Base, Site, Recorder, Camera
+from db_writer import WriteQueue, make_writer_engine, serialized
+
+SYNC_CHANNELS = 256
+SYNC_EVERY_S = 0.2
+
+
+def _make_db() -> str:
+    url = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+    eng = create_engine(url)
+    event.listen(eng, "connect", lambda c, r: c.execute("PRAGMA journal_mode=WAL"))
+    Base.metadata.create_all(bind=eng)
+    db = sessionmaker(bind=eng)()
+    db.add(Site(id=1, name="bench"))
+    db.add(Recorder(id=1, site_id=1, name="NVR", channels=SYNC_CHANNELS))
+    db.add_all([Camera(site_id=1, recorder_id=1, channel=ch, name=f"CAM{ch}")
+                for ch in range(1, SYNC_CHANNELS + 1)])
+    db.commit()
+    db.close()
+    eng.dispose()
+    return url
+
+
+def _engine(url: str, busy_timeout: float):
+    eng = create_engine(url, connect_args={"check_same_thread": False, "timeout": busy_timeout},
+                        pool_size=32, max_overflow=0)
+    event.listen(eng, "connect", lambda c, r: c.execute("PRAGMA journal_mode=WAL"))
+    return eng
+
+
+def _api_write(db, n: int):
+    db.add(Camera(site_id=1, channel=100000 + n, name=f"API{n}", ip=f"10.9.{n // 250 % 250}.{n % 250}"))
+
+
+def _sync_write(db, run: int):
+    db.execute(update(Camera).where(Camera.recorder_id == 1).values(
+        offline_streak=run % 3, status_real="online" if run % 2 else "offline"))
+
+
+def _percentile(values, p):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+def run(mode: str, clients: int, rate: float, seconds: float, busy_timeout: float) -> dict:
+    url = _make_db()
+    eng = _engine(url, busy_timeout)
+    Session = sessionmaker(bind=eng)
+    writer = WriteQueue(make_writer_engine(url)) if mode == "queue" else None
+    stop = threading.Event()
+    lock = threading.Lock()
+    latencies, errors = [], {"locked": 0, "other": 0}
+    counter = [0]
+
+    def record_error(e):
+        with lock:
+            errors["locked" if isinstance(e, OperationalError) and "locked" in str(e) else "other"] += 1
+
+    def next_n():
+        with lock:
+            counter[0] += 1
+            return counter[0]
+
+    def direct_request(n):
+        db = Session()
+        try:
+            _api_write(db, n)
+            db.commit()
+        finally:
+            db.close()
+
+    def client():
+        interval = clients / rate
+        next_at = time.perf_counter()
+        while not stop.is_set():
+            next_at += interval
+            n = next_n()
+            t0 = time.perf_counter()
+            try:
+                if writer:
+                    writer.call(_api_write, n)
+                else:
+                    direct_request(n)
+                with lock:
+                    latencies.append((time.perf_counter() - t0) * 1000)
+            except Exception as e:
+                record_error(e)
+            time.sleep(max(0.0, next_at - time.perf_counter()))
+
+    def sync_commit(r):
+        db = Session()
+        try:
+            _sync_write(db, r)
+            db.commit()
+        finally:
+            db.close()
+
+    def sync_loop():
+        commit = serialized(sync_commit) if writer else sync_commit
+        r = 0
+        while not stop.is_set():
+            r += 1
+            try:
+                commit(r)
+            except Exception as e:
+                record_error(e)
+            stop.wait(SYNC_EVERY_S)
+
+    threads = [threading.Thread(target=client) for _ in range(clients)] + [threading.Thread(target=sync_loop)]
+    t0 = time.perf_counter()
+    for t in threads:
+        t.start()
+    time.sleep(seconds)
+    stop.set()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - t0
+    groups = writer.stats() if writer else None
+    if writer:
+        writer.stop()
+        writer.bind.dispose()
+    eng.dispose()
+    return {
+        "done": len(latencies), "rate": len(latencies) / elapsed,
+        "p50": _percentile(latencies, 50), "p99": _percentile(latencies, 99),
+        "max": max(latencies, default=0.0), "errors": errors, "writer": groups,
+    }
+
+
+if __name__ == "__main__":
+    clients = int(sys.argv[1]) if len(sys.argv) > 1 else 32
+    rate = float(sys.argv[2]) if len(sys.argv) > 2 else 400
+    seconds = float(sys.argv[3]) if len(sys.argv) > 3 else 5
+    busy_timeout = float(sys.argv[4]) if len(sys.argv) > 4 else 5.0
+    print(f"clients={clients} target={rate:.0f} writes/s seconds={seconds:.0f} "
+          f"busy_timeout={busy_timeout}s sync={SYNC_CHANNELS}ch every {SYNC_EVERY_S * 1000:.0f}ms")
+    for mode in ("direct", "queue"):
+        r = run(mode, clients, rate, seconds, busy_timeout)
+        extra = ""
+        if r["writer"]:
+            extra = f"  groups={r['writer']['groups']} avg_group={r['writer']['avg_group']}"
+        print(f"  {mode:6s} {r['done']:6d} writes {r['rate']:7.1f}/s  p50 {r['p50']:7.2f} ms  "
+              f"p99 {r['p99']:8.2f} ms  max {r['max']:8.2f} ms  "
+              f"locked={r['errors']['locked']} other={r['errors']['other']}{extra}")
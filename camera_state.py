@@ -0,0 +1,206 @@
+"""
+NetManager — Camera State Cache
+In-memory per-site anti-jitter state, authoritative between sync runs.
+
+sync_site used to load every camera row of the site and write offline_streak /
+last_seen_at / updated_at back on every run, even when nothing changed. Now:
+
+    - the rows (inventory + status + streak + last_seen) are kept in memory
+      per site and reused as long as the site's DB fingerprint is unchanged
+      (count, max id, max updated_at, sum of streaks, max last_seen) — any
+      CRUD edit, delete or write by another process invalidates the cache
+    - transitions (inventory, status_real/status, config) are written through
+      in the same transaction as their events
+    - streak/last_seen-only changes stay in memory ("dirty") and are
+      checkpointed to the DB every CAMERA_STATE_CHECKPOINT_S, when cameras
+      are added, and on shutdown
+
+After a crash at most CAMERA_STATE_CHECKPOINT_S of streak/last_seen updates
+are lost (an offline camera may need one extra strike).
+
+Usage:
+    state = camera_state.load(db, site_id, recorder_id)
+    ...  state.stage(cam_id, values) for every matched camera
+    rows = state.checkpoint_rows(now)   # write with update_camera_state()
+    fp = camera_state.fingerprint(db, site_id)   # after writes, before commit
+    db.commit(); camera_state.store(site_id, state, fp)
+"""
+import logging
+import os
+from datetime import datetime
+from typing import Dict, List, Any, Optional, Set, Tuple
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from database import Camera, SessionLocal
+from camera_upsert import INVENTORY_FIELDS, load_existing, update_camera_state
+
+logger = logging.getLogger("netmanager.camstate")
+
+CAMERA_STATE_CACHE = os.getenv("CAMERA_STATE_CACHE", "1") == "1"
+CAMERA_STATE_CHECKPOINT_S = int(os.getenv("CAMERA_STATE_CHECKPOINT_S", "900"))
+
+# Changes to these are transitions — written through immediately
+WRITE_THROUGH_FIELDS = INVENTORY_FIELDS + ["configured", "status_config", "status_real", "status"]
+# Changes to these only are kept in memory until the next checkpoint
+MEMORY_FIELDS = ["offline_streak", "last_seen_at"]
+
+_cameras = Camera.__table__
+
+Fingerprint = Tuple[Any, ...]
+
+
+class SiteState:
+    """Cached camera rows of one site (one recorder scope) + pending changes."""
+
+    def __init__(self, site_id: int, recorder_id: Optional[int],
+                 rows: List[Dict[str, Any]], fp: Optional[Fingerprint], now: datetime):
+        self.site_id = site_id
+        self.recorder_id = recorder_id
+        self.rows: Dict[int, Dict[str, Any]] = {r["id"]: r for r in rows}
+        self.fingerprint = fp
+        self.dirty: Set[int] = set()
+        self.checkpointed_at = now
+        self._staged: Dict[int, Dict[str, Any]] = {}
+        self._staged_dirty: Set[int] = set()
+        self._written: Set[int] = set()
+        self._checkpointed = False
+
+    def existing(self) -> List[Dict[str, Any]]:
+        """Copies of the cached rows (safe to hand to the evaluate loop)."""
+        return [dict(r) for r in self.rows.values()]
+
+    def stage(self, cam_id: int, values: Dict[str, Any]) -> bool:
+        """
+        Record the evaluated values of a camera.
+        Returns True if it is a transition that must be written now.
+        """
+        old = self.rows.get(cam_id, {})
+        transition = any(old.get(f) != values.get(f) for f in WRITE_THROUGH_FIELDS)
+        self._staged[cam_id] = {f: values[f] for f in WRITE_THROUGH_FIELDS + MEMORY_FIELDS}
+        if transition:
+            self._written.add(cam_id)
+            self._staged_dirty.discard(cam_id)
+        elif any(old.get(f) != values.get(f) for f in MEMORY_FIELDS):
+            self._staged_dirty.add(cam_id)
+        return transition
+
+    def checkpoint_rows(self, now: datetime, force: bool = False) -> List[Dict[str, Any]]:
+        """
+        Memory-only rows to write in this run: none unless the checkpoint is
+        due (or forced / the cache is disabled).
+        """
+        due = (force or not CAMERA_STATE_CACHE
+               or (now - self.checkpointed_at).total_seconds() >= CAMERA_STATE_CHECKPOINT_S)
+        if not due:
+            return []
+        self._checkpointed = True
+        pending = (self.dirty - self._written) | self._staged_dirty
+        rows = []
+        for cam_id in pending:
+            row = {**self.rows.get(cam_id, {}), **self._staged.get(cam_id, {})}
+            rows.append({"id": cam_id, "offline_streak": row.get("offline_streak") or 0,
+                         "last_seen_at": row.get("last_seen_at")})
+        return rows
+
+    def discard(self):
+        """Forget staged values of a run that did not commit."""
+        self._staged = {}
+        self._staged_dirty = set()
+        self._written = set()
+        self._checkpointed = False
+
+    def apply(self, now: datetime):
+        """Merge staged values after a successful commit."""
+        for cam_id, values in self._staged.items():
+            if cam_id in self.rows:
+                self.rows[cam_id].update(values)
+        if self._checkpointed:
+            self.dirty = set()
+            self.checkpointed_at = now
+        else:
+            # transitions wrote their memory fields too
+            self.dirty = (self.dirty - self._written) | self._staged_dirty
+        self.discard()
+
+
+# site_id -> SiteState
+_states: Dict[int, SiteState] = {}
+_stats = {"hits": 0, "misses": 0, "checkpoints": 0}
+
+
+def fingerprint(db: Session, site_id: int) -> Fingerprint:
+    """Cheap aggregate that changes whenever any camera row of the site changes in the DB."""
+    c = _cameras.c
+    row = db.execute(select(
+        func.count(c.id), func.max(c.id), func.max(c.updated_at),
+        func.total(c.offline_streak), func.max(c.last_seen_at),
+    ).where(c.site_id == site_id)).first()
+    return tuple(row)
+
+
+def load(db: Session, site_id: int, recorder_id: Optional[int] = None,
+         now: Optional[datetime] = None) -> SiteState:
+    """Cached state if still valid for this DB, else a fresh load (one SELECT)."""
+    now = now or datetime.utcnow()
+    cached = _states.get(site_id)
+    if CAMERA_STATE_CACHE and cached and cached.recorder_id == recorder_id:
+        if cached.fingerprint == fingerprint(db, site_id):
+            _stats["hits"] += 1
+            cached.discard()
+            return cached
+        logger.debug("camera state site=%d invalidated (DB changed)", site_id)
+    _stats["misses"] += 1
+    # unsaved memory-only changes of a stale state are dropped with it
+    return SiteState(site_id, recorder_id, load_existing(db, site_id, recorder_id), None, now)
+
+
+def store(site_id: int, state: SiteState, fp: Fingerprint, now: Optional[datetime] = None):
+    """Keep `state` as authoritative after its run committed."""
+    now = now or datetime.utcnow()
+    if state._checkpointed:
+        _stats["checkpoints"] += 1
+    state.apply(now)
+    state.fingerprint = fp
+    if CAMERA_STATE_CACHE:
+        _states[site_id] = state
+
+
+def drop(site_id: int):
+    _states.pop(site_id, None)
+
+
+def reset():
+    _states.clear()
+    for k in _stats:
+        _stats[k] = 0
+
+
+def checkpoint_all() -> int:
+    """Write every site's memory-only changes (shutdown). Returns rows written."""
+    written = 0
+    db = SessionLocal()
+    try:
+        for site_id, state in list(_states.items()):
+            rows = state.checkpoint_rows(datetime.utcnow(), force=True)
+            if rows:
+                update_camera_state(db, rows)
+                written += len(rows)
+            db.commit()
+            store(site_id, state, fingerprint(db, site_id))
+    finally:
+        db.close()
+    logger.info("Camera state checkpoint: %d rows written", written)
+    return written
+
+
+def stats() -> Dict[str, Any]:
+    return {
+        "enabled": CAMERA_STATE_CACHE,
+        "checkpoint_s": CAMERA_STATE_CHECKPOINT_S,
+        "sites": len(_states),
+        "cameras": sum(len(s.rows) for s in _states.values()),
+        "dirty": sum(len(s.dirty) for s in _states.values()),
+        **_stats,
+    }
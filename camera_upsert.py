@@ -0,0 +1,158 @@
+"""
+NetManager — Camera Bulk Upsert
+Core-level write path for hybrid sync.
+
+Instead of loading every Camera ORM object and mutating it attribute by
+attribute, sync_site computes the new values in plain dicts and writes them
+with one SQLite `INSERT ... ON CONFLICT DO UPDATE ... RETURNING` statement
+keyed on (site_id, recorder_id, channel).
+
+Rows that can't be addressed by that key (IP-only matches, credentials
+without a recorder) go through a single executemany UPDATE by primary key.
+Without the key index (migration 002 skipped on duplicated channels), rows
+of matched cameras (carrying "id") are updated by id and only new cameras
+are inserted.
+"""
+import logging
+from typing import Dict, List, Any
+
+from sqlalchemy import select, update, bindparam, or_, and_, text
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from database import Camera, UPSERT_KEY_INDEX
+
+logger = logging.getLogger("netmanager.upsert")
+
+_cameras = Camera.__table__
+
+# Fields compared/written on every sync for a matched camera
+INVENTORY_FIELDS = ["name", "ip", "mac", "model", "serial"]
+STATE_FIELDS = ["configured", "status_config", "status_real", "status",
+                "last_seen_at", "offline_streak"]
+UPDATE_FIELDS = INVENTORY_FIELDS + STATE_FIELDS + ["updated_at"]
+INSERT_FIELDS = ["site_id", "recorder_id", "channel", "cam_type"] + UPDATE_FIELDS
+
+# Columns loaded for matching + change detection (no ORM identity map)
+EXISTING_COLUMNS = ["id", "recorder_id", "channel"] + INVENTORY_FIELDS + STATE_FIELDS
+
+_upsert_key_ok = False
+
+
+def has_upsert_key(db: Session) -> bool:
+    """
+    True if the partial unique index backing ON CONFLICT exists.
+    The migration skips it on databases with duplicated channels — in that
+    case every write goes through the by-id / plain insert path.
+    """
+    global _upsert_key_ok
+    if _upsert_key_ok:
+        return True
+    row = db.execute(text(
+        "SELECT 1 FROM sqlite_master WHERE type='index' AND name=:n"
+    ), {"n": UPSERT_KEY_INDEX}).first()
+    _upsert_key_ok = row is not None
+    return _upsert_key_ok
+
+
+def load_existing(db: Session, site_id: int, recorder_id=None) -> List[Dict[str, Any]]:
+    """Load the columns needed by sync_site as plain dicts (one SELECT)."""
+    q = select(*[_cameras.c[c] for c in EXISTING_COLUMNS]).where(_cameras.c.site_id == site_id)
+    if recorder_id:
+        q = q.where(_cameras.c.recorder_id == recorder_id)
+    return [dict(r) for r in db.execute(q).mappings().all()]
+
+
+def upsert_cameras(db: Session, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Bulk INSERT ... ON CONFLICT(site_id, recorder_id, channel) DO UPDATE.
+
+    Each row must carry every key in INSERT_FIELDS, plus "id" when it is for
+    an existing camera (used if the key index is missing). cam_type is only
+    used on insert (never overwrites a user-edited type). The DO UPDATE is
+    guarded so identical rows are not rewritten.
+
+    Returns [{id, channel, recorder_id}] for rows actually inserted or changed.
+    """
+    if not rows:
+        return []
+    if not has_upsert_key(db):
+        return _upsert_without_key(db, rows)
+
+    stmt = sqlite_insert(_cameras)
+    changed = or_(*[_cameras.c[f].is_not(stmt.excluded[f])
+                    for f in INVENTORY_FIELDS + STATE_FIELDS])
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["site_id", "recorder_id", "channel"],
+        index_where=and_(_cameras.c.recorder_id.is_not(None), _cameras.c.channel.is_not(None)),
+        set_={f: stmt.excluded[f] for f in UPDATE_FIELDS},
+        where=changed,
+    ).returning(_cameras.c.id, _cameras.c.channel, _cameras.c.recorder_id)
+
+    out = [dict(r) for r in db.execute(stmt, [{f: r[f] for f in INSERT_FIELDS} for r in rows]).mappings()]
+    logger.debug("upsert_cameras: %d rows sent, %d written", len(rows), len(out))
+    return out
+
+
+def insert_cameras(db: Session, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Plain bulk INSERT ... RETURNING (no conflict key available)."""
+    if not rows:
+        return []
+    stmt = sqlite_insert(_cameras).returning(
+        _cameras.c.id, _cameras.c.channel, _cameras.c.recorder_id
+    )
+    return [dict(r) for r in db.execute(stmt, [{f: r[f] for f in INSERT_FIELDS} for r in rows]).mappings()]
+
+
+def _update_by_id_stmt():
+    changed = or_(*[_cameras.c[f].is_not(bindparam(f"b_{f}"))
+                    for f in INVENTORY_FIELDS + STATE_FIELDS])
+    return update(_cameras).where(_cameras.c.id == bindparam("b_id"), changed).values(
+        {f: bindparam(f"b_{f}") for f in UPDATE_FIELDS}
+    )
+
+
+def _by_id_params(row: Dict[str, Any]) -> Dict[str, Any]:
+    return {"b_id": row["id"], **{f"b_{f}": row[f] for f in UPDATE_FIELDS}}
+
+
+def update_cameras_by_id(db: Session, rows: List[Dict[str, Any]]) -> int:
+    """
+    executemany UPDATE by primary key. Each row needs "id" + UPDATE_FIELDS.
+    Guarded like the upsert: rows whose values are all unchanged are not
+    rewritten (and keep their updated_at). Returns number of rows written.
+    """
+    if not rows:
+        return 0
+    return db.execute(_update_by_id_stmt(), [_by_id_params(r) for r in rows]).rowcount
+
+
+def _upsert_without_key(db: Session, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    upsert_cameras fallback when the key index is missing: guarded UPDATE by
+    id for matched cameras (one statement each, RETURNING the changed ones),
+    plain INSERT for the rest. Same return value as the upsert.
+    """
+    stmt = _update_by_id_stmt().returning(_cameras.c.id, _cameras.c.channel, _cameras.c.recorder_id)
+    out = []
+    for r in rows:
+        if r.get("id"):
+            out += [dict(m) for m in db.execute(stmt, _by_id_params(r)).mappings()]
+    return out + insert_cameras(db, [r for r in rows if not r.get("id")])
+
+
+def update_camera_state(db: Session, rows: List[Dict[str, Any]]) -> int:
+    """
+    Checkpoint memory-only anti-jitter state (offline_streak, last_seen_at) by id.
+    updated_at is left untouched — these writes are not data changes.
+    """
+    if not rows:
+        return 0
+    stmt = update(_cameras).where(_cameras.c.id == bindparam("b_id")).values(
+        offline_streak=bindparam("b_offline_streak"),
+        last_seen_at=bindparam("b_last_seen_at"),
+        updated_at=_cameras.c.updated_at,     # suppress onupdate
+    )
+    db.execute(stmt, [{"b_id": r["id"], "b_offline_streak": r["offline_streak"],
+                       "b_last_seen_at": r["last_seen_at"]} for r in rows])
+    return len(rows)
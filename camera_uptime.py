@@ -0,0 +1,171 @@
+"""
+NetManager — Camera Uptime / SLA
+Status time series (camera_status_intervals) and uptime over arbitrary windows.
+
+sync_site calls record_transitions() for every camera whose status_real
+changed (and for new cameras): the open interval is closed at `now` and a
+new one is opened. The camera create / update endpoints do the same through
+record_changes() when status_real, the site or the recorder changed. Uptime is then a single indexed aggregate per scope:
+
+    overlap(interval, window) summed by status
+    uptime_pct = online / (online + offline)      (unknown and gaps excluded)
+
+Usage:
+    record_transitions(db, site_id, [(camera_id, recorder_id, "offline")], now)
+    before = {c.id: interval_key(c) for c in cams}
+    ... write, flush ...
+    record_changes(db, cams, before, now)
+    uptime(db, start, end, site_id=1, target_pct=99.5)
+"""
+import logging
+from datetime import datetime
+from collections import defaultdict
+from typing import Dict, Iterable, List, Any, Optional, Tuple
+
+from sqlalchemy import func, select, update, or_, literal, DateTime
+from sqlalchemy.orm import Session
+
+from cold_archive import naive_utc
+from database import CameraStatusInterval
+
+logger = logging.getLogger("netmanager.uptime")
+
+_iv = CameraStatusInterval.__table__
+
+STATUSES = ("online", "offline", "unknown")
+
+Transition = Tuple[int, Optional[int], str]     # (camera_id, recorder_id, new status)
+
+
+# ============================================
+# WRITE
+# ============================================
+
+def record_transitions(db: Session, site_id: int, transitions: List[Transition],
+                       now: datetime) -> List[Dict[str, Any]]:
+    """
+    Close the open interval of each camera and open one with its new status.
+    Returns the new intervals as [{id, camera_id, status, started_at}].
+    """
+    if not transitions:
+        return []
+    ids = [t[0] for t in transitions]
+    db.execute(
+        update(_iv).where(_iv.c.camera_id.in_(ids), _iv.c.ended_at.is_(None)).values(ended_at=now)
+    )
+    stmt = _iv.insert().returning(_iv.c.id, _iv.c.camera_id, _iv.c.status, _iv.c.started_at,
+                                  sort_by_parameter_order=True)
+    return [dict(r) for r in db.execute(stmt, [
+        {"site_id": site_id, "camera_id": cam_id, "recorder_id": recorder_id,
+         "status": status or "unknown", "started_at": now}
+        for cam_id, recorder_id, status in transitions
+    ]).mappings()]
+
+
+def interval_key(cam) -> Tuple[int, Optional[int], str]:
+    """What the open interval of a camera records: (site_id, recorder_id, status_real)."""
+    return cam.site_id, cam.recorder_id, cam.status_real or "unknown"
+
+
+def record_changes(db: Session, cameras: Iterable, before: Dict[int, Tuple[int, Optional[int], str]],
+                   now: datetime) -> List[Dict[str, Any]]:
+    """
+    record_transitions() for the written cameras whose interval_key changed
+    (before = {camera_id: interval_key(cam)} taken ahead of the write;
+    missing for new cameras, which get their first interval). Call after the flush.
+    """
+    by_site: Dict[int, List[Transition]] = defaultdict(list)
+    for cam in cameras:
+        if before.get(cam.id) != interval_key(cam):
+            by_site[cam.site_id].append((cam.id, cam.recorder_id, cam.status_real))
+    return [iv for site_id, transitions in by_site.items()
+            for iv in record_transitions(db, site_id, transitions, now)]
+
+
+# ============================================
+# READ
+# ============================================
+
+def _pct(online: float, offline: float) -> Optional[float]:
+    total = online + offline
+    return round(online * 100.0 / total, 4) if total > 0 else None
+
+
+def _summary(seconds: Dict[str, float], window_s: float, target_pct: Optional[float]) -> Dict[str, Any]:
+    online, offline, unknown = (seconds.get(s, 0.0) for s in STATUSES)
+    pct = _pct(online, offline)
+    return {
+        "online_s": round(online, 3),
+        "offline_s": round(offline, 3),
+        "unknown_s": round(unknown, 3),
+        "no_data_s": round(max(0.0, window_s - online - offline - unknown), 3),
+        "uptime_pct": pct,
+        "sla_met": None if target_pct is None or pct is None else pct >= target_pct,
+    }
+
+
+def uptime(
+    db: Session, start: datetime, end: datetime,
+    camera_id: Optional[int] = None, recorder_id: Optional[int] = None,
+    site_id: Optional[int] = None, target_pct: Optional[float] = None,
+    per_camera: bool = False, now: Optional[datetime] = None,
+) -> Dict[str, Any]:
+    """
+    Seconds per status and uptime % for one camera, recorder or site over
+    [start, end). The window is capped at `now` (open intervals end there).
+    Aware start / end are converted to the stored naive UTC.
+    """
+    start, end = naive_utc(start), naive_utc(end)
+    now = now or datetime.utcnow()
+    end = min(end, now)
+    window_s = max(0.0, (end - start).total_seconds())
+
+    start_b = literal(start, DateTime)
+    end_b = literal(end, DateTime)
+    overlap_end = func.min(func.coalesce(_iv.c.ended_at, end_b), end_b)
+    overlap_start = func.max(_iv.c.started_at, start_b)
+    seconds = func.sum((func.julianday(overlap_end) - func.julianday(overlap_start)) * 86400.0)
+
+    q = select(_iv.c.camera_id, _iv.c.status, seconds).where(
+        _iv.c.started_at < end_b,
+        or_(_iv.c.ended_at.is_(None), _iv.c.ended_at > start_b),
+    )
+    if camera_id is not None:
+        q = q.where(_iv.c.camera_id == camera_id)
+        scope, scope_id = "camera", camera_id
+    elif recorder_id is not None:
+        q = q.where(_iv.c.recorder_id == recorder_id)
+        scope, scope_id = "recorder", recorder_id
+    else:
+        q = q.where(_iv.c.site_id == site_id)
+        scope, scope_id = "site", site_id
+    q = q.group_by(_iv.c.camera_id, _iv.c.status)
+
+    by_camera: Dict[int, Dict[str, float]] = {}
+    for cam_id, status, secs in db.execute(q):
+        by_camera.setdefault(cam_id, {})[status] = max(0.0, secs or 0.0)
+
+    totals: Dict[str, float] = {}
+    for secs in by_camera.values():
+        for status, v in secs.items():
+            totals[status] = totals.get(status, 0.0) + v
+
+    n = len(by_camera) if scope != "camera" else 1
+    out = {
+        "scope": scope,
+        "scope_id": scope_id,
+        "start": start,
+        "end": end,
+        "window_s": window_s,
+        "cameras": len(by_camera),
+        "target_pct": target_pct,
+        # site/recorder totals are camera-seconds — no_data is relative to every camera
+        **_summary(totals, window_s * n, target_pct),
+        "per_camera": [],
+    }
+    if per_camera:
+        rows = [{"camera_id": cam_id, **_summary(secs, window_s, target_pct)}
+                for cam_id, secs in by_camera.items()]
+        rows.sort(key=lambda r: (r["uptime_pct"] is None, r["uptime_pct"] or 0.0))
+        out["per_camera"] = rows
+    return out
@@ -0,0 +1,427 @@
+"""
+NetManager — Cold Storage Archive
+Rows that retention ages out of camera_events, camera_snapshots and
+sync_logs are written to compressed columnar files before they are deleted,
+so the live SQLite file stays small while a year of history stays readable.
+
+Layout (one partition per table / site / month, append-only segments):
+
+    ARCHIVE_DIR/<table>/site=<id>/<YYYY-MM>/<min_id>-<max_id>.nma
+
+    b"NMA1" + u32 header_len + header JSON + column blocks
+    header: {"table", "site_id", "rows", "min_id", "max_id", "min_ts", "max_ts",
+             "columns": [[name, kind, offset, length], ...]}
+    kind c — snapshot_codec frame holding that one column (zlib, dict-encoded strings)
+    kind t — same, datetimes as epoch microseconds
+    kind x — raw bytes column: u32 n, n × i32 lengths (-1 = None), data
+             (snapshot payloads, already compressed)
+
+Readers mmap a segment and decode only the columns they touch; partitions
+and segments outside the requested time window are skipped from the path
+and the header alone. Retrying a batch rewrites the same segment name and
+readers drop duplicate ids, so a failed delete after archiving is harmless.
+Partitions with more than ARCHIVE_COMPACT_SEGMENTS segments are merged, and
+partitions older than ARCHIVE_RETENTION_DAYS are removed.
+
+Usage:
+    archive_rows(db, CameraEvent, ids)          # before deleting them (retention)
+    query("camera_events", site_id, since=..., until=..., where={"severity": "crit"}, limit=100)
+    snapshot_chain(site_id, run_id)             # keyframe + deltas of an archived run
+"""
+import json
+import logging
+import mmap
+import os
+import shutil
+import struct
+import threading
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import select, DateTime, LargeBinary
+from sqlalchemy.orm import Session
+
+import database
+from database import CameraEvent, CameraSnapshot, SyncLog
+from snapshot_codec import Frame, encode_frame
+
+logger = logging.getLogger("netmanager.archive")
+
+ARCHIVE_ENABLED = os.getenv("ARCHIVE_ENABLED", "1") == "1"
+ARCHIVE_DIR = os.getenv("ARCHIVE_DIR", "")                  # default: <db dir>/archive
+ARCHIVE_RETENTION_DAYS = int(os.getenv("ARCHIVE_RETENTION_DAYS", "365"))
+ARCHIVE_COMPACT_SEGMENTS = int(os.getenv("ARCHIVE_COMPACT_SEGMENTS", "32"))
+
+MAGIC = b"NMA1"
+SUFFIX = ".nma"
+
+# table -> (model, timestamp column)
+TABLES = {
+    "camera_events": (CameraEvent, "created_at"),
+    "camera_snapshots": (CameraSnapshot, "collected_at"),
+    "sync_logs": (SyncLog, "created_at"),
+}
+
+_EPOCH = datetime(1970, 1, 1)
+_compact_lock = threading.Lock()
+
+
+def naive_utc(ts: Optional[datetime]) -> Optional[datetime]:
+    """Stored timestamps are naive UTC; convert an aware one (e.g. '...Z' from a query string)."""
+    if ts is not None and ts.tzinfo is not None:
+        return ts.astimezone(timezone.utc).replace(tzinfo=None)
+    return ts
+
+
+def archive_root(bind=None) -> Optional[str]:
+    """ARCHIVE_DIR, or an `archive` dir next to the (file) database; None if disabled."""
+    if not ARCHIVE_ENABLED:
+        return None
+    if ARCHIVE_DIR:
+        return ARCHIVE_DIR
+    path = (bind or database.engine).url.database
+    if not path or path == ":memory:":
+        return None
+    return os.path.join(os.path.dirname(os.path.abspath(path)), "archive")
+
+
+def _to_us(ts: Optional[datetime]) -> Optional[int]:
+    return None if ts is None else (ts - _EPOCH) // timedelta(microseconds=1)
+
+
+def _from_us(us: Optional[int]) -> Optional[datetime]:
+    return None if us is None else _EPOCH + timedelta(microseconds=us)
+
+
+# ============================================
+# SEGMENT FILES
+# ============================================
+
+def _encode_bytes(values: List[Optional[bytes]]) -> bytes:
+    lengths = [-1 if v is None else len(v) for v in values]
+    return struct.pack(f"<I{len(values)}i", len(values), *lengths) + b"".join(v for v in values if v)
+
+
+def _decode_bytes(raw: bytes) -> List[Optional[bytes]]:
+    (n,) = struct.unpack_from("<I", raw, 0)
+    lengths = struct.unpack_from(f"<{n}i", raw, 4)
+    pos = 4 + 4 * n
+    out = []
+    for ln in lengths:
+        if ln < 0:
+            out.append(None)
+        else:
+            out.append(raw[pos:pos + ln])
+            pos += ln
+    return out
+
+
+def write_segment(path: str, table: str, site_id: int, rows: List[Dict[str, Any]]) -> int:
+    """Write rows (full table rows, same keys) as one segment file. Returns its size."""
+    model, ts_col = TABLES[table]
+    kinds = {}
+    for col in model.__table__.c:
+        kinds[col.name] = "t" if isinstance(col.type, DateTime) else "x" if isinstance(col.type, LargeBinary) else "c"
+
+    blocks, columns, offset = [], [], 0
+    for name, kind in kinds.items():
+        values = [r.get(name) for r in rows]
+        if kind == "x":
+            data = _encode_bytes(values)
+        else:
+            if kind == "t":
+                values = [_to_us(v) for v in values]
+            data = encode_frame([{name: v} for v in values])
+        columns.append([name, kind, offset, len(data)])
+        blocks.append(data)
+        offset += len(data)
+
+    ids = [r["id"] for r in rows]
+    stamps = [r[ts_col] for r in rows if r[ts_col] is not None]
+    header = json.dumps({
+        "table": table, "site_id": site_id, "rows": len(rows),
+        "min_id": min(ids), "max_id": max(ids),
+        "min_ts": min(stamps).isoformat() if stamps else None,
+        "max_ts": max(stamps).isoformat() if stamps else None,
+        "columns": columns,
+    }, separators=(",", ":")).encode("utf-8")
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(MAGIC + struct.pack("<I", len(header)) + header)
+        for data in blocks:
+            f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+    return os.path.getsize(path)
+
+
+class Segment:
+    """Memory-mapped segment; columns are decoded on first access."""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mm[:4] != MAGIC:
+            self._mm.close()
+            raise ValueError(f"{path}: not an archive segment")
+        (n,) = struct.unpack_from("<I", self._mm, 4)
+        self.header = json.loads(self._mm[8:8 + n])
+        self._body = 8 + n
+        self._dir = {name: (kind, off, ln) for name, kind, off, ln in self.header["columns"]}
+        self._cols: Dict[str, list] = {}
+
+    @property
+    def rows(self) -> int:
+        return self.header["rows"]
+
+    def column(self, name: str) -> list:
+        col = self._cols.get(name)
+        if col is None:
+            kind, off, ln = self._dir[name]
+            raw = self._mm[self._body + off:self._body + off + ln]
+            if kind == "x":
+                col = _decode_bytes(raw)
+            else:
+                frame = Frame(raw)
+                col = [frame.value(name, i) for i in range(frame.n_rows)]
+                if kind == "t":
+                    col = [_from_us(v) for v in col]
+            self._cols[name] = col
+        return col
+
+    def close(self):
+        self._cols.clear()
+        self._mm.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# ============================================
+# PARTITIONS
+# ============================================
+
+def _partition_dir(root: str, table: str, site_id: int, month: str) -> str:
+    return os.path.join(root, table, f"site={site_id}", month)
+
+
+def _months(root: str, table: str, site_id: int) -> List[str]:
+    base = os.path.join(root, table, f"site={site_id}")
+    try:
+        return sorted(m for m in os.listdir(base) if len(m) == 7)
+    except FileNotFoundError:
+        return []
+
+
+def _segments(part: str) -> List[str]:
+    try:
+        names = [n for n in os.listdir(part) if n.endswith(SUFFIX)]
+    except FileNotFoundError:
+        return []
+    return [os.path.join(part, n) for n in sorted(names, key=lambda n: int(n.split("-")[0]))]
+
+
+def _month_bounds(month: str) -> Tuple[datetime, datetime]:
+    start = datetime.strptime(month, "%Y-%m")
+    end = (start + timedelta(days=32)).replace(day=1)
+    return start, end
+
+
+# ============================================
+# WRITE (retention hook)
+# ============================================
+
+def archive_rows(db: Session, model, ids: List[int]) -> int:
+    """
+    Copy rows `ids` of an archived table into segment files, one per
+    (site, month). Called by retention before the rows are deleted.
+    Returns the number of rows written (0 when archiving is disabled).
+    """
+    root = archive_root(db.get_bind())
+    if root is None or not ids:
+        return 0
+    table = model.__table__.name
+    ts_col = TABLES[table][1]
+    rows = [dict(r) for r in db.execute(select(model.__table__).where(model.id.in_(ids))).mappings()]
+
+    parts: Dict[Tuple[int, str], List[Dict[str, Any]]] = defaultdict(list)
+    for r in rows:
+        ts = r[ts_col] or datetime.utcnow()
+        parts[(r["site_id"], ts.strftime("%Y-%m"))].append(r)
+    for (site_id, month), part_rows in parts.items():
+        part_rows.sort(key=lambda r: r["id"])
+        name = f"{part_rows[0]['id']}-{part_rows[-1]['id']}{SUFFIX}"
+        write_segment(os.path.join(_partition_dir(root, table, site_id, month), name), table, site_id, part_rows)
+        if len(_segments(_partition_dir(root, table, site_id, month))) > ARCHIVE_COMPACT_SEGMENTS:
+            compact(table, site_id, month, root)
+    return len(rows)
+
+
+def _read_all(path: str) -> List[Dict[str, Any]]:
+    with Segment(path) as seg:
+        names = list(seg._dir)
+        cols = [seg.column(n) for n in names]
+        return [dict(zip(names, vals)) for vals in zip(*cols)]
+
+
+def compact(table: str, site_id: int, month: str, root: Optional[str] = None) -> int:
+    """Merge a partition's segments into one (duplicates dropped). Returns segments merged."""
+    root = root or archive_root()
+    part = _partition_dir(root, table, site_id, month)
+    with _compact_lock:
+        paths = _segments(part)
+        if len(paths) < 2:
+            return 0
+        by_id: Dict[int, Dict[str, Any]] = {}
+        for p in paths:
+            for r in _read_all(p):
+                by_id[r["id"]] = r
+        rows = [by_id[i] for i in sorted(by_id)]
+        merged = os.path.join(part, f"{rows[0]['id']}-{rows[-1]['id']}{SUFFIX}")
+        write_segment(merged, table, site_id, rows)
+        for p in paths:
+            if p != merged:
+                os.remove(p)
+    logger.info("Archive compacted %s site=%d %s: %d segments, %d rows", table, site_id, month, len(paths), len(rows))
+    return len(paths)
+
+
+def prune_archive(now: Optional[datetime] = None, days: int = ARCHIVE_RETENTION_DAYS, bind=None) -> int:
+    """Delete month partitions that ended more than `days` ago. Returns partitions removed."""
+    root = archive_root(bind)
+    if root is None or days <= 0 or not os.path.isdir(root):
+        return 0
+    cutoff = (now or datetime.utcnow()) - timedelta(days=days)
+    removed = 0
+    for table in TABLES:
+        base = os.path.join(root, table)
+        for site_dir in (os.listdir(base) if os.path.isdir(base) else []):
+            for month in _months(root, table, int(site_dir.split("=", 1)[1])):
+                if _month_bounds(month)[1] <= cutoff:
+                    shutil.rmtree(os.path.join(base, site_dir, month), ignore_errors=True)
+                    removed += 1
+    return removed
+
+
+# ============================================
+# READ
+# ============================================
+
+def query(table: str, site_id: int, since: Optional[datetime] = None, until: Optional[datetime] = None,
+          where: Optional[Dict[str, Any]] = None, columns: Optional[Iterable[str]] = None,
+          limit: Optional[int] = None, exclude_ids: Iterable[int] = ()) -> List[Dict[str, Any]]:
+    """
+    Archived rows of one site, newest first, with since <= ts <= until and
+    column == value for each `where` item. Only the timestamp, id, filter
+    and requested columns are decoded.
+    """
+    root = archive_root()
+    if root is None:
+        return []
+    since, until = naive_utc(since), naive_utc(until)
+    model, ts_col = TABLES[table]
+    wanted = list(columns) if columns else [c.name for c in model.__table__.c]
+    seen = set(exclude_ids)
+    out: List[Dict[str, Any]] = []
+
+    for month in reversed(_months(root, table, site_id)):
+        start, end = _month_bounds(month)
+        if (since and end <= since) or (until and start > until):
+            continue
+        found = []
+        for path in _segments(_partition_dir(root, table, site_id, month)):
+            try:
+                seg = Segment(path)
+            except FileNotFoundError:            # merged away by compaction meanwhile
+                continue
+            with seg:
+                h = seg.header
+                if h["max_ts"] and since and datetime.fromisoformat(h["max_ts"]) < since:
+                    continue
+                if h["min_ts"] and until and datetime.fromisoformat(h["min_ts"]) > until:
+                    continue
+                stamps, ids = seg.column(ts_col), seg.column("id")
+                keep = [i for i in range(seg.rows)
+                        if ids[i] not in seen
+                        and not (since and (stamps[i] is None or stamps[i] < since))
+                        and not (until and (stamps[i] is None or stamps[i] > until))]
+                for col, value in (where or {}).items():
+                    vals = seg.column(col)
+                    keep = [i for i in keep if vals[i] == value]
+                cols = {c: seg.column(c) for c in wanted}
+                for i in keep:
+                    seen.add(ids[i])
+                    found.append({c: cols[c][i] for c in wanted} | {"id": ids[i], ts_col: stamps[i]})
+        found.sort(key=lambda r: (r[ts_col] or _EPOCH, r["id"]), reverse=True)
+        out.extend(found)
+        if limit and len(out) >= limit:          # older months cannot hold newer rows
+            break
+    return out[:limit] if limit else out
+
+
+def snapshot_chain(site_id: int, run_id: str) -> Optional[List[SimpleNamespace]]:
+    """
+    Archived snapshot `run_id` plus the keyframe and deltas needed to rebuild
+    it (ordered by id, as snapshot_store expects), or None if not archived.
+    """
+    root = archive_root()
+    if root is None:
+        return None
+    paths = [p for m in _months(root, "camera_snapshots", site_id)
+             for p in _segments(_partition_dir(root, "camera_snapshots", site_id, m))]
+    target = None
+    for path in reversed(paths):
+        with Segment(path) as seg:
+            runs = seg.column("run_id")
+            if run_id in runs:
+                i = runs.index(run_id)
+                target = {c: seg.column(c)[i] for c in seg._dir}
+                break
+    if target is None:
+        return None
+    if target["encoding"] != "delta":
+        return [SimpleNamespace(**target)]
+
+    first, last = target["keyframe_id"], target["id"]
+    chain: Dict[int, Dict[str, Any]] = {}
+    for path in paths:
+        with Segment(path) as seg:
+            if seg.header["max_id"] < first or seg.header["min_id"] > last:
+                continue
+            ids, kfs = seg.column("id"), seg.column("keyframe_id")
+            for i, rid in enumerate(ids):
+                if rid == first or (kfs[i] == first and rid <= last):
+                    chain[rid] = {c: seg.column(c)[i] for c in seg._dir}
+    return [SimpleNamespace(**chain[i]) for i in sorted(chain)]
+
+
+def stats() -> Dict[str, Any]:
+    """Per-table segment, row and byte counts plus the oldest/newest archived month."""
+    root = archive_root()
+    out: Dict[str, Any] = {"enabled": root is not None, "dir": root,
+                           "retention_days": ARCHIVE_RETENTION_DAYS, "tables": {}}
+    if root is None:
+        return out
+    for table in TABLES:
+        t = {"segments": 0, "rows": 0, "bytes": 0, "oldest_month": None, "newest_month": None}
+        base = os.path.join(root, table)
+        for site_dir in (os.listdir(base) if os.path.isdir(base) else []):
+            for month in _months(root, table, int(site_dir.split("=", 1)[1])):
+                t["oldest_month"] = min(filter(None, [t["oldest_month"], month]))
+                t["newest_month"] = max(filter(None, [t["newest_month"], month]))
+                for path in _segments(os.path.join(base, site_dir, month)):
+                    with Segment(path) as seg:
+                        t["rows"] += seg.rows
+                    t["segments"] += 1
+                    t["bytes"] += os.path.getsize(path)
+        out["tables"][table] = t
+    return out
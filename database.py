@@ -2,14 +2,18 @@
 NetManager — Database Models & Connection
 SQLite with SQLAlchemy ORM
 """
+import json
 import logging
 import os
+import re
+import sqlite3
 from datetime import datetime
+from typing import Optional
 from sqlalchemy import (
     create_engine, Column, Integer, String, Boolean, Float,
-    DateTime, ForeignKey, Text, JSON, event, text, inspect
+    DateTime, ForeignKey, Text, JSON, LargeBinary, Index, UniqueConstraint, event, text, inspect
 )
-from sqlalchemy.orm import declarative_base, sessionmaker, relationship
+from sqlalchemy.orm import declarative_base, sessionmaker, relationship, validates
 
 logger = logging.getLogger("netmanager.db")
 
@@ -31,16 +35,78 @@ if _db_path:
 
 engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
 
-
-@event.listens_for(engine, "connect")
-def set_sqlite_pragma(dbapi_connection, connection_record):
+# Storage profiles: per-connection PRAGMAs. SQLITE_PROFILE picks one; each
+# value can be overridden with SQLITE_<NAME> (e.g. SQLITE_MMAP_SIZE=0).
+#   safe      — SQLite defaults, fsync on every commit
+#   balanced  — synchronous=NORMAL (WAL: a power cut may lose the last
+#               commits, never corrupts), 64 MB cache, 256 MB mmap
+#   fast      — no fsync at all; for disposable / rebuildable databases
+SQLITE_PROFILES = {
+    "safe": {"synchronous": "FULL", "cache_size": -2000, "mmap_size": 0,
+             "temp_store": "DEFAULT", "busy_timeout": 5000, "journal_size_limit": -1},
+    "balanced": {"synchronous": "NORMAL", "cache_size": -65536, "mmap_size": 268435456,
+                 "temp_store": "MEMORY", "busy_timeout": 5000, "journal_size_limit": 67108864},
+    "fast": {"synchronous": "OFF", "cache_size": -262144, "mmap_size": 1073741824,
+             "temp_store": "MEMORY", "busy_timeout": 5000, "journal_size_limit": 67108864},
+}
+SQLITE_PROFILE = os.getenv("SQLITE_PROFILE", "balanced")
+
+
+def sqlite_profile(name: Optional[str] = None) -> dict:
+    """PRAGMA values for a profile, with SQLITE_<NAME> environment overrides."""
+    name = name or SQLITE_PROFILE
+    if name not in SQLITE_PROFILES:
+        raise ValueError(f"Unknown SQLITE_PROFILE {name!r} (expected one of {', '.join(SQLITE_PROFILES)})")
+    pragmas = dict(SQLITE_PROFILES[name])
+    for key in pragmas:
+        override = os.getenv(f"SQLITE_{key.upper()}")
+        if override:
+            pragmas[key] = override
+    return pragmas
+
+
+_pragmas = sqlite_profile()
+
+
+def apply_sqlite_pragmas(dbapi_connection, pragmas: Optional[dict] = None):
+    """WAL + foreign keys + the storage profile, on a new DBAPI connection."""
     cursor = dbapi_connection.cursor()
     cursor.execute("PRAGMA journal_mode=WAL")
     cursor.execute("PRAGMA foreign_keys=ON")
+    for key, value in (pragmas or _pragmas).items():
+        cursor.execute(f"PRAGMA {key}={value}")
     cursor.close()
 
 
+@event.listens_for(engine, "connect")
+def set_sqlite_pragma(dbapi_connection, connection_record):
+    apply_sqlite_pragmas(dbapi_connection)
+
+
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+# Read-only connections for GET endpoints. Under WAL they read a consistent
+# snapshot without ever blocking (or being blocked by) the writer.
+DB_READ_POOL_SIZE = int(os.getenv("DB_READ_POOL_SIZE", "8"))
+
+
+def is_file_db() -> bool:
+    """False for in-memory SQLite — every engine would see a different database."""
+    return bool(_db_path) and _db_path != ":memory:"
+
+
+if is_file_db():
+    read_engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False},
+                                pool_size=DB_READ_POOL_SIZE, max_overflow=0)
+
+    @event.listens_for(read_engine, "connect")
+    def set_read_only_pragma(dbapi_connection, connection_record):
+        apply_sqlite_pragmas(dbapi_connection)
+        dbapi_connection.execute("PRAGMA query_only=ON")
+else:
+    read_engine = engine
+
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
 Base = declarative_base()
 
 
@@ -73,6 +139,9 @@ class Site(Base):
 
 class Building(Base):
     __tablename__ = "buildings"
+    __table_args__ = (
+        Index("ix_buildings_site", "site_id"),
+    )
     id = Column(Integer, primary_key=True, autoincrement=True)
     site_id = Column(Integer, ForeignKey("sites.id", ondelete="CASCADE"), nullable=False)
     name = Column(String(200), nullable=False)
@@ -85,6 +154,9 @@ class Building(Base):
 
 class Rack(Base):
     __tablename__ = "racks"
+    __table_args__ = (
+        Index("ix_racks_site", "site_id"),
+    )
     id = Column(Integer, primary_key=True, autoincrement=True)
     site_id = Column(Integer, ForeignKey("sites.id", ondelete="CASCADE"), nullable=False)
     building_id = Column(Integer, ForeignKey("buildings.id", ondelete="SET NULL"), nullable=True)
@@ -105,6 +177,9 @@ class Rack(Base):
 
 class Router(Base):
     __tablename__ = "routers"
+    __table_args__ = (
+        Index("ix_routers_site", "site_id"),
+    )
     id = Column(Integer, primary_key=True, autoincrement=True)
     site_id = Column(Integer, ForeignKey("sites.id", ondelete="CASCADE"), nullable=False)
     rack_id = Column(Integer, ForeignKey("racks.id", ondelete="SET NULL"), nullable=True)
@@ -121,6 +196,9 @@ class Router(Base):
 
 class Switch(Base):
     __tablename__ = "switches"
+    __table_args__ = (
+        Index("ix_switches_site", "site_id"),
+    )
     id = Column(Integer, primary_key=True, autoincrement=True)
     site_id = Column(Integer, ForeignKey("sites.id", ondelete="CASCADE"), nullable=False)
     rack_id = Column(Integer, ForeignKey("racks.id", ondelete="SET NULL"), nullable=True)
@@ -140,6 +218,9 @@ class Switch(Base):
 class Recorder(Base):
     """NVR / DVR / XVR / HCVR"""
     __tablename__ = "recorders"
+    __table_args__ = (
+        Index("ix_recorders_site", "site_id"),
+    )
     id = Column(Integer, primary_key=True, autoincrement=True)
     site_id = Column(Integer, ForeignKey("sites.id", ondelete="CASCADE"), nullable=False)
     rack_id = Column(Integer, ForeignKey("racks.id", ondelete="SET NULL"), nullable=True)
@@ -147,17 +228,82 @@ class Recorder(Base):
     type = Column(String(10), default="NVR")  # NVR, DVR, XVR, HCVR
     model = Column(String(200), default="")
     channels = Column(Integer, default=16)
-    nics = Column(JSON, default=list)     # [{ label, ip }]
-    disks = Column(JSON, default=list)    # [{ size, status }]
     created_at = Column(DateTime, default=datetime.utcnow)
 
     site = relationship("Site", back_populates="recorders")
     rack = relationship("Rack", back_populates="recorders")
     cameras = relationship("Camera", back_populates="recorder")
+    # Child rows in list order; assigning [{label, ip}] / [{size, status}] replaces them
+    nics = relationship("RecorderNic", back_populates="recorder", order_by="RecorderNic.id",
+                        cascade="all, delete-orphan", passive_deletes=True)
+    disks = relationship("RecorderDisk", back_populates="recorder", order_by="RecorderDisk.id",
+                         cascade="all, delete-orphan", passive_deletes=True)
+
+    @validates("nics")
+    def _nic_row(self, key, nic):
+        if isinstance(nic, dict):
+            nic = RecorderNic(label=nic.get("label") or "", ip=nic.get("ip") or "")
+        return nic
+
+    @validates("disks")
+    def _disk_row(self, key, disk):
+        if isinstance(disk, dict):
+            disk = RecorderDisk(size=disk.get("size") or "", status=disk.get("status") or "ok")
+        return disk
+
+
+_SIZE_RE = re.compile(r"^\s*(\d+(?:[.,]\d+)?)\s*(T|TB|TIB|G|GB|GIB)\s*$", re.IGNORECASE)
+
+
+def disk_capacity_gb(size: str) -> Optional[float]:
+    """Capacity of a disk size label ("4TB", "500 GB", "3,5TB") in GB; None if unparseable."""
+    m = _SIZE_RE.match(size or "")
+    if not m:
+        return None
+    value = float(m.group(1).replace(",", "."))
+    return value * 1000 if m.group(2).upper().startswith("T") else value
+
+
+class RecorderNic(Base):
+    """Network interface of a recorder (label, IP)"""
+    __tablename__ = "recorder_nics"
+    __table_args__ = (
+        Index("ix_recorder_nics_recorder", "recorder_id"),
+        Index("ix_recorder_nics_ip", "ip"),
+    )
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    recorder_id = Column(Integer, ForeignKey("recorders.id", ondelete="CASCADE"), nullable=False)
+    label = Column(String(100), default="")
+    ip = Column(String(45), default="")
+
+    recorder = relationship("Recorder", back_populates="nics")
+
+
+class RecorderDisk(Base):
+    """Disk of a recorder; size is the label as entered, capacity_gb its parsed value"""
+    __tablename__ = "recorder_disks"
+    __table_args__ = (
+        Index("ix_recorder_disks_recorder", "recorder_id"),
+    )
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    recorder_id = Column(Integer, ForeignKey("recorders.id", ondelete="CASCADE"), nullable=False)
+    size = Column(String(20), default="")
+    capacity_gb = Column(Float, nullable=True)
+    status = Column(String(20), default="ok")          # ok, degraded, failed, ...
+
+    recorder = relationship("Recorder", back_populates="disks")
+
+    @validates("size")
+    def _set_capacity(self, key, size):
+        self.capacity_gb = disk_capacity_gb(size)
+        return size
 
 
 class PatchPanel(Base):
     __tablename__ = "patch_panels"
+    __table_args__ = (
+        Index("ix_patch_panels_site", "site_id"),
+    )
     id = Column(Integer, primary_key=True, autoincrement=True)
     site_id = Column(Integer, ForeignKey("sites.id", ondelete="CASCADE"), nullable=False)
     rack_id = Column(Integer, ForeignKey("racks.id", ondelete="SET NULL"), nullable=True)
@@ -172,8 +318,19 @@ class PatchPanel(Base):
     cameras = relationship("Camera", back_populates="patch_panel")
 
 
+# Partial unique key used by the hybrid sync bulk upsert (INSERT ... ON CONFLICT)
+UPSERT_KEY_INDEX = "ux_cameras_site_recorder_channel"
+
+
 class Camera(Base):
     __tablename__ = "cameras"
+    __table_args__ = (
+        Index(UPSERT_KEY_INDEX, "site_id", "recorder_id", "channel", unique=True,
+              sqlite_where=text("recorder_id IS NOT NULL AND channel IS NOT NULL")),
+        Index("ix_cameras_site_channel", "site_id", "channel"),
+        Index("ix_cameras_site_recorder", "site_id", "recorder_id", "channel"),
+        Index("ix_cameras_site_ip", "site_id", "ip"),
+    )
     id = Column(Integer, primary_key=True, autoincrement=True)
     site_id = Column(Integer, ForeignKey("sites.id", ondelete="CASCADE"), nullable=False)
     recorder_id = Column(Integer, ForeignKey("recorders.id", ondelete="SET NULL"), nullable=True)
@@ -211,13 +368,24 @@ class Camera(Base):
 
 
 class CameraSnapshot(Base):
-    """Point-in-time snapshot of all cameras from a monitoring run."""
+    """Point-in-time snapshot of all cameras from a monitoring run (see snapshot_store)."""
     __tablename__ = "camera_snapshots"
+    __table_args__ = (
+        Index("ix_snapshots_site", "site_id"),
+        Index("ix_snapshots_run", "run_id"),
+        Index("ix_snapshots_keyframe", "keyframe_id"),
+    )
     id = Column(Integer, primary_key=True, autoincrement=True)
     site_id = Column(Integer, ForeignKey("sites.id", ondelete="CASCADE"), nullable=False)
     run_id = Column(String(50), nullable=False)            # UUID per run
     collected_at = Column(DateTime, default=datetime.utcnow)
-    payload_json = Column(Text, default="")                # JSON: full camera list + status
+    payload_json = Column(Text, default="")                # legacy: JSON full camera list + status
+    encoding = Column(String(10), default="json")          # json (legacy), key, delta
+    keyframe_id = Column(Integer, nullable=True)           # delta → id of its keyframe
+    seq = Column(Integer, default=0)                       # position after the keyframe
+    payload_blob = Column(LargeBinary, nullable=True)      # compressed keyframe or delta
+    raw_size = Column(Integer, default=0)                  # bytes of the uncompressed JSON list
+    stored_size = Column(Integer, default=0)               # bytes actually stored
 
     site = relationship("Site")
 
@@ -225,6 +393,10 @@ class CameraSnapshot(Base):
 class CameraEvent(Base):
     """Event log for camera status/inventory changes with deduplication."""
     __tablename__ = "camera_events"
+    __table_args__ = (
+        # listing newest-first per site; severity makes windowed counts index-only
+        Index("ix_events_site_created", "site_id", "created_at", "severity"),
+    )
     id = Column(Integer, primary_key=True, autoincrement=True)
     site_id = Column(Integer, ForeignKey("sites.id", ondelete="CASCADE"), nullable=False)
     camera_id = Column(Integer, ForeignKey("cameras.id", ondelete="SET NULL"), nullable=True)
@@ -240,12 +412,210 @@ class CameraEvent(Base):
     camera = relationship("Camera")
 
 
+class CameraStatusInterval(Base):
+    """
+    Status time series: one row per period a camera spent in a status_real.
+    ended_at NULL = current period. Maintained by sync_site on transitions.
+    """
+    __tablename__ = "camera_status_intervals"
+    __table_args__ = (
+        Index("ix_csi_camera_start", "camera_id", "started_at"),
+        Index("ix_csi_recorder_start", "recorder_id", "started_at"),
+        Index("ix_csi_site_start", "site_id", "started_at"),
+        Index("ux_csi_camera_open", "camera_id", unique=True, sqlite_where=text("ended_at IS NULL")),
+    )
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    site_id = Column(Integer, ForeignKey("sites.id", ondelete="CASCADE"), nullable=False)
+    camera_id = Column(Integer, ForeignKey("cameras.id", ondelete="CASCADE"), nullable=False)
+    recorder_id = Column(Integer, ForeignKey("recorders.id", ondelete="SET NULL"), nullable=True)
+    status = Column(String(20), nullable=False)            # online, offline, unknown
+    started_at = Column(DateTime, nullable=False)
+    ended_at = Column(DateTime, nullable=True)
+
+
+class WebhookDestination(Base):
+    """Outbound webhook receiving camera events (site_id NULL = every site)."""
+    __tablename__ = "webhook_destinations"
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    name = Column(String(200), default="")
+    url = Column(String(500), nullable=False)
+    site_id = Column(Integer, ForeignKey("sites.id", ondelete="CASCADE"), nullable=True)
+    min_severity = Column(String(10), default="crit")      # info, warn, crit
+    secret = Column(String(200), default="")               # HMAC-SHA256 signing key
+    active = Column(Boolean, default=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+
+class WebhookOutbox(Base):
+    """
+    Pending/sent webhook deliveries, one row per (destination, event).
+    Written in the sync transaction; delivered in batches by the dispatcher.
+    """
+    __tablename__ = "webhook_outbox"
+    __table_args__ = (
+        Index("ix_outbox_status_next", "status", "next_attempt_at"),
+    )
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    destination_id = Column(Integer, ForeignKey("webhook_destinations.id", ondelete="CASCADE"), nullable=False)
+    site_id = Column(Integer, nullable=True)
+    event_id = Column(Integer, nullable=True)               # camera_events.id (no FK — events are pruned)
+    payload_json = Column(Text, default="{}")
+    status = Column(String(10), default="pending")          # pending, sent, dead
+    attempts = Column(Integer, default=0)
+    next_attempt_at = Column(DateTime, default=datetime.utcnow)
+    last_error = Column(String(500), default="")
+    created_at = Column(DateTime, default=datetime.utcnow)
+    sent_at = Column(DateTime, nullable=True)
+
+
+class MonitoringRollup(Base):
+    """
+    Hourly / daily summary of sync_logs, camera_events and camera_snapshots.
+    Filled by the retention task right before the raw rows are deleted.
+    """
+    __tablename__ = "monitoring_rollups"
+    __table_args__ = (
+        UniqueConstraint("site_id", "period", "bucket_start", name="ux_rollups_site_period_bucket"),
+    )
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    site_id = Column(Integer, ForeignKey("sites.id", ondelete="CASCADE"), nullable=False)
+    period = Column(String(10), nullable=False)            # hour, day
+    bucket_start = Column(DateTime, nullable=False)
+    sync_runs = Column(Integer, default=0)
+    sync_errors = Column(Integer, default=0)
+    cameras_online_sum = Column(Integer, default=0)        # avg = sum / (sync_runs - sync_errors)
+    cameras_offline_sum = Column(Integer, default=0)
+    cameras_online_min = Column(Integer, nullable=True)    # worst ok run in the bucket
+    events_total = Column(Integer, default=0)
+    events_info = Column(Integer, default=0)
+    events_warn = Column(Integer, default=0)
+    events_crit = Column(Integer, default=0)
+    snapshots = Column(Integer, default=0)
+    snapshot_bytes = Column(Integer, default=0)
+
+
+class SyncLease(Base):
+    """
+    Per-site sync lock shared by every worker/replica using this DB.
+    A row is held until expires_at; the holder renews it while the sync runs.
+    """
+    __tablename__ = "sync_leases"
+    site_id = Column(Integer, ForeignKey("sites.id", ondelete="CASCADE"), primary_key=True)
+    holder = Column(String(200), nullable=False)       # host:pid:token
+    run_id = Column(String(36), default="")
+    acquired_at = Column(DateTime, nullable=False)
+    expires_at = Column(DateTime, nullable=False)
+
+
+class SchemaVersion(Base):
+    """Applied schema migrations, one row per version (see run_migrations)."""
+    __tablename__ = "schema_version"
+    version = Column(Integer, primary_key=True)
+    name = Column(String(100), default="")
+    applied_at = Column(DateTime, default=datetime.utcnow)
+
+
+class SiteCounter(Base):
+    """
+    Denormalized per-site counts, one row per (dimension, key): device
+    totals, cameras by status / status_real / recorder / rack / type and
+    recorders by type. Kept in step by the triggers below on every insert,
+    delete and relevant update — ORM, bulk sync upserts and cascades alike —
+    inside the writing transaction. site_counters.reconcile() rebuilds them.
+
+    The ip / channel / pp_port / switch dimensions are the conflict index
+    read by site_conflicts: a key with n > 1 is a duplicate.
+    """
+    __tablename__ = "site_counters"
+    __table_args__ = (
+        Index("ix_site_counters_conflicts", "site_id", "dim", sqlite_where=text("n > 1")),
+    )
+    site_id = Column(Integer, primary_key=True)
+    dim = Column(String(20), primary_key=True)       # device, status, ..., recorder_type; ip, channel, pp_port, switch
+    key = Column(String(64), primary_key=True)       # '' for NULL
+    n = Column(Integer, nullable=False, default=0)
+
+
+# table -> [(dim, key expression over {r} = NEW/OLD, columns that move the row)]
+COUNTER_DIMS = {
+    "cameras": [
+        ("device", "'cameras'", ()),
+        ("status", "COALESCE({r}.status, '')", ("status",)),
+        ("status_real", "COALESCE({r}.status_real, '')", ("status_real",)),
+        ("recorder", "COALESCE(CAST({r}.recorder_id AS TEXT), '')", ("recorder_id",)),
+        ("rack", "COALESCE(CAST({r}.rack_id AS TEXT), '')", ("rack_id",)),
+        ("type", "COALESCE({r}.cam_type, '')", ("cam_type",)),
+        # conflict index ('' = not set, never a conflict)
+        ("ip", "COALESCE({r}.ip, '')", ("ip",)),
+        ("channel", "CASE WHEN {r}.recorder_id AND {r}.channel THEN {r}.recorder_id || ':' || {r}.channel "
+                    "ELSE '' END", ("recorder_id", "channel")),
+        ("pp_port", "CASE WHEN {r}.patch_panel_id AND {r}.patch_panel_port "
+                    "THEN {r}.patch_panel_id || ':' || {r}.patch_panel_port ELSE '' END",
+         ("patch_panel_id", "patch_panel_port")),
+        ("switch", "COALESCE(CAST({r}.switch_id AS TEXT), '')", ("switch_id",)),
+    ],
+    "recorders": [
+        ("device", "'recorders'", ()),
+        ("recorder_type", "COALESCE({r}.type, '')", ("type",)),
+    ],
+    "racks": [("device", "'racks'", ())],
+    "switches": [("device", "'switches'", ())],
+    "routers": [("device", "'routers'", ())],
+    "patch_panels": [("device", "'patch_panels'", ())],
+    "buildings": [("device", "'buildings'", ())],
+}
+
+
+def _counter_upsert(values) -> str:
+    rows = ", ".join(f"({site}, '{dim}', {key}, {n})" for site, dim, key, n in values)
+    return (f"INSERT INTO site_counters (site_id, dim, key, n) VALUES {rows} "
+            f"ON CONFLICT (site_id, dim, key) DO UPDATE SET n = n + excluded.n;")
+
+
+def counter_trigger_ddl() -> list:
+    """CREATE TRIGGER statements maintaining site_counters."""
+    ddl = ["CREATE TRIGGER IF NOT EXISTS trg_sites_counters_del AFTER DELETE ON sites "
+           "BEGIN DELETE FROM site_counters WHERE site_id = OLD.id; END"]
+    for table, dims in COUNTER_DIMS.items():
+        ins = [("NEW.site_id", dim, key.format(r="NEW"), 1) for dim, key, _ in dims]
+        dele = [("OLD.site_id", dim, key.format(r="OLD"), -1) for dim, key, _ in dims]
+        ddl.append(f"CREATE TRIGGER IF NOT EXISTS trg_{table}_counters_ins AFTER INSERT ON {table} "
+                   f"BEGIN {_counter_upsert(ins)} END")
+        ddl.append(f"CREATE TRIGGER IF NOT EXISTS trg_{table}_counters_del AFTER DELETE ON {table} "
+                   f"BEGIN {_counter_upsert(dele)} END")
+        for dim, key, cols in dims:
+            cols = ("site_id",) + cols
+            when = " OR ".join(f"OLD.{c} IS NOT NEW.{c}" for c in cols)
+            move = [("OLD.site_id", dim, key.format(r="OLD"), -1), ("NEW.site_id", dim, key.format(r="NEW"), 1)]
+            ddl.append(f"CREATE TRIGGER IF NOT EXISTS trg_{table}_counters_upd_{dim} "
+                       f"AFTER UPDATE OF {', '.join(cols)} ON {table} WHEN {when} "
+                       f"BEGIN {_counter_upsert(move)} END")
+    return ddl
+
+
+def counter_truth_select(site_id: Optional[int] = None) -> str:
+    """SELECT site_id, dim, key, n computed from the base tables (what the triggers maintain)."""
+    where = f" WHERE site_id = {int(site_id)}" if site_id is not None else ""
+    parts = []
+    for table, dims in COUNTER_DIMS.items():
+        for dim, key, _ in dims:
+            k = key.format(r=table)
+            parts.append(f"SELECT site_id, '{dim}', {k}, COUNT(*) FROM {table}{where} GROUP BY site_id, {k}")
+    return " UNION ALL ".join(parts)
+
+
+@event.listens_for(Base.metadata, "after_create")
+def _create_counter_triggers(target, connection, **kw):
+    for stmt in counter_trigger_ddl():
+        connection.exec_driver_sql(stmt)
+
+
 # ============================================
 # DB HELPERS
 # ============================================
 
 def init_db():
-    """Create all tables"""
+    """Create all tables (no versioning — startup uses run_migrations)"""
     Base.metadata.create_all(bind=engine)
 
 
@@ -264,100 +634,305 @@ def _table_exists(conn, table: str) -> bool:
     return result.fetchone() is not None
 
 
-def run_migrations():
+def _index_exists(conn, name: str) -> bool:
+    """Check if an index exists in the database."""
+    result = conn.execute(text(
+        "SELECT name FROM sqlite_master WHERE type='index' AND name=:n"
+    ), {"n": name})
+    return result.fetchone() is not None
+
+
+def _add_columns(conn, table: str, cols) -> int:
+    """ALTER TABLE ADD COLUMN for each (name, ddl) the table lacks."""
+    added = 0
+    for col_name, col_def in cols:
+        if not _table_has_column(conn, table, col_name):
+            conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {col_name} {col_def}"))
+            logger.info("  + %s.%s", table, col_name)
+            added += 1
+    return added
+
+
+# ============================================
+# SCHEMA MIGRATIONS
+# ============================================
+#
+# Numbered, append-only. Each step runs once per database, in order, inside
+# the migration transaction; the last applied number is kept in
+# schema_version. Steps must still tolerate a database that already has
+# their change: databases from before versioning start at 0 whatever their
+# actual shape. A brand-new database is built by create_all and stamped
+# with the latest version without running any step.
+
+def _m001_monitoring_columns(conn):
+    """Hybrid monitoring, delta snapshots, scheduler interval; tables added since."""
+    if _table_exists(conn, "sites"):
+        _add_columns(conn, "sites", [
+            ("cctv_subnet", "TEXT DEFAULT ''"),
+            ("network_segments", "TEXT DEFAULT '[]'"),
+        ])
+    if _table_exists(conn, "cameras"):
+        _add_columns(conn, "cameras", [
+            ("configured",     "INTEGER DEFAULT 1"),
+            ("status_config",  "TEXT DEFAULT 'enabled'"),
+            ("status_real",    "TEXT DEFAULT 'unknown'"),
+            ("last_seen_at",   "TEXT"),           # DATETIME stored as TEXT in SQLite
+            ("offline_streak", "INTEGER DEFAULT 0"),
+        ])
+    if _table_exists(conn, "nvr_credentials"):
+        _add_columns(conn, "nvr_credentials", [("sync_interval_s", "INTEGER")])
+    if _table_exists(conn, "camera_snapshots"):
+        _add_columns(conn, "camera_snapshots", [
+            ("encoding",     "TEXT DEFAULT 'json'"),
+            ("keyframe_id",  "INTEGER"),
+            ("seq",          "INTEGER DEFAULT 0"),
+            ("payload_blob", "BLOB"),
+            ("raw_size",     "INTEGER DEFAULT 0"),
+            ("stored_size",  "INTEGER DEFAULT 0"),
+        ])
+
+    backfill_intervals = not _table_exists(conn, "camera_status_intervals")
+    for tbl in ("camera_snapshots", "camera_events", "monitoring_rollups", "sync_leases",
+                "camera_status_intervals", "webhook_destinations", "webhook_outbox"):
+        if not _table_exists(conn, tbl):
+            logger.info("  + table %s", tbl)
+    Base.metadata.create_all(bind=conn)
+
+    if backfill_intervals:
+        # Seed one open interval per existing camera (its current status since its last update)
+        n = conn.execute(text(
+            "INSERT INTO camera_status_intervals (site_id, camera_id, recorder_id, status, started_at) "
+            "SELECT site_id, id, recorder_id, COALESCE(NULLIF(status_real, ''), 'unknown'), "
+            "COALESCE(updated_at, created_at, CURRENT_TIMESTAMP) FROM cameras"
+        )).rowcount
+        logger.info("  + seeded %d camera status intervals", n)
+
+
+def _m002_camera_upsert_key(conn):
     """
-    Idempotent SQLite schema migration — safe to call on every startup.
-    Adds any columns/tables that exist in the ORM models but are missing
-    from the live database.
+    Unique (site, recorder, channel) key for the sync bulk upsert. Skipped
+    (with a warning) if the live data already has duplicates; the sync then
+    falls back to plain INSERT / UPDATE-by-id.
+    """
+    if _index_exists(conn, UPSERT_KEY_INDEX):
+        return
+    dupes = conn.execute(text(
+        "SELECT COUNT(*) FROM (SELECT 1 FROM cameras "
+        "WHERE recorder_id IS NOT NULL AND channel IS NOT NULL "
+        "GROUP BY site_id, recorder_id, channel HAVING COUNT(*) > 1)"
+    )).scalar()
+    if dupes:
+        logger.warning("  ! %s not created: %d duplicated (site, recorder, channel) keys",
+                       UPSERT_KEY_INDEX, dupes)
+        return
+    conn.execute(text(
+        f"CREATE UNIQUE INDEX {UPSERT_KEY_INDEX} "
+        "ON cameras (site_id, recorder_id, channel) "
+        "WHERE recorder_id IS NOT NULL AND channel IS NOT NULL"
+    ))
+    logger.info("  + index %s", UPSERT_KEY_INDEX)
+
+
+def _m003_sync_log_stage_timings(conn):
+    """Per-stage pipeline timings and skipped-write count on sync_logs."""
+    _add_columns(conn, "sync_logs", [
+        ("stage_timings_json", "TEXT"),
+        ("cameras_skipped", "INTEGER DEFAULT 0"),
+    ])
+
+
+def _m004_hot_path_indexes(conn):
+    """
+    Indexes declared on the models (__table_args__): site_id filters, sync
+    match keys, event / sync log listing by created_at.
+    """
+    for table in Base.metadata.sorted_tables:
+        if not _table_exists(conn, table.name):        # created by a later step
+            continue
+        for idx in sorted(table.indexes, key=lambda i: i.name):
+            if idx.name == UPSERT_KEY_INDEX or _index_exists(conn, idx.name):
+                continue
+            idx.create(conn)
+            logger.info("  + index %s", idx.name)
+
+
+def _install_counters(conn):
+    """(Re)create the counter triggers from COUNTER_DIMS and recount every site."""
+    for (name,) in conn.execute(text(
+            "SELECT name FROM sqlite_master WHERE type = 'trigger' AND name LIKE 'trg%counters%'")).all():
+        conn.exec_driver_sql(f"DROP TRIGGER {name}")
+    for stmt in counter_trigger_ddl():
+        conn.exec_driver_sql(stmt)
+    conn.execute(text("DELETE FROM site_counters"))
+    n = conn.execute(text(
+        f"INSERT INTO site_counters (site_id, dim, key, n) {counter_truth_select()}")).rowcount
+    logger.info("  + %d site counters", n)
+
+
+def _m005_site_counters(conn):
+    """Per-site counters table, its triggers, and counts for the existing rows."""
+    SiteCounter.__table__.create(conn, checkfirst=True)
+    _install_counters(conn)
+
+
+def _m006_recorder_nics_disks(conn):
+    """
+    Recorder NICs and disks move from the recorders.nics / .disks JSON
+    columns into recorder_nics / recorder_disks (parsed capacity, indexed
+    IP). The JSON columns are dropped afterwards (SQLite >= 3.35).
+    """
+    for model in (RecorderNic, RecorderDisk):
+        model.__table__.create(conn, checkfirst=True)
+    if not _table_has_column(conn, "recorders", "nics"):
+        return
+
+    def _items(raw):
+        try:
+            items = json.loads(raw) if raw else []
+        except (TypeError, ValueError):
+            items = []
+        return [i for i in items if isinstance(i, dict)] if isinstance(items, list) else []
+
+    conn.execute(text("DELETE FROM recorder_nics"))
+    conn.execute(text("DELETE FROM recorder_disks"))
+    nics, disks = [], []
+    for rid, raw_nics, raw_disks in conn.execute(text("SELECT id, nics, disks FROM recorders ORDER BY id")):
+        nics += [{"recorder_id": rid, "label": n.get("label") or "", "ip": n.get("ip") or ""}
+                 for n in _items(raw_nics)]
+        disks += [{"recorder_id": rid, "size": str(d.get("size") or ""), "status": d.get("status") or "ok",
+                   "capacity_gb": disk_capacity_gb(str(d.get("size") or ""))}
+                  for d in _items(raw_disks)]
+    if nics:
+        conn.execute(RecorderNic.__table__.insert(), nics)
+    if disks:
+        conn.execute(RecorderDisk.__table__.insert(), disks)
+    logger.info("  + %d recorder NICs, %d disks", len(nics), len(disks))
+
+    if sqlite3.sqlite_version_info >= (3, 35, 0):
+        conn.execute(text("ALTER TABLE recorders DROP COLUMN nics"))
+        conn.execute(text("ALTER TABLE recorders DROP COLUMN disks"))
+    else:
+        logger.warning("  ! SQLite %s cannot drop recorders.nics / .disks; left unused",
+                       sqlite3.sqlite_version)
+
+
+def _m007_conflict_index(conn):
+    """Camera ip / channel / patch panel port / switch counters (conflict index)."""
+    SiteCounter.__table__.create(conn, checkfirst=True)
+    for idx in SiteCounter.__table__.indexes:
+        idx.create(conn, checkfirst=True)
+    _install_counters(conn)
+
+
+MIGRATIONS = [
+    (1, "monitoring_columns", _m001_monitoring_columns),
+    (2, "camera_upsert_key", _m002_camera_upsert_key),
+    (3, "sync_log_stage_timings", _m003_sync_log_stage_timings),
+    (4, "hot_path_indexes", _m004_hot_path_indexes),
+    (5, "site_counters", _m005_site_counters),
+    (6, "recorder_nics_disks", _m006_recorder_nics_disks),
+    (7, "conflict_index", _m007_conflict_index),
+]
+
+# How long a starting process waits for another one that is migrating
+MIGRATION_LOCK_TIMEOUT_MS = int(os.getenv("MIGRATION_LOCK_TIMEOUT_MS", "600000"))
+
+_schema_status: Optional[dict] = None
+
+
+def latest_version() -> int:
+    return MIGRATIONS[-1][0] if MIGRATIONS else 0
+
+
+def schema_version(conn) -> Optional[int]:
+    """Last applied migration; None if the database predates versioning."""
+    if not _table_exists(conn, "schema_version"):
+        return None
+    return conn.execute(text("SELECT MAX(version) FROM schema_version")).scalar() or 0
+
+
+def _status(version: Optional[int]) -> dict:
+    global _schema_status
+    latest = latest_version()
+    current = version or 0
+    pending = [f"migration {n:03d}_{name}" for n, name, _ in MIGRATIONS if n > current]
+    _schema_status = {"ok": not pending, "missing": pending, "version": current, "expected": latest}
+    return _schema_status
+
+
+def run_migrations(bind=None) -> dict:
+    """
+    Bring the database to the latest schema version — safe to call on every
+    startup, from any number of processes.
 
     WHY: SQLAlchemy's create_all() creates missing tables but does NOT
     add columns to existing tables.  In production (EasyPanel / Docker)
     the SQLite file persists across deploys, so new columns added in code
     would cause "no such column" errors without explicit ALTER TABLE.
-    """
-    logger.info("Running schema migrations ...")
-    applied = 0
-
-    with engine.connect() as conn:
-        # ------------------------------------------------------------------
-        # sites table
-        # ------------------------------------------------------------------
-        if _table_exists(conn, "sites"):
-            _cols = [
-                ("cctv_subnet", "TEXT DEFAULT ''"),
-                ("network_segments", "TEXT DEFAULT '[]'"),
-            ]
-            for col_name, col_def in _cols:
-                if not _table_has_column(conn, "sites", col_name):
-                    conn.execute(text(
-                        f"ALTER TABLE sites ADD COLUMN {col_name} {col_def}"
-                    ))
-                    logger.info("  + sites.%s", col_name)
-                    applied += 1
-
-        # ------------------------------------------------------------------
-        # cameras table — hybrid monitoring columns
-        # ------------------------------------------------------------------
-        if _table_exists(conn, "cameras"):
-            _cols = [
-                ("configured",     "INTEGER DEFAULT 1"),
-                ("status_config",  "TEXT DEFAULT 'enabled'"),
-                ("status_real",    "TEXT DEFAULT 'unknown'"),
-                ("last_seen_at",   "TEXT"),           # DATETIME stored as TEXT in SQLite
-                ("offline_streak", "INTEGER DEFAULT 0"),
-            ]
-            for col_name, col_def in _cols:
-                if not _table_has_column(conn, "cameras", col_name):
-                    conn.execute(text(
-                        f"ALTER TABLE cameras ADD COLUMN {col_name} {col_def}"
-                    ))
-                    logger.info("  + cameras.%s", col_name)
-                    applied += 1
-
-        # ------------------------------------------------------------------
-        # New tables — create_all handles these but we log it for clarity
-        # ------------------------------------------------------------------
-        for tbl in ("camera_snapshots", "camera_events"):
-            if not _table_exists(conn, tbl):
-                logger.info("  + table %s (will be created by create_all)", tbl)
-
-        conn.commit()
-
-    # Now let create_all pick up any brand-new tables
-    Base.metadata.create_all(bind=engine)
-
-    logger.info("Schema migrations complete (%d ALTER(s) applied)", applied)
 
+    An up-to-date database costs one SELECT. Otherwise every pending step
+    runs in a single BEGIN IMMEDIATE transaction: SQLite's write lock keeps
+    other processes (workers, replicas) out until it commits — they wait,
+    re-read the version and find nothing left to do — and a failing step
+    rolls back the whole upgrade.
+    """
+    eng = bind or engine
+    latest = latest_version()
+    with eng.connect() as conn:
+        version = schema_version(conn)
+    if version is not None and version >= latest:
+        logger.info("Schema at version %d — no migrations pending", version)
+        return _status(version)
 
-def check_schema_ok() -> dict:
+    logger.info("Running schema migrations ...")
+    with eng.connect() as conn:
+        busy_timeout = conn.exec_driver_sql("PRAGMA busy_timeout").scalar()
+        conn.exec_driver_sql(f"PRAGMA busy_timeout = {MIGRATION_LOCK_TIMEOUT_MS}")
+        conn.exec_driver_sql("BEGIN IMMEDIATE")
+        try:
+            version = schema_version(conn)         # another process may have won the lock
+            if version is not None and version >= latest:
+                conn.rollback()
+                logger.info("Schema migrated by another process (version %d)", version)
+                return _status(version)
+            if version is None and not _table_exists(conn, "sites"):
+                Base.metadata.create_all(bind=conn)
+                steps = []
+                logger.info("  + new database: all tables created")
+            else:
+                Base.metadata.tables["schema_version"].create(conn, checkfirst=True)
+                steps = [m for m in MIGRATIONS if m[0] > (version or 0)]
+            for n, name, fn in steps:
+                logger.info("  migration %03d_%s", n, name)
+                fn(conn)
+            conn.execute(SchemaVersion.__table__.insert(), [
+                {"version": n, "name": name}
+                for n, name, _ in MIGRATIONS if n > (version or 0)
+            ])
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.exec_driver_sql(f"PRAGMA busy_timeout = {busy_timeout}")
+    logger.info("Schema migrations complete (version %d → %d, %d step(s) applied)",
+                version or 0, latest, len(steps))
+    return _status(latest)
+
+
+def check_schema_ok(refresh: bool = False) -> dict:
     """
-    Quick check that critical columns exist.
-    Returns {"ok": True} or {"ok": False, "missing": [...]}.
+    Schema status for /api/health: {"ok", "missing", "version", "expected"}.
+    Cached from the last run_migrations; `refresh` re-reads the version (one SELECT).
     """
-    missing = []
-    required = [
-        ("sites",   "cctv_subnet"),
-        ("cameras", "configured"),
-        ("cameras", "status_config"),
-        ("cameras", "status_real"),
-        ("cameras", "offline_streak"),
-        ("cameras", "last_seen_at"),
-    ]
-    required_tables = ["camera_snapshots", "camera_events"]
-
+    if _schema_status is not None and not refresh:
+        return _schema_status
     try:
         with engine.connect() as conn:
-            for tbl, col in required:
-                if _table_exists(conn, tbl) and not _table_has_column(conn, tbl, col):
-                    missing.append(f"{tbl}.{col}")
-            for tbl in required_tables:
-                if not _table_exists(conn, tbl):
-                    missing.append(f"table:{tbl}")
+            return _status(schema_version(conn))
     except Exception as e:
         return {"ok": False, "missing": [f"error: {e}"]}
 
-    return {"ok": len(missing) == 0, "missing": missing}
-
 
 def get_db():
     """Dependency: yield a session, auto-close"""
@@ -368,6 +943,15 @@ def get_db():
         db.close()
 
 
+def get_read_db():
+    """Dependency for GET endpoints: a session on the read-only pool"""
+    db = ReadSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
 # ============================================
 # AUTH MODELS
 # ============================================
@@ -388,6 +972,9 @@ class User(Base):
 class UserSite(Base):
     """Many-to-many: which sites a viewer can access"""
     __tablename__ = "user_sites"
+    __table_args__ = (
+        Index("ix_user_sites_user_site", "user_id", "site_id"),   # covers site access checks
+    )
     id = Column(Integer, primary_key=True, autoincrement=True)
     user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
     site_id = Column(Integer, ForeignKey("sites.id", ondelete="CASCADE"), nullable=False)
@@ -399,6 +986,9 @@ class UserSite(Base):
 class NvrCredential(Base):
     """Stored NVR/DVR credentials per site — passwords encrypted"""
     __tablename__ = "nvr_credentials"
+    __table_args__ = (
+        Index("ix_nvr_credentials_site", "site_id"),
+    )
     id = Column(Integer, primary_key=True, autoincrement=True)
     site_id = Column(Integer, ForeignKey("sites.id", ondelete="CASCADE"), nullable=False)
     recorder_id = Column(Integer, ForeignKey("recorders.id", ondelete="SET NULL"), nullable=True)
@@ -410,6 +1000,7 @@ class NvrCredential(Base):
     active = Column(Boolean, default=True)
     last_sync = Column(DateTime, nullable=True)
     last_status = Column(String(50), default="")      # ok, error, timeout
+    sync_interval_s = Column(Integer, nullable=True)  # scheduler cadence (NULL = default)
     created_at = Column(DateTime, default=datetime.utcnow)
 
     site = relationship("Site")
@@ -420,6 +1011,9 @@ class NvrCredential(Base):
 class SyncLog(Base):
     """Log of every NVR sync operation"""
     __tablename__ = "sync_logs"
+    __table_args__ = (
+        Index("ix_sync_logs_site_created", "site_id", "created_at"),
+    )
     id = Column(Integer, primary_key=True, autoincrement=True)
     credential_id = Column(Integer, ForeignKey("nvr_credentials.id", ondelete="CASCADE"), nullable=False)
     site_id = Column(Integer, ForeignKey("sites.id", ondelete="CASCADE"), nullable=False)
@@ -431,7 +1025,13 @@ class SyncLog(Base):
     cameras_updated = Column(Integer, default=0)
     cameras_online = Column(Integer, default=0)
     cameras_offline = Column(Integer, default=0)
+    cameras_skipped = Column(Integer, default=0)   # matched cameras not rewritten (unchanged)
     error_message = Column(Text, default="")
+    stage_timings_json = Column(Text, nullable=True)  # {"probe": {"ms": .., "count": ..}, ...}
     created_at = Column(DateTime, default=datetime.utcnow)
 
     credential = relationship("NvrCredential", back_populates="sync_logs")
+
+    @property
+    def stage_timings(self) -> Optional[dict]:
+        return json.loads(self.stage_timings_json) if self.stage_timings_json else None
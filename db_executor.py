@@ -0,0 +1,85 @@
+"""
+NetManager — DB Executor
+Runs blocking SQLAlchemy work off the event loop on a dedicated thread pool.
+
+The async paths (sync_site, NVR test/preview/sync endpoints, job endpoints)
+used to run their queries and commits directly on the event loop, so a slow
+SQLite write froze every other request and all in-flight TCP probes. They now
+hand each block of DB work to this executor and await it.
+
+A dedicated pool (rather than asyncio.to_thread's default executor) keeps DB
+work from queueing behind unrelated blocking calls and bounds the number of
+concurrent SQLite connections (DB_EXECUTOR_THREADS).
+
+A Session is never used by two threads at once: the caller awaits each call
+before touching the session again. Engines whose connections are pinned to a
+thread (SingletonThreadPool — in-memory "sqlite://" without StaticPool) cannot
+move across threads, so for them the work runs inline.
+
+Usage:
+    cred = await run_db(db, _get_or_404, NvrCredential, cid)   # fn(db, *args)
+    await run_sync(lease.bind, lease.acquire)                    # fn(*args)
+"""
+import asyncio
+import functools
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, TypeVar
+
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import SingletonThreadPool
+
+logger = logging.getLogger("netmanager.dbexec")
+
+DB_EXECUTOR_THREADS = int(os.getenv("DB_EXECUTOR_THREADS", "4"))
+
+T = TypeVar("T")
+
+_executor: Optional[ThreadPoolExecutor] = None
+_lock = threading.Lock()
+_stats = {"calls": 0, "inline": 0}
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=max(1, DB_EXECUTOR_THREADS),
+                                           thread_name_prefix="netmanager-db")
+        return _executor
+
+
+def _pinned(bind) -> bool:
+    """True if the engine's connections cannot leave the thread that opened them."""
+    pool = getattr(bind, "pool", None)
+    return isinstance(pool, SingletonThreadPool)
+
+
+async def run_sync(bind, fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """Run fn(*args, **kwargs) — blocking DB work against `bind` — on the DB executor."""
+    if _pinned(bind):
+        _stats["inline"] += 1
+        return fn(*args, **kwargs)
+    _stats["calls"] += 1
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_executor(), functools.partial(fn, *args, **kwargs))
+
+
+async def run_db(db: Session, fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """Run fn(db, *args, **kwargs) on the DB executor."""
+    return await run_sync(db.get_bind(), fn, db, *args, **kwargs)
+
+
+def shutdown():
+    """Wait for pending DB work and stop the pool (app shutdown)."""
+    global _executor
+    with _lock:
+        ex, _executor = _executor, None
+    if ex is not None:
+        ex.shutdown(wait=True)
+
+
+def stats() -> Dict[str, Any]:
+    return {"threads": DB_EXECUTOR_THREADS, **_stats}
@@ -0,0 +1,158 @@
+"""
+NetManager — SQLite Maintenance
+WAL checkpoints and ANALYZE on a schedule.
+
+SQLite's automatic checkpoint runs on commit and gives up while readers still
+use older WAL frames, so during long syncs (and with the read-only pool always
+open) the WAL keeps growing. Each tick:
+    1. PASSIVE checkpoint — copies what it can, never blocks anyone
+    2. if the WAL file is still larger than WAL_TRUNCATE_BYTES, a TRUNCATE
+       checkpoint under the writer lock resets it to zero bytes. It waits at
+       most TRUNCATE_BUSY_TIMEOUT_MS for readers, and is skipped (retried
+       next tick) when PASSIVE already found frames pinned by a reader
+Every ANALYZE_INTERVAL_S the planner statistics (sqlite_stat1) are refreshed
+with a bounded ANALYZE (PRAGMA analysis_limit), also under the writer lock.
+
+Usage:
+    checkpoint()                           # one PASSIVE (+ TRUNCATE if large)
+    analyze()
+    asyncio.create_task(maintenance_loop())
+"""
+import asyncio
+import logging
+import os
+import time
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from sqlalchemy import text
+
+import database
+from db_writer import write_lock
+
+logger = logging.getLogger("netmanager.maintenance")
+
+CHECKPOINT_INTERVAL_S = int(os.getenv("CHECKPOINT_INTERVAL_S", "60"))
+WAL_TRUNCATE_BYTES = int(os.getenv("WAL_TRUNCATE_BYTES", str(64 * 1024 * 1024)))
+TRUNCATE_BUSY_TIMEOUT_MS = int(os.getenv("TRUNCATE_BUSY_TIMEOUT_MS", "200"))   # writes queue meanwhile
+ANALYZE_INTERVAL_S = int(os.getenv("ANALYZE_INTERVAL_S", str(6 * 3600)))
+ANALYZE_LIMIT = int(os.getenv("ANALYZE_LIMIT", "1000"))   # rows sampled per index (0 = full scan)
+
+_stats: Dict[str, Any] = {"checkpoints": 0, "truncates": 0, "truncates_skipped": 0, "analyzes": 0,
+                          "last_checkpoint": {}, "last_analyze": {}}
+
+
+def wal_path() -> Optional[str]:
+    return f"{database._db_path}-wal" if database.is_file_db() else None
+
+
+def wal_size() -> int:
+    path = wal_path()
+    try:
+        return os.path.getsize(path) if path else 0
+    except OSError:
+        return 0
+
+
+def _wal_checkpoint(mode: str, busy_timeout_ms: Optional[int] = None) -> Dict[str, int]:
+    with database.engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        if busy_timeout_ms is None:
+            busy, log, done = conn.execute(text(f"PRAGMA wal_checkpoint({mode})")).one()
+        else:                                    # pooled connection: put the profile's timeout back
+            saved = conn.execute(text("PRAGMA busy_timeout")).scalar()
+            conn.execute(text(f"PRAGMA busy_timeout={int(busy_timeout_ms)}"))
+            try:
+                busy, log, done = conn.execute(text(f"PRAGMA wal_checkpoint({mode})")).one()
+            finally:
+                conn.execute(text(f"PRAGMA busy_timeout={int(saved)}"))
+    return {"busy": busy, "wal_frames": log, "checkpointed": done}
+
+
+def checkpoint(truncate_bytes: int = WAL_TRUNCATE_BYTES) -> Dict[str, Any]:
+    """
+    PASSIVE checkpoint, then TRUNCATE if the WAL file is still over
+    truncate_bytes. TRUNCATE holds the writer lock to keep queued writes
+    from extending the WAL, so it only waits TRUNCATE_BUSY_TIMEOUT_MS for
+    readers on old frames — and is not tried at all when PASSIVE could not
+    copy every frame (a reader still pins them); the next tick retries.
+    """
+    t0 = time.monotonic()
+    before = wal_size()
+    result = {"mode": "PASSIVE", "wal_bytes_before": before, **_wal_checkpoint("PASSIVE")}
+    if truncate_bytes and wal_size() > truncate_bytes:
+        if result["busy"] or result["checkpointed"] < result["wal_frames"]:
+            result["truncate_skipped"] = True
+            _stats["truncates_skipped"] += 1
+        else:
+            with write_lock:
+                result.update(mode="TRUNCATE", **_wal_checkpoint("TRUNCATE", TRUNCATE_BUSY_TIMEOUT_MS))
+            _stats["truncates"] += 1
+    result["wal_bytes_after"] = wal_size()
+    result["elapsed_ms"] = int((time.monotonic() - t0) * 1000)
+    result["finished_at"] = datetime.utcnow().isoformat()
+    _stats["checkpoints"] += 1
+    _stats["last_checkpoint"] = result
+    if result["mode"] == "TRUNCATE" or result["busy"] or result.get("truncate_skipped"):
+        logger.info("WAL checkpoint %s: %d -> %d bytes, frames %d/%d, busy=%d",
+                    result["mode"], before, result["wal_bytes_after"],
+                    result["checkpointed"], result["wal_frames"], result["busy"])
+    return result
+
+
+def analyze(limit: int = ANALYZE_LIMIT) -> Dict[str, Any]:
+    """Refresh sqlite_stat1. With a limit, each index is sampled instead of fully scanned."""
+    t0 = time.monotonic()
+    with write_lock, database.engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.execute(text(f"PRAGMA analysis_limit={int(limit)}"))
+        conn.execute(text("ANALYZE"))
+        conn.execute(text("PRAGMA analysis_limit=0"))
+    result = {"limit": limit, "elapsed_ms": int((time.monotonic() - t0) * 1000),
+              "finished_at": datetime.utcnow().isoformat()}
+    _stats["analyzes"] += 1
+    _stats["last_analyze"] = result
+    logger.info("ANALYZE done in %dms (limit=%d)", result["elapsed_ms"], limit)
+    return result
+
+
+def storage_status() -> Dict[str, Any]:
+    """Effective PRAGMAs, file sizes and maintenance counters (admin endpoint)."""
+    pragmas = {}
+    with database.engine.connect() as conn:
+        for key in ("journal_mode", "synchronous", "cache_size", "mmap_size", "temp_store",
+                    "busy_timeout", "journal_size_limit", "wal_autocheckpoint",
+                    "page_size", "page_count", "freelist_count"):
+            pragmas[key] = conn.execute(text(f"PRAGMA {key}")).scalar()
+    return {
+        "profile": database.SQLITE_PROFILE,
+        "pragmas": pragmas,
+        "db_bytes": pragmas["page_size"] * pragmas["page_count"],
+        "wal_bytes": wal_size(),
+        "schedule": {"checkpoint_interval_s": CHECKPOINT_INTERVAL_S,
+                     "wal_truncate_bytes": WAL_TRUNCATE_BYTES,
+                     "truncate_busy_timeout_ms": TRUNCATE_BUSY_TIMEOUT_MS,
+                     "analyze_interval_s": ANALYZE_INTERVAL_S,
+                     "analyze_limit": ANALYZE_LIMIT},
+        **stats(),
+    }
+
+
+def stats() -> Dict[str, Any]:
+    return {k: (dict(v) if isinstance(v, dict) else v) for k, v in _stats.items()}
+
+
+async def maintenance_loop(checkpoint_interval_s: int = CHECKPOINT_INTERVAL_S,
+                           analyze_interval_s: int = ANALYZE_INTERVAL_S):
+    """Background task: checkpoint every tick, ANALYZE when due (both in a worker thread)."""
+    next_analyze = time.monotonic()
+    while True:
+        try:
+            await asyncio.to_thread(checkpoint)
+        except Exception as e:
+            logger.error("WAL checkpoint failed: %s: %s", type(e).__name__, e)
+        if analyze_interval_s > 0 and time.monotonic() >= next_analyze:
+            next_analyze = time.monotonic() + analyze_interval_s
+            try:
+                await asyncio.to_thread(analyze)
+            except Exception as e:
+                logger.error("ANALYZE failed: %s: %s", type(e).__name__, e)
+        await asyncio.sleep(checkpoint_interval_s)
@@ -0,0 +1,253 @@
+"""
+NetManager — Single Writer Queue
+One dedicated SQLite writer connection fed by a queue, with group commit.
+
+SQLite allows one writer at a time. CRUD requests, sync commits and
+background jobs used to race for that lock from many pooled connections;
+whoever waited longer than the busy timeout got "database is locked" (503).
+API writes are now submitted as small jobs and executed by a single thread
+that owns the only writer connection:
+
+    - jobs waiting in the queue are run together in one transaction and
+      committed once (group commit): one WAL sync for the whole group
+    - each job runs in its own SAVEPOINT, so a failing job (404, unique
+      violation, ...) is rolled back alone and its exception is raised in
+      the caller; the rest of the group still commits
+    - the transaction is BEGIN IMMEDIATE: the write lock is taken up front,
+      never upgraded from a read snapshot
+
+A job is fn(db, *args) -> result. It must not commit. The session does not
+expire on commit and is closed after the group, so returned ORM objects are
+detached with their loaded columns readable (FastAPI response models).
+
+Writers that cannot be queued (the sync write phase runs on its own session)
+hold the same lock through `serialized(fn)`, so they never wait on SQLite's
+busy handler for another in-process writer.
+
+Usage:
+    cam = get_writer().call(_create_row, Camera, data)   # from a threadpool endpoint
+    res = await get_writer().run(fn, arg)                # from async code
+    await run_db(db, serialized(_persist))
+"""
+import asyncio
+import functools
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Optional, TypeVar
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import sessionmaker
+
+from database import apply_sqlite_pragmas
+
+logger = logging.getLogger("netmanager.dbwriter")
+
+WRITE_BATCH_MAX = int(os.getenv("DB_WRITE_BATCH_MAX", "64"))          # jobs per group commit
+WRITE_BATCH_WAIT_MS = float(os.getenv("DB_WRITE_BATCH_WAIT_MS", "0"))  # extra wait to grow a group
+
+T = TypeVar("T")
+
+_STOP = object()
+
+# Held by the writer thread while a group runs and commits, and by serialized()
+# writers — one in-process writer at a time.
+write_lock = threading.RLock()
+
+
+def make_writer_engine(url: str) -> Engine:
+    """
+    Engine with exactly one connection whose transactions are BEGIN IMMEDIATE.
+    pysqlite's own transaction handling is turned off (isolation_level=None) so
+    BEGIN and SAVEPOINT are emitted exactly as SQLAlchemy asks.
+    """
+    eng = create_engine(url, connect_args={"check_same_thread": False},
+                        pool_size=1, max_overflow=0)
+
+    @event.listens_for(eng, "connect")
+    def _connect(dbapi_connection, connection_record):
+        dbapi_connection.isolation_level = None
+        apply_sqlite_pragmas(dbapi_connection)
+
+    @event.listens_for(eng, "begin")
+    def _begin(conn):
+        conn.exec_driver_sql("BEGIN IMMEDIATE")
+
+    return eng
+
+
+class _Job:
+    __slots__ = ("fn", "args", "kwargs", "future", "queued_at")
+
+    def __init__(self, fn, args, kwargs):
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.future: Future = Future()
+        self.queued_at = time.monotonic()
+
+
+class WriteQueue:
+    """A writer thread draining queued jobs into group-committed transactions."""
+
+    def __init__(self, bind: Engine, batch_max: int = WRITE_BATCH_MAX,
+                 batch_wait_ms: float = WRITE_BATCH_WAIT_MS):
+        self.bind = bind
+        self.batch_max = max(1, batch_max)
+        self.batch_wait_s = batch_wait_ms / 1000.0
+        self._Session = sessionmaker(bind=bind, autoflush=False, expire_on_commit=False)
+        self._queue: "queue.Queue" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self._stats = {"jobs": 0, "failed": 0, "groups": 0, "max_group": 0,
+                       "commit_errors": 0, "wait_ms_max": 0.0}
+
+    # ---- submit ----
+
+    def _ensure_started(self):
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._loop, name="netmanager-writer", daemon=True)
+                self._thread.start()
+
+    def submit(self, fn: Callable[..., T], *args: Any, **kwargs: Any) -> Future:
+        """Queue fn(db, *args, **kwargs); the Future resolves after its group commits."""
+        if threading.current_thread() is self._thread:
+            raise RuntimeError("write job submitted from the writer thread (would deadlock)")
+        self._ensure_started()
+        job = _Job(fn, args, kwargs)
+        self._queue.put(job)
+        return job.future
+
+    def call(self, fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        """Blocking submit — for sync (threadpool) endpoints and worker threads."""
+        return self.submit(fn, *args, **kwargs).result()
+
+    async def run(self, fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        return await asyncio.wrap_future(self.submit(fn, *args, **kwargs))
+
+    # ---- writer thread ----
+
+    def _next_group(self, first) -> List[_Job]:
+        group = [first]
+        deadline = time.monotonic() + self.batch_wait_s
+        while len(group) < self.batch_max:
+            try:
+                remaining = deadline - time.monotonic()
+                job = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if job is _STOP:
+                self._queue.put(_STOP)         # finish this group, stop after it
+                break
+            group.append(job)
+        return group
+
+    def _loop(self):
+        while True:
+            first = self._queue.get()
+            if first is _STOP:
+                return
+            group = self._next_group(first)
+            with write_lock:
+                self._run_group(group)
+
+    def _run_group(self, group: List[_Job]):
+        started = time.monotonic()
+        results = []
+        db = self._Session()
+        try:
+            for job in group:
+                try:
+                    with db.begin_nested():
+                        value = job.fn(db, *job.args, **job.kwargs)
+                    results.append((job, value, None))
+                except Exception as e:
+                    results.append((job, None, e))
+            db.commit()
+        except Exception as e:
+            logger.error("Write group of %d failed to commit: %s", len(group), e)
+            self._stats["commit_errors"] += 1
+            db.rollback()
+            ran = {id(job) for job, _, _ in results}
+            results = [(job, None, err or e) for job, _, err in results]
+            results += [(job, None, e) for job in group if id(job) not in ran]
+        finally:
+            db.close()
+
+        st = self._stats
+        st["groups"] += 1
+        st["jobs"] += len(group)
+        st["max_group"] = max(st["max_group"], len(group))
+        st["wait_ms_max"] = max(st["wait_ms_max"], (started - group[0].queued_at) * 1000)
+        for job, value, err in results:
+            if err is not None:
+                st["failed"] += 1
+                job.future.set_exception(err)
+            else:
+                job.future.set_result(value)
+
+    # ---- lifecycle ----
+
+    def stop(self, timeout: Optional[float] = None):
+        """Run everything already queued, then stop the writer thread."""
+        thread = self._thread
+        if thread is None:
+            return
+        self._queue.put(_STOP)
+        thread.join(timeout)
+        self._thread = None
+
+    def stats(self) -> Dict[str, Any]:
+        st = dict(self._stats)
+        st["queue_depth"] = self._queue.qsize()
+        st["avg_group"] = round(st["jobs"] / st["groups"], 2) if st["groups"] else 0
+        st["wait_ms_max"] = round(st["wait_ms_max"], 2)
+        return st
+
+
+# ============================================
+# PROCESS-WIDE WRITER
+# ============================================
+
+_writer: Optional[WriteQueue] = None
+_writer_lock = threading.Lock()
+
+
+def get_writer() -> WriteQueue:
+    """The app's writer, on its own connection to DATABASE_URL (created on first use)."""
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            import database
+            bind = make_writer_engine(database.DATABASE_URL) if database.is_file_db() else database.engine
+            _writer = WriteQueue(bind)
+        return _writer
+
+
+def serialized(fn: Callable[..., T]) -> Callable[..., T]:
+    """Wrap a write phase that runs on its own session so it holds the writer lock."""
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        with write_lock:
+            return fn(*args, **kwargs)
+    return wrapper
+
+
+def shutdown():
+    global _writer
+    with _writer_lock:
+        w, _writer = _writer, None
+    if w is not None:
+        w.stop()
+        import database
+        if w.bind is not database.engine:
+            w.bind.dispose()
+
+
+def stats() -> Dict[str, Any]:
+    return _writer.stats() if _writer is not None else {}
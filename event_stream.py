@@ -0,0 +1,304 @@
+"""
+NetManager — Live Event Stream
+In-process pub/sub feeding the per-site Server-Sent Events endpoint.
+
+sync_site publishes, right after its commit:
+    camera_event — new CameraEvent rows         (durable, id from camera_events)
+    status       — status_real transitions       (durable, id from camera_status_intervals)
+    sync         — run summary                   (ephemeral, no id)
+
+Every durable message carries an SSE id "<event_id>-<interval_id>" (the
+stream cursor). A client reconnecting with Last-Event-ID gets what it
+missed replayed from the DB, then continues live.
+
+Backpressure: each subscriber has a bounded queue. Publishing never blocks;
+a subscriber whose queue overflows is flagged as lagged, its queue is
+cleared and the stream catches up from the DB using its cursor.
+
+Usage:
+    bus.publish(site_id, messages)
+    async for chunk in sse_stream(site_id, last_event_id, is_disconnected): ...
+"""
+import asyncio
+import json
+import logging
+import os
+import threading
+from datetime import datetime
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from database import SessionLocal, CameraEvent, CameraStatusInterval
+
+logger = logging.getLogger("netmanager.stream")
+
+SSE_QUEUE_SIZE = int(os.getenv("SSE_QUEUE_SIZE", "256"))
+SSE_REPLAY_LIMIT = int(os.getenv("SSE_REPLAY_LIMIT", "500"))
+SSE_HEARTBEAT_S = float(os.getenv("SSE_HEARTBEAT_S", "15"))
+
+Cursor = Tuple[int, int]     # (last camera_events.id, last camera_status_intervals.id)
+
+
+def format_cursor(cursor: Cursor) -> str:
+    return f"{cursor[0]}-{cursor[1]}"
+
+
+def parse_cursor(value: Optional[str]) -> Optional[Cursor]:
+    """Parse a Last-Event-ID value; None if absent or malformed."""
+    if not value:
+        return None
+    try:
+        e, s = value.split("-", 1)
+        return int(e), int(s)
+    except ValueError:
+        return None
+
+
+# ============================================
+# MESSAGES
+# ============================================
+
+def event_message(evt: CameraEvent) -> Dict[str, Any]:
+    return {
+        "type": "camera_event",
+        "event_id": evt.id,
+        "data": {
+            "id": evt.id,
+            "site_id": evt.site_id,
+            "camera_id": evt.camera_id,
+            "channel": evt.channel,
+            "event_type": evt.event_type,
+            "from_status": evt.from_status,
+            "to_status": evt.to_status,
+            "severity": evt.severity,
+            "message": evt.message,
+            "created_at": evt.created_at,
+        },
+    }
+
+
+def status_message(interval_id: int, camera_id: int, status: str, at: datetime) -> Dict[str, Any]:
+    return {
+        "type": "status",
+        "interval_id": interval_id,
+        "data": {"camera_id": camera_id, "status_real": status, "since": at},
+    }
+
+
+def _default(o):
+    return o.isoformat() if isinstance(o, datetime) else str(o)
+
+
+def encode(msg: Dict[str, Any], cursor: Optional[Cursor] = None) -> str:
+    """One SSE frame."""
+    lines = []
+    if cursor is not None:
+        lines.append(f"id: {format_cursor(cursor)}")
+    lines.append(f"event: {msg['type']}")
+    lines.append("data: " + json.dumps(msg["data"], default=_default, separators=(",", ":")))
+    return "\n".join(lines) + "\n\n"
+
+
+def advance(cursor: Cursor, msg: Dict[str, Any]) -> Optional[Cursor]:
+    """New cursor if `msg` is durable and newer than `cursor`, else None (skip / no id)."""
+    if msg["type"] == "camera_event":
+        return (msg["event_id"], cursor[1]) if msg["event_id"] > cursor[0] else None
+    if msg["type"] == "status":
+        return (cursor[0], msg["interval_id"]) if msg["interval_id"] > cursor[1] else None
+    return cursor
+
+
+# ============================================
+# PUB/SUB
+# ============================================
+
+class Subscription:
+    def __init__(self, site_id: int, maxsize: int):
+        self.site_id = site_id
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+        self.lagged = False
+        self.dropped = 0
+        self.loop = asyncio.get_running_loop()
+
+    def offer(self, msg: Dict[str, Any]):
+        """Called on the subscriber's loop; never blocks."""
+        if self.lagged:
+            self.dropped += 1
+            return
+        try:
+            self.queue.put_nowait(msg)
+        except asyncio.QueueFull:
+            # slow consumer — drop the backlog, it will catch up from the DB
+            self.lagged = True
+            self.dropped += self.queue.qsize() + 1
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait({"type": "_lagged"})
+
+
+class EventBus:
+    def __init__(self, queue_size: int = SSE_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self._subs: Dict[int, Set[Subscription]] = {}
+        self._lock = threading.Lock()
+        self.published = 0
+
+    def subscribe(self, site_id: int) -> Subscription:
+        sub = Subscription(site_id, self.queue_size)
+        with self._lock:
+            self._subs.setdefault(site_id, set()).add(sub)
+        return sub
+
+    def unsubscribe(self, sub: Subscription):
+        with self._lock:
+            subs = self._subs.get(sub.site_id)
+            if subs:
+                subs.discard(sub)
+                if not subs:
+                    self._subs.pop(sub.site_id, None)
+
+    def publish(self, site_id: int, messages: List[Dict[str, Any]]):
+        """Fan out to the site's subscribers. Safe to call from any thread."""
+        if not messages:
+            return
+        with self._lock:
+            subs = list(self._subs.get(site_id, ()))
+        self.published += len(messages)
+        for sub in subs:
+            for msg in messages:
+                try:
+                    running = asyncio.get_running_loop()
+                except RuntimeError:
+                    running = None
+                if running is sub.loop:
+                    sub.offer(msg)
+                elif not sub.loop.is_closed():
+                    sub.loop.call_soon_threadsafe(sub.offer, msg)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            subs = [s for ss in self._subs.values() for s in ss]
+        return {
+            "sites": len({s.site_id for s in subs}),
+            "subscribers": len(subs),
+            "queued": sum(s.queue.qsize() for s in subs),
+            "lagged": sum(1 for s in subs if s.lagged),
+            "published": self.published,
+        }
+
+
+# Process-wide bus used by sync_site and the API
+bus = EventBus()
+
+
+# ============================================
+# REPLAY
+# ============================================
+
+def current_cursor(db: Session, site_id: int) -> Cursor:
+    """Cursor pointing at the newest durable message of a site."""
+    e = db.query(func.max(CameraEvent.id)).filter(CameraEvent.site_id == site_id).scalar() or 0
+    s = db.query(func.max(CameraStatusInterval.id)).filter(
+        CameraStatusInterval.site_id == site_id).scalar() or 0
+    return e, s
+
+
+def replay(db: Session, site_id: int, cursor: Cursor, limit: int = SSE_REPLAY_LIMIT) -> List[Dict[str, Any]]:
+    """
+    Durable messages after `cursor`, oldest first (events and transitions
+    interleaved by time), at most `limit` of each kind.
+    """
+    events = db.query(CameraEvent).filter(
+        CameraEvent.site_id == site_id, CameraEvent.id > cursor[0]
+    ).order_by(CameraEvent.id).limit(limit).all()
+    intervals = db.query(CameraStatusInterval).filter(
+        CameraStatusInterval.site_id == site_id, CameraStatusInterval.id > cursor[1]
+    ).order_by(CameraStatusInterval.id).limit(limit).all()
+    msgs = [(e.created_at or datetime.min, 0, event_message(e)) for e in events]
+    msgs += [(i.started_at, 1, status_message(i.id, i.camera_id, i.status, i.started_at))
+             for i in intervals]
+    msgs.sort(key=lambda m: (m[0], m[1]))
+    return [m[2] for m in msgs]
+
+
+def _replay_in_thread(site_id: int, cursor: Cursor) -> List[Dict[str, Any]]:
+    db = SessionLocal()
+    try:
+        return replay(db, site_id, cursor)
+    finally:
+        db.close()
+
+
+def _cursor_in_thread(site_id: int) -> Cursor:
+    db = SessionLocal()
+    try:
+        return current_cursor(db, site_id)
+    finally:
+        db.close()
+
+
+# ============================================
+# SSE GENERATOR
+# ============================================
+
+async def _catch_up(site_id: int, cursor: Cursor) -> AsyncIterator[Tuple[str, Cursor]]:
+    """Replay from the DB in batches until the cursor is current."""
+    while True:
+        batch = await asyncio.to_thread(_replay_in_thread, site_id, cursor)
+        for msg in batch:
+            cursor = advance(cursor, msg) or cursor
+            yield encode(msg, cursor), cursor
+        kinds = [m["type"] for m in batch]
+        if max(kinds.count("camera_event"), kinds.count("status")) < SSE_REPLAY_LIMIT:
+            return
+
+
+async def sse_stream(
+    site_id: int, last_event_id: Optional[str],
+    is_disconnected: Callable[[], Awaitable[bool]],
+    event_bus: Optional[EventBus] = None,
+    heartbeat_s: float = SSE_HEARTBEAT_S,
+) -> AsyncIterator[str]:
+    """
+    Yields SSE frames for a site: replay after Last-Event-ID (if any), then
+    live messages. Subscribes before replaying so nothing falls in between;
+    duplicates are skipped by cursor.
+    """
+    event_bus = event_bus or bus
+    sub = event_bus.subscribe(site_id)
+    try:
+        cursor = parse_cursor(last_event_id)
+        if cursor is None:
+            cursor = await asyncio.to_thread(_cursor_in_thread, site_id)
+        else:
+            async for frame, cursor in _catch_up(site_id, cursor):
+                yield frame
+        yield "retry: 5000\n" + encode({"type": "hello", "data": {"site_id": site_id}}, cursor)
+
+        while True:
+            try:
+                msg = await asyncio.wait_for(sub.queue.get(), timeout=heartbeat_s)
+            except asyncio.TimeoutError:
+                if await is_disconnected():
+                    return
+                yield ": ping\n\n"
+                continue
+
+            if msg["type"] == "_lagged":
+                sub.lagged = False
+                logger.info("SSE site=%d subscriber lagged (%d dropped) — catching up from DB",
+                            site_id, sub.dropped)
+                async for frame, cursor in _catch_up(site_id, cursor):
+                    yield frame
+                continue
+
+            nxt = advance(cursor, msg)
+            if nxt is None:
+                continue            # already sent during replay
+            durable = msg["type"] in ("camera_event", "status")
+            cursor = nxt
+            yield encode(msg, cursor if durable else None)
+    finally:
+        event_bus.unsubscribe(sub)
@@ -9,9 +9,9 @@ from fastapi import FastAPI, Depends, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from fastapi.responses import FileResponse
-from sqlalchemy.orm import Session
-from sqlalchemy.exc import OperationalError as SAOperationalError
-from sqlalchemy import text
+from sqlalchemy.orm import Session, selectinload
+from sqlalchemy.exc import OperationalError as SAOperationalError, IntegrityError as SAIntegrityError
+from sqlalchemy import text, func
 import os
 
 # ============================================
@@ -25,11 +25,12 @@ logging.basicConfig(
 logger = logging.getLogger("netmanager")
 
 from database import (
-    init_db, get_db, run_migrations, check_schema_ok, engine,
-    Site, Building, Rack, Router, Switch, Recorder, PatchPanel, Camera,
+    get_db, get_read_db, run_migrations, check_schema_ok, engine,
+    Site, Building, Rack, Router, Switch, Recorder, RecorderNic, RecorderDisk, PatchPanel, Camera,
     User, UserSite, NvrCredential, SyncLog,
-    CameraSnapshot, CameraEvent
+    CameraSnapshot, CameraEvent, MonitoringRollup
 )
+from db_writer import get_writer, serialized, shutdown as _db_writer_shutdown, stats as _db_writer_stats
 from schemas import (
     SiteCreate, SiteUpdate, SiteOut,
     BuildingCreate, BuildingUpdate, BuildingOut,
@@ -38,7 +39,7 @@ from schemas import (
     SwitchCreate, SwitchUpdate, SwitchOut,
     RecorderCreate, RecorderUpdate, RecorderOut,
     PatchPanelCreate, PatchPanelUpdate, PatchPanelOut,
-    CameraCreate, CameraUpdate, CameraOut, CameraBulkCreate,
+    CameraCreate, CameraUpdate, CameraOut, CameraWriteOut, CameraBulkCreate,
     DashboardStats, SiteFullExport,
     LoginRequest, LoginResponse, UserCreate, UserUpdate, UserOut,
     UserSiteAssign, SiteListItem,
@@ -46,12 +47,15 @@ from schemas import (
     NvrCredentialCreate, NvrCredentialUpdate, NvrCredentialOut,
     NvrSyncPreview, NvrSyncRequest, NvrSyncResult, SyncLogOut,
     NvrCameraPreview,
-    HybridSyncResult, HybridSyncAllResult, CameraEventOut,
+    CameraEventOut,
+    SyncJobOut, SyncJobSubmitOut,
+    CameraSnapshotOut, SnapshotStorageStats, ChannelHistoryOut, SnapshotDiffOut, MonitoringRollupOut, UptimeOut,
+    WebhookDestinationCreate, WebhookDestinationUpdate, WebhookDestinationOut,
 )
 from auth import (
     hash_password, verify_password, create_token,
     get_current_user, require_admin, get_user_site_ids,
-    check_site_access, ensure_admin_exists
+    check_site_access, ensure_admin_exists, user_from_token
 )
 
 # ============================================
@@ -75,7 +79,6 @@ app.add_middleware(
 
 @app.on_event("startup")
 def on_startup():
-    init_db()
     run_migrations()
     db = next(get_db())
     ensure_admin_exists(db)
@@ -83,6 +86,44 @@ def on_startup():
     logger.info("NetManager API started — schema OK")
 
 
+RETENTION_ENABLED = os.getenv("RETENTION_ENABLED", "1") == "1"
+SCHEDULER_ENABLED = os.getenv("SCHEDULER_ENABLED", "1") == "1"
+WEBHOOKS_ENABLED = os.getenv("WEBHOOKS_ENABLED", "1") == "1"
+MAINTENANCE_ENABLED = os.getenv("MAINTENANCE_ENABLED", "1") == "1"
+_background_tasks: list = []
+
+
+@app.on_event("startup")
+async def start_background_tasks():
+    """Start in-process background loops (helpers are imported further below)."""
+    if RETENTION_ENABLED:
+        _background_tasks.append(asyncio.create_task(_retention.retention_loop()))
+    if SCHEDULER_ENABLED:
+        _background_tasks.append(asyncio.create_task(_scheduler.run()))
+    if WEBHOOKS_ENABLED:
+        _background_tasks.append(asyncio.create_task(_webhooks.run()))
+    if MAINTENANCE_ENABLED:
+        _background_tasks.append(asyncio.create_task(_maintenance.maintenance_loop()))
+        _background_tasks.append(asyncio.create_task(_site_counters.reconcile_loop()))
+
+
+@app.on_event("shutdown")
+async def stop_background_tasks():
+    for task in _background_tasks:
+        task.cancel()
+    _background_tasks.clear()
+    await _sync_jobs.stop()
+    try:
+        # persist streak/last_seen changes still only in memory
+        await asyncio.to_thread(_camera_state.checkpoint_all)
+    except Exception as e:
+        logger.error("Camera state checkpoint failed: %s", e)
+    # let in-flight DB work (sync writes, commits) finish before exit
+    await asyncio.to_thread(_db_executor_shutdown)
+    # drain queued API writes (group commit) and close the writer connection
+    await asyncio.to_thread(_db_writer_shutdown)
+
+
 # ============================================
 # GLOBAL ERROR HANDLER — Schema Drift Protection
 # ============================================
@@ -101,6 +142,27 @@ async def handle_db_operational_error(request: Request, exc: SAOperationalError)
     )
 
 
+@app.exception_handler(SAIntegrityError)
+async def handle_db_integrity_error(request: Request, exc: SAIntegrityError):
+    """
+    Unique-key violations (e.g. two cameras on the same recorder channel)
+    are conflicts — 409 naming the key. Other constraint failures (foreign
+    key, NOT NULL, CHECK) are bad requests — 400 instead of a bare 500.
+    """
+    logger.warning("DB IntegrityError on %s %s: %s", request.method, request.url.path, exc.orig)
+    msg = str(exc.orig)
+    if msg.startswith("UNIQUE constraint failed: "):
+        key = msg.split(": ", 1)[1]
+        return JSONResponse(
+            status_code=409,
+            content={"detail": f"Conflicto de datos — ya existe un registro con la misma clave ({key}).", "key": key},
+        )
+    return JSONResponse(
+        status_code=400,
+        content={"detail": f"Datos inválidos — restricción de la base de datos no cumplida ({msg})."},
+    )
+
+
 # ============================================
 # GENERIC CRUD HELPERS
 # ============================================
@@ -112,11 +174,17 @@ def _get_or_404(db: Session, model, item_id: int):
     return item
 
 
+def _write(fn, *args, **kwargs):
+    """Run fn(db, *args) as a job of the single DB writer (group commit); returns its result."""
+    return get_writer().call(fn, *args, **kwargs)
+
+
+# Write jobs — run through _write(), committed by the writer
+
 def _create(db: Session, model, data: dict):
     item = model(**data)
     db.add(item)
-    db.commit()
-    db.refresh(item)
+    db.flush()
     return item
 
 
@@ -125,15 +193,13 @@ def _update(db: Session, model, item_id: int, data: dict):
     for k, v in data.items():
         if hasattr(item, k):
             setattr(item, k, v)
-    db.commit()
-    db.refresh(item)
+    db.flush()
     return item
 
 
 def _delete(db: Session, model, item_id: int):
     item = _get_or_404(db, model, item_id)
     db.delete(item)
-    db.commit()
     return {"ok": True, "id": item_id}
 
 
@@ -157,7 +223,7 @@ def login(data: LoginRequest, db: Session = Depends(get_db)):
     )
 
 @app.get("/api/auth/me", response_model=UserOut, tags=["Auth"])
-def get_me(user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+def get_me(user: User = Depends(get_current_user), db: Session = Depends(get_read_db)):
     site_ids = get_user_site_ids(user, db)
     return UserOut(id=user.id, username=user.username, display_name=user.display_name,
                    role=user.role, active=user.active, site_ids=site_ids)
@@ -167,30 +233,29 @@ def get_me(user: User = Depends(get_current_user), db: Session = Depends(get_db)
 # USER MANAGEMENT (admin only)
 # ============================================
 
-@app.post("/api/users", response_model=UserOut, tags=["Users"])
-def create_user(data: UserCreate, admin: User = Depends(require_admin), db: Session = Depends(get_db)):
+def _create_user(db: Session, data: UserCreate, password_hash: str) -> UserOut:
     if db.query(User).filter_by(username=data.username).first():
         raise HTTPException(400, f"Username '{data.username}' ya existe")
     user = User(username=data.username, display_name=data.display_name,
-                password_hash=hash_password(data.password), role=data.role)
+                password_hash=password_hash, role=data.role)
     db.add(user)
-    db.commit()
-    db.refresh(user)
+    db.flush()
     return UserOut(id=user.id, username=user.username, display_name=user.display_name,
                    role=user.role, active=user.active, site_ids=[])
 
+@app.post("/api/users", response_model=UserOut, tags=["Users"])
+def create_user(data: UserCreate, admin: User = Depends(require_admin)):
+    # hash outside the writer: PBKDF2 is slow and would hold up the whole group
+    return _write(_create_user, data, hash_password(data.password))
+
 @app.get("/api/users", response_model=List[UserOut], tags=["Users"])
-def list_users(admin: User = Depends(require_admin), db: Session = Depends(get_db)):
-    users = db.query(User).all()
-    result = []
-    for u in users:
-        site_ids = [us.site_id for us in db.query(UserSite).filter_by(user_id=u.id).all()]
-        result.append(UserOut(id=u.id, username=u.username, display_name=u.display_name,
-                              role=u.role, active=u.active, site_ids=site_ids))
-    return result
+def list_users(admin: User = Depends(require_admin), db: Session = Depends(get_read_db)):
+    users = db.query(User).options(selectinload(User.site_access)).all()
+    return [UserOut(id=u.id, username=u.username, display_name=u.display_name, role=u.role,
+                    active=u.active, site_ids=[us.site_id for us in u.site_access])
+            for u in users]
 
-@app.put("/api/users/{uid}", response_model=UserOut, tags=["Users"])
-def update_user(uid: int, data: UserUpdate, admin: User = Depends(require_admin), db: Session = Depends(get_db)):
+def _update_user(db: Session, uid: int, data: UserUpdate, password_hash: Optional[str]) -> UserOut:
     user = db.query(User).get(uid)
     if not user:
         raise HTTPException(404, "Usuario no encontrado")
@@ -200,61 +265,67 @@ def update_user(uid: int, data: UserUpdate, admin: User = Depends(require_admin)
         user.role = data.role
     if data.active is not None:
         user.active = data.active
-    if data.password:
-        user.password_hash = hash_password(data.password)
-    db.commit()
-    db.refresh(user)
+    if password_hash:
+        user.password_hash = password_hash
+    db.flush()
     site_ids = [us.site_id for us in db.query(UserSite).filter_by(user_id=user.id).all()]
     return UserOut(id=user.id, username=user.username, display_name=user.display_name,
                    role=user.role, active=user.active, site_ids=site_ids)
 
+@app.put("/api/users/{uid}", response_model=UserOut, tags=["Users"])
+def update_user(uid: int, data: UserUpdate, admin: User = Depends(require_admin)):
+    return _write(_update_user, uid, data, hash_password(data.password) if data.password else None)
+
 @app.delete("/api/users/{uid}", tags=["Users"])
-def delete_user(uid: int, admin: User = Depends(require_admin), db: Session = Depends(get_db)):
-    return _delete(db, User, uid)
+def delete_user(uid: int, admin: User = Depends(require_admin)):
+    return _write(_delete, User, uid)
 
-@app.put("/api/users/{uid}/sites", response_model=UserOut, tags=["Users"])
-def assign_user_sites(uid: int, data: UserSiteAssign, admin: User = Depends(require_admin), db: Session = Depends(get_db)):
-    """Assign sites to a viewer user (replaces all current assignments)"""
+def _assign_user_sites(db: Session, uid: int, data: UserSiteAssign) -> UserOut:
     user = db.query(User).get(uid)
     if not user:
         raise HTTPException(404, "Usuario no encontrado")
     db.query(UserSite).filter_by(user_id=uid).delete()
     for sid in data.site_ids:
         db.add(UserSite(user_id=uid, site_id=sid))
-    db.commit()
     return UserOut(id=user.id, username=user.username, display_name=user.display_name,
                    role=user.role, active=user.active, site_ids=data.site_ids)
 
+@app.put("/api/users/{uid}/sites", response_model=UserOut, tags=["Users"])
+def assign_user_sites(uid: int, data: UserSiteAssign, admin: User = Depends(require_admin)):
+    """Assign sites to a viewer user (replaces all current assignments)"""
+    return _write(_assign_user_sites, uid, data)
+
 
 # ============================================
 # SITES (protected)
 # ============================================
 
 @app.post("/api/sites", response_model=SiteOut, tags=["Sites"])
-def create_site(data: SiteCreate, admin: User = Depends(require_admin), db: Session = Depends(get_db)):
-    return _create(db, Site, data.model_dump())
+def create_site(data: SiteCreate, admin: User = Depends(require_admin)):
+    return _write(_create, Site, data.model_dump())
+
+
+import site_counters as _site_counters
 
 
 @app.get("/api/sites", response_model=List[SiteListItem], tags=["Sites"])
-def list_sites(user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+def list_sites(user: User = Depends(get_current_user), db: Session = Depends(get_read_db)):
     """List sites the current user can access"""
     site_ids = get_user_site_ids(user, db)
-    sites = db.query(Site).filter(Site.id.in_(site_ids)).all() if site_ids else []
-    result = []
-    for s in sites:
-        cam_count = db.query(Camera).filter_by(site_id=s.id).count()
-        result.append(SiteListItem(id=s.id, name=s.name, address=s.address, camera_count=cam_count))
-    return result
+    sites = db.query(Site.id, Site.name, Site.address).filter(Site.id.in_(site_ids)).all() if site_ids else []
+    counts = _site_counters.camera_counts(db, [s.id for s in sites])
+    return [SiteListItem(id=s.id, name=s.name, address=s.address, camera_count=counts.get(s.id, 0))
+            for s in sites]
 
 
 @app.get("/api/sites/{site_id}", response_model=SiteOut, tags=["Sites"])
-def get_site(site_id: int, user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+def get_site(site_id: int, user: User = Depends(get_current_user), db: Session = Depends(get_read_db)):
     check_site_access(user, site_id, db)
     return _get_or_404(db, Site, site_id)
 
 
 @app.put("/api/sites/{site_id}", response_model=SiteOut, tags=["Sites"])
-def update_site(site_id: int, data: SiteUpdate, admin: User = Depends(require_admin), db: Session = Depends(get_db)):
+def update_site(site_id: int, data: SiteUpdate, admin: User = Depends(require_admin)):
     d = data.model_dump()
     # Serialize NetworkSegmentItem objects to plain dicts for JSON column
     if "network_segments" in d:
@@ -262,12 +333,12 @@ def update_site(site_id: int, data: SiteUpdate, admin: User = Depends(require_ad
             s if isinstance(s, dict) else s
             for s in d["network_segments"]
         ]
-    return _update(db, Site, site_id, d)
+    return _write(_update, Site, site_id, d)
 
 
 @app.delete("/api/sites/{site_id}", tags=["Sites"])
-def delete_site(site_id: int, admin: User = Depends(require_admin), db: Session = Depends(get_db)):
-    return _delete(db, Site, site_id)
+def delete_site(site_id: int, admin: User = Depends(require_admin)):
+    return _write(_delete, Site, site_id)
 
 
 # ============================================
@@ -296,7 +367,7 @@ AUTO_SEGMENT_COLORS = ["#10b981", "#3b82f6", "#f59e0b", "#ef4444", "#8b5cf6",
 
 
 @app.get("/api/sites/{site_id}/network-segments", response_model=NetworkSegmentsOut, tags=["Network"])
-def get_network_segments(site_id: int, user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+def get_network_segments(site_id: int, user: User = Depends(get_current_user), db: Session = Depends(get_read_db)):
     """Return auto-detected segments from device IPs + manual segments saved on the site"""
     check_site_access(user, site_id, db)
     site = _get_or_404(db, Site, site_id)
@@ -314,11 +385,8 @@ def get_network_segments(site_id: int, user: User = Depends(get_current_user), d
             all_ips.append(rt.lan_ip)
         if rt.wan_ip:
             all_ips.append(rt.wan_ip)
-    for rec in db.query(Recorder).filter_by(site_id=site_id).all():
-        for nic in (rec.nics or []):
-            ip = nic.get("ip", "") if isinstance(nic, dict) else ""
-            if ip:
-                all_ips.append(ip)
+    all_ips += [ip for (ip,) in db.query(RecorderNic.ip).join(Recorder).filter(
+        Recorder.site_id == site_id, RecorderNic.ip != "")]
 
     detected = _detect_subnets(all_ips)
 
@@ -364,14 +432,11 @@ def update_network_segments(site_id: int, data: NetworkSegmentsUpdate,
                             user: User = Depends(get_current_user), db: Session = Depends(get_db)):
     """Save manual network segments for a site (auto-detected ones are not stored)"""
     check_site_access(user, site_id, db)
-    site = _get_or_404(db, Site, site_id)
     # Only store non-auto segments
-    site.network_segments = [
+    _write(_update, Site, site_id, {"network_segments": [
         {"name": s.name, "subnet": s.subnet, "color": s.color}
         for s in data.segments if not s.auto
-    ]
-    db.commit()
-    db.refresh(site)
+    ]})
     # Return the full merged view
     return get_network_segments(site_id, user, db)
 
@@ -381,7 +446,7 @@ def update_network_segments(site_id: int, data: NetworkSegmentsUpdate,
 # ============================================
 
 @app.get("/api/sites/{site_id}/full", response_model=SiteFullExport, tags=["Sites"])
-def get_site_full(site_id: int, user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+def get_site_full(site_id: int, user: User = Depends(get_current_user), db: Session = Depends(get_read_db)):
     """Get all data for a site in one call — used to hydrate the frontend"""
     check_site_access(user, site_id, db)
     site = _get_or_404(db, Site, site_id)
@@ -391,7 +456,8 @@ def get_site_full(site_id: int, user: User = Depends(get_current_user), db: Sess
         racks=db.query(Rack).filter_by(site_id=site_id).all(),
         routers=db.query(Router).filter_by(site_id=site_id).all(),
         switches=db.query(Switch).filter_by(site_id=site_id).all(),
-        recorders=db.query(Recorder).filter_by(site_id=site_id).all(),
+        recorders=db.query(Recorder).options(selectinload(Recorder.nics), selectinload(Recorder.disks))
+                    .filter_by(site_id=site_id).all(),
         cameras=db.query(Camera).filter_by(site_id=site_id).all(),
         patch_panels=db.query(PatchPanel).filter_by(site_id=site_id).all(),
     )
@@ -402,43 +468,40 @@ def get_site_full(site_id: int, user: User = Depends(get_current_user), db: Sess
 # ============================================
 
 @app.get("/api/sites/{site_id}/dashboard", response_model=DashboardStats, tags=["Dashboard"])
-def get_dashboard(site_id: int, user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+def get_dashboard(site_id: int, user: User = Depends(get_current_user), db: Session = Depends(get_read_db)):
     check_site_access(user, site_id, db)
     _get_or_404(db, Site, site_id)
-    cams = db.query(Camera).filter_by(site_id=site_id).all()
-    recs = db.query(Recorder).filter_by(site_id=site_id).all()
-    racks = db.query(Rack).filter_by(site_id=site_id).all()
-
-    online = sum(1 for c in cams if c.status != "offline")
-    total_tb = sum(
-        float(d.get("size", "0").replace("TB", "").strip())
-        for r in recs for d in (r.disks or [])
-        if "TB" in str(d.get("size", ""))
-    )
+    counters = _site_counters.read(db, [site_id])[site_id]
+    device = counters["device"]
+    recs = db.query(Recorder.id, Recorder.name).filter_by(site_id=site_id).all()
+    racks = db.query(Rack.id, Rack.name).filter_by(site_id=site_id).all()
+
+    cameras = device.get("cameras", 0)
+    online = cameras - counters["status"].get("offline", 0)
+    total_gb, degraded = db.query(
+        func.coalesce(func.sum(RecorderDisk.capacity_gb), 0),
+        func.count().filter(RecorderDisk.status != "ok"),
+    ).join(Recorder).filter(Recorder.site_id == site_id).one()
     rec_types = {}
-    for r in recs:
-        t = r.type or "NVR"
-        rec_types[t] = rec_types.get(t, 0) + 1
-
-    cams_by_rack = {}
-    for rack in racks:
-        cams_by_rack[rack.name] = sum(1 for c in cams if c.rack_id == rack.id)
+    for t, n in counters["recorder_type"].items():
+        rec_types[t or "NVR"] = rec_types.get(t or "NVR", 0) + n
 
-    cams_by_rec = {}
-    for r in recs:
-        cams_by_rec[r.name] = sum(1 for c in cams if c.recorder_id == r.id)
+    by_rack, by_rec = counters["rack"], counters["recorder"]
+    cams_by_rack = {rack.name: by_rack.get(str(rack.id), 0) for rack in racks}
+    cams_by_rec = {r.name: by_rec.get(str(r.id), 0) for r in recs}
 
     return DashboardStats(
-        cameras=len(cams),
+        cameras=cameras,
         cameras_online=online,
-        cameras_offline=len(cams) - online,
-        recorders=len(recs),
-        switches=db.query(Switch).filter_by(site_id=site_id).count(),
-        racks=len(racks),
-        routers=db.query(Router).filter_by(site_id=site_id).count(),
-        patch_panels=db.query(PatchPanel).filter_by(site_id=site_id).count(),
-        buildings=db.query(Building).filter_by(site_id=site_id).count(),
-        total_storage_tb=total_tb,
+        cameras_offline=cameras - online,
+        recorders=device.get("recorders", 0),
+        switches=device.get("switches", 0),
+        racks=device.get("racks", 0),
+        routers=device.get("routers", 0),
+        patch_panels=device.get("patch_panels", 0),
+        buildings=device.get("buildings", 0),
+        total_storage_tb=round(total_gb / 1000, 3),
+        disks_degraded=degraded,
         recorders_by_type=rec_types,
         cameras_by_rack=cams_by_rack,
         cameras_by_recorder=cams_by_rec,
@@ -450,20 +513,20 @@ def get_dashboard(site_id: int, user: User = Depends(get_current_user), db: Sess
 # ============================================
 
 @app.post("/api/buildings", response_model=BuildingOut, tags=["Buildings"])
-def create_building(data: BuildingCreate, user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    return _create(db, Building, data.model_dump())
+def create_building(data: BuildingCreate, user: User = Depends(get_current_user)):
+    return _write(_create, Building, data.model_dump())
 
 @app.get("/api/sites/{site_id}/buildings", response_model=List[BuildingOut], tags=["Buildings"])
-def list_buildings(site_id: int, user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+def list_buildings(site_id: int, user: User = Depends(get_current_user), db: Session = Depends(get_read_db)):
     return db.query(Building).filter_by(site_id=site_id).all()
 
 @app.put("/api/buildings/{bid}", response_model=BuildingOut, tags=["Buildings"])
-def update_building(bid: int, data: BuildingUpdate, user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    return _update(db, Building, bid, data.model_dump())
+def update_building(bid: int, data: BuildingUpdate, user: User = Depends(get_current_user)):
+    return _write(_update, Building, bid, data.model_dump())
 
 @app.delete("/api/buildings/{bid}", tags=["Buildings"])
-def delete_building(bid: int, user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    return _delete(db, Building, bid)
+def delete_building(bid: int, user: User = Depends(get_current_user)):
+    return _write(_delete, Building, bid)
 
 
 # ============================================
@@ -471,20 +534,20 @@ def delete_building(bid: int, user: User = Depends(get_current_user), db: Sessio
 # ============================================
 
 @app.post("/api/racks", response_model=RackOut, tags=["Racks"])
-def create_rack(data: RackCreate, user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    return _create(db, Rack, data.model_dump())
+def create_rack(data: RackCreate, user: User = Depends(get_current_user)):
+    return _write(_create, Rack, data.model_dump())
 
 @app.get("/api/sites/{site_id}/racks", response_model=List[RackOut], tags=["Racks"])
-def list_racks(site_id: int, user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+def list_racks(site_id: int, user: User = Depends(get_current_user), db: Session = Depends(get_read_db)):
     return db.query(Rack).filter_by(site_id=site_id).all()
 
 @app.put("/api/racks/{rid}", response_model=RackOut, tags=["Racks"])
-def update_rack(rid: int, data: RackUpdate, user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    return _update(db, Rack, rid, data.model_dump())
+def update_rack(rid: int, data: RackUpdate, user: User = Depends(get_current_user)):
+    return _write(_update, Rack, rid, data.model_dump())
 
 @app.delete("/api/racks/{rid}", tags=["Racks"])
-def delete_rack(rid: int, user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    return _delete(db, Rack, rid)
+def delete_rack(rid: int, user: User = Depends(get_current_user)):
+    return _write(_delete, Rack, rid)
 
 
 # ============================================
@@ -492,20 +555,20 @@ def delete_rack(rid: int, user: User = Depends(get_current_user), db: Session =
 # ============================================
 
 @app.post("/api/routers", response_model=RouterOut, tags=["Routers"])
-def create_router(data: RouterCreate, user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    return _create(db, Router, data.model_dump())
+def create_router(data: RouterCreate, user: User = Depends(get_current_user)):
+    return _write(_create, Router, data.model_dump())
 
 @app.get("/api/sites/{site_id}/routers", response_model=List[RouterOut], tags=["Routers"])
-def list_routers(site_id: int, user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+def list_routers(site_id: int, user: User = Depends(get_current_user), db: Session = Depends(get_read_db)):
     return db.query(Router).filter_by(site_id=site_id).all()
 
 @app.put("/api/routers/{rid}", response_model=RouterOut, tags=["Routers"])
-def update_router(rid: int, data: RouterUpdate, user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    return _update(db, Router, rid, data.model_dump())
+def update_router(rid: int, data: RouterUpdate, user: User = Depends(get_current_user)):
+    return _write(_update, Router, rid, data.model_dump())
 
 @app.delete("/api/routers/{rid}", tags=["Routers"])
-def delete_router(rid: int, user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    return _delete(db, Router, rid)
+def delete_router(rid: int, user: User = Depends(get_current_user)):
+    return _write(_delete, Router, rid)
 
 
 # ============================================
@@ -513,20 +576,20 @@ def delete_router(rid: int, user: User = Depends(get_current_user), db: Session
 # ============================================
 
 @app.post("/api/switches", response_model=SwitchOut, tags=["Switches"])
-def create_switch(data: SwitchCreate, user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    return _create(db, Switch, data.model_dump())
+def create_switch(data: SwitchCreate, user: User = Depends(get_current_user)):
+    return _write(_create, Switch, data.model_dump())
 
 @app.get("/api/sites/{site_id}/switches", response_model=List[SwitchOut], tags=["Switches"])
-def list_switches(site_id: int, user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+def list_switches(site_id: int, user: User = Depends(get_current_user), db: Session = Depends(get_read_db)):
     return db.query(Switch).filter_by(site_id=site_id).all()
 
 @app.put("/api/switches/{sid}", response_model=SwitchOut, tags=["Switches"])
-def update_switch(sid: int, data: SwitchUpdate, user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    return _update(db, Switch, sid, data.model_dump())
+def update_switch(sid: int, data: SwitchUpdate, user: User = Depends(get_current_user)):
+    return _write(_update, Switch, sid, data.model_dump())
 
 @app.delete("/api/switches/{sid}", tags=["Switches"])
-def delete_switch(sid: int, user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    return _delete(db, Switch, sid)
+def delete_switch(sid: int, user: User = Depends(get_current_user)):
+    return _write(_delete, Switch, sid)
 
 
 # ============================================
@@ -534,26 +597,27 @@ def delete_switch(sid: int, user: User = Depends(get_current_user), db: Session
 # ============================================
 
 @app.post("/api/recorders", response_model=RecorderOut, tags=["Recorders"])
-def create_recorder(data: RecorderCreate, user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+def create_recorder(data: RecorderCreate, user: User = Depends(get_current_user)):
     d = data.model_dump()
     d["nics"] = [n.model_dump() if hasattr(n, "model_dump") else n for n in d.get("nics", [])]
     d["disks"] = [dk.model_dump() if hasattr(dk, "model_dump") else dk for dk in d.get("disks", [])]
-    return _create(db, Recorder, d)
+    return _write(_create, Recorder, d)
 
 @app.get("/api/sites/{site_id}/recorders", response_model=List[RecorderOut], tags=["Recorders"])
-def list_recorders(site_id: int, user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    return db.query(Recorder).filter_by(site_id=site_id).all()
+def list_recorders(site_id: int, user: User = Depends(get_current_user), db: Session = Depends(get_read_db)):
+    return (db.query(Recorder).options(selectinload(Recorder.nics), selectinload(Recorder.disks))
+            .filter_by(site_id=site_id).all())
 
 @app.put("/api/recorders/{rid}", response_model=RecorderOut, tags=["Recorders"])
-def update_recorder(rid: int, data: RecorderUpdate, user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+def update_recorder(rid: int, data: RecorderUpdate, user: User = Depends(get_current_user)):
     d = data.model_dump()
     d["nics"] = [n.model_dump() if hasattr(n, "model_dump") else n for n in d.get("nics", [])]
     d["disks"] = [dk.model_dump() if hasattr(dk, "model_dump") else dk for dk in d.get("disks", [])]
-    return _update(db, Recorder, rid, d)
+    return _write(_update, Recorder, rid, d)
 
 @app.delete("/api/recorders/{rid}", tags=["Recorders"])
-def delete_recorder(rid: int, user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    return _delete(db, Recorder, rid)
+def delete_recorder(rid: int, user: User = Depends(get_current_user)):
+    return _write(_delete, Recorder, rid)
 
 
 # ============================================
@@ -561,44 +625,61 @@ def delete_recorder(rid: int, user: User = Depends(get_current_user), db: Sessio
 # ============================================
 
 @app.post("/api/patch-panels", response_model=PatchPanelOut, tags=["PatchPanels"])
-def create_patch_panel(data: PatchPanelCreate, user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    return _create(db, PatchPanel, data.model_dump())
+def create_patch_panel(data: PatchPanelCreate, user: User = Depends(get_current_user)):
+    return _write(_create, PatchPanel, data.model_dump())
 
 @app.get("/api/sites/{site_id}/patch-panels", response_model=List[PatchPanelOut], tags=["PatchPanels"])
-def list_patch_panels(site_id: int, user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+def list_patch_panels(site_id: int, user: User = Depends(get_current_user), db: Session = Depends(get_read_db)):
     return db.query(PatchPanel).filter_by(site_id=site_id).all()
 
 @app.put("/api/patch-panels/{pid}", response_model=PatchPanelOut, tags=["PatchPanels"])
-def update_patch_panel(pid: int, data: PatchPanelUpdate, user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    return _update(db, PatchPanel, pid, data.model_dump())
+def update_patch_panel(pid: int, data: PatchPanelUpdate, user: User = Depends(get_current_user)):
+    return _write(_update, PatchPanel, pid, data.model_dump())
 
 @app.delete("/api/patch-panels/{pid}", tags=["PatchPanels"])
-def delete_patch_panel(pid: int, user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    return _delete(db, PatchPanel, pid)
+def delete_patch_panel(pid: int, user: User = Depends(get_current_user)):
+    return _write(_delete, PatchPanel, pid)
 
 
 # ============================================
 # CAMERAS
 # ============================================
 
-@app.post("/api/cameras", response_model=CameraOut, tags=["Cameras"])
-def create_camera(data: CameraCreate, user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    return _create(db, Camera, data.model_dump())
+import site_conflicts as _site_conflicts
+from camera_uptime import interval_key as _interval_key, record_changes as _uptime_record
+from datetime import datetime as _dt
+
+
+def _with_conflicts(db: Session, cams: List[Camera], before: dict) -> List[CameraWriteOut]:
+    """Written cameras with the conflicts each one entered (inside the write job, after flush)."""
+    new = _site_conflicts.introduced(db, cams, before)
+    return [CameraWriteOut.model_validate(c).model_copy(update={"conflicts": new[c.id]}) for c in cams]
 
-@app.post("/api/cameras/bulk", response_model=List[CameraOut], tags=["Cameras"])
-def create_cameras_bulk(data: CameraBulkCreate, user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+
+@app.post("/api/cameras", response_model=CameraWriteOut, tags=["Cameras"])
+def create_camera(data: CameraCreate, conflicts: bool = False, user: User = Depends(get_current_user)):
+    """Create a camera; with ?conflicts=true the response lists the conflicts it introduced"""
+    def _create_one(db: Session):
+        cam = _create(db, Camera, data.model_dump())
+        _uptime_record(db, [cam], {}, _dt.utcnow())
+        return _with_conflicts(db, [cam], {})[0] if conflicts else cam
+    return _write(_create_one)
+
+@app.post("/api/cameras/bulk", response_model=List[CameraWriteOut], tags=["Cameras"])
+def create_cameras_bulk(data: CameraBulkCreate, conflicts: bool = False, user: User = Depends(get_current_user)):
     """Create multiple cameras in a single transaction"""
-    created = []
-    for cam_data in data.cameras:
-        d = cam_data.model_dump()
-        d["site_id"] = data.site_id
-        cam = Camera(**d)
-        db.add(cam)
-        created.append(cam)
-    db.commit()
-    for c in created:
-        db.refresh(c)
-    return created
+    def _create_all(db: Session):
+        created = []
+        for cam_data in data.cameras:
+            d = cam_data.model_dump()
+            d["site_id"] = data.site_id
+            cam = Camera(**d)
+            db.add(cam)
+            created.append(cam)
+        db.flush()
+        _uptime_record(db, created, {}, _dt.utcnow())
+        return _with_conflicts(db, created, {}) if conflicts else created
+    return _write(_create_all)
 
 @app.get("/api/sites/{site_id}/cameras", response_model=List[CameraOut], tags=["Cameras"])
 def list_cameras(
@@ -608,7 +689,7 @@ def list_cameras(
     rack_id: Optional[int] = None,
     cam_type: Optional[str] = None,
     user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     q = db.query(Camera).filter_by(site_id=site_id)
     if status:
@@ -622,16 +703,16 @@ def list_cameras(
     return q.order_by(Camera.channel).all()
 
 @app.get("/api/cameras/{cid}", response_model=CameraOut, tags=["Cameras"])
-def get_camera(cid: int, user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+def get_camera(cid: int, user: User = Depends(get_current_user), db: Session = Depends(get_read_db)):
     return _get_or_404(db, Camera, cid)
 
-@app.put("/api/cameras/bulk-update", response_model=List[CameraOut], tags=["Cameras"])
+@app.put("/api/cameras/bulk-update", response_model=List[CameraWriteOut], tags=["Cameras"])
 def bulk_update_cameras(
     camera_ids: List[int],
     field: str = Query(...),
     value: str = Query(...),
+    conflicts: bool = False,
     user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
 ):
     """Bulk update a single field on multiple cameras.
     NOTE: This route MUST be defined before /api/cameras/{cid}
@@ -647,24 +728,35 @@ def bulk_update_cameras(
         coerced = int(value) if value and value not in ("", "null", "None") else None
     else:
         coerced = value
-    updated = []
-    for cid in camera_ids:
-        cam = db.query(Camera).get(cid)
-        if cam:
-            setattr(cam, field, coerced)
-            updated.append(cam)
-    db.commit()
-    for c in updated:
-        db.refresh(c)
-    return updated
 
-@app.put("/api/cameras/{cid}", response_model=CameraOut, tags=["Cameras"])
-def update_camera(cid: int, data: CameraUpdate, user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    return _update(db, Camera, cid, data.model_dump())
+    def _set_field(db: Session):
+        updated, before, intervals = [], {}, {}
+        for cid in camera_ids:
+            cam = db.query(Camera).get(cid)
+            if cam:
+                before[cam.id] = _site_conflicts.camera_keys(cam)
+                intervals[cam.id] = _interval_key(cam)
+                setattr(cam, field, coerced)
+                updated.append(cam)
+        db.flush()
+        _uptime_record(db, updated, intervals, _dt.utcnow())
+        return _with_conflicts(db, updated, before) if conflicts else updated
+    return _write(_set_field)
+
+@app.put("/api/cameras/{cid}", response_model=CameraWriteOut, tags=["Cameras"])
+def update_camera(cid: int, data: CameraUpdate, conflicts: bool = False, user: User = Depends(get_current_user)):
+    """Update a camera; with ?conflicts=true the response lists the conflicts it introduced"""
+    def _update_one(db: Session):
+        cam = _get_or_404(db, Camera, cid)
+        before, intervals = {cid: _site_conflicts.camera_keys(cam)}, {cid: _interval_key(cam)}
+        cam = _update(db, Camera, cid, data.model_dump())
+        _uptime_record(db, [cam], intervals, _dt.utcnow())
+        return _with_conflicts(db, [cam], before)[0] if conflicts else cam
+    return _write(_update_one)
 
 @app.delete("/api/cameras/{cid}", tags=["Cameras"])
-def delete_camera(cid: int, user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    return _delete(db, Camera, cid)
+def delete_camera(cid: int, user: User = Depends(get_current_user)):
+    return _write(_delete, Camera, cid)
 
 
 # ============================================
@@ -672,60 +764,9 @@ def delete_camera(cid: int, user: User = Depends(get_current_user), db: Session
 # ============================================
 
 @app.get("/api/sites/{site_id}/validate", tags=["Validation"])
-def validate_site(site_id: int, user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    """Run all validations and return conflicts"""
-    cams = db.query(Camera).filter_by(site_id=site_id).all()
-    switches = db.query(Switch).filter_by(site_id=site_id).all()
-    pps = db.query(PatchPanel).filter_by(site_id=site_id).all()
-
-    errors = []
-    warnings = []
-
-    # Duplicate IPs
-    ip_map = {}
-    for c in cams:
-        if c.ip:
-            ip_map.setdefault(c.ip, []).append(c)
-    for ip, group in ip_map.items():
-        if len(group) > 1:
-            same_type = all(c.cam_type == group[0].cam_type for c in group)
-            names = [c.name or f"CH{c.channel}" for c in group]
-            ids = [c.id for c in group]
-            if same_type:
-                errors.append({"type": "ip_duplicate", "msg": f"IP {ip} duplicada: {', '.join(names)}", "ids": ids})
-            else:
-                warnings.append({"type": "ip_cross_segment", "msg": f"IP {ip} en segmentos diferentes: {', '.join(names)}", "ids": ids})
-
-    # Duplicate channels per recorder
-    ch_map = {}
-    for c in cams:
-        if c.channel and c.recorder_id:
-            key = (c.recorder_id, c.channel)
-            ch_map.setdefault(key, []).append(c)
-    for (_, ch), group in ch_map.items():
-        if len(group) > 1:
-            names = [c.name or c.ip or f"ID{c.id}" for c in group]
-            errors.append({"type": "channel_duplicate", "msg": f"Canal {ch} duplicado: {', '.join(names)}", "ids": [c.id for c in group]})
-
-    # Duplicate PP ports
-    pp_map = {}
-    for c in cams:
-        if c.patch_panel_id and c.patch_panel_port:
-            key = (c.patch_panel_id, c.patch_panel_port)
-            pp_map.setdefault(key, []).append(c)
-    for (ppid, port), group in pp_map.items():
-        if len(group) > 1:
-            pp = next((p for p in pps if p.id == ppid), None)
-            names = [c.name or c.ip or f"ID{c.id}" for c in group]
-            errors.append({"type": "pp_port_duplicate", "msg": f"Puerto {port} de {pp.name if pp else 'PP'} duplicado: {', '.join(names)}", "ids": [c.id for c in group]})
-
-    # Switch overload
-    for sw in switches:
-        count = sum(1 for c in cams if c.switch_id == sw.id)
-        if count > sw.ports:
-            warnings.append({"type": "switch_overload", "msg": f"{sw.name}: {count} cámaras exceden {sw.ports} puertos", "ids": []})
-
-    return {"errors": errors, "warnings": warnings, "total": len(errors) + len(warnings)}
+def validate_site(site_id: int, user: User = Depends(get_current_user), db: Session = Depends(get_read_db)):
+    """Run all validations and return conflicts (read from the conflict index, see site_conflicts)"""
+    return _site_conflicts.validate(db, site_id)
 
 
 # ============================================
@@ -851,6 +892,7 @@ def seed_donbosco(db: Session = Depends(get_db)):
 from crypto_utils import encrypt_password, decrypt_password
 from dahua_rpc import sync_nvr as _sync_nvr_rpc
 from datetime import datetime as _dt
+from db_executor import run_db, shutdown as _db_executor_shutdown, stats as _db_executor_stats
 import asyncio
 
 
@@ -858,7 +900,7 @@ import asyncio
 def create_nvr_credential(data: NvrCredentialCreate, admin: User = Depends(require_admin), db: Session = Depends(get_db)):
     """Add NVR credentials for a site (admin only). Password is encrypted."""
     _get_or_404(db, Site, data.site_id)
-    cred = NvrCredential(
+    return _write(_create, NvrCredential, dict(
         site_id=data.site_id,
         recorder_id=data.recorder_id,
         label=data.label or f"NVR {data.ip}",
@@ -867,59 +909,62 @@ def create_nvr_credential(data: NvrCredentialCreate, admin: User = Depends(requi
         username=data.username,
         password_enc=encrypt_password(data.password),
         active=True,
-    )
-    db.add(cred)
-    db.commit()
-    db.refresh(cred)
-    return cred
+        sync_interval_s=data.sync_interval_s,
+    ))
 
 
 @app.get("/api/sites/{site_id}/nvr-credentials", response_model=List[NvrCredentialOut], tags=["NVR Sync"])
-def list_nvr_credentials(site_id: int, admin: User = Depends(require_admin), db: Session = Depends(get_db)):
+def list_nvr_credentials(site_id: int, admin: User = Depends(require_admin), db: Session = Depends(get_read_db)):
     """List NVR credentials for a site (admin only). Passwords are NOT returned."""
     return db.query(NvrCredential).filter_by(site_id=site_id).all()
 
 
 @app.put("/api/nvr-credentials/{cid}", response_model=NvrCredentialOut, tags=["NVR Sync"])
-def update_nvr_credential(cid: int, data: NvrCredentialUpdate, admin: User = Depends(require_admin), db: Session = Depends(get_db)):
+def update_nvr_credential(cid: int, data: NvrCredentialUpdate, admin: User = Depends(require_admin)):
     """Update NVR credential (admin only)."""
-    cred = _get_or_404(db, NvrCredential, cid)
+    changes = {}
     if data.label is not None:
-        cred.label = data.label
+        changes["label"] = data.label
     if data.ip is not None:
-        cred.ip = data.ip
+        changes["ip"] = data.ip
     if data.port is not None:
-        cred.port = data.port
+        changes["port"] = data.port
     if data.username is not None:
-        cred.username = data.username
+        changes["username"] = data.username
     if data.password is not None and data.password:
-        cred.password_enc = encrypt_password(data.password)
+        changes["password_enc"] = encrypt_password(data.password)
     if data.active is not None:
-        cred.active = data.active
+        changes["active"] = data.active
     if data.recorder_id is not None:
-        cred.recorder_id = data.recorder_id
-    db.commit()
-    db.refresh(cred)
-    return cred
+        changes["recorder_id"] = data.recorder_id
+    if data.sync_interval_s is not None:
+        # 0 resets to the scheduler default
+        changes["sync_interval_s"] = data.sync_interval_s or None
+    return _write(_update, NvrCredential, cid, changes)
 
 
 @app.delete("/api/nvr-credentials/{cid}", tags=["NVR Sync"])
-def delete_nvr_credential(cid: int, admin: User = Depends(require_admin), db: Session = Depends(get_db)):
+def delete_nvr_credential(cid: int, admin: User = Depends(require_admin)):
     """Delete NVR credential (admin only)."""
-    return _delete(db, NvrCredential, cid)
+    return _write(_delete, NvrCredential, cid)
+
+
+def _set_cred_status(db: Session, cred: NvrCredential, ok: bool):
+    cred.last_status = "ok" if ok else "error"
+    if ok:
+        cred.last_sync = _dt.utcnow()
+    db.commit()
 
 
 @app.post("/api/nvr-credentials/{cid}/test", tags=["NVR Sync"])
 async def test_nvr_connection(cid: int, admin: User = Depends(require_admin), db: Session = Depends(get_db)):
     """Test NVR connection without syncing."""
-    cred = _get_or_404(db, NvrCredential, cid)
+    cred = await run_db(db, _get_or_404, NvrCredential, cid)
     password = decrypt_password(cred.password_enc)
     logger.info("Testing NVR connection: cred=%d ip=%s:%d", cid, cred.ip, cred.port)
     result = await _sync_nvr_rpc(cred.ip, cred.port, cred.username, password)
+    await run_db(db, serialized(_set_cred_status), cred, result["ok"])
     if result["ok"]:
-        cred.last_status = "ok"
-        cred.last_sync = _dt.utcnow()
-        db.commit()
         return {
             "ok": True,
             "message": f"Conexión exitosa — {len(result['cameras'])} cámaras detectadas",
@@ -927,8 +972,6 @@ async def test_nvr_connection(cid: int, admin: User = Depends(require_admin), db
             "debug": result.get("debug", {})
         }
     else:
-        cred.last_status = "error"
-        db.commit()
         return {
             "ok": False,
             "message": result["error"],
@@ -940,14 +983,18 @@ async def test_nvr_connection(cid: int, admin: User = Depends(require_admin), db
 @app.post("/api/nvr-credentials/{cid}/preview", tags=["NVR Sync"])
 async def preview_nvr_sync(cid: int, admin: User = Depends(require_admin), db: Session = Depends(get_db)):
     """Connect to NVR, get cameras, and compare with existing DB. Returns preview without making changes."""
-    cred = _get_or_404(db, NvrCredential, cid)
+    cred = await run_db(db, _get_or_404, NvrCredential, cid)
     password = decrypt_password(cred.password_enc)
     logger.info("Preview NVR sync: cred=%d ip=%s:%d", cid, cred.ip, cred.port)
     result = await _sync_nvr_rpc(cred.ip, cred.port, cred.username, password)
+    return await run_db(db, _preview_result, cred, result)
 
+
+def _preview_result(db: Session, cred: NvrCredential, result: dict) -> dict:
+    """Compare the NVR inventory with the DB (runs on the DB executor)."""
+    cid = cred.id
     if not result["ok"]:
-        cred.last_status = "error"
-        db.commit()
+        _set_cred_status(db, cred, False)
         return {
             "ok": False,
             "error": result["error"],
@@ -995,14 +1042,13 @@ async def preview_nvr_sync(cid: int, admin: User = Depends(require_admin), db: S
         else:
             new_cams.append(preview)
 
-    cred.last_status = "ok"
-    cred.last_sync = _dt.utcnow()
-    db.commit()
+    nvr_label = cred.label
+    _set_cred_status(db, cred, True)
 
     return {
         "ok": True,
         "credential_id": cid,
-        "nvr_label": cred.label,
+        "nvr_label": nvr_label,
         "cameras": [NvrCameraPreview(**nc).model_dump() for nc in nvr_cameras],
         "new_cameras": [c.model_dump() for c in new_cams],
         "existing_cameras": [c.model_dump() for c in existing_cams],
@@ -1014,14 +1060,19 @@ async def preview_nvr_sync(cid: int, admin: User = Depends(require_admin), db: S
 async def execute_nvr_sync(cid: int, req: NvrSyncRequest,
                            admin: User = Depends(require_admin), db: Session = Depends(get_db)):
     """Execute NVR sync: add new cameras and/or update existing ones."""
-    cred = _get_or_404(db, NvrCredential, cid)
+    cred = await run_db(db, _get_or_404, NvrCredential, cid)
     password = decrypt_password(cred.password_enc)
     logger.info("Execute NVR sync: cred=%d action=%s ip=%s:%d", cid, req.action, cred.ip, cred.port)
     result = await _sync_nvr_rpc(cred.ip, cred.port, cred.username, password)
+    return await run_db(db, serialized(_apply_nvr_sync), cred, req, admin.id, result)
 
+
+def _apply_nvr_sync(db: Session, cred: NvrCredential, req: NvrSyncRequest,
+                    user_id: int, result: dict) -> NvrSyncResult:
+    """Apply an NVR inventory to the DB (runs on the DB executor)."""
     log = SyncLog(
-        credential_id=cid, site_id=cred.site_id,
-        user_id=admin.id, action=req.action,
+        credential_id=cred.id, site_id=cred.site_id,
+        user_id=user_id, action=req.action,
     )
 
     if not result["ok"]:
@@ -1123,81 +1174,528 @@ async def execute_nvr_sync(cid: int, req: NvrSyncRequest,
     )
 
 
+import json as _json
+import cold_archive
+
+
+def _archived_history(table: str, site_id: int, rows: list, limit: int,
+                      since: Optional[_dt], until: Optional[_dt],
+                      where: Optional[dict] = None) -> List[dict]:
+    """
+    Rows from the cold archive that continue a newest-first live listing.
+    Only consulted when the live table ran out before `limit`, i.e. the
+    request reaches past the hot window.
+    """
+    if len(rows) >= limit:
+        return []
+    ts = cold_archive.TABLES[table][1]
+    if rows:
+        oldest = getattr(rows[-1], ts)
+        until = min(until, oldest) if until else oldest
+    return cold_archive.query(table, site_id, since=since, until=until, where=where,
+                              limit=limit - len(rows), exclude_ids=[r.id for r in rows])
+
+
 @app.get("/api/sites/{site_id}/sync-logs", response_model=List[SyncLogOut], tags=["NVR Sync"])
 def list_sync_logs(site_id: int, limit: int = Query(default=50, le=200),
-                   admin: User = Depends(require_admin), db: Session = Depends(get_db)):
-    """Get sync history for a site."""
-    return db.query(SyncLog).filter_by(site_id=site_id).order_by(SyncLog.created_at.desc()).limit(limit).all()
+                   since: Optional[_dt] = None, until: Optional[_dt] = None,
+                   admin: User = Depends(require_admin), db: Session = Depends(get_read_db)):
+    """Get sync history for a site (continues into the cold archive past the live rows)."""
+    since, until = cold_archive.naive_utc(since), cold_archive.naive_utc(until)
+    q = db.query(SyncLog).filter_by(site_id=site_id)
+    if since:
+        q = q.filter(SyncLog.created_at >= since)
+    if until:
+        q = q.filter(SyncLog.created_at <= until)
+    rows = q.order_by(SyncLog.created_at.desc()).limit(limit).all()
+    archived = _archived_history("sync_logs", site_id, rows, limit, since, until)
+    for r in archived:
+        r["stage_timings"] = _json.loads(r["stage_timings_json"]) if r.get("stage_timings_json") else None
+    return rows + archived
 
 
 # ============================================
 # HYBRID MONITORING (jobs + events)
 # ============================================
 
-from nvr_sync_service import sync_site as _hybrid_sync_site, sync_all_sites as _hybrid_sync_all
-import time as _time
+from sync_jobs import runner as _sync_jobs
+from sync_scheduler import scheduler as _scheduler
+import camera_state as _camera_state
+from nvr_sync_service import write_stats as _sync_write_stats
+from sync_lease import list_leases, SYNC_LEASE_TTL_S, PROCESS_ID as LEASE_PROCESS_ID
+from sync_metrics import stage_percentiles
+from datetime import timedelta as _td
 
 JOB_SECRET = os.getenv("JOB_SECRET", "netmanager-job-secret-change-me")
+# Max seconds a ?wait=true request blocks before returning the job id anyway
+JOB_WAIT_TIMEOUT_S = float(os.getenv("JOB_WAIT_TIMEOUT_S", "600"))
 
 
-@app.post("/api/jobs/nvr/sync-all", tags=["Jobs"])
-async def job_sync_all(request: Request, db: Session = Depends(get_db)):
-    """
-    Sync all sites with active NVR credentials.
-    Protected by x-job-secret header. Designed for n8n/cron.
-    """
+def _require_job_secret(request: Request):
     secret = request.headers.get("x-job-secret", "")
     if secret != JOB_SECRET:
         raise HTTPException(403, "Invalid or missing x-job-secret header")
 
-    t0 = _time.monotonic()
-    results = await _hybrid_sync_all(db)
-    elapsed = int((_time.monotonic() - t0) * 1000)
 
-    return {
-        "ok": True,
-        "sites_synced": len(results),
-        "results": results,
-        "total_elapsed_ms": elapsed,
-    }
+def _submit_out(job, dedup: dict) -> SyncJobSubmitOut:
+    return SyncJobSubmitOut(
+        ok=True,
+        job_id=job.id if job else None,
+        status=job.status if job else "",
+        site_ids=job.site_ids if job else [],
+        deduplicated=dedup,
+    )
+
 
+async def _wait_job(job):
+    """Block until the job finishes (bounded). Returns False on timeout."""
+    try:
+        await _sync_jobs.wait(job.id, timeout=JOB_WAIT_TIMEOUT_S)
+        return True
+    except asyncio.TimeoutError:
+        return False
+
+
+def _active_credential_sites(db: Session) -> List[int]:
+    return [sid for (sid,) in db.query(NvrCredential.site_id).filter_by(active=True).distinct()]
 
-@app.post("/api/jobs/nvr/sync-site/{site_id}", tags=["Jobs"])
-async def job_sync_site(site_id: int, request: Request,
-                        db: Session = Depends(get_db)):
+
+@app.post("/api/jobs/nvr/sync-all", status_code=202, tags=["Jobs"])
+async def job_sync_all(request: Request, wait: bool = False, db: Session = Depends(get_db)):
     """
-    Sync a single site. Protected by x-job-secret header.
+    Enqueue a sync of all sites with active NVR credentials; returns a job id.
+    Sites already queued/running are not enqueued twice (see `deduplicated`).
+    Protected by x-job-secret header. Designed for n8n/cron.
+    ?wait=true blocks and returns the legacy summary (bounded by JOB_WAIT_TIMEOUT_S).
     """
-    secret = request.headers.get("x-job-secret", "")
-    if secret != JOB_SECRET:
-        raise HTTPException(403, "Invalid or missing x-job-secret header")
+    _require_job_secret(request)
+    site_ids = await run_db(db, _active_credential_sites)
+    job, dedup = _sync_jobs.submit("all", site_ids, requested_by="job")
+
+    if wait and job and await _wait_job(job):
+        d = job.to_dict()
+        return JSONResponse(status_code=200, content={
+            "ok": True,
+            "job_id": job.id,
+            "sites_synced": d["done"],
+            "results": d["results"],
+            "total_elapsed_ms": job.elapsed_ms,
+        })
+    return _submit_out(job, dedup)
+
+
+@app.post("/api/jobs/nvr/sync-site/{site_id}", status_code=202, tags=["Jobs"])
+async def job_sync_site(site_id: int, request: Request, wait: bool = False):
+    """
+    Enqueue a sync of a single site; returns a job id. Protected by x-job-secret header.
+    ?wait=true blocks and returns the site result.
+    """
+    _require_job_secret(request)
+    job, dedup = _sync_jobs.submit("site", [site_id], requested_by="job")
+
+    if wait and job and await _wait_job(job):
+        return JSONResponse(status_code=200, content=job.results.get(site_id, {}))
+    return _submit_out(job, dedup)
+
 
-    result = await _hybrid_sync_site(site_id, db)
-    return result.to_dict()
+@app.get("/api/jobs/{job_id}", response_model=SyncJobOut, tags=["Jobs"])
+def job_status(job_id: str, request: Request):
+    """Job status, progress and per-site results. Protected by x-job-secret header."""
+    _require_job_secret(request)
+    job = _sync_jobs.get(job_id)
+    if not job:
+        raise HTTPException(404, f"Job {job_id} not found")
+    return job.to_dict()
 
 
-@app.post("/api/admin/nvr/hybrid-sync/{site_id}", response_model=HybridSyncResult, tags=["NVR Sync"])
-async def admin_hybrid_sync(site_id: int, admin: User = Depends(require_admin),
-                            db: Session = Depends(get_db)):
+@app.post("/api/admin/nvr/hybrid-sync/{site_id}", response_model=SyncJobSubmitOut,
+          status_code=202, tags=["NVR Sync"])
+async def admin_hybrid_sync(site_id: int, admin: User = Depends(require_admin)):
     """
-    Admin trigger: run hybrid sync (NVR inventory + TCP probe) for a site.
+    Admin trigger: enqueue a hybrid sync (NVR inventory + TCP probe) for a site.
+    Poll /api/admin/jobs/{job_id} for the result.
     """
     logger.info("Admin hybrid sync: site=%d by user=%s", site_id, admin.username)
-    result = await _hybrid_sync_site(site_id, db)
-    return HybridSyncResult(**result.to_dict())
+    job, dedup = _sync_jobs.submit("site", [site_id], requested_by=admin.username)
+    return _submit_out(job, dedup)
+
+
+@app.get("/api/admin/jobs", tags=["NVR Sync"])
+def list_sync_jobs(limit: int = Query(default=50, le=200), admin: User = Depends(require_admin)):
+    """Recent sync jobs (newest first) + queue depth and sites in flight."""
+    return {
+        "queue_depth": _sync_jobs.queue_depth(),
+        "active_sites": _sync_jobs.active_sites(),
+        "jobs": [j.to_dict() for j in _sync_jobs.list(limit)],
+    }
+
+
+@app.get("/api/admin/scheduler", tags=["NVR Sync"])
+def get_scheduler(limit: int = Query(default=100, le=1000), admin: User = Depends(require_admin)):
+    """Upcoming scheduled syncs per site (soonest first)."""
+    return {
+        "enabled": SCHEDULER_ENABLED,
+        "last_refresh": _scheduler.last_refresh,
+        "sites": len(_scheduler.entries),
+        "upcoming": _scheduler.upcoming(limit),
+    }
+
+
+@app.get("/api/admin/camera-state", tags=["NVR Sync"])
+def get_camera_state(admin: User = Depends(require_admin)):
+    """
+    In-memory anti-jitter state cache (sites/cameras held, dirty rows, hit/miss
+    counters) and sync write amplification (matched cameras vs rows rewritten).
+    """
+    return {**_camera_state.stats(), "writes": _sync_write_stats()}
+
+
+@app.get("/api/admin/db", tags=["Admin"])
+def get_db_stats(admin: User = Depends(require_admin)):
+    """Writer queue (group size, queue depth, failed jobs) and DB executor counters."""
+    return {"writer": _db_writer_stats(), "executor": _db_executor_stats()}
+
+
+@app.get("/api/admin/sync-leases", tags=["NVR Sync"])
+def get_sync_leases(db: Session = Depends(get_read_db), admin: User = Depends(require_admin)):
+    """Sites currently locked by a sync (any worker/replica sharing this DB)."""
+    return {"ttl_s": SYNC_LEASE_TTL_S, "process": LEASE_PROCESS_ID, "leases": list_leases(db)}
+
+
+@app.get("/api/admin/sync-stages", tags=["NVR Sync"])
+def get_sync_stages(
+    hours: int = Query(24, ge=1, le=24 * 90),
+    site_id: Optional[int] = None,
+    db: Session = Depends(get_read_db),
+    admin: User = Depends(require_admin),
+):
+    """Fleet-wide p50/p90/p99/max duration per sync pipeline stage over the last `hours`."""
+    return stage_percentiles(db, _dt.utcnow() - _td(hours=hours), site_id=site_id)
+
+
+@app.get("/api/admin/jobs/{job_id}", response_model=SyncJobOut, tags=["NVR Sync"])
+def admin_job_status(job_id: str, admin: User = Depends(require_admin)):
+    """Job status, progress and per-site results."""
+    job = _sync_jobs.get(job_id)
+    if not job:
+        raise HTTPException(404, f"Job {job_id} not found")
+    return job.to_dict()
 
 
 @app.get("/api/sites/{site_id}/camera-events", response_model=List[CameraEventOut], tags=["Monitoring"])
 def list_camera_events(site_id: int, limit: int = Query(default=100, le=500),
                        severity: Optional[str] = None,
+                       since: Optional[_dt] = None, until: Optional[_dt] = None,
                        user: User = Depends(get_current_user),
-                       db: Session = Depends(get_db)):
-    """Get camera events (status/inventory changes) for a site."""
+                       db: Session = Depends(get_read_db)):
+    """Get camera events (status/inventory changes) for a site, newest first; older
+    history than the live table holds is read from the cold archive."""
     check_site_access(user, site_id, db)
+    since, until = cold_archive.naive_utc(since), cold_archive.naive_utc(until)
     q = db.query(CameraEvent).filter_by(site_id=site_id)
     if severity:
         q = q.filter_by(severity=severity)
-    return q.order_by(CameraEvent.created_at.desc()).limit(limit).all()
+    if since:
+        q = q.filter(CameraEvent.created_at >= since)
+    if until:
+        q = q.filter(CameraEvent.created_at <= until)
+    rows = q.order_by(CameraEvent.created_at.desc()).limit(limit).all()
+    return rows + _archived_history("camera_events", site_id, rows, limit, since, until,
+                                    {"severity": severity} if severity else None)
+
+
+from fastapi.responses import StreamingResponse
+from database import SessionLocal
+from event_stream import sse_stream as _sse_stream, bus as _event_bus
+
+
+def _authorize_stream(token: Optional[str], site_id: int):
+    db = SessionLocal()
+    try:
+        user = user_from_token(token, db)
+        check_site_access(user, site_id, db)
+    finally:
+        db.close()
+
+
+@app.get("/api/sites/{site_id}/stream", tags=["Monitoring"])
+async def stream_site_events(site_id: int, request: Request,
+                             token: Optional[str] = None,
+                             last_event_id: Optional[str] = None):
+    """
+    Server-Sent Events: new camera events (`camera_event`), status transitions
+    (`status`) and run summaries (`sync`) for a site, pushed as sync commits.
+    Auth via Bearer header or ?token= (EventSource can't send headers).
+    Reconnects resume from the Last-Event-ID header (or ?last_event_id=).
+    """
+    auth = request.headers.get("authorization", "")
+    if auth.lower().startswith("bearer "):
+        token = auth[7:]
+    # short-lived session: the stream itself must not hold a DB connection
+    await asyncio.to_thread(_authorize_stream, token, site_id)
+    resume_from = request.headers.get("last-event-id") or last_event_id
+    return StreamingResponse(
+        _sse_stream(site_id, resume_from, request.is_disconnected),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.get("/api/admin/stream", tags=["Monitoring"])
+def get_stream_stats(admin: User = Depends(require_admin)):
+    """Live stream pub/sub: subscribers, queued messages, lagged consumers."""
+    return _event_bus.stats()
+
+
+from snapshot_store import (
+    load_snapshot as _load_snapshot, storage_stats as _snapshot_storage_stats,
+    channel_history as _channel_history, changed_between as _changed_between,
+    load_archived_snapshot as _load_archived_snapshot,
+)
+
+
+@app.get("/api/sites/{site_id}/snapshots/diff", response_model=SnapshotDiffOut, tags=["Monitoring"])
+def get_snapshot_diff(site_id: int, a: str, b: str,
+                      user: User = Depends(get_current_user),
+                      db: Session = Depends(get_read_db)):
+    """Cameras that changed between sync runs `a` and `b` (added, removed, modified fields)."""
+    check_site_access(user, site_id, db)
+    out = _changed_between(db, site_id, a, b)
+    if out is None:
+        raise HTTPException(404, "Snapshot not found")
+    return out
+
+
+@app.get("/api/sites/{site_id}/snapshots/channels/{channel}", response_model=ChannelHistoryOut,
+         tags=["Monitoring"])
+def get_channel_history(site_id: int, channel: int,
+                        last: int = Query(20, ge=1, le=2000),
+                        fields: str = "status_real",
+                        user: User = Depends(get_current_user),
+                        db: Session = Depends(get_read_db)):
+    """A channel's values (default status_real) across the last `last` sync runs, oldest first."""
+    check_site_access(user, site_id, db)
+    names = [f.strip() for f in fields.split(",") if f.strip()] or ["status_real"]
+    return ChannelHistoryOut(site_id=site_id, channel=channel, fields=names,
+                             runs=_channel_history(db, site_id, channel, last, names))
+
+
+@app.get("/api/sites/{site_id}/snapshots/{run_id}", response_model=CameraSnapshotOut, tags=["Monitoring"])
+def get_camera_snapshot(site_id: int, run_id: str,
+                        user: User = Depends(get_current_user),
+                        db: Session = Depends(get_read_db)):
+    """Get the full camera list captured by a sync run (rebuilt from keyframe + deltas)."""
+    check_site_access(user, site_id, db)
+    row = db.query(CameraSnapshot).filter_by(site_id=site_id, run_id=run_id).first()
+    if not row:
+        archived = _load_archived_snapshot(site_id, run_id)
+        if not archived:
+            raise HTTPException(404, f"Snapshot {run_id} not found")
+        row, cameras = archived
+        return CameraSnapshotOut(site_id=site_id, run_id=run_id, collected_at=row.collected_at,
+                                 encoding=row.encoding or "json", cameras=cameras)
+    return CameraSnapshotOut(
+        site_id=site_id, run_id=run_id, collected_at=row.collected_at,
+        encoding=row.encoding or "json",
+        cameras=_load_snapshot(db, run_id, site_id) or [],
+    )
+
+
+@app.get("/api/admin/snapshots/storage", response_model=SnapshotStorageStats, tags=["Monitoring"])
+def get_snapshot_storage(site_id: Optional[int] = None,
+                         admin: User = Depends(require_admin),
+                         db: Session = Depends(get_read_db)):
+    """Snapshot storage report: raw vs stored bytes, keyframes vs deltas."""
+    return SnapshotStorageStats(**_snapshot_storage_stats(db, site_id))
+
+
+# ============================================
+# RETENTION (background pruning + rollups)
+# ============================================
+
+import retention as _retention
+
+
+@app.get("/api/admin/retention", tags=["Admin"])
+def get_retention_status(admin: User = Depends(require_admin)):
+    """Retention policies and summary of the last pass."""
+    return {"policies": _retention.policies(), "last_run": dict(_retention.last_run)}
+
+
+@app.post("/api/admin/retention/run", tags=["Admin"])
+async def run_retention_now(admin: User = Depends(require_admin)):
+    """Run a retention pass now (in a worker thread)."""
+    logger.info("Manual retention pass by user=%s", admin.username)
+    return await asyncio.to_thread(_retention.run_retention)
+
+
+@app.get("/api/admin/archive", tags=["Admin"])
+def get_archive_status(admin: User = Depends(require_admin)):
+    """Cold archive location and per-table segment / row / byte counts."""
+    return cold_archive.stats()
+
+
+# ============================================
+# STORAGE (SQLite profile, WAL checkpoints, ANALYZE)
+# ============================================
+
+import db_maintenance as _maintenance
+
+
+@app.get("/api/admin/storage", tags=["Admin"])
+def get_storage_status(admin: User = Depends(require_admin)):
+    """Storage profile, effective PRAGMAs, WAL size and maintenance counters."""
+    return _maintenance.storage_status()
+
+
+@app.post("/api/admin/storage/checkpoint", tags=["Admin"])
+async def run_checkpoint_now(admin: User = Depends(require_admin)):
+    """WAL checkpoint now; always truncates the WAL file."""
+    logger.info("Manual WAL checkpoint by user=%s", admin.username)
+    return await asyncio.to_thread(_maintenance.checkpoint, 1)
+
+
+@app.get("/api/admin/counters", tags=["Admin"])
+def get_counters_status(admin: User = Depends(require_admin)):
+    """Summary of the last site counters reconcile (rows, drift found)."""
+    return dict(_site_counters.last_run)
+
+
+@app.post("/api/admin/counters/reconcile", tags=["Admin"])
+async def reconcile_counters_now(site_id: Optional[int] = None, admin: User = Depends(require_admin)):
+    """Recompute site counters from the base tables now; reports any drift fixed."""
+    logger.info("Manual counters reconcile by user=%s site=%s", admin.username, site_id)
+    return await asyncio.to_thread(_site_counters.reconcile, None, site_id)
+
+
+@app.post("/api/admin/storage/analyze", tags=["Admin"])
+async def run_analyze_now(admin: User = Depends(require_admin)):
+    """Refresh query planner statistics now."""
+    logger.info("Manual ANALYZE by user=%s", admin.username)
+    return await asyncio.to_thread(_maintenance.analyze)
+
+
+@app.get("/api/sites/{site_id}/rollups", response_model=List[MonitoringRollupOut], tags=["Monitoring"])
+def list_rollups(site_id: int, period: str = Query(default="hour", pattern="^(hour|day)$"),
+                 since: Optional[_dt] = None, until: Optional[_dt] = None,
+                 limit: int = Query(default=168, le=2000),
+                 user: User = Depends(get_current_user),
+                 db: Session = Depends(get_read_db)):
+    """Hourly/daily summaries of pruned sync logs, events and snapshots."""
+    check_site_access(user, site_id, db)
+    q = db.query(MonitoringRollup).filter_by(site_id=site_id, period=period)
+    if since:
+        q = q.filter(MonitoringRollup.bucket_start >= since)
+    if until:
+        q = q.filter(MonitoringRollup.bucket_start < until)
+    return q.order_by(MonitoringRollup.bucket_start.desc()).limit(limit).all()
+
+
+from camera_uptime import uptime as _uptime
+
+
+def _uptime_window(start: Optional[_dt], end: Optional[_dt], days: int):
+    start, end = cold_archive.naive_utc(start), cold_archive.naive_utc(end)
+    end = end or _dt.utcnow()
+    start = start or end - _td(days=days)
+    if start >= end:
+        raise HTTPException(400, "start debe ser anterior a end")
+    return start, end
+
+
+@app.get("/api/cameras/{cid}/uptime", response_model=UptimeOut, tags=["Monitoring"])
+def camera_uptime(cid: int, start: Optional[_dt] = None, end: Optional[_dt] = None,
+                  days: int = Query(default=30, ge=1, le=3660),
+                  target: Optional[float] = Query(default=None, ge=0, le=100),
+                  user: User = Depends(get_current_user), db: Session = Depends(get_read_db)):
+    """Uptime/SLA of a camera over [start, end) (default: last `days` days)."""
+    cam = _get_or_404(db, Camera, cid)
+    check_site_access(user, cam.site_id, db)
+    start, end = _uptime_window(start, end, days)
+    return _uptime(db, start, end, camera_id=cid, target_pct=target)
+
+
+@app.get("/api/recorders/{rid}/uptime", response_model=UptimeOut, tags=["Monitoring"])
+def recorder_uptime(rid: int, start: Optional[_dt] = None, end: Optional[_dt] = None,
+                    days: int = Query(default=30, ge=1, le=3660),
+                    target: Optional[float] = Query(default=None, ge=0, le=100),
+                    per_camera: bool = False,
+                    user: User = Depends(get_current_user), db: Session = Depends(get_read_db)):
+    """Aggregated uptime/SLA of the cameras of a recorder (optionally per camera, worst first)."""
+    rec = _get_or_404(db, Recorder, rid)
+    check_site_access(user, rec.site_id, db)
+    start, end = _uptime_window(start, end, days)
+    return _uptime(db, start, end, recorder_id=rid, target_pct=target, per_camera=per_camera)
+
+
+@app.get("/api/sites/{site_id}/uptime", response_model=UptimeOut, tags=["Monitoring"])
+def site_uptime(site_id: int, start: Optional[_dt] = None, end: Optional[_dt] = None,
+                days: int = Query(default=30, ge=1, le=3660),
+                target: Optional[float] = Query(default=None, ge=0, le=100),
+                per_camera: bool = False,
+                user: User = Depends(get_current_user), db: Session = Depends(get_read_db)):
+    """Aggregated uptime/SLA of every camera of a site (optionally per camera, worst first)."""
+    check_site_access(user, site_id, db)
+    start, end = _uptime_window(start, end, days)
+    return _uptime(db, start, end, site_id=site_id, target_pct=target, per_camera=per_camera)
+
+
+# ============================================
+# WEBHOOKS (admin)
+# ============================================
+from database import WebhookDestination, WebhookOutbox
+from webhooks import dispatcher as _webhooks, OUTBOX_PENDING as _OUTBOX_PENDING
+
+
+def _webhook_out(d: WebhookDestination) -> WebhookDestinationOut:
+    return WebhookDestinationOut(
+        id=d.id, name=d.name or "", url=d.url, site_id=d.site_id,
+        min_severity=d.min_severity or "crit", has_secret=bool(d.secret),
+        active=bool(d.active), created_at=d.created_at,
+    )
+
+
+@app.get("/api/admin/webhooks", response_model=List[WebhookDestinationOut], tags=["Webhooks"])
+def list_webhooks(db: Session = Depends(get_read_db), admin: User = Depends(require_admin)):
+    return [_webhook_out(d) for d in db.query(WebhookDestination).order_by(WebhookDestination.id).all()]
+
+
+@app.post("/api/admin/webhooks", response_model=WebhookDestinationOut, tags=["Webhooks"])
+def create_webhook(data: WebhookDestinationCreate,
+                   admin: User = Depends(require_admin)):
+    return _webhook_out(_write(_create, WebhookDestination, data.model_dump()))
+
+
+@app.put("/api/admin/webhooks/{wid}", response_model=WebhookDestinationOut, tags=["Webhooks"])
+def update_webhook(wid: int, data: WebhookDestinationUpdate,
+                   admin: User = Depends(require_admin)):
+    return _webhook_out(_write(_update, WebhookDestination, wid, data.model_dump(exclude_unset=True)))
+
+
+@app.delete("/api/admin/webhooks/{wid}", tags=["Webhooks"])
+def delete_webhook(wid: int, admin: User = Depends(require_admin)):
+    return _write(_delete, WebhookDestination, wid)
+
+
+@app.post("/api/admin/webhooks/{wid}/test", tags=["Webhooks"])
+def test_webhook(wid: int, db: Session = Depends(get_db), admin: User = Depends(require_admin)):
+    """Queue a synthetic event for one destination (delivered by the dispatcher)."""
+    dest = _get_or_404(db, WebhookDestination, wid)
+    now = _dt.utcnow()
+    _write(_create, WebhookOutbox, dict(
+        destination_id=dest.id, site_id=dest.site_id, event_id=None, status=_OUTBOX_PENDING,
+        payload_json=_json.dumps({"event_type": "test", "severity": "info",
+                                  "message": "NetManager webhook test", "created_at": now.isoformat()}),
+        next_attempt_at=now, created_at=now,
+    ))
+    _webhooks.notify()
+    return {"ok": True, "queued": 1}
+
+
+@app.get("/api/admin/webhooks/stats", tags=["Webhooks"])
+def webhook_stats(db: Session = Depends(get_read_db), admin: User = Depends(require_admin)):
+    """Outbox queue depth, oldest pending age, delivery latency percentiles, last error."""
+    return {"enabled": WEBHOOKS_ENABLED, **_webhooks.stats(db)}
 
 
 # ============================================
@@ -1205,7 +1703,7 @@ def list_camera_events(site_id: int, limit: int = Query(default=100, le=500),
 # ============================================
 
 @app.get("/api/health", tags=["Admin"])
-def health(db: Session = Depends(get_db)):
+def health(db: Session = Depends(get_read_db)):
     """
     Health check: API + DB connection + schema validation.
     Returns 200 if all OK, 503 if DB or schema is broken.
@@ -1223,9 +1721,10 @@ def health(db: Session = Depends(get_db)):
         from fastapi.responses import JSONResponse as _JR
         return _JR(status_code=503, content=result)
 
-    # Schema validation
+    # Schema validation (cached by run_migrations — no per-request introspection)
     schema = check_schema_ok()
     result["schema"] = "ok" if schema["ok"] else "drift"
+    result["schema_version"] = schema.get("version")
     if not schema["ok"]:
         result["schema_missing"] = schema["missing"]
         logger.warning("Health check schema drift: %s", schema["missing"])
@@ -9,17 +9,29 @@ Returns a SyncRunResult with summary stats and events generated.
 """
 import json
 import logging
+import os
 import uuid
 import time
-from datetime import datetime
-from typing import Dict, List, Any, Optional
+from datetime import datetime, timedelta
+from typing import Dict, List, Any, Optional, Set, Tuple
 
 from sqlalchemy.orm import Session
 
 from database import (
-    Site, Camera, NvrCredential, SyncLog,
-    CameraSnapshot, CameraEvent
+    Site, NvrCredential, SyncLog, CameraEvent
 )
+from camera_upsert import (
+    INVENTORY_FIELDS, upsert_cameras, update_cameras_by_id, update_camera_state,
+)
+import camera_state
+from snapshot_store import save_snapshot
+from camera_uptime import record_transitions
+from event_stream import bus as event_bus, event_message, status_message
+from webhooks import enqueue_events, dispatcher as webhook_dispatcher
+from sync_lease import SiteLease
+from sync_metrics import StageTimer, defer_commit, write_deferred_commits, forget_deferred_commits
+from db_executor import run_db, run_sync
+from db_writer import serialized
 from crypto_utils import decrypt_password
 from dahua_rpc import sync_nvr as _sync_nvr_rpc
 from camera_probe import probe_many, is_valid_ip
@@ -29,6 +41,11 @@ logger = logging.getLogger("netmanager.sync")
 # Anti-jitter: require N consecutive offline probes before marking offline/crit
 OFFLINE_STRIKES_THRESHOLD = 2
 
+# Dedup: an event with the same (channel, event_type, to_status, severity) inside this window is dropped
+EVENT_DEDUP_WINDOW_S = int(os.getenv("EVENT_DEDUP_WINDOW_S", "300"))
+
+EventKey = Tuple[Optional[int], str, str, str]
+
 
 class SyncRunResult:
     """Result of a single sync_site run."""
@@ -47,6 +64,8 @@ class SyncRunResult:
         self.status_changes: int = 0
         self.elapsed_ms: int = 0
         self.run_id: str = ""
+        self.stages: Dict[str, Dict[str, Any]] = {}   # per-stage {"ms", "count"} (SyncLog.stage_timings_json)
+        self.skipped_writes: int = 0    # matched cameras left untouched in the DB (nothing changed)
 
     def to_dict(self) -> dict:
         return {
@@ -81,6 +100,170 @@ def _detect_inventory_changes(
     return changes
 
 
+def _event_key(evt: CameraEvent) -> EventKey:
+    """
+    Dedup key for an event: (channel, event_type, to_status, severity).
+    Severity is part of the key so the crit "offline" after a first-strike
+    warn "offline" is not dropped as a duplicate.
+    """
+    return (evt.channel, evt.event_type or "", evt.to_status or "", evt.severity or "")
+
+
+def _load_recent_event_keys(db: Session, site_id: int, since: datetime) -> Set[EventKey]:
+    """Load dedup keys of all events for a site created since `since` — one query."""
+    rows = db.query(
+        CameraEvent.channel, CameraEvent.event_type, CameraEvent.to_status, CameraEvent.severity
+    ).filter(
+        CameraEvent.site_id == site_id,
+        CameraEvent.created_at >= since,
+    ).distinct().all()
+    return {(ch, et or "", ts or "", sev or "") for ch, et, ts, sev in rows}
+
+
+def _filter_duplicate_events(
+    events: List[CameraEvent], recent_keys: Set[EventKey]
+) -> List[CameraEvent]:
+    """
+    Drop events whose key is already in `recent_keys`.
+    Keys of kept events are added to the set, so duplicates inside the
+    same batch are dropped as well.
+    """
+    kept = []
+    for evt in events:
+        key = _event_key(evt)
+        if key in recent_keys:
+            continue
+        recent_keys.add(key)
+        kept.append(evt)
+    return kept
+
+
+def _evaluate_camera(
+    site_id: int, ch: int, old: Dict[str, Any], nc: Dict[str, Any],
+    real_status: str, now: datetime, result: SyncRunResult,
+) -> Tuple[Dict[str, Any], List[CameraEvent]]:
+    """
+    Compute the new column values for an existing camera and the events the
+    transition produces (inventory change + status change with anti-jitter).
+    Returns (values, events); values has every key in UPDATE_FIELDS.
+    """
+    events: List[CameraEvent] = []
+    cam_id = old["id"]
+
+    # --- INVENTORY CHANGE DETECTION ---
+    old_data = {f: old.get(f) or "" for f in INVENTORY_FIELDS}
+    changes = _detect_inventory_changes(old_data, nc, ch)
+    if changes:
+        result.inventory_changes += 1
+        events.append(CameraEvent(
+            site_id=site_id,
+            camera_id=cam_id,
+            channel=ch,
+            event_type="inventory_change",
+            from_status=json.dumps({f: old_data[f] for f in changes}),
+            to_status=json.dumps({f: nc.get(f, "") for f in changes}),
+            severity="info",
+            message=f"CH{ch} inventario cambió: {', '.join(changes)}",
+        ))
+
+    # Update fields from NVR (never overwrite with blank)
+    values: Dict[str, Any] = {f: nc.get(f) or old.get(f) for f in INVENTORY_FIELDS}
+    values["configured"] = True
+    values["status_config"] = "enabled"
+    values["status_real"] = old.get("status_real")
+    values["status"] = old.get("status")
+    values["last_seen_at"] = old.get("last_seen_at")
+    values["offline_streak"] = old.get("offline_streak") or 0
+    values["updated_at"] = now
+    name = values["name"]
+
+    # --- STATUS CHANGE DETECTION with anti-jitter ---
+    old_status_real = old.get("status_real") or "unknown"
+
+    if real_status == "online":
+        values["offline_streak"] = 0
+        values["last_seen_at"] = now
+        if old_status_real != "online":
+            result.status_changes += 1
+            events.append(CameraEvent(
+                site_id=site_id,
+                camera_id=cam_id,
+                channel=ch,
+                event_type="status_change",
+                from_status=old_status_real,
+                to_status="online",
+                severity="info",
+                message=f"CH{ch} {name}: {old_status_real} → online",
+            ))
+        values["status_real"] = "online"
+        values["status"] = "online"  # legacy field
+
+    elif real_status == "offline":
+        values["offline_streak"] += 1
+        streak = values["offline_streak"]
+        if streak >= OFFLINE_STRIKES_THRESHOLD:
+            if old_status_real != "offline":
+                result.status_changes += 1
+                events.append(CameraEvent(
+                    site_id=site_id,
+                    camera_id=cam_id,
+                    channel=ch,
+                    event_type="status_change",
+                    from_status=old_status_real,
+                    to_status="offline",
+                    severity="crit",
+                    message=f"CH{ch} {name}: {old_status_real} → offline ({streak} strikes)",
+                ))
+            values["status_real"] = "offline"
+            values["status"] = "offline"
+        elif old_status_real == "online":
+            # First strike — warn but don't change status_real yet
+            events.append(CameraEvent(
+                site_id=site_id,
+                camera_id=cam_id,
+                channel=ch,
+                event_type="status_change",
+                from_status=old_status_real,
+                to_status="offline",
+                severity="warn",
+                message=f"CH{ch} {name}: probe fallido ({streak}/{OFFLINE_STRIKES_THRESHOLD})",
+            ))
+
+    else:
+        # unknown — don't change status_real, don't generate events
+        if not old.get("status_real"):
+            values["status_real"] = "unknown"
+
+    return values, events
+
+
+# Process-wide write amplification counters (matched cameras vs rows actually rewritten)
+_write_stats = {"runs": 0, "matched": 0, "written": 0, "skipped": 0, "commit_ms": 0.0}
+
+
+def write_stats() -> Dict[str, Any]:
+    matched, runs = _write_stats["matched"], _write_stats["runs"]
+    return {**_write_stats,
+            "skip_ratio": round(_write_stats["skipped"] / matched, 4) if matched else None,
+            "avg_commit_ms": round(_write_stats["commit_ms"] / runs, 3) if runs else None}
+
+
+def _active_credential(db: Session, site_id: int) -> Optional[NvrCredential]:
+    return db.query(NvrCredential).filter_by(site_id=site_id, active=True).first()
+
+
+def _log_nvr_error(db: Session, cred: NvrCredential, site_id: int, error: str, timer: StageTimer):
+    """Mark the credential as failing and log the run (NVR unreachable / auth error)."""
+    cred.last_status = "error"
+    db.add(SyncLog(
+        credential_id=cred.id, site_id=site_id,
+        action="hybrid_sync", status="error",
+        error_message=error,
+        stage_timings_json=timer.to_json(),
+    ))
+    db.commit()
+
+
 async def sync_site(site_id: int, db: Session) -> SyncRunResult:
     """
     Full hybrid sync for one site:
@@ -91,6 +274,9 @@ async def sync_site(site_id: int, db: Session) -> SyncRunResult:
     5. Save snapshot
     6. Detect changes + generate events with anti-jitter
 
+    Runs under the site's sync lease: if another worker/replica holds it the
+    run is skipped with error_code LEASE_HELD.
+
     Returns SyncRunResult with summary.
     """
     t0 = time.monotonic()
@@ -98,10 +284,32 @@ async def sync_site(site_id: int, db: Session) -> SyncRunResult:
     result.site_id = site_id
     result.run_id = str(uuid.uuid4())[:12]
 
+    lease = SiteLease(db.get_bind(), site_id, run_id=result.run_id)
+    if not await run_sync(lease.bind, lease.acquire):
+        result.error = f"Sincronización en curso en otro proceso ({lease.current_holder})"
+        result.error_code = "LEASE_HELD"
+        result.elapsed_ms = int((time.monotonic() - t0) * 1000)
+        return result
+
+    lease.start_renewal()
+    try:
+        return await _sync_site_locked(site_id, db, result, t0, lease)
+    except Exception:
+        await run_db(db, Session.rollback)
+        raise
+    finally:
+        await lease.release()
+
+
+async def _sync_site_locked(site_id: int, db: Session, result: SyncRunResult,
+                            t0: float, lease: SiteLease) -> SyncRunResult:
+    """
+    Body of sync_site, run while holding the site lease.
+    All DB work runs on the DB executor; only NVR/probe I/O and the
+    evaluate loop run on the event loop.
+    """
     # 1. Get active credential for this site
-    cred = db.query(NvrCredential).filter_by(
-        site_id=site_id, active=True
-    ).first()
+    cred = await run_db(db, _active_credential, site_id)
 
     if not cred:
         result.error = "No hay credenciales NVR activas para este sitio"
@@ -113,271 +321,230 @@ async def sync_site(site_id: int, db: Session) -> SyncRunResult:
     logger.info("[%s] Sync site=%d (%s:%d) run=%s",
                 result.run_id, site_id, cred.ip, cred.port, result.run_id)
 
+    timer = StageTimer()
     password = decrypt_password(cred.password_enc)
-    nvr_result = await _sync_nvr_rpc(cred.ip, cred.port, cred.username, password)
+    with timer.stage("nvr_fetch") as st:
+        nvr_result = await _sync_nvr_rpc(cred.ip, cred.port, cred.username, password)
+        st.count = len(nvr_result.get("cameras") or [])
 
     if not nvr_result["ok"]:
         result.error = nvr_result["error"]
         result.error_code = nvr_result.get("error_code", "NVR_ERROR")
-        cred.last_status = "error"
-        db.commit()
+        result.stages = timer.to_dict()
+        await run_db(db, serialized(_log_nvr_error), cred, site_id, result.error, timer)
         result.elapsed_ms = int((time.monotonic() - t0) * 1000)
-
-        # Log the failure
-        log = SyncLog(
-            credential_id=cred.id, site_id=site_id,
-            action="hybrid_sync", status="error",
-            error_message=result.error,
-        )
-        db.add(log)
-        db.commit()
         return result
 
     nvr_cameras = nvr_result["cameras"]
     result.total = len(nvr_cameras)
 
     # 3. TCP probe for real status
-    probed_status = await probe_many(nvr_cameras)
-
-    # 4. Get existing cameras from DB
-    existing_q = db.query(Camera).filter_by(site_id=site_id)
-    if cred.recorder_id:
-        existing_q = existing_q.filter_by(recorder_id=cred.recorder_id)
-    existing = existing_q.all()
-    existing_by_ch: Dict[int, Camera] = {c.channel: c for c in existing if c.channel}
-    existing_by_ip: Dict[str, Camera] = {c.ip: c for c in existing if c.ip}
+    with timer.stage("probe") as st:
+        probed_status = await probe_many(nvr_cameras)
+        st.count = len(nvr_cameras)
+
+    # 4. Existing cameras — in-memory state if still valid, else one SELECT (plain rows)
+    with timer.stage("load_state") as st:
+        state = await run_db(db, camera_state.load, site_id, cred.recorder_id)
+        existing = state.existing()
+        st.count = len(existing)
+    existing_by_ch: Dict[int, Dict[str, Any]] = {c["channel"]: c for c in existing if c["channel"]}
+    existing_by_ip: Dict[str, Dict[str, Any]] = {c["ip"]: c for c in existing if c["ip"]}
 
     now = datetime.utcnow()
     events_to_add: List[CameraEvent] = []
-
-    # 5. Upsert each camera
-    for nc in nvr_cameras:
-        ch = nc["channel"]
-        real_status = probed_status.get(ch, "unknown")
-
-        # Count totals
-        if real_status == "online":
-            result.online += 1
-        elif real_status == "offline":
-            result.offline += 1
-        else:
-            result.unknown += 1
-
-        # Find existing camera
-        match = existing_by_ch.get(ch) or existing_by_ip.get(nc.get("ip", ""))
-
-        if match:
-            # --- INVENTORY CHANGE DETECTION ---
-            old_data = {
-                "ip": match.ip or "",
-                "mac": match.mac or "",
-                "model": match.model or "",
-                "serial": match.serial or "",
-                "name": match.name or "",
-            }
-            changes = _detect_inventory_changes(old_data, nc, ch)
-            if changes:
-                result.inventory_changes += 1
-                msg = f"CH{ch} inventario cambió: {', '.join(changes)}"
-                events_to_add.append(CameraEvent(
-                    site_id=site_id,
-                    camera_id=match.id,
-                    channel=ch,
-                    event_type="inventory_change",
-                    from_status=json.dumps({f: old_data[f] for f in changes}),
-                    to_status=json.dumps({f: nc.get(f, "") for f in changes}),
-                    severity="info",
-                    message=msg,
-                ))
-
-            # Update fields from NVR
-            if nc.get("name"):
-                match.name = nc["name"]
-            if nc.get("ip"):
-                match.ip = nc["ip"]
-            if nc.get("mac"):
-                match.mac = nc["mac"]
-            if nc.get("model"):
-                match.model = nc["model"]
-            if nc.get("serial"):
-                match.serial = nc["serial"]
-            match.configured = True
-            match.status_config = "enabled"
-
-            # --- STATUS CHANGE DETECTION with anti-jitter ---
-            old_status_real = match.status_real or "unknown"
-
+    upsert_rows: List[Dict[str, Any]] = []   # addressable by (site, recorder, channel)
+    by_id_rows: List[Dict[str, Any]] = []    # IP-only matches / no recorder key
+    status_transitions: List[Tuple[int, Optional[int], str]] = []   # for the status time series
+    new_channels: List[Tuple[int, str]] = []
+
+    # 5. Compute new state for each camera
+    with timer.stage("evaluate") as st:
+        st.count = len(nvr_cameras)
+        for nc in nvr_cameras:
+            ch = nc["channel"]
+            real_status = probed_status.get(ch, "unknown")
+
+            # Count totals
             if real_status == "online":
-                match.offline_streak = 0
-                match.last_seen_at = now
-                if old_status_real != "online":
-                    result.status_changes += 1
-                    sev = "info" if old_status_real == "unknown" else "info"
-                    events_to_add.append(CameraEvent(
-                        site_id=site_id,
-                        camera_id=match.id,
-                        channel=ch,
-                        event_type="status_change",
-                        from_status=old_status_real,
-                        to_status="online",
-                        severity=sev,
-                        message=f"CH{ch} {match.name}: {old_status_real} → online",
-                    ))
-                match.status_real = "online"
-                match.status = "online"  # legacy field
-
+                result.online += 1
             elif real_status == "offline":
-                match.offline_streak = (match.offline_streak or 0) + 1
-                if match.offline_streak >= OFFLINE_STRIKES_THRESHOLD:
-                    if old_status_real != "offline":
-                        result.status_changes += 1
-                        events_to_add.append(CameraEvent(
-                            site_id=site_id,
-                            camera_id=match.id,
-                            channel=ch,
-                            event_type="status_change",
-                            from_status=old_status_real,
-                            to_status="offline",
-                            severity="crit",
-                            message=f"CH{ch} {match.name}: {old_status_real} → offline ({match.offline_streak} strikes)",
-                        ))
-                    match.status_real = "offline"
-                    match.status = "offline"
+                result.offline += 1
+            else:
+                result.unknown += 1
+
+            # Find existing camera
+            match = existing_by_ch.get(ch) or existing_by_ip.get(nc.get("ip", ""))
+
+            if match:
+                values, events = _evaluate_camera(site_id, ch, match, nc, real_status, now, result)
+                events_to_add.extend(events)
+                result.updated += 1
+                if values["status_real"] != match.get("status_real"):
+                    status_transitions.append((match["id"], match["recorder_id"], values["status_real"]))
+                if not state.stage(match["id"], values):
+                    continue    # no transition — streak/last_seen stay in memory
+                if cred.recorder_id and match["recorder_id"] == cred.recorder_id and match["channel"] == ch:
+                    upsert_rows.append({
+                        "id": match["id"], "site_id": site_id, "recorder_id": cred.recorder_id,
+                        "channel": ch, "cam_type": "", **values,
+                    })
                 else:
-                    # First strike — warn but don't change status_real yet
-                    if old_status_real == "online":
-                        events_to_add.append(CameraEvent(
-                            site_id=site_id,
-                            camera_id=match.id,
-                            channel=ch,
-                            event_type="status_change",
-                            from_status=old_status_real,
-                            to_status="offline",
-                            severity="warn",
-                            message=f"CH{ch} {match.name}: probe fallido ({match.offline_streak}/{OFFLINE_STRIKES_THRESHOLD})",
-                        ))
-                    # Keep current status_real until threshold
+                    by_id_rows.append({"id": match["id"], **values})
 
             else:
-                # unknown — don't change status_real, don't generate events
-                if old_status_real == "unknown" or not match.status_real:
-                    match.status_real = "unknown"
+                # New camera
+                upsert_rows.append({
+                    "site_id": site_id,
+                    "recorder_id": cred.recorder_id,
+                    "channel": ch,
+                    "name": nc.get("name", ""),
+                    "ip": nc.get("ip", ""),
+                    "model": nc.get("model", ""),
+                    "serial": nc.get("serial", ""),
+                    "mac": nc.get("mac", ""),
+                    "cam_type": "ip-net" if nc.get("ip") else "analog",
+                    "configured": True,
+                    "status_config": "enabled",
+                    "status_real": real_status,
+                    "status": real_status if real_status != "unknown" else "online",
+                    "last_seen_at": now if real_status == "online" else None,
+                    "offline_streak": 0 if real_status != "offline" else 1,
+                    "updated_at": now,
+                })
+                new_channels.append((ch, real_status))
+                result.added += 1
+
+    def _persist(db: Session):
+        """Write phase, run on the DB executor. None if the lease was lost."""
+        nonlocal events_to_add, status_transitions
+        # Bulk write: one upsert statement + one executemany UPDATE
+        with timer.stage("upsert") as st:
+            written = upsert_cameras(db, upsert_rows)
+            written_by_id = update_cameras_by_id(db, by_id_rows)
+            # upsert RETURNING lists inserts + changed rows only; the by-id UPDATE is guarded too
+            result.skipped_writes = result.updated - (len(written) - result.added) - written_by_id
+            if new_channels:
+                new_ids = {(w["recorder_id"], w["channel"]): w["id"] for w in written}
+                status_transitions += [(new_ids[(cred.recorder_id, ch)], cred.recorder_id, status)
+                                       for ch, status in new_channels if (cred.recorder_id, ch) in new_ids]
+            new_intervals = record_transitions(db, site_id, status_transitions, now)
+            # Memory-only state is checkpointed periodically (and always when cameras were added)
+            checkpoint_rows = state.checkpoint_rows(now, force=result.added > 0)
+            update_camera_state(db, checkpoint_rows)
+            st.count = len(written) + written_by_id + len(checkpoint_rows)
+        logger.debug("[%s] upsert: %d rows written, %d updated by id, %d unchanged skipped, "
+                     "%d state checkpointed", result.run_id, len(written), written_by_id,
+                     result.skipped_writes, len(checkpoint_rows))
+
+        # 6. Save snapshot
+        with timer.stage("snapshot") as st:
+            snapshot_payload = []
+            for nc in nvr_cameras:
+                ch = nc["channel"]
+                snapshot_payload.append({
+                    "channel": ch,
+                    "name": nc.get("name", ""),
+                    "ip": nc.get("ip", ""),
+                    "mac": nc.get("mac", ""),
+                    "model": nc.get("model", ""),
+                    "serial": nc.get("serial", ""),
+                    "configured": True,
+                    "status_config": "enabled",
+                    "status_real": probed_status.get(ch, "unknown"),
+                })
+
+            save_snapshot(db, site_id, result.run_id, snapshot_payload)
+            st.count = len(snapshot_payload)
+
+        # 7. Add events (deduplicated — same channel+event_type+to_status within window is dropped)
+        with timer.stage("events") as st:
+            if events_to_add:
+                recent_keys = _load_recent_event_keys(
+                    db, site_id, now - timedelta(seconds=EVENT_DEDUP_WINDOW_S)
+                )
+                events_to_add = _filter_duplicate_events(events_to_add, recent_keys)
+                db.add_all(events_to_add)
+            st.count = len(events_to_add)
+
+        # 8. Update credential and log — unless the lease expired and another holder took over
+        if lease.lost:
+            db.rollback()
+            return None
+
+        cred.last_status = "ok"
+        cred.last_sync = now
 
-            match.updated_at = now
-            result.updated += 1
-
-        else:
-            # New camera — add to DB
-            cam = Camera(
-                site_id=site_id,
-                recorder_id=cred.recorder_id,
-                channel=ch,
-                name=nc.get("name", ""),
-                ip=nc.get("ip", ""),
-                model=nc.get("model", ""),
-                serial=nc.get("serial", ""),
-                mac=nc.get("mac", ""),
-                cam_type="ip-net" if nc.get("ip") else "analog",
-                configured=True,
-                status_config="enabled",
-                status_real=real_status,
-                status=real_status if real_status != "unknown" else "online",
-                last_seen_at=now if real_status == "online" else None,
-                offline_streak=0 if real_status != "offline" else 1,
-            )
-            db.add(cam)
-            result.added += 1
-
-    # 6. Save snapshot
-    snapshot_payload = []
-    for nc in nvr_cameras:
-        ch = nc["channel"]
-        snapshot_payload.append({
-            "channel": ch,
-            "name": nc.get("name", ""),
-            "ip": nc.get("ip", ""),
-            "mac": nc.get("mac", ""),
-            "model": nc.get("model", ""),
-            "serial": nc.get("serial", ""),
-            "configured": True,
-            "status_config": "enabled",
-            "status_real": probed_status.get(ch, "unknown"),
-        })
-
-    snapshot = CameraSnapshot(
-        site_id=site_id,
-        run_id=result.run_id,
-        payload_json=json.dumps(snapshot_payload),
-    )
-    db.add(snapshot)
-
-    # 7. Add events (deduplicated — same event_type+channel within 5 min is dropped)
-    for evt in events_to_add:
-        # Dedup: check if same event exists in last 5 minutes
-        recent = db.query(CameraEvent).filter(
-            CameraEvent.site_id == site_id,
-            CameraEvent.channel == evt.channel,
-            CameraEvent.event_type == evt.event_type,
-            CameraEvent.to_status == evt.to_status,
-            CameraEvent.created_at >= datetime(now.year, now.month, now.day,
-                                                now.hour, max(0, now.minute - 5)),
-        ).first()
-        if not recent:
-            db.add(evt)
-
-    # 8. Update credential and log
-    cred.last_status = "ok"
-    cred.last_sync = now
-
-    log = SyncLog(
-        credential_id=cred.id,
-        site_id=site_id,
-        action="hybrid_sync",
-        status="ok",
-        cameras_found=result.total,
-        cameras_added=result.added,
-        cameras_updated=result.updated,
-        cameras_online=result.online,
-        cameras_offline=result.offline,
-    )
-    db.add(log)
-    db.commit()
+        log = SyncLog(
+            credential_id=cred.id,
+            site_id=site_id,
+            action="hybrid_sync",
+            status="ok",
+            cameras_found=result.total,
+            cameras_added=result.added,
+            cameras_updated=result.updated,
+            cameras_online=result.online,
+            cameras_offline=result.offline,
+            cameras_skipped=result.skipped_writes,
+            stage_timings_json=timer.to_json(),
+        )
+        with timer.stage("commit") as st:
+            db.add(log)
+            db.flush()
+            # Outbound webhooks: outbox rows only — delivery happens after commit, off this transaction
+            queued_webhooks = enqueue_events(db, site_id, events_to_add)
+            fp = camera_state.fingerprint(db, site_id)
+            live = [event_message(e) for e in events_to_add]
+            live += [status_message(i["id"], i["camera_id"], i["status"], i["started_at"]) for i in new_intervals]
+            # Fence: the renewal only checks every ttl/3 — a stalled run must not commit over a new holder
+            if not lease.fence(db):
+                db.rollback()
+                return None
+            # Commit stages of earlier runs, into their rows — this transaction is already paid for
+            deferred = write_deferred_commits(db)
+            db.commit()
+            forget_deferred_commits(deferred)
+            st.count = queued_webhooks
+        # The row cannot hold its own commit time: the next sync transaction adds it
+        result.stages = timer.to_dict()
+        defer_commit(log.id, result.stages["commit"])
+        return fp, live, queued_webhooks
+
+    persisted = await run_db(db, serialized(_persist))
+    if persisted is None:
+        camera_state.drop(site_id)
+        result.error = "Lease de sincronización perdido; resultados descartados"
+        result.error_code = "LEASE_LOST"
+        result.elapsed_ms = int((time.monotonic() - t0) * 1000)
+        logger.warning("[%s] site=%d lease lost before commit — run discarded",
+                       result.run_id, site_id)
+        return result
+    fp, live, queued_webhooks = persisted
+    _write_stats["runs"] += 1
+    _write_stats["matched"] += result.updated
+    _write_stats["written"] += result.updated - result.skipped_writes
+    _write_stats["skipped"] += result.skipped_writes
+    _write_stats["commit_ms"] += result.stages["commit"]["ms"]
+
+    if result.added:
+        camera_state.drop(site_id)      # reload next run to pick up the new ids
+    else:
+        camera_state.store(site_id, state, fp, now)
 
     result.ok = True
     result.elapsed_ms = int((time.monotonic() - t0) * 1000)
 
+    # Push to live SSE subscribers (after commit, so replay by Last-Event-ID agrees)
+    live.append({"type": "sync", "data": result.to_dict()})
+    event_bus.publish(site_id, live)
+    if queued_webhooks:
+        webhook_dispatcher.notify()
+
     logger.info("[%s] Sync complete: site=%d total=%d online=%d offline=%d unknown=%d "
-                "added=%d updated=%d inv_changes=%d status_changes=%d elapsed=%dms",
+                "added=%d updated=%d inv_changes=%d status_changes=%d commit=%.1fms elapsed=%dms",
                 result.run_id, site_id, result.total, result.online, result.offline,
                 result.unknown, result.added, result.updated, result.inventory_changes,
-                result.status_changes, result.elapsed_ms)
+                result.status_changes, result.stages["commit"]["ms"], result.elapsed_ms)
 
     return result
 
-
-async def sync_all_sites(db: Session) -> List[dict]:
-    """
-    Sync all sites that have active NVR credentials.
-    Returns list of SyncRunResult dicts.
-    """
-    # Find all sites with active credentials
-    creds = db.query(NvrCredential).filter_by(active=True).all()
-    site_ids = list(set(c.site_id for c in creds))
-
-    logger.info("sync_all_sites: %d sites to sync", len(site_ids))
-
-    results = []
-    for sid in site_ids:
-        try:
-            r = await sync_site(sid, db)
-            results.append(r.to_dict())
-        except Exception as e:
-            logger.error("sync_all_sites: site=%d failed: %s", sid, e)
-            results.append({
-                "site_id": sid,
-                "ok": False,
-                "error": f"{type(e).__name__}: {e}",
-                "error_code": "INTERNAL_ERROR",
-            })
-
-    return results
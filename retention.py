@@ -0,0 +1,281 @@
+"""
+NetManager — Retention & Downsampling
+Keeps camera_snapshots, camera_events and sync_logs from growing without bound.
+
+Each pass, per table:
+    1. select a small batch of rows older than the retention cutoff
+    2. copy them to the cold archive (cold_archive, when enabled)
+    3. roll them up into hourly + daily MonitoringRollup buckets
+    4. delete the batch and commit (short SQLite write lock)
+Then hourly rollups past ROLLUP_HOURLY_RETENTION_DAYS and archive partitions
+past ARCHIVE_RETENTION_DAYS are dropped (daily rollups are kept) and an
+incremental vacuum returns free pages to the OS.
+
+Usage:
+    stats = run_retention(db)          # one pass, synchronous
+    asyncio.create_task(retention_loop())
+"""
+import asyncio
+import logging
+import os
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, List, Any, Optional, Tuple
+
+from sqlalchemy import func, case, text, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from database import (
+    engine, SessionLocal,
+    CameraSnapshot, CameraEvent, SyncLog, MonitoringRollup,
+)
+import cold_archive
+
+logger = logging.getLogger("netmanager.retention")
+
+# Retention policies (days; 0 disables pruning for that table)
+SNAPSHOT_RETENTION_DAYS = int(os.getenv("SNAPSHOT_RETENTION_DAYS", "14"))
+EVENT_RETENTION_DAYS = int(os.getenv("EVENT_RETENTION_DAYS", "90"))
+SYNC_LOG_RETENTION_DAYS = int(os.getenv("SYNC_LOG_RETENTION_DAYS", "30"))
+ROLLUP_HOURLY_RETENTION_DAYS = int(os.getenv("ROLLUP_HOURLY_RETENTION_DAYS", "180"))
+
+RETENTION_BATCH_SIZE = int(os.getenv("RETENTION_BATCH_SIZE", "500"))
+RETENTION_INTERVAL_S = int(os.getenv("RETENTION_INTERVAL_S", "3600"))
+RETENTION_VACUUM_PAGES = int(os.getenv("RETENTION_VACUUM_PAGES", "2000"))
+
+_HOUR_FMT = "%Y-%m-%d %H:00:00"
+_ROLLUP_SUM_FIELDS = [
+    "sync_runs", "sync_errors", "cameras_online_sum", "cameras_offline_sum",
+    "events_total", "events_info", "events_warn", "events_crit",
+    "snapshots", "snapshot_bytes",
+]
+
+# Last pass summary (exposed by the admin endpoint)
+last_run: Dict[str, Any] = {}
+
+
+def policies() -> Dict[str, int]:
+    return {
+        "snapshot_retention_days": SNAPSHOT_RETENTION_DAYS,
+        "event_retention_days": EVENT_RETENTION_DAYS,
+        "sync_log_retention_days": SYNC_LOG_RETENTION_DAYS,
+        "rollup_hourly_retention_days": ROLLUP_HOURLY_RETENTION_DAYS,
+        "archive_retention_days": cold_archive.ARCHIVE_RETENTION_DAYS,
+        "batch_size": RETENTION_BATCH_SIZE,
+        "interval_s": RETENTION_INTERVAL_S,
+    }
+
+
+# ============================================
+# ROLLUPS
+# ============================================
+
+def _add_rollups(db: Session, hourly: List[Dict[str, Any]]):
+    """
+    Merge hourly aggregates (site_id, bucket_start, metrics...) into the
+    hourly and daily rollup rows. Sums are added, the minimum is kept.
+    """
+    buckets: Dict[Tuple[int, str, datetime], Dict[str, Any]] = defaultdict(dict)
+    for row in hourly:
+        hour = datetime.strptime(row["bucket"], "%Y-%m-%d %H:%M:%S")
+        day = hour.replace(hour=0)
+        for key in ((row["site_id"], "hour", hour), (row["site_id"], "day", day)):
+            b = buckets[key]
+            for f in _ROLLUP_SUM_FIELDS:
+                b[f] = b.get(f, 0) + (row.get(f) or 0)
+            new_min = row.get("cameras_online_min")
+            if new_min is not None:
+                old_min = b.get("cameras_online_min")
+                b["cameras_online_min"] = new_min if old_min is None else min(old_min, new_min)
+            else:
+                b.setdefault("cameras_online_min", None)
+
+    if not buckets:
+        return
+    tbl = MonitoringRollup.__table__
+    stmt = sqlite_insert(tbl)
+    set_ = {f: tbl.c[f] + stmt.excluded[f] for f in _ROLLUP_SUM_FIELDS}
+    set_["cameras_online_min"] = func.min(
+        func.coalesce(tbl.c.cameras_online_min, stmt.excluded.cameras_online_min),
+        func.coalesce(stmt.excluded.cameras_online_min, tbl.c.cameras_online_min),
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["site_id", "period", "bucket_start"], set_=set_,
+    )
+    db.execute(stmt, [
+        {"site_id": site_id, "period": period, "bucket_start": bucket, **metrics}
+        for (site_id, period, bucket), metrics in buckets.items()
+    ])
+
+
+def _hourly_aggregate(db: Session, model, ids: List[int], columns) -> List[Dict[str, Any]]:
+    """GROUP BY (site_id, hour) over the given ids."""
+    ts = model.collected_at if model is CameraSnapshot else model.created_at
+    bucket = func.strftime(_HOUR_FMT, ts).label("bucket")
+    q = select(model.site_id.label("site_id"), bucket, *columns).where(
+        model.id.in_(ids)
+    ).group_by(model.site_id, bucket)
+    return [dict(r) for r in db.execute(q).mappings()]
+
+
+# ============================================
+# PRUNING (one batch each)
+# ============================================
+
+def _prune_batch(db: Session, model, ids: List[int], columns) -> int:
+    if not ids:
+        return 0
+    cold_archive.archive_rows(db, model, ids)
+    _add_rollups(db, _hourly_aggregate(db, model, ids, columns))
+    db.query(model).filter(model.id.in_(ids)).delete(synchronize_session=False)
+    db.commit()
+    return len(ids)
+
+
+def prune_sync_logs(db: Session, cutoff: datetime, batch: int = RETENTION_BATCH_SIZE) -> int:
+    ids = [i for (i,) in db.query(SyncLog.id).filter(
+        SyncLog.created_at < cutoff).order_by(SyncLog.id).limit(batch)]
+    ok = SyncLog.status != "error"
+    return _prune_batch(db, SyncLog, ids, [
+        func.count(SyncLog.id).label("sync_runs"),
+        func.sum(case((SyncLog.status == "error", 1), else_=0)).label("sync_errors"),
+        func.sum(case((ok, SyncLog.cameras_online), else_=0)).label("cameras_online_sum"),
+        func.sum(case((ok, SyncLog.cameras_offline), else_=0)).label("cameras_offline_sum"),
+        func.min(case((ok, SyncLog.cameras_online))).label("cameras_online_min"),
+    ])
+
+
+def prune_camera_events(db: Session, cutoff: datetime, batch: int = RETENTION_BATCH_SIZE) -> int:
+    ids = [i for (i,) in db.query(CameraEvent.id).filter(
+        CameraEvent.created_at < cutoff).order_by(CameraEvent.id).limit(batch)]
+    return _prune_batch(db, CameraEvent, ids, [
+        func.count(CameraEvent.id).label("events_total"),
+        func.sum(case((CameraEvent.severity == "info", 1), else_=0)).label("events_info"),
+        func.sum(case((CameraEvent.severity == "warn", 1), else_=0)).label("events_warn"),
+        func.sum(case((CameraEvent.severity == "crit", 1), else_=0)).label("events_crit"),
+    ])
+
+
+def prune_camera_snapshots(db: Session, cutoff: datetime, batch: int = RETENTION_BATCH_SIZE) -> int:
+    """
+    Snapshots are deleted per keyframe group (keyframe + its deltas) and only
+    when the whole group is older than the cutoff, so every remaining delta
+    can still be rebuilt. Deltas go before their keyframe (id DESC), so an
+    interrupted pass leaves a readable prefix of the group.
+    """
+    group = func.coalesce(CameraSnapshot.keyframe_id, CameraSnapshot.id)
+    expired_groups = select(group).group_by(group).having(
+        func.max(CameraSnapshot.collected_at) < cutoff
+    )
+    ids = [i for (i,) in db.query(CameraSnapshot.id).filter(
+        group.in_(expired_groups)).order_by(CameraSnapshot.id.desc()).limit(batch)]
+    return _prune_batch(db, CameraSnapshot, ids, [
+        func.count(CameraSnapshot.id).label("snapshots"),
+        func.sum(func.coalesce(func.nullif(CameraSnapshot.stored_size, 0),
+                               func.length(CameraSnapshot.payload_json))).label("snapshot_bytes"),
+    ])
+
+
+def prune_hourly_rollups(db: Session, cutoff: datetime) -> int:
+    n = db.query(MonitoringRollup).filter(
+        MonitoringRollup.period == "hour", MonitoringRollup.bucket_start < cutoff,
+    ).delete(synchronize_session=False)
+    db.commit()
+    return n
+
+
+# ============================================
+# VACUUM
+# ============================================
+
+def ensure_incremental_vacuum() -> bool:
+    """
+    Switch the DB to auto_vacuum=INCREMENTAL (needs one full VACUUM).
+    Returns True if it was already enabled.
+    """
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        mode = conn.execute(text("PRAGMA auto_vacuum")).scalar()
+        if mode == 2:
+            return True
+        logger.info("Enabling auto_vacuum=INCREMENTAL (one-time VACUUM) ...")
+        conn.execute(text("PRAGMA auto_vacuum=INCREMENTAL"))
+        conn.execute(text("VACUUM"))
+    return False
+
+
+def incremental_vacuum(pages: int = RETENTION_VACUUM_PAGES) -> int:
+    """Release up to `pages` free pages. Returns the freelist size before."""
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        free = conn.execute(text("PRAGMA freelist_count")).scalar() or 0
+        if free:
+            conn.execute(text(f"PRAGMA incremental_vacuum({int(pages)})"))
+    return free
+
+
+# ============================================
+# PASS
+# ============================================
+
+def run_retention(db: Optional[Session] = None, now: Optional[datetime] = None,
+                  batch: int = RETENTION_BATCH_SIZE, vacuum: bool = True) -> Dict[str, Any]:
+    """
+    One full retention pass. Deletes in batches of `batch` rows, committing
+    after each so writers (sync, CRUD) are never blocked for long.
+    """
+    own = db is None
+    db = db or SessionLocal()
+    now = now or datetime.utcnow()
+    t0 = time.monotonic()
+    stats = {"sync_logs": 0, "camera_events": 0, "camera_snapshots": 0,
+             "hourly_rollups": 0, "archive_partitions": 0, "freed_pages": 0}
+    try:
+        plan = [
+            ("sync_logs", SYNC_LOG_RETENTION_DAYS, prune_sync_logs),
+            ("camera_events", EVENT_RETENTION_DAYS, prune_camera_events),
+            ("camera_snapshots", SNAPSHOT_RETENTION_DAYS, prune_camera_snapshots),
+        ]
+        for key, days, prune in plan:
+            if days <= 0:
+                continue
+            cutoff = now - timedelta(days=days)
+            while True:
+                n = prune(db, cutoff, batch)
+                stats[key] += n
+                if n < batch:
+                    break
+
+        if ROLLUP_HOURLY_RETENTION_DAYS > 0:
+            stats["hourly_rollups"] = prune_hourly_rollups(
+                db, now - timedelta(days=ROLLUP_HOURLY_RETENTION_DAYS))
+        stats["archive_partitions"] = cold_archive.prune_archive(now, bind=db.get_bind())
+    finally:
+        if own:
+            db.close()
+
+    if vacuum and any(stats[k] for k in ("sync_logs", "camera_events", "camera_snapshots")):
+        stats["freed_pages"] = incremental_vacuum()
+
+    stats["elapsed_ms"] = int((time.monotonic() - t0) * 1000)
+    stats["finished_at"] = datetime.utcnow().isoformat()
+    last_run.clear()
+    last_run.update(stats)
+    logger.info("Retention pass: logs=%d events=%d snapshots=%d hourly_rollups=%d freed_pages=%d elapsed=%dms",
+                stats["sync_logs"], stats["camera_events"], stats["camera_snapshots"],
+                stats["hourly_rollups"], stats["freed_pages"], stats["elapsed_ms"])
+    return stats
+
+
+async def retention_loop(interval_s: int = RETENTION_INTERVAL_S):
+    """Background task: run a retention pass every interval_s (in a worker thread)."""
+    try:
+        await asyncio.to_thread(ensure_incremental_vacuum)
+    except Exception as e:
+        logger.error("ensure_incremental_vacuum failed: %s", e)
+    while True:
+        try:
+            await asyncio.to_thread(run_retention)
+        except Exception as e:
+            logger.error("Retention pass failed: %s: %s", type(e).__name__, e)
+        await asyncio.sleep(interval_s)
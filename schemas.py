@@ -2,9 +2,9 @@
 NetManager — Pydantic Schemas
 Request/Response models for the API
 """
-from typing import Optional, List, Any
+from typing import Optional, List, Any, Dict
 from datetime import datetime
-from pydantic import BaseModel, ConfigDict
+from pydantic import BaseModel, ConfigDict, Field
 
 
 # ============================================
@@ -134,10 +134,12 @@ class SwitchOut(SwitchBase):
 # ============================================
 
 class NicItem(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
     label: str = ""
     ip: str = ""
 
 class DiskItem(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
     size: str = ""
     status: str = "ok"
 
@@ -226,6 +228,10 @@ class CameraOut(CameraBase):
     created_at: Optional[datetime] = None
     updated_at: Optional[datetime] = None
 
+class CameraWriteOut(CameraOut):
+    """Camera create / update response; conflicts is filled when asked for (?conflicts=true)"""
+    conflicts: Optional[List[Dict[str, Any]]] = None
+
 
 # ============================================
 # DASHBOARD / STATS
@@ -242,6 +248,7 @@ class DashboardStats(BaseModel):
     patch_panels: int = 0
     buildings: int = 0
     total_storage_tb: float = 0
+    disks_degraded: int = 0
     recorders_by_type: dict = {}
     cameras_by_rack: dict = {}
     cameras_by_recorder: dict = {}
@@ -328,6 +335,7 @@ class NvrCredentialCreate(BaseModel):
     port: int = 80
     username: str = "admin"
     password: str  # plain — encrypted on server side
+    sync_interval_s: Optional[int] = None  # scheduler cadence (None = default)
 
 class NvrCredentialUpdate(BaseModel):
     label: Optional[str] = None
@@ -337,6 +345,7 @@ class NvrCredentialUpdate(BaseModel):
     password: Optional[str] = None   # optional — only update if provided
     active: Optional[bool] = None
     recorder_id: Optional[int] = None
+    sync_interval_s: Optional[int] = None
 
 class NvrCredentialOut(BaseModel):
     model_config = ConfigDict(from_attributes=True)
@@ -350,6 +359,7 @@ class NvrCredentialOut(BaseModel):
     active: bool = True
     last_sync: Optional[datetime] = None
     last_status: str = ""
+    sync_interval_s: Optional[int] = None
     created_at: Optional[datetime] = None
 
 class NvrCameraPreview(BaseModel):
@@ -405,7 +415,9 @@ class SyncLogOut(BaseModel):
     cameras_updated: int = 0
     cameras_online: int = 0
     cameras_offline: int = 0
+    cameras_skipped: int = 0
     error_message: str = ""
+    stage_timings: Optional[Dict[str, Dict[str, float]]] = None   # {"probe": {"ms", "count"}, ...}
     created_at: Optional[datetime] = None
 
 
@@ -439,6 +451,35 @@ class HybridSyncAllResult(BaseModel):
     total_elapsed_ms: int = 0
 
 
+class SyncJobSubmitOut(BaseModel):
+    """Returned when a sync is enqueued."""
+    ok: bool = True
+    job_id: Optional[str] = None        # None if every site was already queued/running
+    status: str = ""
+    site_ids: List[int] = []
+    deduplicated: dict = {}             # {site_id: job_id already covering it}
+
+
+class SyncJobOut(BaseModel):
+    """Status, progress and per-site results of a sync job."""
+    job_id: str
+    kind: str = ""
+    status: str = ""
+    requested_by: str = ""
+    site_ids: List[int] = []
+    current_site: Optional[int] = None
+    done: int = 0
+    total: int = 0
+    ok_count: int = 0
+    failed_count: int = 0
+    results: List[dict] = []
+    error: str = ""
+    created_at: Optional[datetime] = None
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    elapsed_ms: int = 0
+
+
 class CameraEventOut(BaseModel):
     model_config = ConfigDict(from_attributes=True)
     id: int
@@ -451,3 +492,129 @@ class CameraEventOut(BaseModel):
     severity: str = "info"
     message: str = ""
     created_at: Optional[datetime] = None
+
+
+class CameraSnapshotOut(BaseModel):
+    """Snapshot reconstructed from keyframe + deltas."""
+    site_id: int
+    run_id: str
+    collected_at: Optional[datetime] = None
+    encoding: str = ""
+    cameras: List[dict] = []
+
+
+class SnapshotStorageStats(BaseModel):
+    """Snapshot storage savings (raw JSON vs stored bytes)."""
+    snapshots: int = 0
+    keyframes: int = 0
+    deltas: int = 0
+    legacy: int = 0
+    raw_bytes: int = 0
+    stored_bytes: int = 0
+    saved_bytes: int = 0
+    ratio: float = 1.0
+
+
+class ChannelHistoryOut(BaseModel):
+    """One channel across the last K snapshots (oldest first)."""
+    site_id: int
+    channel: int
+    fields: List[str] = []
+    runs: List[dict] = []      # {run_id, collected_at, present, <fields>}
+
+
+class SnapshotChangeOut(BaseModel):
+    channel: int
+    change: str                # added, removed, modified
+    fields: List[str] = []
+    before: Optional[dict] = None
+    after: Optional[dict] = None
+
+
+class SnapshotDiffOut(BaseModel):
+    """Cameras that differ between two snapshots of a site."""
+    site_id: int
+    run_a: str
+    run_b: str
+    collected_at_a: Optional[datetime] = None
+    collected_at_b: Optional[datetime] = None
+    runs_between: int = 0
+    changed: List[SnapshotChangeOut] = []
+
+
+class MonitoringRollupOut(BaseModel):
+    """Hourly/daily summary kept after raw rows are pruned."""
+    model_config = ConfigDict(from_attributes=True)
+    site_id: int
+    period: str
+    bucket_start: datetime
+    sync_runs: int = 0
+    sync_errors: int = 0
+    cameras_online_sum: int = 0
+    cameras_offline_sum: int = 0
+    cameras_online_min: Optional[int] = None
+    events_total: int = 0
+    events_info: int = 0
+    events_warn: int = 0
+    events_crit: int = 0
+    snapshots: int = 0
+    snapshot_bytes: int = 0
+
+
+class CameraUptimeOut(BaseModel):
+    """Seconds per status and uptime % of one camera in a window."""
+    camera_id: int
+    online_s: float = 0
+    offline_s: float = 0
+    unknown_s: float = 0
+    no_data_s: float = 0
+    uptime_pct: Optional[float] = None      # online / (online + offline); None if no probe data
+    sla_met: Optional[bool] = None
+
+
+class UptimeOut(BaseModel):
+    """Uptime/SLA of a camera, recorder or site over [start, end)."""
+    scope: str                              # camera, recorder, site
+    scope_id: int
+    start: datetime
+    end: datetime
+    window_s: float
+    cameras: int = 0
+    target_pct: Optional[float] = None
+    online_s: float = 0                     # camera-seconds for recorder/site
+    offline_s: float = 0
+    unknown_s: float = 0
+    no_data_s: float = 0
+    uptime_pct: Optional[float] = None
+    sla_met: Optional[bool] = None
+    per_camera: List[CameraUptimeOut] = []
+
+
+class WebhookDestinationCreate(BaseModel):
+    name: str = ""
+    url: str
+    site_id: Optional[int] = None           # None = every site
+    min_severity: str = Field(default="crit", pattern="^(info|warn|crit)$")
+    secret: str = ""                        # HMAC-SHA256 signing key (optional)
+    active: bool = True
+
+
+class WebhookDestinationUpdate(BaseModel):
+    name: Optional[str] = None
+    url: Optional[str] = None
+    site_id: Optional[int] = None
+    min_severity: Optional[str] = Field(default=None, pattern="^(info|warn|crit)$")
+    secret: Optional[str] = None
+    active: Optional[bool] = None
+
+
+class WebhookDestinationOut(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+    id: int
+    name: str = ""
+    url: str
+    site_id: Optional[int] = None
+    min_severity: str = "crit"
+    has_secret: bool = False
+    active: bool = True
+    created_at: Optional[datetime] = None
@@ -0,0 +1,161 @@
+"""
+NetManager — Site Conflict Index
+Duplicate camera IPs / recorder channels / patch panel ports and overloaded
+switches, read from the conflict index instead of rebuilding maps over every
+camera of the site.
+
+The index is the ip / channel / pp_port / switch dimensions of site_counters
+(database.COUNTER_DIMS): SQLite triggers keep the number of cameras per IP,
+(recorder, channel), (patch panel, port) and switch current on every camera
+insert, update, delete and bulk sync upsert. A key counted more than once
+is a conflict, found through a partial index on n > 1; only the cameras of
+conflicting keys are loaded, to name them.
+
+Usage:
+    validate(db, site_id)                   # {"errors": [...], "warnings": [...], "total": n}
+    before = {c.id: camera_keys(c) for c in cams}
+    ... write, flush ...
+    introduced(db, cams, before)            # {camera_id: [conflicts it just entered]}
+"""
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import and_, cast, String, text, tuple_
+from sqlalchemy.orm import Session
+
+from database import Camera, PatchPanel, SiteCounter, Switch
+
+DUPLICATE_DIMS = ("ip", "channel", "pp_port")
+
+# (level, dim, key, item) — item is what /validate returns
+Conflict = Tuple[str, str, str, dict]
+
+
+def camera_keys(cam) -> Dict[str, str]:
+    """Conflict index keys of a camera (same values as the trigger expressions; '' = not set)."""
+    rid, ch = cam.recorder_id, cam.channel
+    ppid, port = cam.patch_panel_id, cam.patch_panel_port
+    return {
+        "site": str(cam.site_id),
+        "ip": cam.ip or "",
+        "channel": f"{rid}:{ch}" if rid and ch else "",
+        "pp_port": f"{ppid}:{port}" if ppid and port else "",
+        "switch": str(cam.switch_id) if cam.switch_id else "",
+    }
+
+
+def _pairs(keys: Iterable[str]) -> List[Tuple[int, int]]:
+    return [tuple(int(p) for p in k.split(":")) for k in keys]
+
+
+def _groups(rows, key) -> List[list]:
+    """Rows grouped by key, groups ordered by their first (lowest id) camera."""
+    groups = defaultdict(list)
+    for r in rows:
+        groups[key(r)].append(r)
+    return sorted(groups.values(), key=lambda g: g[0].id)
+
+
+def _conflicts(db: Session, site_id: int, keys: Optional[Dict[str, Set[str]]] = None) -> List[Conflict]:
+    """Conflicts of a site, all of them or only those on the given {dim: keys}."""
+    dup: Dict[str, Set[str]] = defaultdict(set)
+    q = db.query(SiteCounter.dim, SiteCounter.key).filter(
+        SiteCounter.site_id == site_id, SiteCounter.dim.in_(DUPLICATE_DIMS),
+        text("site_counters.n > 1"),                    # literal, so the partial index applies
+        SiteCounter.key != "")
+    for dim, key in q:
+        if keys is None or key in keys.get(dim, ()):
+            dup[dim].add(key)
+
+    cols = (Camera.id, Camera.name, Camera.channel, Camera.ip, Camera.cam_type,
+            Camera.recorder_id, Camera.patch_panel_id, Camera.patch_panel_port)
+    cams = db.query(*cols).filter(Camera.site_id == site_id)
+    out: List[Conflict] = []
+
+    # Duplicate IPs
+    if dup["ip"]:
+        rows = cams.filter(Camera.ip.in_(dup["ip"])).order_by(Camera.id).all()
+        for group in _groups(rows, lambda c: c.ip):
+            ip = group[0].ip
+            names = [c.name or f"CH{c.channel}" for c in group]
+            ids = [c.id for c in group]
+            if all(c.cam_type == group[0].cam_type for c in group):
+                item = {"type": "ip_duplicate", "msg": f"IP {ip} duplicada: {', '.join(names)}", "ids": ids}
+                out.append(("error", "ip", ip, item))
+            else:
+                item = {"type": "ip_cross_segment", "msg": f"IP {ip} en segmentos diferentes: {', '.join(names)}",
+                        "ids": ids}
+                out.append(("warning", "ip", ip, item))
+
+    # Duplicate channels per recorder
+    if dup["channel"]:
+        rows = (cams.filter(tuple_(Camera.recorder_id, Camera.channel).in_(_pairs(dup["channel"])))
+                .order_by(Camera.id).all())
+        for group in _groups(rows, lambda c: (c.recorder_id, c.channel)):
+            c0 = group[0]
+            names = [c.name or c.ip or f"ID{c.id}" for c in group]
+            item = {"type": "channel_duplicate", "msg": f"Canal {c0.channel} duplicado: {', '.join(names)}",
+                    "ids": [c.id for c in group]}
+            out.append(("error", "channel", f"{c0.recorder_id}:{c0.channel}", item))
+
+    # Duplicate PP ports
+    if dup["pp_port"]:
+        rows = (cams.filter(tuple_(Camera.patch_panel_id, Camera.patch_panel_port).in_(_pairs(dup["pp_port"])))
+                .order_by(Camera.id).all())
+        pp_names = dict(db.query(PatchPanel.id, PatchPanel.name).filter(
+            PatchPanel.site_id == site_id, PatchPanel.id.in_({c.patch_panel_id for c in rows})))
+        for group in _groups(rows, lambda c: (c.patch_panel_id, c.patch_panel_port)):
+            c0 = group[0]
+            names = [c.name or c.ip or f"ID{c.id}" for c in group]
+            item = {"type": "pp_port_duplicate",
+                    "msg": f"Puerto {c0.patch_panel_port} de {pp_names.get(c0.patch_panel_id, 'PP')} duplicado: "
+                           f"{', '.join(names)}",
+                    "ids": [c.id for c in group]}
+            out.append(("error", "pp_port", f"{c0.patch_panel_id}:{c0.patch_panel_port}", item))
+
+    # Switch overload
+    q = db.query(Switch.id, Switch.name, Switch.ports, SiteCounter.n).join(SiteCounter, and_(
+        SiteCounter.site_id == Switch.site_id, SiteCounter.dim == "switch",
+        SiteCounter.key == cast(Switch.id, String),
+    )).filter(Switch.site_id == site_id, SiteCounter.n > Switch.ports).order_by(Switch.id)
+    for sw in q:
+        if keys is None or str(sw.id) in keys.get("switch", ()):
+            item = {"type": "switch_overload", "msg": f"{sw.name}: {sw.n} cámaras exceden {sw.ports} puertos",
+                    "ids": []}
+            out.append(("warning", "switch", str(sw.id), item))
+    return out
+
+
+def validate(db: Session, site_id: int) -> dict:
+    """All conflicts of a site, in the /validate response shape."""
+    found = _conflicts(db, site_id)
+    errors = [item for level, _, _, item in found if level == "error"]
+    warnings = [item for level, _, _, item in found if level == "warning"]
+    return {"errors": errors, "warnings": warnings, "total": len(errors) + len(warnings)}
+
+
+def introduced(db: Session, cameras: Iterable, before: Optional[Dict[int, Dict[str, str]]] = None
+               ) -> Dict[int, List[dict]]:
+    """
+    Conflicts each written camera entered with this write: those on a key
+    it did not have before (before = {camera_id: camera_keys(cam)} taken
+    ahead of the write; missing for new cameras). Call after the flush.
+    """
+    cameras = list(cameras)
+    before = before or {}
+    entered: Dict[int, List[Tuple[str, str]]] = {}
+    wanted: Dict[int, Dict[str, Set[str]]] = defaultdict(lambda: defaultdict(set))
+    for cam in cameras:
+        keys, old = camera_keys(cam), before.get(cam.id, {})
+        moved = old.get("site") != keys["site"]
+        entered[cam.id] = [(dim, key) for dim, key in keys.items()
+                           if dim != "site" and key and (moved or old.get(dim) != key)]
+        for dim, key in entered[cam.id]:
+            wanted[cam.site_id][dim].add(key)
+
+    by_key: Dict[Tuple[int, str, str], List[dict]] = defaultdict(list)
+    for site_id, keys in wanted.items():
+        for _, dim, key, item in _conflicts(db, site_id, keys):
+            by_key[(site_id, dim, key)].append(item)
+    return {cam.id: [item for dim, key in entered[cam.id] for item in by_key.get((cam.site_id, dim, key), [])]
+            for cam in cameras}
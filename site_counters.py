@@ -0,0 +1,121 @@
+"""
+NetManager — Per-site Counters
+Reads and reconciles the site_counters table.
+
+The table is maintained by SQLite triggers (database.counter_trigger_ddl),
+so every write path — CRUD through the writer, bulk sync upserts, ON DELETE
+cascades — updates it in the same transaction. Readers get a site's device
+totals and camera breakdowns from a handful of rows instead of scanning
+cameras. reconcile() recomputes the counts from the base tables (GROUP BY)
+and reports any drift, e.g. after rows were edited with triggers disabled.
+
+Usage:
+    c = read(db, [site_id])[site_id]    # {"device": {"cameras": 120, ...}, "status": {...}, ...}
+    camera_counts(db, site_ids)         # {site_id: cameras}
+    reconcile(db)                       # {"rows": .., "drift": [...]}
+"""
+import asyncio
+import logging
+import os
+import time
+from collections import defaultdict
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from database import SessionLocal, SiteCounter, counter_truth_select
+from db_writer import serialized
+
+logger = logging.getLogger("netmanager.counters")
+
+COUNTERS_RECONCILE_INTERVAL_S = int(os.getenv("COUNTERS_RECONCILE_INTERVAL_S", str(6 * 3600)))
+
+# Last reconcile summary (exposed by the admin endpoint)
+last_run: Dict[str, Any] = {}
+
+
+def read(db: Session, site_ids: Iterable[int], dims: Optional[List[str]] = None) -> Dict[int, Dict[str, Dict[str, int]]]:
+    """{site_id: {dim: {key: n}}} for the given sites (every site present, possibly empty)."""
+    site_ids = list(site_ids)
+    out: Dict[int, Dict[str, Dict[str, int]]] = {sid: defaultdict(dict) for sid in site_ids}
+    if not site_ids:
+        return out
+    q = db.query(SiteCounter.site_id, SiteCounter.dim, SiteCounter.key, SiteCounter.n).filter(
+        SiteCounter.site_id.in_(site_ids), SiteCounter.n != 0)
+    if dims:
+        q = q.filter(SiteCounter.dim.in_(dims))
+    for sid, dim, key, n in q:
+        out[sid][dim][key] = n
+    return out
+
+
+def camera_counts(db: Session, site_ids: Iterable[int]) -> Dict[int, int]:
+    """Camera total per site, one indexed query for all of them."""
+    site_ids = list(site_ids)
+    if not site_ids:
+        return {}
+    return dict(db.query(SiteCounter.site_id, SiteCounter.n).filter(
+        SiteCounter.site_id.in_(site_ids), SiteCounter.dim == "device", SiteCounter.key == "cameras"))
+
+
+@serialized
+def _rebuild(db: Session, site_id: Optional[int]):
+    """
+    Replace the counters (of one site or all) with counts from the base
+    tables. Returns (stored, actual) rows, both read in this transaction.
+    """
+    scope = "" if site_id is None else " WHERE site_id = :sid"
+    params = {} if site_id is None else {"sid": site_id}
+    # takes the write lock first; RETURNING is the stored snapshot no commit can slip past
+    stored = db.execute(text(f"DELETE FROM site_counters{scope} RETURNING site_id, dim, key, n"), params).all()
+    rows = db.execute(text(counter_truth_select(site_id))).all()
+    if rows:
+        db.execute(SiteCounter.__table__.insert(), [
+            {"site_id": sid, "dim": dim, "key": key, "n": n} for sid, dim, key, n in rows
+        ])
+    db.commit()
+    return stored, rows
+
+
+def reconcile(db: Optional[Session] = None, site_id: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Recompute counters from the base tables in one write transaction.
+    Returns the number of rows and every (site, dim, key) whose stored count
+    was wrong — the stored counts are read in that same transaction, so
+    writes committed meanwhile are not reported as drift.
+    """
+    own = db is None
+    db = db or SessionLocal()
+    t0 = time.monotonic()
+    try:
+        stored, rows = _rebuild(db, site_id)
+    finally:
+        if own:
+            db.close()
+
+    before = {(s, d, k): n for s, d, k, n in stored if n != 0}
+    after = {(s, d, k): n for s, d, k, n in rows}
+    drift = [
+        {"site_id": s, "dim": d, "key": k, "stored": before.get((s, d, k), 0), "actual": after.get((s, d, k), 0)}
+        for s, d, k in sorted(set(before) | set(after))
+        if before.get((s, d, k), 0) != after.get((s, d, k), 0)
+    ]
+    result = {"rows": len(after), "drift": drift, "elapsed_ms": int((time.monotonic() - t0) * 1000),
+              "finished_at": datetime.utcnow().isoformat()}
+    last_run.clear()
+    last_run.update(result)
+    if drift:
+        logger.warning("Site counters drift fixed: %d key(s), e.g. %s", len(drift), drift[0])
+    return result
+
+
+async def reconcile_loop(interval_s: int = COUNTERS_RECONCILE_INTERVAL_S):
+    """Background task: reconcile all counters every interval_s (in a worker thread)."""
+    while True:
+        await asyncio.sleep(interval_s)
+        try:
+            await asyncio.to_thread(reconcile)
+        except Exception as e:
+            logger.error("Counters reconcile failed: %s: %s", type(e).__name__, e)
@@ -0,0 +1,246 @@
+"""
+NetManager — Columnar Snapshot Codec
+Compact binary encoding for snapshot keyframes and deltas.
+
+A frame holds a list of camera dicts column by column — string columns are
+dictionary-encoded (per-column dictionary + small integer codes) — plus named
+integer sections (deleted channels, channel order, channels changed vs the
+previous run):
+
+    b"NMC1" + zlib(
+        u32 n_rows
+        u16 n_entries, then per entry:
+            u8 name_len, name, u8 type, u8 width, u32 offset, u32 length
+        body
+    )
+
+    type q — int per row (None = smallest value of the width)   e.g. channel
+    type b — uint8 per row (0, 1, 2 = None)                      e.g. configured
+    type s — u32 dict_len, NUL-joined utf-8 dictionary, then one
+             code per row (None = largest value of the width)    e.g. name, status_real
+    type j — like s, values JSON-encoded                         (anything else)
+    type Q — int section                                         ("_del", "_order", "_chg")
+
+`width` is the array typecode actually used (b/h/i/q signed, B/H/I
+unsigned): each column is stored in the narrowest one that fits.
+
+Readers look up single columns / rows through the directory without
+materializing every camera dict — e.g. "status of channel N" reads only the
+channel and status_real columns and one string.
+
+Usage:
+    blob = encode_frame(cameras, {"chg": [3, 7]})
+    f = Frame(blob)
+    i = f.find(3); f.value("status_real", i); f.section("chg"); f.rows()
+"""
+import json
+import struct
+import sys
+import zlib
+from array import array
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+MAGIC = b"NMC1"
+BOOL_NONE = 2
+
+_ENTRY = struct.Struct("<BBII")    # type, width, offset, length (after the name)
+_SWAP = sys.byteorder != "little"
+
+# (typecode, min, max) — narrowest first
+_SIGNED = [("b", -2 ** 7, 2 ** 7 - 1), ("h", -2 ** 15, 2 ** 15 - 1),
+           ("i", -2 ** 31, 2 ** 31 - 1), ("q", -2 ** 63, 2 ** 63 - 1)]
+_UNSIGNED = [("B", 0, 2 ** 8 - 1), ("H", 0, 2 ** 16 - 1), ("I", 0, 2 ** 32 - 1)]
+_NONE = {t: lo for t, lo, _ in _SIGNED}
+_NONE.update({t: hi for t, _, hi in _UNSIGNED})
+
+
+def is_columnar(blob: Optional[bytes]) -> bool:
+    return bool(blob) and bytes(blob[:4]) == MAGIC
+
+
+def _arr_bytes(a: array) -> bytes:
+    if _SWAP:
+        a = array(a.typecode, a)
+        a.byteswap()
+    return a.tobytes()
+
+
+def _signed(values: List[Optional[int]]) -> Tuple[str, bytes]:
+    """Narrowest signed array; None is stored as the width's minimum."""
+    present = [v for v in values if v is not None]
+    lo, hi = (min(present), max(present)) if present else (0, 0)
+    t = next(t for t, tmin, tmax in _SIGNED if tmin < lo and hi <= tmax)
+    return t, _arr_bytes(array(t, [_NONE[t] if v is None else v for v in values]))
+
+
+def _unsigned(values: List[Optional[int]]) -> Tuple[str, bytes]:
+    """Narrowest unsigned array; None is stored as the width's maximum."""
+    hi = max((v for v in values if v is not None), default=0)
+    t = next(t for t, _, tmax in _UNSIGNED if hi < tmax)
+    return t, _arr_bytes(array(t, [_NONE[t] if v is None else v for v in values]))
+
+
+def _arr_from(typecode: str, data) -> array:
+    a = array(typecode)
+    a.frombytes(data)
+    if _SWAP:
+        a.byteswap()
+    return a
+
+
+def _column_type(values: Iterable[Any]) -> str:
+    kinds = {type(v) for v in values if v is not None}
+    if not kinds:
+        return "s"
+    if kinds == {bool}:
+        return "b"
+    if kinds == {int}:
+        return "q"
+    if kinds == {str}:
+        return "s"
+    return "j"
+
+
+# ============================================
+# ENCODE
+# ============================================
+
+def encode_frame(rows: List[Dict[str, Any]], sections: Optional[Dict[str, Iterable[int]]] = None,
+                 level: int = 6) -> bytes:
+    """Encode camera dicts (+ integer sections) into one compressed columnar frame."""
+    columns: List[str] = []
+    for r in rows:
+        for k in r:
+            if k not in columns:
+                columns.append(k)
+
+    entries: List[tuple] = []
+    for col in columns:
+        values = [r.get(col) for r in rows]
+        t = _column_type(values)
+        if t == "q":
+            width, data = _signed(values)
+        elif t == "b":
+            width, data = "B", bytes(BOOL_NONE if v is None else int(v) for v in values)
+        else:
+            if t == "j":
+                values = [None if v is None else json.dumps(v, separators=(",", ":")) for v in values]
+            elif any("\0" in v for v in values if v is not None):
+                t, values = "j", [None if v is None else json.dumps(v) for v in values]
+            codes: Dict[str, int] = {}
+            for v in values:
+                if v is not None and v not in codes:
+                    codes[v] = len(codes)
+            width, idx = _unsigned([None if v is None else codes[v] for v in values])
+            dictionary = "\0".join(codes).encode("utf-8")
+            data = struct.pack("<I", len(dictionary)) + dictionary + idx
+        entries.append((col, t, width, data))
+
+    for name, values in (sections or {}).items():
+        width, data = _signed(list(values))
+        entries.append(("_" + name, "Q", width, data))
+
+    directory = [struct.pack("<IH", len(rows), len(entries))]
+    body = []
+    offset = 0
+    for name, t, width, data in entries:
+        nb = name.encode("utf-8")
+        directory.append(struct.pack("<B", len(nb)) + nb + _ENTRY.pack(ord(t), ord(width), offset, len(data)))
+        body.append(data)
+        offset += len(data)
+    return MAGIC + zlib.compress(b"".join(directory) + b"".join(body), level)
+
+
+# ============================================
+# DECODE
+# ============================================
+
+class Frame:
+    """Lazy reader over one encoded frame: columns are decoded on first access."""
+
+    def __init__(self, blob: bytes):
+        if not is_columnar(blob):
+            raise ValueError("not a columnar snapshot frame")
+        self._data = memoryview(zlib.decompress(bytes(blob[4:])))
+        self.n_rows, n = struct.unpack_from("<IH", self._data, 0)
+        pos = 6
+        self._dir: Dict[str, tuple] = {}
+        for _ in range(n):
+            ln = self._data[pos]
+            name = bytes(self._data[pos + 1:pos + 1 + ln]).decode("utf-8")
+            t, width, off, length = _ENTRY.unpack_from(self._data, pos + 1 + ln)
+            self._dir[name] = (chr(t), chr(width), off, length)
+            pos += 1 + ln + _ENTRY.size
+        self._body = pos
+        self._cols: Dict[str, Any] = {}
+        self._dicts: Dict[str, List[str]] = {}
+
+    @property
+    def columns(self) -> List[str]:
+        return [n for n in self._dir if not n.startswith("_")]
+
+    def _raw(self, name: str):
+        t, width, off, length = self._dir[name]
+        start = self._body + off
+        return t, width, self._data[start:start + length]
+
+    def _column(self, name: str):
+        col = self._cols.get(name)
+        if col is None:
+            t, width, raw = self._raw(name)
+            if t == "b":
+                col = bytes(raw)
+            elif t in ("s", "j"):
+                (n,) = struct.unpack_from("<I", raw, 0)
+                col = _arr_from(width, raw[4 + n:])
+            else:
+                col = _arr_from(width, raw)
+            self._cols[name] = col
+        return col
+
+    def _string(self, name: str, code: int) -> str:
+        d = self._dicts.get(name)
+        if d is None:
+            _, _, raw = self._raw(name)
+            (n,) = struct.unpack_from("<I", raw, 0)
+            d = self._dicts[name] = bytes(raw[4:4 + n]).decode("utf-8").split("\0") if n else [""]
+        return d[code]
+
+    def value(self, name: str, i: int) -> Any:
+        """One cell; None if the column is absent."""
+        if name not in self._dir:
+            return None
+        t, width = self._dir[name][:2]
+        v = self._column(name)[i]
+        if t == "b":
+            return None if v == BOOL_NONE else bool(v)
+        if v == _NONE[width]:
+            return None
+        if t == "q":
+            return v
+        s = self._string(name, v)
+        return json.loads(s) if t == "j" else s
+
+    def ints(self, name: str) -> array:
+        """An int64 column (e.g. channel) as an array — no per-row objects."""
+        return self._column(name)
+
+    def find(self, channel: int) -> int:
+        """Row index of a channel, or -1."""
+        if "channel" not in self._dir:
+            return -1
+        try:
+            return self.ints("channel").index(channel)
+        except ValueError:
+            return -1
+
+    def section(self, name: str) -> Optional[List[int]]:
+        """Integer section ("del", "order", "chg"); None if not stored."""
+        key = "_" + name
+        return list(self._column(key)) if key in self._dir else None
+
+    def row(self, i: int) -> Dict[str, Any]:
+        return {c: self.value(c, i) for c in self.columns}
+
+    def rows(self) -> List[Dict[str, Any]]:
+        return [self.row(i) for i in range(self.n_rows)]
@@ -0,0 +1,427 @@
+"""
+NetManager — Camera Snapshot Store
+Delta-encoded, compressed storage for CameraSnapshot rows.
+
+Every sync run used to store the full camera list as plain JSON. Consecutive
+payloads are almost always identical, so snapshots are now written as:
+
+    key    — full camera list, every SNAPSHOT_KEYFRAME_EVERY runs
+    delta  — {"set": [...], "del": [...], "order": [...]} against the
+             previous snapshot of the same site
+
+Blobs are columnar frames (snapshot_codec: dictionary-encoded strings,
+one column per field) that also record the channels changed vs the previous
+run ("chg"), so channel_history() and changed_between() read a couple of
+columns per run instead of decoding whole payloads. Older zlib(JSON) blobs
+and legacy rows (encoding="json", plain payload_json) are still readable.
+
+Usage:
+    save_snapshot(db, site_id, run_id, cameras)
+    cameras = load_snapshot(db, run_id)
+    channel_history(db, site_id, channel=5, last=20)
+    changed_between(db, site_id, run_a, run_b)
+"""
+import json
+import logging
+import os
+import zlib
+from typing import Dict, List, Any, Optional, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from database import CameraSnapshot
+from snapshot_codec import Frame, encode_frame, is_columnar
+import cold_archive
+
+logger = logging.getLogger("netmanager.snapshots")
+
+# A full keyframe every N snapshots per site (12 × 5 min = hourly)
+SNAPSHOT_KEYFRAME_EVERY = int(os.getenv("SNAPSHOT_KEYFRAME_EVERY", "12"))
+
+ENC_JSON = "json"    # legacy — uncompressed payload_json
+ENC_KEY = "key"
+ENC_DELTA = "delta"
+
+# site_id -> (run_id, (snapshot_id, keyframe_id, seq, payload)) of the last snapshot written
+_last: Dict[int, Tuple[str, Tuple[int, int, int, List[Dict[str, Any]]]]] = {}
+
+
+# ============================================
+# ENCODING
+# ============================================
+
+def _pack(obj: Any) -> bytes:
+    return zlib.compress(json.dumps(obj, separators=(",", ":")).encode("utf-8"), 6)
+
+
+def _unpack(blob: bytes) -> Any:
+    return json.loads(zlib.decompress(blob).decode("utf-8"))
+
+
+def _encode(encoding: str, payload: Any, changed: Optional[List[int]]) -> bytes:
+    """Columnar frame for a keyframe (camera list) or a delta dict."""
+    sections: Dict[str, List[int]] = {}
+    if changed is not None:
+        sections["chg"] = changed
+    if encoding == ENC_KEY:
+        return encode_frame(payload, sections)
+    sections["del"] = payload.get("del", [])
+    if "order" in payload:
+        sections["order"] = payload["order"]
+    return encode_frame(payload.get("set", []), sections)
+
+
+def _decode(encoding: str, blob: bytes) -> Any:
+    """Inverse of _encode (also reads the older zlib(JSON) blobs)."""
+    if not is_columnar(blob):
+        return _unpack(blob)
+    frame = Frame(blob)
+    if encoding == ENC_KEY:
+        return frame.rows()
+    delta: Dict[str, Any] = {}
+    if frame.n_rows:
+        delta["set"] = frame.rows()
+    if frame.section("del"):
+        delta["del"] = frame.section("del")
+    if frame.section("order") is not None:
+        delta["order"] = frame.section("order")
+    return delta
+
+
+def _changed_channels(delta: Dict[str, Any]) -> List[int]:
+    return sorted({c["channel"] for c in delta.get("set", [])} | set(delta.get("del", [])))
+
+
+def compute_delta(prev: List[Dict[str, Any]], cur: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Delta from prev → cur, keyed by channel.
+    Only changed/added cameras are stored; "order" is included only when the
+    channel order can't be derived from prev.
+    """
+    prev_by_ch = {c["channel"]: c for c in prev}
+    cur_chs = [c["channel"] for c in cur]
+    cur_set = set(cur_chs)
+
+    delta: Dict[str, Any] = {}
+    changed = [c for c in cur if prev_by_ch.get(c["channel"]) != c]
+    if changed:
+        delta["set"] = changed
+    removed = [ch for ch in prev_by_ch if ch not in cur_set]
+    if removed:
+        delta["del"] = removed
+
+    expected = [ch for ch in prev_by_ch if ch in cur_set]
+    expected += [ch for ch in cur_chs if ch not in prev_by_ch]
+    if expected != cur_chs:
+        delta["order"] = cur_chs
+    return delta
+
+
+def apply_delta(prev: List[Dict[str, Any]], delta: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Inverse of compute_delta."""
+    by_ch = {c["channel"]: c for c in prev}
+    order = [c["channel"] for c in prev]
+    for ch in delta.get("del", []):
+        by_ch.pop(ch, None)
+    for c in delta.get("set", []):
+        if c["channel"] not in by_ch:
+            order.append(c["channel"])
+        by_ch[c["channel"]] = c
+    order = delta.get("order") or [ch for ch in order if ch in by_ch]
+    return [by_ch[ch] for ch in order]
+
+
+# ============================================
+# WRITE
+# ============================================
+
+def _decode_chain(rows: List[CameraSnapshot]) -> List[Dict[str, Any]]:
+    """Decode a keyframe followed by its deltas (ordered by id)."""
+    payload: List[Dict[str, Any]] = []
+    for row in rows:
+        if row.encoding == ENC_DELTA:
+            payload = apply_delta(payload, _decode(ENC_DELTA, row.payload_blob))
+        elif row.encoding == ENC_KEY:
+            payload = _decode(ENC_KEY, row.payload_blob)
+        else:
+            payload = json.loads(row.payload_json or "[]")
+    return payload
+
+
+def _chain_rows(db: Session, row: CameraSnapshot) -> List[CameraSnapshot]:
+    """Keyframe + deltas needed to rebuild `row`."""
+    if row.encoding != ENC_DELTA:
+        return [row]
+    return db.query(CameraSnapshot).filter(
+        (CameraSnapshot.id == row.keyframe_id) |
+        ((CameraSnapshot.keyframe_id == row.keyframe_id) & (CameraSnapshot.id <= row.id))
+    ).order_by(CameraSnapshot.id).all()
+
+
+def _previous_state(db: Session, site_id: int) -> Optional[Tuple[int, int, int, List[Dict[str, Any]]]]:
+    """(id, keyframe_id, seq, payload) of the newest snapshot for a site, or None."""
+    last = db.query(CameraSnapshot).filter_by(site_id=site_id).order_by(
+        CameraSnapshot.id.desc()
+    ).first()
+    if not last:
+        return None
+    cached = _last.get(site_id)
+    if cached and cached[0] == last.run_id and cached[1][0] == last.id:
+        return cached[1]
+    if last.encoding == ENC_DELTA:
+        keyframe_id, seq = last.keyframe_id, last.seq or 0
+    else:
+        keyframe_id, seq = last.id, 0
+    return last.id, keyframe_id, seq, _decode_chain(_chain_rows(db, last))
+
+
+def save_snapshot(
+    db: Session, site_id: int, run_id: str, cameras: List[Dict[str, Any]],
+) -> CameraSnapshot:
+    """
+    Add a snapshot row (keyframe or delta) to the session.
+    The row is flushed so its id can seed the next delta; the caller commits.
+    """
+    raw_size = len(json.dumps(cameras, separators=(",", ":")))
+    prev = _previous_state(db, site_id)
+
+    delta = compute_delta(prev[3], cameras) if prev is not None else None
+    changed = _changed_channels(delta) if delta is not None else None
+
+    if prev is None or prev[2] + 1 >= SNAPSHOT_KEYFRAME_EVERY:
+        snap = CameraSnapshot(site_id=site_id, run_id=run_id, encoding=ENC_KEY,
+                              keyframe_id=None, seq=0, payload_json="",
+                              payload_blob=_encode(ENC_KEY, cameras, changed))
+    else:
+        prev_id, keyframe_id, seq, prev_payload = prev
+        snap = CameraSnapshot(site_id=site_id, run_id=run_id, encoding=ENC_DELTA,
+                              keyframe_id=keyframe_id, seq=seq + 1, payload_json="",
+                              payload_blob=_encode(ENC_DELTA, delta, changed))
+    snap.raw_size = raw_size
+    snap.stored_size = len(snap.payload_blob)
+    db.add(snap)
+    db.flush()
+
+    _last[site_id] = (run_id, (snap.id, snap.keyframe_id or snap.id, snap.seq, cameras))
+    return snap
+
+
+# ============================================
+# READ
+# ============================================
+
+def load_snapshot(db: Session, run_id: str, site_id: Optional[int] = None) -> Optional[List[Dict[str, Any]]]:
+    """Reconstruct the full camera list of a snapshot by run_id (None if not found)."""
+    q = db.query(CameraSnapshot).filter_by(run_id=run_id)
+    if site_id is not None:
+        q = q.filter_by(site_id=site_id)
+    row = q.first()
+    if not row:
+        return None
+    return _decode_chain(_chain_rows(db, row))
+
+
+def load_archived_snapshot(site_id: int, run_id: str) -> Optional[Tuple[Any, List[Dict[str, Any]]]]:
+    """(row, cameras) of a snapshot moved to the cold archive, or None."""
+    chain = cold_archive.snapshot_chain(site_id, run_id)
+    if not chain:
+        return None
+    return chain[-1], _decode_chain(chain)
+
+
+def storage_stats(db: Session, site_id: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Storage savings report: raw JSON bytes vs bytes actually stored.
+    Legacy rows count their payload_json length for both.
+    """
+    legacy_len = func.length(CameraSnapshot.payload_json)
+    q = db.query(
+        CameraSnapshot.encoding,
+        func.count(CameraSnapshot.id),
+        func.sum(func.coalesce(CameraSnapshot.raw_size, 0)),
+        func.sum(func.coalesce(CameraSnapshot.stored_size, 0)),
+        func.sum(legacy_len),
+    )
+    if site_id is not None:
+        q = q.filter(CameraSnapshot.site_id == site_id)
+
+    stats = {"snapshots": 0, "keyframes": 0, "deltas": 0, "legacy": 0,
+             "raw_bytes": 0, "stored_bytes": 0}
+    for enc, count, raw, stored, legacy in q.group_by(CameraSnapshot.encoding).all():
+        stats["snapshots"] += count
+        if enc == ENC_KEY:
+            stats["keyframes"] += count
+        elif enc == ENC_DELTA:
+            stats["deltas"] += count
+        else:
+            stats["legacy"] += count
+            raw = stored = legacy or 0
+        stats["raw_bytes"] += raw or 0
+        stats["stored_bytes"] += stored or 0
+
+    raw = stats["raw_bytes"]
+    stats["saved_bytes"] = raw - stats["stored_bytes"]
+    stats["ratio"] = round(stats["stored_bytes"] / raw, 4) if raw else 1.0
+    return stats
+
+
+# ============================================
+# QUERY (no full decode)
+# ============================================
+
+_MISSING = object()
+
+
+class _RowView:
+    """Per-channel lookups on one stored snapshot (columnar rows are read lazily)."""
+
+    def __init__(self, row: CameraSnapshot):
+        self.row = row
+        self.is_delta = row.encoding == ENC_DELTA
+        self.frame: Optional[Frame] = None
+        if row.encoding in (ENC_KEY, ENC_DELTA) and is_columnar(row.payload_blob):
+            self.frame = Frame(row.payload_blob)
+            self._del = set(self.frame.section("del") or []) if self.is_delta else set()
+            return
+        if row.encoding == ENC_DELTA:
+            payload = _unpack(row.payload_blob)
+            cams, self._del = payload.get("set", []), set(payload.get("del", []))
+        elif row.encoding == ENC_KEY:
+            cams, self._del = _unpack(row.payload_blob), set()
+        else:
+            cams, self._del = json.loads(row.payload_json or "[]"), set()
+        self._by_ch = {c["channel"]: c for c in cams}
+
+    def changed(self) -> Optional[List[int]]:
+        """Channels changed vs the previous snapshot; None if not recorded (older formats)."""
+        return self.frame.section("chg") if self.frame is not None else None
+
+    def lookup(self, channel: int, fields: Optional[List[str]]) -> Any:
+        """
+        The camera's values in this snapshot: a dict, None if absent/removed,
+        or _MISSING if a delta does not touch the channel.
+        """
+        if channel in self._del:
+            return None
+        if self.frame is not None:
+            i = self.frame.find(channel)
+            if i < 0:
+                return _MISSING if self.is_delta else None
+            if fields is None:
+                return self.frame.row(i)
+            return {f: self.frame.value(f, i) for f in fields}
+        cam = self._by_ch.get(channel)
+        if cam is None:
+            return _MISSING if self.is_delta else None
+        return dict(cam) if fields is None else {f: cam.get(f) for f in fields}
+
+
+def _walk(db: Session, site_id: int, first: CameraSnapshot, last_id: int) -> List[CameraSnapshot]:
+    """Rows from the keyframe `first` depends on up to `last_id`, oldest first."""
+    start = first.keyframe_id if first.encoding == ENC_DELTA and first.keyframe_id else first.id
+    return db.query(CameraSnapshot).filter(
+        CameraSnapshot.site_id == site_id,
+        CameraSnapshot.id >= start, CameraSnapshot.id <= last_id,
+    ).order_by(CameraSnapshot.id).all()
+
+
+def _states(rows: List[CameraSnapshot], channels: List[int],
+            fields: Optional[List[str]], want: set) -> Dict[int, Dict[int, Any]]:
+    """Replay `rows` for a few channels; {row id: {channel: values or None}} for ids in `want`."""
+    state: Dict[int, Any] = {}
+    out: Dict[int, Dict[int, Any]] = {}
+    for row in rows:
+        view = _RowView(row)
+        for ch in channels:
+            v = view.lookup(ch, fields)
+            if v is not _MISSING:
+                state[ch] = v
+        if row.id in want:
+            out[row.id] = {ch: state.get(ch) for ch in channels}
+    return out
+
+
+def channel_history(db: Session, site_id: int, channel: int, last: int = 20,
+                    fields: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+    """
+    One channel across the last `last` snapshots of a site, oldest first:
+    [{run_id, collected_at, present, <fields>}]. Only the channel's row is
+    read from each snapshot.
+    """
+    fields = fields or ["status_real"]
+    recent = db.query(CameraSnapshot).filter_by(site_id=site_id).order_by(
+        CameraSnapshot.id.desc()
+    ).limit(last).all()
+    if not recent:
+        return []
+    recent.reverse()
+    states = _states(_walk(db, site_id, recent[0], recent[-1].id), [channel], fields,
+                     {r.id for r in recent})
+    out = []
+    for r in recent:
+        v = states.get(r.id, {}).get(channel)
+        out.append({"run_id": r.run_id, "collected_at": r.collected_at, "present": v is not None,
+                    **{f: (v or {}).get(f) for f in fields}})
+    return out
+
+
+def _find_run(db: Session, site_id: int, run_id: str) -> Optional[CameraSnapshot]:
+    return db.query(CameraSnapshot).filter_by(site_id=site_id, run_id=run_id).first()
+
+
+def changed_between(db: Session, site_id: int, run_a: str, run_b: str) -> Optional[Dict[str, Any]]:
+    """
+    Cameras that differ between two snapshots of a site (None if either is
+    missing). Candidates come from the per-run "chg" sections of the runs in
+    between, so only those channels' rows are compared.
+    """
+    a, b = _find_run(db, site_id, run_a), _find_run(db, site_id, run_b)
+    if a is None or b is None:
+        return None
+    if a.id > b.id:
+        a, b = b, a
+
+    between = db.query(CameraSnapshot).filter(
+        CameraSnapshot.site_id == site_id,
+        CameraSnapshot.id > a.id, CameraSnapshot.id <= b.id,
+    ).order_by(CameraSnapshot.id).all()
+    candidates: Optional[set] = set()
+    for row in between:
+        chg = _RowView(row).changed()
+        if chg is None:
+            candidates = None       # an older-format run in range — compare everything
+            break
+        candidates.update(chg)
+
+    if candidates is None:
+        before = {c["channel"]: c for c in _decode_chain(_chain_rows(db, a))}
+        after = {c["channel"]: c for c in _decode_chain(_chain_rows(db, b))}
+        channels = sorted(set(before) | set(after))
+    else:
+        channels = sorted(candidates)
+        rows = _walk(db, site_id, a, b.id)
+        states = _states(rows, channels, None, {a.id, b.id})
+        before, after = states.get(a.id, {}), states.get(b.id, {})
+
+    changes = []
+    for ch in channels:
+        old, new = before.get(ch), after.get(ch)
+        if old == new:
+            continue
+        if old is None:
+            kind, diff = "added", []
+        elif new is None:
+            kind, diff = "removed", []
+        else:
+            kind = "modified"
+            diff = sorted(k for k in set(old) | set(new) if old.get(k) != new.get(k))
+        changes.append({"channel": ch, "change": kind, "fields": diff, "before": old, "after": new})
+
+    return {
+        "site_id": site_id,
+        "run_a": a.run_id, "run_b": b.run_id,
+        "collected_at_a": a.collected_at, "collected_at_b": b.collected_at,
+        "runs_between": len(between),
+        "changed": changes,
+    }
@@ -624,6 +624,17 @@ function AdminPanel({ authToken, onSyncComplete }) {
 
   useEffect(() => { load(); }, []);
 
+  // Live camera events for the selected site (SSE; the browser resumes with Last-Event-ID)
+  useEffect(() => {
+    if (!nvrSiteId || !window.EventSource) return;
+    const es = new EventSource(`${API_BASE}/api/sites/${nvrSiteId}/stream?token=${encodeURIComponent(authToken)}`);
+    es.addEventListener("camera_event", (e) => {
+      const evt = JSON.parse(e.data);
+      setCameraEvents(prev => prev.some(x => x.id === evt.id) ? prev : [evt, ...prev].slice(0, 50));
+    });
+    return () => es.close();
+  }, [nvrSiteId]);
+
   const flash = (m) => { setMsg(m); setTimeout(() => setMsg(""), 3000); };
 
   const saveUser = async (u) => {
@@ -788,14 +799,26 @@ function AdminPanel({ authToken, onSyncComplete }) {
     setHybridSyncing(true); setHybridResult(null);
     try {
       const r = await fetch(`${API_BASE}/api/admin/nvr/hybrid-sync/${siteId}`, { method: "POST", headers: hdrs });
-      const data = await r.json();
-      if (r.ok) {
+      const sub = await r.json();
+      // Sync runs in the background job queue — poll until the job finishes
+      let job = null;
+      if (r.ok && sub.job_id) {
+        for (let i = 0; i < 900; i++) {
+          await new Promise(res => setTimeout(res, 1000));
+          const jr = await fetch(`${API_BASE}/api/admin/jobs/${sub.job_id}`, { headers: hdrs });
+          if (!jr.ok) break;
+          job = await jr.json();
+          if (job.status === "done" || job.status === "error") break;
+        }
+      }
+      const data = (job && (job.results || []).find(x => x.site_id === Number(siteId))) || {};
+      if (r.ok && data.ok) {
         setHybridResult(data);
         flash(`✅ Hybrid sync: ${data.total || 0} cámaras, ${data.online || 0} online, ${data.offline || 0} offline`);
         loadCameraEvents(siteId);
         if (onSyncComplete) onSyncComplete();
       } else {
-        flash(`❌ ${data.detail || "Error en hybrid sync"}`);
+        flash(`❌ ${data.error || sub.detail || (job && job.error) || "Error en hybrid sync"}`);
       }
     } catch (e) { flash("Error de conexión: " + e.message); }
     setHybridSyncing(false);
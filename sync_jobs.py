@@ -0,0 +1,222 @@
+"""
+NetManager — Sync Job Queue
+In-process job runner for hybrid sync runs.
+
+HTTP endpoints enqueue a job and return its id immediately; a small pool of
+asyncio workers runs sync_site for each site of the job, each with its own
+DB session. Progress and per-site results are kept in memory and can be
+polled by job id.
+
+A site that is already queued or running in another job is not enqueued
+again — the caller gets the id of the job that already covers it.
+
+Usage:
+    job, dedup = runner.submit("site", [site_id], requested_by="admin")
+    runner.get(job.id).to_dict()
+"""
+import asyncio
+import logging
+import os
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from database import SessionLocal
+
+logger = logging.getLogger("netmanager.jobs")
+
+SYNC_JOB_WORKERS = int(os.getenv("SYNC_JOB_WORKERS", "2"))
+SYNC_JOB_HISTORY = int(os.getenv("SYNC_JOB_HISTORY", "200"))
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+JOB_ERROR = "error"
+
+
+class SyncJob:
+    """A queued sync request covering one or more sites."""
+    def __init__(self, kind: str, site_ids: List[int], requested_by: str = ""):
+        self.id: str = uuid.uuid4().hex[:12]
+        self.kind: str = kind                      # site, all
+        self.site_ids: List[int] = list(site_ids)
+        self.requested_by: str = requested_by
+        self.status: str = JOB_QUEUED
+        self.error: str = ""
+        self.current_site: Optional[int] = None
+        self.results: Dict[int, dict] = {}
+        self.created_at: datetime = datetime.utcnow()
+        self.started_at: Optional[datetime] = None
+        self.finished_at: Optional[datetime] = None
+        self.elapsed_ms: int = 0
+        self._done = asyncio.Event()
+
+    @property
+    def finished(self) -> bool:
+        return self.status in (JOB_DONE, JOB_ERROR)
+
+    def to_dict(self) -> dict:
+        results = [self.results[s] for s in self.site_ids if s in self.results]
+        return {
+            "job_id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "requested_by": self.requested_by,
+            "site_ids": self.site_ids,
+            "current_site": self.current_site,
+            "done": len(results),
+            "total": len(self.site_ids),
+            "ok_count": sum(1 for r in results if r.get("ok")),
+            "failed_count": sum(1 for r in results if not r.get("ok")),
+            "results": results,
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "elapsed_ms": self.elapsed_ms,
+        }
+
+
+async def run_site_sync(site_id: int) -> dict:
+    """Default job step: hybrid sync one site with its own session."""
+    from nvr_sync_service import sync_site
+    db = SessionLocal()
+    try:
+        return (await sync_site(site_id, db)).to_dict()
+    finally:
+        db.close()
+
+
+class SyncJobRunner:
+    """Queue + worker pool + bounded in-memory job history."""
+
+    def __init__(self, sync_fn: Callable[[int], Awaitable[dict]] = run_site_sync,
+                 workers: int = SYNC_JOB_WORKERS, history: int = SYNC_JOB_HISTORY):
+        self.sync_fn = sync_fn
+        self.workers = max(1, workers)
+        self.history = history
+        self._jobs: "OrderedDict[str, SyncJob]" = OrderedDict()
+        self._active_sites: Dict[int, str] = {}   # site_id -> job_id (queued or running)
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+
+    # ---- lifecycle ----
+
+    def start(self):
+        """Create the queue and workers on the running loop (idempotent)."""
+        if self._tasks and not all(t.done() for t in self._tasks):
+            return
+        self._queue = asyncio.Queue()
+        self._tasks = [asyncio.create_task(self._worker(i)) for i in range(self.workers)]
+        # Re-enqueue jobs left queued by a previous stop()
+        for job in self._jobs.values():
+            if job.status == JOB_QUEUED:
+                self._queue.put_nowait(job)
+        logger.info("Sync job runner started (%d workers)", self.workers)
+
+    async def stop(self):
+        for t in self._tasks:
+            t.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    # ---- API ----
+
+    def submit(self, kind: str, site_ids: List[int], requested_by: str = "") -> Tuple[Optional[SyncJob], Dict[int, str]]:
+        """
+        Enqueue a job for the sites not already queued/running.
+        Returns (job or None if every site was already covered, {site_id: existing_job_id}).
+        """
+        deduplicated = {s: self._active_sites[s] for s in site_ids if s in self._active_sites}
+        fresh = [s for s in dict.fromkeys(site_ids) if s not in deduplicated]
+        if not fresh:
+            if kind == "site" and deduplicated:
+                return self._jobs.get(next(iter(deduplicated.values()))), deduplicated
+            return None, deduplicated
+
+        self.start()
+        job = SyncJob(kind, fresh, requested_by)
+        self._jobs[job.id] = job
+        for s in fresh:
+            self._active_sites[s] = job.id
+        self._trim_history()
+        self._queue.put_nowait(job)
+        logger.info("Job %s queued: kind=%s sites=%s (dedup=%d) by=%s",
+                    job.id, kind, fresh, len(deduplicated), requested_by or "-")
+        return job, deduplicated
+
+    def get(self, job_id: str) -> Optional[SyncJob]:
+        return self._jobs.get(job_id)
+
+    def list(self, limit: int = 50) -> List[SyncJob]:
+        return list(reversed(self._jobs.values()))[:limit]
+
+    def queue_depth(self) -> int:
+        return self._queue.qsize() if self._queue else 0
+
+    def active_sites(self) -> Dict[int, str]:
+        return dict(self._active_sites)
+
+    async def wait(self, job_id: str, timeout: Optional[float] = None) -> Optional[SyncJob]:
+        job = self._jobs.get(job_id)
+        if job and not job.finished:
+            await asyncio.wait_for(job._done.wait(), timeout)
+        return job
+
+    # ---- internals ----
+
+    def _trim_history(self):
+        while len(self._jobs) > self.history:
+            oldest_id, oldest = next(iter(self._jobs.items()))
+            if not oldest.finished:
+                break
+            self._jobs.pop(oldest_id)
+
+    async def _worker(self, n: int):
+        while True:
+            job = await self._queue.get()
+            try:
+                await self._run(job)
+            except Exception as e:  # never let a worker die
+                logger.error("Job %s crashed: %s: %s", job.id, type(e).__name__, e)
+                job.status = JOB_ERROR
+                job.error = f"{type(e).__name__}: {e}"
+            finally:
+                for s in job.site_ids:
+                    if self._active_sites.get(s) == job.id:
+                        self._active_sites.pop(s, None)
+                job.current_site = None
+                if job.finished_at is None:
+                    job.finished_at = datetime.utcnow()
+                job._done.set()
+                self._queue.task_done()
+
+    async def _run(self, job: SyncJob):
+        t0 = time.monotonic()
+        job.status = JOB_RUNNING
+        job.started_at = datetime.utcnow()
+        for site_id in job.site_ids:
+            job.current_site = site_id
+            try:
+                job.results[site_id] = await self.sync_fn(site_id)
+            except Exception as e:
+                logger.error("Job %s: site=%d failed: %s", job.id, site_id, e)
+                job.results[site_id] = {
+                    "site_id": site_id,
+                    "ok": False,
+                    "error": f"{type(e).__name__}: {e}",
+                    "error_code": "INTERNAL_ERROR",
+                }
+            # site finished — a new request for it may be queued again
+            if self._active_sites.get(site_id) == job.id:
+                self._active_sites.pop(site_id, None)
+        job.status = JOB_DONE
+        job.finished_at = datetime.utcnow()
+        job.elapsed_ms = int((time.monotonic() - t0) * 1000)
+        logger.info("Job %s done: %d sites in %dms", job.id, len(job.site_ids), job.elapsed_ms)
+
+
+# Process-wide runner used by the API
+runner = SyncJobRunner()
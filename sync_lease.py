@@ -0,0 +1,171 @@
+"""
+NetManager — Sync Leases
+DB-backed per-site lease so only one process (uvicorn worker / replica) runs
+sync_site for a site at a time.
+
+A lease row (site_id, holder, expires_at) is taken with a single atomic
+INSERT ... ON CONFLICT DO UPDATE ... WHERE expires_at < now, renewed in the
+background while the sync runs, and deleted on release. If the holder dies
+the lease simply expires after SYNC_LEASE_TTL_S. The renewal only notices a
+takeover every ttl/3, so writers fence() inside their transaction before
+committing.
+
+Usage:
+    lease = SiteLease(engine, site_id)
+    if not lease.acquire():
+        ...  # another holder is syncing this site
+    lease.start_renewal()
+    try:
+        ... write ...
+        if not lease.fence(db):
+            db.rollback()              # expired / taken over meanwhile
+        ...
+    finally:
+        await lease.release()
+"""
+import asyncio
+import logging
+import os
+import socket
+import uuid
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import delete, update, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from database import SyncLease
+from db_executor import run_sync
+
+logger = logging.getLogger("netmanager.lease")
+
+SYNC_LEASE_TTL_S = int(os.getenv("SYNC_LEASE_TTL_S", "120"))
+
+# Identifies this process in lease rows (host:pid)
+PROCESS_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+_leases = SyncLease.__table__
+
+
+class SiteLease:
+    """One acquisition of the sync lease for a site."""
+
+    def __init__(self, bind, site_id: int, ttl_s: int = SYNC_LEASE_TTL_S, run_id: str = ""):
+        self.bind = bind
+        self.site_id = site_id
+        self.ttl_s = ttl_s
+        self.run_id = run_id
+        self.holder = f"{PROCESS_ID}:{uuid.uuid4().hex[:8]}"
+        self.held = False
+        self.lost = False
+        self.current_holder = ""        # who holds it when acquire() fails
+        self._renew_task: Optional[asyncio.Task] = None
+
+    def _session(self) -> Session:
+        return Session(bind=self.bind)
+
+    def acquire(self, now: Optional[datetime] = None) -> bool:
+        """Take the lease if free or expired. Commits immediately."""
+        now = now or datetime.utcnow()
+        stmt = sqlite_insert(_leases).values(
+            site_id=self.site_id, holder=self.holder, run_id=self.run_id,
+            acquired_at=now, expires_at=now + timedelta(seconds=self.ttl_s),
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["site_id"],
+            set_={
+                "holder": stmt.excluded.holder,
+                "run_id": stmt.excluded.run_id,
+                "acquired_at": stmt.excluded.acquired_at,
+                "expires_at": stmt.excluded.expires_at,
+            },
+            where=_leases.c.expires_at < now,
+        ).returning(_leases.c.holder)
+
+        with self._session() as s:
+            row = s.execute(stmt).first()
+            if row is None:
+                self.current_holder = s.execute(
+                    select(_leases.c.holder).where(_leases.c.site_id == self.site_id)
+                ).scalar() or ""
+            s.commit()
+        self.held = row is not None
+        if not self.held:
+            logger.info("Lease site=%d held by %s — skipping", self.site_id, self.current_holder)
+        return self.held
+
+    def renew(self, now: Optional[datetime] = None) -> bool:
+        """Extend the lease. Returns False (and marks it lost) if someone else took it."""
+        now = now or datetime.utcnow()
+        with self._session() as s:
+            n = s.execute(
+                update(_leases)
+                .where(_leases.c.site_id == self.site_id, _leases.c.holder == self.holder)
+                .values(expires_at=now + timedelta(seconds=self.ttl_s))
+            ).rowcount
+            s.commit()
+        if n == 0:
+            self.lost = True
+            logger.warning("Lease site=%d lost by %s", self.site_id, self.holder)
+        return n > 0
+
+    def fence(self, db: Session, now: Optional[datetime] = None) -> bool:
+        """
+        Check, inside the caller's write transaction, that the lease is still
+        ours and unexpired. Run it after the transaction's first write (the
+        SQLite write lock keeps a takeover from committing until we finish)
+        and right before commit. Marks the lease lost on failure.
+        """
+        now = now or datetime.utcnow()
+        ok = db.execute(select(1).where(
+            _leases.c.site_id == self.site_id, _leases.c.holder == self.holder, _leases.c.expires_at > now,
+        )).first() is not None
+        if not ok:
+            self.lost = True
+            logger.warning("Lease site=%d expired or taken over before commit (%s)", self.site_id, self.holder)
+        return ok
+
+    def start_renewal(self):
+        """Renew every ttl/3 in the background until release()."""
+        async def _loop():
+            while True:
+                await asyncio.sleep(self.ttl_s / 3)
+                try:
+                    if not await run_sync(self.bind, self.renew):
+                        return
+                except Exception as e:
+                    logger.error("Lease renew site=%d failed: %s", self.site_id, e)
+        self._renew_task = asyncio.create_task(_loop())
+
+    def _delete(self):
+        with self._session() as s:
+            s.execute(delete(_leases).where(
+                _leases.c.site_id == self.site_id, _leases.c.holder == self.holder
+            ))
+            s.commit()
+
+    async def release(self):
+        if self._renew_task:
+            self._renew_task.cancel()
+            self._renew_task = None
+        if not self.held:
+            return
+        self.held = False
+        try:
+            await run_sync(self.bind, self._delete)
+        except Exception as e:
+            # not fatal — the row expires after ttl_s
+            logger.error("Lease release site=%d failed: %s", self.site_id, e)
+
+
+def list_leases(db: Session) -> list:
+    now = datetime.utcnow()
+    return [{
+        "site_id": l.site_id,
+        "holder": l.holder,
+        "run_id": l.run_id,
+        "acquired_at": l.acquired_at,
+        "expires_at": l.expires_at,
+        "expired": l.expires_at < now,
+    } for l in db.query(SyncLease).order_by(SyncLease.site_id).all()]
@@ -0,0 +1,165 @@
+"""
+NetManager — Sync Stage Metrics
+Per-stage wall time and item counts for every sync_site run.
+
+Stages (in order): nvr_fetch, probe, load_state, evaluate, upsert,
+snapshot, events, commit. Each is recorded as {"ms": float, "count": int}
+and persisted as JSON on the run's SyncLog row (stage_timings_json), so
+fleet-wide percentiles per stage can be computed afterwards. The row is
+written in the run's own transaction, so it cannot hold that commit: the
+commit stage is deferred and added to the row by the next sync
+transaction of this process (no extra transaction or fsync).
+
+Usage:
+    timer = StageTimer()
+    with timer.stage("probe") as st:
+        status = await probe_many(cams)
+        st.count = len(cams)
+    log.stage_timings_json = timer.to_json()
+    ...
+    ids = write_deferred_commits(db)     # inside the write transaction
+    db.commit()
+    forget_deferred_commits(ids)
+    defer_commit(log.id, timer.stages["commit"])
+"""
+import json
+import math
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from database import SyncLog
+
+SYNC_STAGES = ["nvr_fetch", "probe", "load_state", "evaluate", "upsert", "snapshot", "events", "commit"]
+
+
+class _Stage:
+    __slots__ = ("count",)
+
+    def __init__(self):
+        self.count = 0
+
+
+class StageTimer:
+    """Collects {stage: {"ms", "count"}} for one run."""
+
+    def __init__(self):
+        self.stages: Dict[str, Dict[str, Any]] = {}
+        self._t0 = time.perf_counter()
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[_Stage]:
+        st = _Stage()
+        t = time.perf_counter()
+        try:
+            yield st
+        finally:
+            prev = self.stages.get(name, {"ms": 0.0, "count": 0})
+            self.stages[name] = {
+                "ms": round(prev["ms"] + (time.perf_counter() - t) * 1000, 3),
+                "count": prev["count"] + st.count,
+            }
+
+    def total_ms(self) -> float:
+        return round((time.perf_counter() - self._t0) * 1000, 3)
+
+    def to_dict(self) -> Dict[str, Dict[str, Any]]:
+        return dict(self.stages)
+
+    def to_json(self) -> str:
+        return json.dumps(self.stages, separators=(",", ":"))
+
+
+# ============================================
+# DEFERRED COMMIT STAGE
+# ============================================
+
+# {sync_log_id: {"ms", "count"}} — commit stages of rows already committed
+_deferred_commits: Dict[int, Dict[str, Any]] = {}
+
+
+def defer_commit(log_id: int, stage: Dict[str, Any]):
+    """Remember the commit stage of a committed row for the next write transaction."""
+    _deferred_commits[log_id] = stage
+
+
+def write_deferred_commits(db: Session) -> List[int]:
+    """
+    Add the deferred commit stages to their rows, inside the caller's
+    transaction. Returns their ids: forget_deferred_commits() them once
+    that transaction committed (on rollback they are kept for the next one).
+    """
+    pending = dict(_deferred_commits)
+    if pending:
+        db.execute(text(
+            "UPDATE sync_logs SET stage_timings_json = "
+            "json_set(COALESCE(NULLIF(stage_timings_json, ''), '{}'), '$.commit', json(:stage)) WHERE id = :id"
+        ), [{"id": i, "stage": json.dumps(st, separators=(",", ":"))} for i, st in pending.items()])
+    return list(pending)
+
+
+def forget_deferred_commits(ids: List[int]):
+    for i in ids:
+        _deferred_commits.pop(i, None)
+
+
+# ============================================
+# PERCENTILES
+# ============================================
+
+def _percentile(sorted_vals: List[float], p: float) -> Optional[float]:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_vals:
+        return None
+    k = max(0, min(len(sorted_vals) - 1, math.ceil(p / 100.0 * len(sorted_vals)) - 1))
+    return round(sorted_vals[k], 3)
+
+
+def stage_percentiles(
+    db: Session, since: datetime, site_id: Optional[int] = None, limit: int = 20000,
+) -> Dict[str, Any]:
+    """
+    p50/p90/p99/max wall time (ms) and p50 item count per stage over the
+    hybrid sync runs since `since` (newest `limit` runs).
+    """
+    q = db.query(SyncLog.stage_timings_json).filter(
+        SyncLog.action == "hybrid_sync",
+        SyncLog.created_at >= since,
+        SyncLog.stage_timings_json.isnot(None),
+        SyncLog.stage_timings_json != "",
+    )
+    if site_id is not None:
+        q = q.filter(SyncLog.site_id == site_id)
+    rows = q.order_by(SyncLog.id.desc()).limit(limit).all()
+
+    ms: Dict[str, List[float]] = {}
+    counts: Dict[str, List[int]] = {}
+    for (raw,) in rows:
+        try:
+            stages = json.loads(raw)
+        except ValueError:
+            continue
+        for name, v in stages.items():
+            ms.setdefault(name, []).append(float(v.get("ms", 0)))
+            counts.setdefault(name, []).append(int(v.get("count", 0)))
+
+    order = SYNC_STAGES + sorted(n for n in ms if n not in SYNC_STAGES)
+    out = {}
+    for name in order:
+        if name not in ms:
+            continue
+        vals = sorted(ms[name])
+        out[name] = {
+            "runs": len(vals),
+            "p50_ms": _percentile(vals, 50),
+            "p90_ms": _percentile(vals, 90),
+            "p99_ms": _percentile(vals, 99),
+            "max_ms": round(vals[-1], 3),
+            "mean_ms": round(sum(vals) / len(vals), 3),
+            "count_p50": _percentile(sorted(counts[name]), 50),
+        }
+    return {"since": since, "site_id": site_id, "runs": len(rows), "stages": out}
@@ -0,0 +1,234 @@
+"""
+NetManager — Sync Scheduler
+Built-in per-site scheduler for hybrid sync (replaces the external n8n cron).
+
+Each site with active NVR credentials gets its own cadence:
+    interval = min(sync_interval_s of its active credentials) or SYNC_DEFAULT_INTERVAL_S
+
+Runs are spread out with random jitter, enqueued through the sync job runner
+(which already suppresses duplicates), skipped while a previous run for the
+same site is still queued/running, and never replayed after downtime: an
+overdue site runs once, spread over SYNC_CATCHUP_SPREAD_S, and at most
+SYNC_MAX_STARTS_PER_TICK sites start per tick.
+
+Every worker / replica runs its own scheduler. Before submitting, the due
+sites are re-checked against the shared database: a site whose sync lease
+is held, or whose credentials were synced less than half an interval
+ago, was already run by another process — its slot is skipped and the schedule
+re-based on that run, so each interval has one run cluster-wide.
+
+Usage:
+    asyncio.create_task(scheduler.run())
+    scheduler.upcoming()
+"""
+import asyncio
+import logging
+import os
+import random
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import func
+
+from database import SessionLocal, NvrCredential, SyncLease
+from sync_jobs import runner as default_runner, SyncJobRunner
+
+logger = logging.getLogger("netmanager.scheduler")
+
+SYNC_DEFAULT_INTERVAL_S = int(os.getenv("SYNC_DEFAULT_INTERVAL_S", "300"))
+SYNC_MIN_INTERVAL_S = int(os.getenv("SYNC_MIN_INTERVAL_S", "60"))
+SYNC_JITTER_FRACTION = float(os.getenv("SYNC_JITTER_FRACTION", "0.1"))
+SYNC_CATCHUP_SPREAD_S = int(os.getenv("SYNC_CATCHUP_SPREAD_S", "120"))
+SYNC_MAX_STARTS_PER_TICK = int(os.getenv("SYNC_MAX_STARTS_PER_TICK", "5"))
+SCHEDULER_TICK_S = float(os.getenv("SCHEDULER_TICK_S", "5"))
+SCHEDULER_REFRESH_S = int(os.getenv("SCHEDULER_REFRESH_S", "60"))
+
+
+class ScheduleEntry:
+    """Next/last run bookkeeping for one site."""
+    def __init__(self, site_id: int, interval_s: int):
+        self.site_id: int = site_id
+        self.interval_s: int = interval_s
+        self.next_run_at: datetime = datetime.utcnow()
+        self.last_run_at: Optional[datetime] = None
+        self.last_job_id: str = ""
+        self.runs: int = 0
+        self.skipped_overlap: int = 0
+        self.skipped_elsewhere: int = 0
+
+    def to_dict(self, now: Optional[datetime] = None) -> dict:
+        now = now or datetime.utcnow()
+        return {
+            "site_id": self.site_id,
+            "interval_s": self.interval_s,
+            "next_run_at": self.next_run_at,
+            "due_in_s": int((self.next_run_at - now).total_seconds()),
+            "last_run_at": self.last_run_at,
+            "last_job_id": self.last_job_id,
+            "runs": self.runs,
+            "skipped_overlap": self.skipped_overlap,
+            "skipped_elsewhere": self.skipped_elsewhere,
+        }
+
+
+def load_site_intervals() -> List[Tuple[int, int, Optional[datetime]]]:
+    """[(site_id, interval_s, last_sync)] for every site with active credentials."""
+    db = SessionLocal()
+    try:
+        rows = db.query(
+            NvrCredential.site_id,
+            func.min(func.coalesce(NvrCredential.sync_interval_s, SYNC_DEFAULT_INTERVAL_S)),
+            func.max(NvrCredential.last_sync),
+        ).filter(NvrCredential.active == True).group_by(NvrCredential.site_id).all()  # noqa: E712
+        return [(sid, int(iv), last) for sid, iv, last in rows]
+    finally:
+        db.close()
+
+
+# site_id -> (latest last_sync of its active credentials, lease currently held)
+SiteActivity = Dict[int, Tuple[Optional[datetime], bool]]
+
+
+def load_site_activity(site_ids: Iterable[int], now: Optional[datetime] = None) -> SiteActivity:
+    """Cluster-wide state of the given sites, read just before they are submitted."""
+    site_ids = list(site_ids)
+    now = now or datetime.utcnow()
+    db = SessionLocal()
+    try:
+        last = dict(db.query(NvrCredential.site_id, func.max(NvrCredential.last_sync)).filter(
+            NvrCredential.site_id.in_(site_ids), NvrCredential.active == True,  # noqa: E712
+        ).group_by(NvrCredential.site_id).all())
+        leased = {sid for (sid,) in db.query(SyncLease.site_id).filter(
+            SyncLease.site_id.in_(site_ids), SyncLease.expires_at > now)}
+        return {sid: (last.get(sid), sid in leased) for sid in site_ids}
+    finally:
+        db.close()
+
+
+class SyncScheduler:
+    """In-memory per-site schedule, ticking on the event loop."""
+
+    def __init__(self, runner: SyncJobRunner = default_runner,
+                 jitter_fraction: float = SYNC_JITTER_FRACTION,
+                 max_starts_per_tick: int = SYNC_MAX_STARTS_PER_TICK,
+                 catchup_spread_s: int = SYNC_CATCHUP_SPREAD_S,
+                 rng: Optional[random.Random] = None):
+        self.runner = runner
+        self.jitter_fraction = jitter_fraction
+        self.max_starts_per_tick = max(1, max_starts_per_tick)
+        self.catchup_spread_s = catchup_spread_s
+        self.rng = rng or random.Random()
+        self.entries: Dict[int, ScheduleEntry] = {}
+        self.last_refresh: Optional[datetime] = None
+
+    def _jitter(self, interval_s: int) -> float:
+        j = interval_s * self.jitter_fraction
+        return self.rng.uniform(-j, j)
+
+    def _next_after(self, now: datetime, interval_s: int) -> datetime:
+        return now + timedelta(seconds=interval_s + self._jitter(interval_s))
+
+    def apply(self, rows: List[Tuple[int, int, Optional[datetime]]], now: datetime):
+        """Sync the schedule with the current (site_id, interval_s, last_sync) list."""
+        seen = set()
+        for site_id, interval_s, last_sync in rows:
+            interval_s = max(SYNC_MIN_INTERVAL_S, interval_s)
+            seen.add(site_id)
+            entry = self.entries.get(site_id)
+            if entry is None:
+                entry = ScheduleEntry(site_id, interval_s)
+                entry.last_run_at = last_sync
+                if last_sync is None:
+                    # never synced — spread first runs over one interval
+                    entry.next_run_at = now + timedelta(seconds=self.rng.uniform(0, interval_s))
+                else:
+                    due = last_sync + timedelta(seconds=interval_s)
+                    if due <= now:
+                        # overdue after downtime — one catch-up run, spread out
+                        spread = min(interval_s, self.catchup_spread_s)
+                        entry.next_run_at = now + timedelta(seconds=self.rng.uniform(0, spread))
+                    else:
+                        entry.next_run_at = due + timedelta(seconds=self._jitter(interval_s))
+                self.entries[site_id] = entry
+            elif entry.interval_s != interval_s:
+                # interval changed — re-base on the last run
+                base = entry.last_run_at or now
+                entry.interval_s = interval_s
+                entry.next_run_at = max(now, self._next_after(base, interval_s))
+        for site_id in list(self.entries):
+            if site_id not in seen:
+                self.entries.pop(site_id)
+        self.last_refresh = now
+
+    def due_sites(self, now: datetime) -> List[int]:
+        return [e.site_id for e in self.entries.values() if e.next_run_at <= now]
+
+    def _ran_elsewhere(self, entry: ScheduleEntry, activity: SiteActivity, now: datetime) -> bool:
+        """Skip the slot if another process is syncing the site or synced it this interval."""
+        last_sync, leased = activity.get(entry.site_id, (None, False))
+        # within half an interval: a run of ours started a whole (jittered) interval ago
+        recent = last_sync is not None and last_sync > now - timedelta(seconds=entry.interval_s / 2)
+        if not (leased or recent):
+            return False
+        entry.skipped_elsewhere += 1
+        if recent:
+            entry.last_run_at = last_sync
+        entry.next_run_at = max(now, self._next_after(last_sync if recent else now, entry.interval_s))
+        logger.debug("Scheduler: site=%d %s — slot skipped", entry.site_id,
+                     "leased by another process" if leased else f"synced elsewhere at {last_sync}")
+        return True
+
+    def tick(self, now: datetime, activity: Optional[SiteActivity] = None) -> List[int]:
+        """
+        Enqueue due sites (bounded per tick). Returns site ids submitted.
+        With `activity` (load_site_activity of the due sites), sites run
+        by another process meanwhile are skipped.
+        """
+        due = sorted((e for e in self.entries.values() if e.next_run_at <= now),
+                     key=lambda e: e.next_run_at)
+        active = self.runner.active_sites()
+        started = []
+        for entry in due:
+            if len(started) >= self.max_starts_per_tick:
+                break   # the rest stay due and start on the next tick
+            if activity is not None and entry.site_id not in active and self._ran_elsewhere(entry, activity, now):
+                continue
+            if entry.site_id in active:
+                # previous run still queued/running — skip this slot
+                entry.skipped_overlap += 1
+                entry.next_run_at = self._next_after(now, entry.interval_s)
+                logger.info("Scheduler: site=%d still running (job %s) — slot skipped",
+                            entry.site_id, active[entry.site_id])
+                continue
+            job, _ = self.runner.submit("site", [entry.site_id], requested_by="scheduler")
+            entry.last_job_id = job.id if job else ""
+            entry.last_run_at = now
+            entry.runs += 1
+            entry.next_run_at = self._next_after(now, entry.interval_s)
+            started.append(entry.site_id)
+        return started
+
+    def upcoming(self, limit: int = 100) -> List[dict]:
+        now = datetime.utcnow()
+        entries = sorted(self.entries.values(), key=lambda e: e.next_run_at)[:limit]
+        return [e.to_dict(now) for e in entries]
+
+    async def run(self, tick_s: float = SCHEDULER_TICK_S, refresh_s: int = SCHEDULER_REFRESH_S):
+        """Background loop: refresh intervals from DB periodically, tick every tick_s."""
+        logger.info("Sync scheduler started (tick=%.1fs, refresh=%ds)", tick_s, refresh_s)
+        while True:
+            try:
+                now = datetime.utcnow()
+                if self.last_refresh is None or (now - self.last_refresh).total_seconds() >= refresh_s:
+                    rows = await asyncio.to_thread(load_site_intervals)
+                    self.apply(rows, now)
+                due = self.due_sites(now)
+                if due:
+                    self.tick(now, await asyncio.to_thread(load_site_activity, due, now))
+            except Exception as e:
+                logger.error("Scheduler tick failed: %s: %s", type(e).__name__, e)
+            await asyncio.sleep(tick_s)
+
+
+# Process-wide scheduler used by the API
+scheduler = SyncScheduler()
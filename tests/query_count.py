@@ -0,0 +1,54 @@
+"""
+Query-count assertions for tests.
+
+count_queries() records every SQL statement an engine executes inside the
+block; assert_constant_queries() runs an endpoint at several data sizes
+and fails if its statement count changes, i.e. it issues a query per row
+(N+1) somewhere.
+
+Usage:
+    with count_queries(engine) as stmts:
+        list_users(admin, db)
+    assert len(stmts) == 2
+
+    assert_constant_queries(engine, lambda: list_users(admin, db), grow=add_users)
+"""
+from contextlib import contextmanager
+from typing import Callable, Iterable, List
+
+import pytest
+from sqlalchemy import event
+
+
+@contextmanager
+def count_queries(engine):
+    """Yield a list that collects the statements executed on engine in the block."""
+    stmts: List[str] = []
+
+    def _record(conn, cursor, statement, parameters, context, executemany):
+        stmts.append(statement)
+
+    event.listen(engine, "before_cursor_execute", _record)
+    try:
+        yield stmts
+    finally:
+        event.remove(engine, "before_cursor_execute", _record)
+
+
+def assert_constant_queries(engine, run: Callable[[], object], grow: Callable[[int], None],
+                            sizes: Iterable[int] = (1, 5, 25)):
+    """
+    For each size: grow(size) brings the data up to that size, then run()
+    is counted. Fails with the statements of the largest run if the count
+    is not the same at every size.
+    """
+    counts = {}
+    for size in sizes:
+        grow(size)
+        with count_queries(engine) as stmts:
+            run()
+        counts[size] = len(stmts)
+    if len(set(counts.values())) > 1:
+        listing = "\n".join(f"  {s}" for s in stmts)
+        pytest.fail(f"query count grows with data size {counts}; last run:\n{listing}")
+    return counts[size]
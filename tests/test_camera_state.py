@@ -0,0 +1,135 @@
+"""
+Tests for camera_state module.
+Covers: cache reuse between runs, write-through only on transitions,
+periodic checkpoint of streak/last_seen, invalidation on external edits.
+"""
+import pytest
+import sys
+import os
+
+# Allow importing from parent dir
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+import camera_state
+import nvr_sync_service
+from database import Base, Site, Recorder, NvrCredential, Camera
+from nvr_sync_service import sync_site
+
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(bind=engine)()
+    session.add(Site(id=1, name="Test"))
+    session.add(Recorder(id=1, site_id=1, name="NVR"))
+    session.add(NvrCredential(site_id=1, recorder_id=1, ip="10.0.0.250", password_enc="b64:eA=="))
+    session.commit()
+    camera_state.reset()
+    yield session
+    session.close()
+    camera_state.reset()
+
+
+@pytest.fixture
+def nvr(monkeypatch):
+    inventory = [{"channel": ch, "name": f"CAM{ch}", "ip": f"10.0.0.{ch}",
+                  "mac": "", "model": "M", "serial": ""} for ch in range(1, 5)]
+    status = {ch: "online" for ch in range(1, 5)}
+
+    async def fake_rpc(ip, port, user, password):
+        return {"ok": True, "cameras": inventory}
+
+    async def fake_probe(cameras):
+        return dict(status)
+
+    monkeypatch.setattr(nvr_sync_service, "_sync_nvr_rpc", fake_rpc)
+    monkeypatch.setattr(nvr_sync_service, "probe_many", fake_probe)
+    return {"inventory": inventory, "status": status}
+
+
+@pytest.fixture
+def camera_writes(db):
+    """Count INSERT/UPDATE statements against the cameras table."""
+    counts = {"n": 0}
+
+    def before(conn, cursor, statement, params, context, executemany):
+        s = statement.lstrip().upper()
+        if (s.startswith("UPDATE CAMERAS") or s.startswith("INSERT INTO CAMERAS")):
+            counts["n"] += 1
+    event.listen(db.get_bind(), "before_cursor_execute", before)
+    yield counts
+    event.remove(db.get_bind(), "before_cursor_execute", before)
+
+
+class TestCameraStateCache:
+
+    @pytest.mark.asyncio
+    async def test_steady_state_run_writes_no_cameras(self, db, nvr, camera_writes):
+        await sync_site(1, db)
+        await sync_site(1, db)      # reloads once after inserts
+        camera_writes["n"] = 0
+        r = await sync_site(1, db)
+        assert r.ok and r.updated == 4
+        assert camera_writes["n"] == 0
+        assert camera_state.stats()["hits"] >= 1
+
+    @pytest.mark.asyncio
+    async def test_transition_is_written_through(self, db, nvr):
+        await sync_site(1, db)
+        await sync_site(1, db)
+        before = db.query(Camera).filter_by(channel=3).one().updated_at
+        nvr["status"][3] = "offline"
+        await sync_site(1, db)
+        await sync_site(1, db)
+        db.expire_all()
+        cam = db.query(Camera).filter_by(channel=3).one()
+        assert cam.status_real == "offline"
+        assert cam.offline_streak == 2
+        assert cam.updated_at > before
+
+    @pytest.mark.asyncio
+    async def test_checkpoint_persists_memory_state(self, db, nvr, monkeypatch):
+        await sync_site(1, db)
+        await sync_site(1, db)
+        nvr["status"][2] = "offline"
+        await sync_site(1, db)              # first strike — memory only
+        cam = db.query(Camera).filter_by(channel=2).one()
+        updated_at = cam.updated_at
+        assert cam.offline_streak == 0
+        nvr["status"][2] = "unknown"        # no change this run, must stay dirty
+        monkeypatch.setattr(camera_state, "CAMERA_STATE_CHECKPOINT_S", 0)
+        await sync_site(1, db)
+        db.expire_all()
+        cam = db.query(Camera).filter_by(channel=2).one()
+        assert cam.offline_streak == 1
+        assert cam.updated_at == updated_at     # checkpoint is not a data change
+        assert camera_state.stats()["dirty"] == 0
+
+    @pytest.mark.asyncio
+    async def test_external_edit_invalidates_cache(self, db, nvr):
+        await sync_site(1, db)
+        await sync_site(1, db)
+        cam = db.query(Camera).filter_by(channel=1).one()
+        cam.status_real = "offline"     # e.g. edited through the API
+        db.commit()
+        misses = camera_state.stats()["misses"]
+        r = await sync_site(1, db)
+        assert camera_state.stats()["misses"] == misses + 1
+        assert r.status_changes == 1    # offline → online seen against the DB value
+
+    @pytest.mark.asyncio
+    async def test_checkpoint_all_flushes_dirty(self, db, nvr, monkeypatch):
+        monkeypatch.setattr(camera_state, "SessionLocal", sessionmaker(bind=db.get_bind()))
+        await sync_site(1, db)
+        await sync_site(1, db)
+        nvr["status"][4] = "offline"
+        await sync_site(1, db)
+        # 3 refreshed last_seen_at + 1 first strike
+        assert camera_state.checkpoint_all() == 4
+        assert camera_state.stats()["dirty"] == 0
+        db.expire_all()
+        assert db.query(Camera).filter_by(channel=4).one().offline_streak == 1
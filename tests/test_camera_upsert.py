@@ -0,0 +1,133 @@
+"""
+Tests for camera_upsert module.
+Covers: upsert_cameras (insert / conflict update / unchanged skip / no key index),
+update_cameras_by_id, load_existing
+"""
+import pytest
+import sys
+import os
+from datetime import datetime
+
+# Allow importing from parent dir
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+
+import camera_upsert
+from database import Base, Site, Recorder, Camera, UPSERT_KEY_INDEX
+from camera_upsert import (
+    load_existing,
+    upsert_cameras,
+    update_cameras_by_id,
+    UPDATE_FIELDS,
+)
+
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(bind=engine)()
+    session.add(Site(id=1, name="Test"))
+    session.add(Recorder(id=1, site_id=1, name="NVR"))
+    session.commit()
+    yield session
+    session.close()
+    engine.dispose()
+
+
+def _row(ch, **kw):
+    row = {
+        "site_id": 1, "recorder_id": 1, "channel": ch, "cam_type": "ip-net",
+        "name": f"CAM{ch}", "ip": f"10.0.0.{ch}", "mac": "", "model": "M", "serial": "",
+        "configured": True, "status_config": "enabled", "status_real": "online",
+        "status": "online", "last_seen_at": None, "offline_streak": 0,
+        "updated_at": datetime(2024, 1, 1),
+    }
+    row.update(kw)
+    return row
+
+
+# ============================================
+# upsert_cameras
+# ============================================
+class TestUpsertCameras:
+
+    def test_empty(self, db):
+        assert upsert_cameras(db, []) == []
+
+    def test_inserts_new_rows(self, db):
+        out = upsert_cameras(db, [_row(1), _row(2)])
+        db.commit()
+        assert sorted(r["channel"] for r in out) == [1, 2]
+        assert db.query(Camera).count() == 2
+
+    def test_conflict_updates_existing_row(self, db):
+        upsert_cameras(db, [_row(1)])
+        out = upsert_cameras(db, [_row(1, name="RENAMED", status_real="offline")])
+        db.commit()
+        assert len(out) == 1
+        cams = db.query(Camera).all()
+        assert len(cams) == 1
+        assert cams[0].name == "RENAMED"
+        assert cams[0].status_real == "offline"
+
+    def test_unchanged_row_not_returned(self, db):
+        upsert_cameras(db, [_row(1), _row(2)])
+        out = upsert_cameras(db, [_row(1), _row(2, ip="10.9.9.9")])
+        assert [r["channel"] for r in out] == [2]
+
+    def test_cam_type_not_overwritten(self, db):
+        upsert_cameras(db, [_row(1, cam_type="ip-poe-nvr")])
+        upsert_cameras(db, [_row(1, cam_type="analog", name="X")])
+        db.commit()
+        assert db.query(Camera).one().cam_type == "ip-poe-nvr"
+
+    def test_null_recorder_never_conflicts(self, db):
+        upsert_cameras(db, [_row(1, recorder_id=None)])
+        upsert_cameras(db, [_row(1, recorder_id=None)])
+        db.commit()
+        assert db.query(Camera).count() == 2
+
+    def test_without_key_updates_matched_by_id(self, db, monkeypatch):
+        db.execute(text(f"DROP INDEX {UPSERT_KEY_INDEX}"))     # migration 002 skipped
+        monkeypatch.setattr(camera_upsert, "_upsert_key_ok", False)
+        upsert_cameras(db, [_row(1), _row(2)])
+        ids = {c["channel"]: c["id"] for c in load_existing(db, 1, 1)}
+        out = upsert_cameras(db, [_row(1, id=ids[1], name="RENAMED"), _row(2, id=ids[2]), _row(3)])
+        db.commit()
+        assert sorted(r["channel"] for r in out) == [1, 3]
+        assert db.query(Camera.channel, Camera.name).order_by(Camera.channel).all() == [
+            (1, "RENAMED"), (2, "CAM2"), (3, "CAM3")]
+
+
+# ============================================
+# update_cameras_by_id / load_existing
+# ============================================
+class TestUpdateById:
+
+    def test_updates_by_primary_key(self, db):
+        upsert_cameras(db, [_row(1), _row(2)])
+        existing = load_existing(db, 1, 1)
+        cam = next(c for c in existing if c["channel"] == 2)
+        values = {f: cam.get(f) for f in UPDATE_FIELDS}
+        values.update(name="BY-ID", updated_at=datetime(2024, 2, 1))
+        assert update_cameras_by_id(db, [{"id": cam["id"], **values}]) == 1
+        db.commit()
+        assert db.get(Camera, cam["id"]).name == "BY-ID"
+
+    def test_unchanged_row_is_not_rewritten(self, db):
+        upsert_cameras(db, [_row(1)])
+        cam = load_existing(db, 1, 1)[0]
+        before = db.get(Camera, cam["id"]).updated_at
+        values = {f: cam.get(f) for f in UPDATE_FIELDS}
+        values["updated_at"] = datetime(2030, 1, 1)
+        assert update_cameras_by_id(db, [{"id": cam["id"], **values}]) == 0
+        db.commit()
+        assert db.get(Camera, cam["id"]).updated_at == before
+
+    def test_load_existing_filters_recorder(self, db):
+        upsert_cameras(db, [_row(1), _row(2, recorder_id=None)])
+        assert [c["channel"] for c in load_existing(db, 1, 1)] == [1]
+        assert len(load_existing(db, 1)) == 2
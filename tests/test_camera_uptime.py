@@ -0,0 +1,177 @@
+"""
+Tests for camera_uptime module.
+Covers: interval bookkeeping on transitions, window overlap math (aware start / end included),
+recorder/site aggregation, SLA flag, and intervals written by sync_site
+and the camera create / update endpoints.
+"""
+import pytest
+import sys
+import os
+from datetime import datetime, timedelta, timezone
+
+# Allow importing from parent dir
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine
+from pydantic import TypeAdapter
+from sqlalchemy.orm import sessionmaker
+
+import camera_state
+import main
+import nvr_sync_service
+from database import Base, Site, Recorder, NvrCredential, Camera, CameraStatusInterval, User
+from camera_uptime import record_transitions, uptime
+from schemas import CameraCreate, CameraBulkCreate, CameraUpdate
+
+T0 = datetime(2024, 6, 1, 0, 0, 0)
+H = timedelta(hours=1)
+
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(bind=engine)()
+    session.add(Site(id=1, name="Test"))
+    session.add(Recorder(id=1, site_id=1, name="NVR"))
+    session.add_all([Camera(id=i, site_id=1, recorder_id=1, channel=i) for i in (1, 2)])
+    session.commit()
+    yield session
+    session.close()
+
+
+@pytest.fixture
+def history(db):
+    """cam1: online 0-6h, offline 6-8h, online since 8h. cam2: unknown 0-1h, online since 1h."""
+    record_transitions(db, 1, [(1, 1, "online"), (2, 1, "unknown")], T0)
+    record_transitions(db, 1, [(2, 1, "online")], T0 + H)
+    record_transitions(db, 1, [(1, 1, "offline")], T0 + 6 * H)
+    record_transitions(db, 1, [(1, 1, "online")], T0 + 8 * H)
+    db.commit()
+
+
+class TestRecordTransitions:
+
+    def test_one_open_interval_per_camera(self, db, history):
+        open_ = db.query(CameraStatusInterval).filter(CameraStatusInterval.ended_at.is_(None)).all()
+        assert sorted((i.camera_id, i.status) for i in open_) == [(1, "online"), (2, "online")]
+        assert db.query(CameraStatusInterval).filter_by(camera_id=1).count() == 3
+
+
+class TestUptime:
+
+    def test_camera_window(self, db, history):
+        r = uptime(db, T0, T0 + 10 * H, camera_id=1, now=T0 + 24 * H)
+        assert r["online_s"] == 8 * 3600
+        assert r["offline_s"] == 2 * 3600
+        assert r["uptime_pct"] == 80.0
+
+    def test_window_clipped_inside_intervals(self, db, history):
+        r = uptime(db, T0 + 5 * H, T0 + 7 * H, camera_id=1, now=T0 + 24 * H)
+        assert r["online_s"] == 3600
+        assert r["offline_s"] == 3600
+
+    def test_open_interval_ends_now(self, db, history):
+        r = uptime(db, T0 + 8 * H, T0 + 48 * H, camera_id=1, now=T0 + 10 * H)
+        assert r["window_s"] == 2 * 3600
+        assert r["online_s"] == 2 * 3600
+
+    def test_no_data_before_first_interval(self, db, history):
+        r = uptime(db, T0 - 2 * H, T0 + H, camera_id=1, now=T0 + 24 * H)
+        assert r["no_data_s"] == 2 * 3600
+        assert r["uptime_pct"] == 100.0
+
+    def test_aware_window(self, db, history):
+        cet = timezone(timedelta(hours=1))
+        r = uptime(db, (T0 + H).replace(tzinfo=cet), (T0 + 11 * H).replace(tzinfo=cet), camera_id=1,
+                   now=T0 + 24 * H)
+        assert r["online_s"] == 8 * 3600 and r["offline_s"] == 2 * 3600
+
+    def test_endpoints_z_query_params(self, db, history):
+        db.add(User(id=1, username="admin", password_hash="x", role="admin"))
+        db.commit()
+        z = TypeAdapter(datetime).validate_python               # how FastAPI parses ?end=...Z
+        start, end = z("2024-06-01T00:00:00Z"), z("2099-01-01T00:00:00Z")
+        admin = db.get(User, 1)
+        kw = dict(days=30, target=None, user=admin, db=db)
+        r = main.camera_uptime(1, z("2024-06-01T00:00:00Z"), z("2024-06-01T10:00:00Z"), **kw)
+        assert r["uptime_pct"] == 80.0
+        assert main.recorder_uptime(1, start, end, per_camera=False, **kw)["cameras"] == 2
+        assert main.site_uptime(1, start, end, per_camera=False, **kw)["cameras"] == 2
+
+    def test_site_aggregate_and_sla(self, db, history):
+        r = uptime(db, T0, T0 + 10 * H, site_id=1, target_pct=90, per_camera=True, now=T0 + 24 * H)
+        assert r["cameras"] == 2
+        assert r["online_s"] == (8 + 9) * 3600
+        assert r["unknown_s"] == 3600
+        assert r["uptime_pct"] == pytest.approx(17 / 19 * 100, abs=1e-3)
+        assert r["sla_met"] is False
+        assert [c["camera_id"] for c in r["per_camera"]] == [1, 2]   # worst first
+        assert r["per_camera"][1]["sla_met"] is True
+
+    def test_recorder_scope(self, db, history):
+        r = uptime(db, T0, T0 + 10 * H, recorder_id=1, now=T0 + 24 * H)
+        assert r["scope"] == "recorder"
+        assert r["offline_s"] == 2 * 3600
+
+
+class TestSyncWritesIntervals:
+
+    @pytest.mark.asyncio
+    async def test_sync_opens_and_closes_intervals(self, db, monkeypatch):
+        camera_state.reset()
+        db.query(Camera).delete()
+        db.add(NvrCredential(site_id=1, recorder_id=1, ip="10.0.0.250", password_enc="b64:eA=="))
+        db.commit()
+        status = {1: "online"}
+
+        async def fake_rpc(ip, port, user, password):
+            return {"ok": True, "cameras": [{"channel": 1, "name": "C1", "ip": "10.0.0.1"}]}
+
+        async def fake_probe(cameras):
+            return dict(status)
+
+        monkeypatch.setattr(nvr_sync_service, "_sync_nvr_rpc", fake_rpc)
+        monkeypatch.setattr(nvr_sync_service, "probe_many", fake_probe)
+
+        await nvr_sync_service.sync_site(1, db)
+        await nvr_sync_service.sync_site(1, db)     # no change — no new interval
+        status[1] = "offline"
+        await nvr_sync_service.sync_site(1, db)     # first strike — still online
+        await nvr_sync_service.sync_site(1, db)     # offline
+        rows = db.query(CameraStatusInterval).order_by(CameraStatusInterval.id).all()
+        assert [(r.status, r.ended_at is None) for r in rows] == [("online", False), ("offline", True)]
+        camera_state.reset()
+
+
+class TestApiWritesIntervals:
+
+    @pytest.fixture
+    def write(self, db, monkeypatch):
+        def _write(fn, *args, **kwargs):
+            out = fn(db, *args, **kwargs)
+            db.commit()
+            return out
+        monkeypatch.setattr(main, "_write", _write)
+
+    def _intervals(self, db, cam_id):
+        rows = db.query(CameraStatusInterval).filter_by(camera_id=cam_id).order_by(CameraStatusInterval.id)
+        return [(r.recorder_id, r.status, r.ended_at is None) for r in rows]
+
+    def test_create_opens_interval(self, db, write):
+        cam = main.create_camera(CameraCreate(site_id=1, recorder_id=1, channel=5, status_real="online"), user=None)
+        assert self._intervals(db, cam.id) == [(1, "online", True)]
+        cams = main.create_cameras_bulk(CameraBulkCreate(site_id=1, cameras=[{"channel": 6}, {"channel": 7}]),
+                                        user=None)
+        assert [self._intervals(db, c.id) for c in cams] == [[(None, "unknown", True)]] * 2
+
+    def test_update_reopens_on_status_or_recorder_change(self, db, write):
+        db.add(Recorder(id=2, site_id=1, name="NVR2"))
+        db.commit()
+        cam = main.create_camera(CameraCreate(site_id=1, recorder_id=1, channel=5, status_real="online"), user=None)
+        main.update_camera(cam.id, CameraUpdate(recorder_id=1, channel=5, status_real="online", name="x"), user=None)
+        assert self._intervals(db, cam.id) == [(1, "online", True)]           # nothing the interval records
+
+        main.update_camera(cam.id, CameraUpdate(recorder_id=1, channel=5, status_real="offline"), user=None)
+        main.bulk_update_cameras([cam.id], field="recorder_id", value="2", user=None)
+        assert self._intervals(db, cam.id) == [(1, "online", False), (1, "offline", False), (2, "offline", True)]
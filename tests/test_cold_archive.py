@@ -0,0 +1,226 @@
+"""
+Tests for cold_archive module.
+Covers: segment round trip (ints, strings, datetimes, bytes, None), retention
+archiving before delete, newest-first queries with window / filter / limit,
+duplicate batches, compaction, archive retention, archived snapshot rebuild.
+"""
+import pytest
+import os
+import sys
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+import cold_archive
+import database
+import main
+import snapshot_store
+from cold_archive import Segment, archive_rows, query, compact, prune_archive
+from database import Base, Site, NvrCredential, CameraEvent, CameraSnapshot, SyncLog, User
+from retention import run_retention
+from snapshot_store import save_snapshot, load_snapshot, load_archived_snapshot
+
+NOW = datetime(2024, 6, 1, 12, 0)
+
+
+@pytest.fixture
+def archive_dir(tmp_path, monkeypatch):
+    path = str(tmp_path / "archive")
+    monkeypatch.setattr(cold_archive, "ARCHIVE_DIR", path)
+    return path
+
+
+@pytest.fixture
+def db(tmp_path, archive_dir, monkeypatch):
+    monkeypatch.setattr(snapshot_store, "_last", {})
+    monkeypatch.setattr(snapshot_store, "SNAPSHOT_KEYFRAME_EVERY", 3)
+    engine = create_engine(f"sqlite:///{tmp_path / 'nm.db'}")
+    monkeypatch.setattr(database, "engine", engine)
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(bind=engine)()
+    session.add_all([Site(id=1, name="A"), Site(id=2, name="B")])
+    session.add(NvrCredential(id=1, site_id=1, ip="10.0.0.1"))
+    session.commit()
+    yield session
+    session.close()
+    engine.dispose()
+
+
+def _events(db, n, start, step=timedelta(hours=1), site_id=1):
+    rows = [CameraEvent(site_id=site_id, camera_id=None if i % 4 == 0 else i, channel=i % 16,
+                        event_type="status_change", from_status="online", to_status="offline",
+                        severity=("info", "warn", "crit")[i % 3], message=f"cam {i}",
+                        created_at=start + step * i)
+            for i in range(n)]
+    db.add_all(rows)
+    db.commit()
+    return [r.id for r in rows]
+
+
+def _segments(archive_dir, table="camera_events", site_id=1):
+    out = []
+    for root, _, files in os.walk(os.path.join(archive_dir, table, f"site={site_id}")):
+        out += [os.path.join(root, f) for f in files if f.endswith(".nma")]
+    return sorted(out)
+
+
+class TestSegment:
+
+    def test_round_trip(self, tmp_path):
+        rows = [
+            {"id": 1, "site_id": 1, "run_id": "r1", "collected_at": datetime(2024, 1, 1, 0, 0, 0, 123456),
+             "payload_json": "", "encoding": "key", "keyframe_id": None, "seq": 0,
+             "payload_blob": b"\x00\x01binary", "raw_size": 100, "stored_size": 8},
+            {"id": 2, "site_id": 1, "run_id": "r2", "collected_at": None,
+             "payload_json": None, "encoding": "delta", "keyframe_id": 1, "seq": 1,
+             "payload_blob": None, "raw_size": None, "stored_size": 0},
+        ]
+        path = str(tmp_path / "s.nma")
+        cold_archive.write_segment(path, "camera_snapshots", 1, rows)
+        with Segment(path) as seg:
+            assert seg.rows == 2
+            assert seg.header["min_id"] == 1 and seg.header["max_id"] == 2
+            assert seg.column("payload_blob") == [b"\x00\x01binary", None]
+            assert seg.column("collected_at") == [rows[0]["collected_at"], None]
+            assert seg.column("keyframe_id") == [None, 1]
+            assert seg.column("payload_json") == ["", None]
+            assert set(seg._cols) == {"payload_blob", "collected_at", "keyframe_id", "payload_json"}
+
+    def test_rejects_other_files(self, tmp_path):
+        path = tmp_path / "x.nma"
+        path.write_bytes(b"SQLite format 3\0")
+        with pytest.raises(ValueError):
+            Segment(str(path))
+
+
+class TestRetentionArchives:
+
+    def test_rows_archived_before_delete(self, db, archive_dir):
+        _events(db, 10, NOW - timedelta(days=200))
+        _events(db, 2, NOW - timedelta(hours=2))
+        stats = run_retention(db, now=NOW, batch=4, vacuum=False)
+        assert stats["camera_events"] == 10
+        assert db.query(CameraEvent).count() == 2
+        rows = query("camera_events", 1)
+        assert len(rows) == 10
+        assert [r["message"] for r in rows] == [f"cam {i}" for i in range(9, -1, -1)]
+        assert rows[0]["camera_id"] == 9 and rows[-1]["camera_id"] is None
+        assert len(_segments(archive_dir)) == 3                     # batches 4 + 4 + 2
+
+    def test_disabled_keeps_nothing(self, db, archive_dir, monkeypatch):
+        monkeypatch.setattr(cold_archive, "ARCHIVE_ENABLED", False)
+        _events(db, 3, NOW - timedelta(days=200))
+        run_retention(db, now=NOW, vacuum=False)
+        assert not os.path.exists(archive_dir)
+        assert query("camera_events", 1) == []
+
+    def test_sync_logs_and_partitions_by_site_month(self, db, archive_dir):
+        for site, when in [(1, datetime(2023, 10, 30)), (1, datetime(2023, 11, 2)), (2, datetime(2023, 11, 3))]:
+            db.add(SyncLog(credential_id=1, site_id=site, status="ok", created_at=when,
+                           stage_timings_json='{"probe": {"ms": 5.0, "count": 1}}'))
+        db.commit()
+        run_retention(db, now=NOW, vacuum=False)
+        assert sorted(os.listdir(os.path.join(archive_dir, "sync_logs", "site=1"))) == ["2023-10", "2023-11"]
+        assert [r["created_at"] for r in query("sync_logs", 2)] == [datetime(2023, 11, 3)]
+        assert query("sync_logs", 1)[0]["stage_timings_json"] == '{"probe": {"ms": 5.0, "count": 1}}'
+
+
+class TestQuery:
+
+    @pytest.fixture
+    def archived(self, db):
+        ids = _events(db, 60, datetime(2023, 1, 20), step=timedelta(days=1))    # Jan 20 .. Mar 20
+        archive_rows(db, CameraEvent, ids)
+        return ids
+
+    def test_window(self, archived):
+        rows = query("camera_events", 1, since=datetime(2023, 2, 1), until=datetime(2023, 2, 3))
+        assert [r["created_at"].day for r in rows] == [3, 2, 1]
+
+    def test_aware_window(self, db, archived):
+        since = datetime(2023, 2, 1, 3, tzinfo=timezone(timedelta(hours=3)))        # 00:00 UTC
+        until = datetime.fromisoformat("2023-02-03T00:00:00+00:00")                # '...Z' in the query string
+        rows = query("camera_events", 1, since=since, until=until)
+        assert [r["created_at"].day for r in rows] == [3, 2, 1]
+        db.query(CameraEvent).delete()                                            # history only in the archive
+        db.add(User(id=1, username="admin", password_hash="x", role="admin"))
+        db.commit()
+        rows = main.list_camera_events(1, limit=100, severity=None, since=since, until=until,
+                                       user=db.get(User, 1), db=db)
+        assert [r["created_at"].day for r in rows] == [3, 2, 1]
+
+    def test_filter_and_columns(self, archived):
+        rows = query("camera_events", 1, where={"severity": "crit"}, columns=["message"])
+        assert len(rows) == 20
+        assert set(rows[0]) == {"id", "created_at", "message"}
+
+    def test_limit_stops_at_month(self, archived, archive_dir, monkeypatch):
+        opened = []
+        real = Segment.__init__
+
+        def spy(self, path):
+            opened.append(path)
+            real(self, path)
+
+        monkeypatch.setattr(Segment, "__init__", spy)
+        rows = query("camera_events", 1, limit=5)
+        assert [r["created_at"] for r in rows] == [datetime(2023, 3, 20) - timedelta(days=i) for i in range(5)]
+        assert all("2023-03" in p for p in opened)                  # Jan/Feb never opened
+
+    def test_exclude_ids_and_duplicates(self, db, archived):
+        archive_rows(db, CameraEvent, archived[:10])                  # retried batch, new file
+        assert len(query("camera_events", 1)) == 60
+        assert len(query("camera_events", 1, exclude_ids=archived[-3:])) == 57
+
+    def test_other_site_and_missing(self, archived):
+        assert query("camera_events", 2) == []
+
+
+class TestMaintenance:
+
+    def test_compaction_merges_segments(self, db, archive_dir, monkeypatch):
+        monkeypatch.setattr(cold_archive, "ARCHIVE_COMPACT_SEGMENTS", 3)
+        ids = _events(db, 20, datetime(2023, 5, 1))
+        for k in range(0, 20, 5):
+            archive_rows(db, CameraEvent, ids[k:k + 5])
+        assert len(_segments(archive_dir)) == 1
+        assert len(query("camera_events", 1)) == 20
+
+    def test_compact_drops_duplicates(self, db, archive_dir):
+        ids = _events(db, 6, datetime(2023, 5, 1))
+        archive_rows(db, CameraEvent, ids[:4])
+        archive_rows(db, CameraEvent, ids[2:])
+        assert compact("camera_events", 1, "2023-05") == 2
+        with Segment(_segments(archive_dir)[0]) as seg:
+            assert seg.column("id") == ids
+
+    def test_prune_old_months(self, db, archive_dir):
+        ids = _events(db, 2, datetime(2022, 1, 10)) + _events(db, 2, datetime(2024, 5, 10))
+        archive_rows(db, CameraEvent, ids)
+        assert prune_archive(NOW, days=365) == 1
+        assert [r["created_at"].year for r in query("camera_events", 1)] == [2024, 2024]
+
+
+class TestSnapshots:
+
+    def test_archived_delta_rebuilds(self, db):
+        payloads = [[{"channel": 1, "status_real": s}, {"channel": 2, "status_real": "online"}]
+                    for s in ("online", "offline", "online", "offline", "unknown")]
+        for i, cams in enumerate(payloads):
+            snap = save_snapshot(db, 1, f"r{i}", cams)
+            snap.collected_at = datetime(2024, 1, 1) + timedelta(hours=i)
+            db.commit()
+        snap = save_snapshot(db, 1, "live", payloads[0])
+        db.commit()
+
+        run_retention(db, now=NOW, vacuum=False)
+        assert {s.run_id for s in db.query(CameraSnapshot)} == {"r3", "r4", "live"}
+        for i in range(3):
+            assert load_snapshot(db, f"r{i}") is None
+            row, cameras = load_archived_snapshot(1, f"r{i}")
+            assert cameras == payloads[i]
+            assert row.collected_at == datetime(2024, 1, 1) + timedelta(hours=i)
+        assert load_archived_snapshot(1, "nope") is None
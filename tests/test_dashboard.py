@@ -0,0 +1,92 @@
+"""
+Tests for the SQL-aggregated site dashboard (main.get_dashboard).
+Covers: same DashboardStats as counting the loaded rows in Python, after
+inserts, edits, moves and deletes; empty site; recorder type fallback.
+"""
+import random
+import pytest
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+import main
+from database import Base, Site, Rack, Recorder, Switch, Router, Building, PatchPanel, Camera, User
+
+
+@pytest.fixture
+def db():
+    eng = create_engine("sqlite://")
+    event.listen(eng, "connect", lambda c, r: c.execute("PRAGMA foreign_keys=ON"))
+    Base.metadata.create_all(bind=eng)
+    session = sessionmaker(bind=eng)()
+    session.add_all([User(id=1, username="admin", password_hash="x", role="admin"),
+                     Site(id=1, name="A"), Site(id=2, name="B")])
+    session.commit()
+    yield session
+    session.close()
+    eng.dispose()
+
+
+def _expected(db, site_id):
+    cams = db.query(Camera).filter_by(site_id=site_id).all()
+    recs = db.query(Recorder).filter_by(site_id=site_id).all()
+    racks = db.query(Rack).filter_by(site_id=site_id).all()
+    online = sum(1 for c in cams if c.status != "offline")
+    types = {}
+    for r in recs:
+        types[r.type or "NVR"] = types.get(r.type or "NVR", 0) + 1
+    return {
+        "cameras": len(cams), "cameras_online": online, "cameras_offline": len(cams) - online,
+        "recorders": len(recs), "racks": len(racks),
+        "switches": db.query(Switch).filter_by(site_id=site_id).count(),
+        "routers": db.query(Router).filter_by(site_id=site_id).count(),
+        "buildings": db.query(Building).filter_by(site_id=site_id).count(),
+        "patch_panels": db.query(PatchPanel).filter_by(site_id=site_id).count(),
+        "total_storage_tb": sum((d.capacity_gb or 0) for r in recs for d in r.disks) / 1000,
+        "disks_degraded": sum(1 for r in recs for d in r.disks if d.status != "ok"),
+        "recorders_by_type": types,
+        "cameras_by_rack": {k.name: sum(1 for c in cams if c.rack_id == k.id) for k in racks},
+        "cameras_by_recorder": {r.name: sum(1 for c in cams if c.recorder_id == r.id) for r in recs},
+    }
+
+
+def _dashboard(db, site_id):
+    db.expire_all()
+    return main.get_dashboard(site_id, db.get(User, 1), db).model_dump()
+
+
+def test_empty_site(db):
+    assert _dashboard(db, 2) == _expected(db, 2)
+
+
+def test_matches_python_counts(db):
+    rnd = random.Random(7)
+    for sid in (1, 2):
+        db.add_all([Rack(id=sid * 10 + i, site_id=sid, name=f"R{i}") for i in range(3)])
+        db.add_all([Recorder(id=sid * 10 + i, site_id=sid, name=f"NVR{i}", type=("NVR", "DVR", None)[i],
+                             disks=[{"size": "4TB"}, {"size": "500GB", "status": "degraded"}]) for i in range(3)])
+        db.add_all([Switch(site_id=sid, name="SW"), Router(site_id=sid, name="RT"),
+                    Building(site_id=sid, name="B"), PatchPanel(site_id=sid, name="PP")])
+        db.flush()
+        db.add_all([Camera(site_id=sid, channel=ch, status=rnd.choice(["online", "offline", "maintenance"]),
+                           recorder_id=rnd.choice([None, sid * 10, sid * 10 + 1, sid * 10 + 2]),
+                           rack_id=rnd.choice([None, sid * 10, sid * 10 + 1]))
+                    for ch in range(60)])
+    db.commit()
+    assert _dashboard(db, 1) == _expected(db, 1)
+
+    cams = db.query(Camera).filter_by(site_id=1).all()
+    for c in cams[:10]:
+        c.status, c.rack_id = "offline", 12
+    for c in cams[10:15]:
+        c.site_id, c.recorder_id, c.rack_id = 2, 20, None
+    for c in cams[15:20]:
+        db.delete(c)
+    db.delete(db.get(Recorder, 11))
+    db.commit()
+    for sid in (1, 2):
+        assert _dashboard(db, sid) == _expected(db, sid)
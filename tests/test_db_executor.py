@@ -0,0 +1,144 @@
+"""
+Tests for db_executor module.
+Covers: run_db/run_sync, inline fallback for thread-pinned engines, and the
+event loop staying responsive (probes progressing) while sync_site commits.
+"""
+import pytest
+import asyncio
+import threading
+import time
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+import nvr_sync_service
+import camera_state
+import db_executor
+from database import Base, Site, Recorder, NvrCredential, Camera
+from db_executor import run_db, run_sync
+
+
+@pytest.fixture
+def engine():
+    """In-memory DB shared across threads (what a file DB gives in production)."""
+    eng = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=eng)
+    yield eng
+    eng.dispose()
+
+
+@pytest.fixture
+def db(engine):
+    session = sessionmaker(bind=engine)()
+    session.add(Site(id=1, name="Test"))
+    session.commit()
+    camera_state.reset()
+    yield session
+    camera_state.reset()
+    session.close()
+
+
+class TestRunDb:
+
+    @pytest.mark.asyncio
+    async def test_runs_off_the_loop_thread(self, db):
+        def where(_db):
+            return threading.current_thread().name
+        name = await run_db(db, where)
+        assert name.startswith("netmanager-db")
+
+    @pytest.mark.asyncio
+    async def test_passes_args_and_returns(self, db):
+        def count(_db, site_id):
+            return _db.query(Site).filter_by(id=site_id).count()
+        assert await run_db(db, count, 1) == 1
+        assert await run_db(db, count, 2) == 0
+
+    @pytest.mark.asyncio
+    async def test_exceptions_propagate(self, engine):
+        def boom():
+            raise ValueError("x")
+        with pytest.raises(ValueError):
+            await run_sync(engine, boom)
+
+    @pytest.mark.asyncio
+    async def test_thread_pinned_engine_runs_inline(self):
+        eng = create_engine("sqlite://")      # SingletonThreadPool: one connection per thread
+        main_thread = threading.current_thread().name
+        name = await run_sync(eng, lambda: threading.current_thread().name)
+        assert name == main_thread
+        eng.dispose()
+
+
+class TestLoopStaysResponsive:
+
+    @pytest.fixture
+    def slow_site(self, db, monkeypatch):
+        db.add(Recorder(id=1, site_id=1, name="NVR"))
+        db.add(NvrCredential(site_id=1, recorder_id=1, ip="10.0.0.250", password_enc="b64:eA=="))
+        db.commit()
+        inventory = [{"channel": ch, "name": f"CAM{ch}", "ip": f"10.0.0.{ch}"} for ch in range(1, 9)]
+
+        async def fake_rpc(ip, port, user, password):
+            return {"ok": True, "cameras": inventory}
+
+        async def fake_probe(cameras):
+            return {c["channel"]: "online" for c in cameras}
+
+        monkeypatch.setattr(nvr_sync_service, "_sync_nvr_rpc", fake_rpc)
+        monkeypatch.setattr(nvr_sync_service, "probe_many", fake_probe)
+
+        # every commit of the sync session takes 300ms (slow disk / busy SQLite)
+        event.listen(db, "before_commit", lambda s: time.sleep(0.3))
+        return db
+
+    @pytest.mark.asyncio
+    async def test_probes_progress_during_long_commit(self, slow_site):
+        ticks = []
+        stop = asyncio.Event()
+
+        async def prober():
+            # stands in for in-flight TCP probes of other sites: 10ms steps
+            while not stop.is_set():
+                ticks.append(time.monotonic())
+                await asyncio.sleep(0.01)
+
+        task = asyncio.create_task(prober())
+        t0 = time.monotonic()
+        r = await nvr_sync_service.sync_site(1, slow_site)
+        elapsed = time.monotonic() - t0
+        stop.set()
+        await task
+
+        assert r.ok is True
+        assert slow_site.query(Camera).count() == 8
+        assert elapsed >= 0.3                            # the commits really were slow
+        gaps = [b - a for a, b in zip(ticks, ticks[1:])]
+        assert len(ticks) >= 20                          # kept ticking through the commits
+        assert max(gaps) < 0.25                          # never blocked for a whole commit
+
+    @pytest.mark.asyncio
+    async def test_blocking_on_the_loop_would_stall(self, db):
+        """Control: the same sleep run inline does stall the loop."""
+        ticks = []
+
+        async def prober():
+            for _ in range(30):
+                ticks.append(time.monotonic())
+                await asyncio.sleep(0.01)
+
+        task = asyncio.create_task(prober())
+        await asyncio.sleep(0.02)
+        time.sleep(0.3)
+        await task
+        gaps = [b - a for a, b in zip(ticks, ticks[1:])]
+        assert max(gaps) >= 0.25
+
+
+def teardown_module(module):
+    db_executor.shutdown()
@@ -0,0 +1,162 @@
+"""
+Tests for db_maintenance module and the SQLite storage profiles.
+Covers: profile selection + env overrides, PRAGMAs applied per connection,
+PASSIVE / TRUNCATE checkpoints (short busy timeout, skipped while a
+reader pins frames), bounded ANALYZE, storage status.
+"""
+import pytest
+import sqlite3
+import sys
+import os
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, event, text
+
+import database
+import db_maintenance
+from database import Base, sqlite_profile, apply_sqlite_pragmas
+
+
+@pytest.fixture
+def file_db(tmp_path, monkeypatch):
+    path = str(tmp_path / "nm.db")
+    eng = create_engine(f"sqlite:///{path}")
+    event.listen(eng, "connect", lambda c, r: apply_sqlite_pragmas(c))
+    Base.metadata.create_all(bind=eng)
+    monkeypatch.setattr(database, "engine", eng)
+    monkeypatch.setattr(database, "_db_path", path)
+    monkeypatch.setattr(db_maintenance, "_stats", {"checkpoints": 0, "truncates": 0, "truncates_skipped": 0,
+                                                   "analyzes": 0, "last_checkpoint": {}, "last_analyze": {}})
+    yield eng
+    eng.dispose()
+
+
+def _fill(eng, rows=2000):
+    with eng.begin() as conn:
+        conn.execute(text("INSERT INTO sites (id, name) VALUES (1, 'S')"))
+        conn.execute(database.CameraEvent.__table__.insert(), [
+            {"site_id": 1, "event_type": "status_change", "severity": "info", "message": "x" * 200}
+            for _ in range(rows)
+        ])
+
+
+class TestProfiles:
+
+    def test_default_is_balanced(self):
+        assert database.SQLITE_PROFILE == "balanced"
+        assert sqlite_profile()["synchronous"] == "NORMAL"
+
+    def test_env_override(self, monkeypatch):
+        monkeypatch.setenv("SQLITE_MMAP_SIZE", "0")
+        p = sqlite_profile("fast")
+        assert p["mmap_size"] == "0"
+        assert p["synchronous"] == "OFF"
+
+    def test_unknown_profile(self):
+        with pytest.raises(ValueError):
+            sqlite_profile("turbo")
+
+    def test_pragmas_applied(self, tmp_path):
+        conn = sqlite3.connect(str(tmp_path / "p.db"))
+        apply_sqlite_pragmas(conn, sqlite_profile("balanced"))
+        get = lambda k: conn.execute(f"PRAGMA {k}").fetchone()[0]
+        assert get("journal_mode") == "wal"
+        assert get("foreign_keys") == 1
+        assert get("synchronous") == 1                   # NORMAL
+        assert get("cache_size") == -65536
+        assert get("mmap_size") == 268435456
+        assert get("temp_store") == 2                    # MEMORY
+        assert get("busy_timeout") == 5000
+        conn.close()
+
+
+class TestCheckpoint:
+
+    def test_passive_below_threshold_keeps_file(self, file_db):
+        _fill(file_db)
+        assert db_maintenance.wal_size() > 0
+        r = db_maintenance.checkpoint(truncate_bytes=1 << 40)
+        assert r["mode"] == "PASSIVE"
+        assert r["busy"] == 0
+        assert r["checkpointed"] == r["wal_frames"]
+        assert r["wal_bytes_after"] > 0                  # frames copied, file kept for reuse
+
+    def test_truncate_over_threshold(self, file_db):
+        _fill(file_db)
+        r = db_maintenance.checkpoint(truncate_bytes=1024)
+        assert r["mode"] == "TRUNCATE"
+        assert r["wal_bytes_before"] > 1024
+        assert r["wal_bytes_after"] == 0
+        assert db_maintenance.stats()["truncates"] == 1
+
+    def test_open_reader_makes_passive_partial(self, file_db, tmp_path):
+        _fill(file_db, rows=10)
+        reader = sqlite3.connect(str(tmp_path / "nm.db"), isolation_level=None)
+        reader.execute("BEGIN")
+        reader.execute("SELECT COUNT(*) FROM camera_events").fetchone()   # pins the snapshot
+        with file_db.begin() as conn:
+            conn.execute(database.CameraEvent.__table__.insert(),
+                         [{"site_id": 1, "event_type": "x", "severity": "info"} for _ in range(500)])
+        r = db_maintenance.checkpoint(truncate_bytes=0)
+        assert r["checkpointed"] < r["wal_frames"]
+        reader.execute("COMMIT")
+        reader.close()
+        r = db_maintenance.checkpoint(truncate_bytes=0)
+        assert r["checkpointed"] == r["wal_frames"]
+
+    def test_truncate_skipped_while_reader_pins_frames(self, file_db, tmp_path):
+        _fill(file_db, rows=10)
+        reader = sqlite3.connect(str(tmp_path / "nm.db"), isolation_level=None)
+        reader.execute("BEGIN")
+        reader.execute("SELECT COUNT(*) FROM camera_events").fetchone()
+        with file_db.begin() as conn:
+            conn.execute(database.CameraEvent.__table__.insert(),
+                         [{"site_id": 1, "event_type": "x", "severity": "info"} for _ in range(500)])
+        r = db_maintenance.checkpoint(truncate_bytes=1024)
+        assert r["mode"] == "PASSIVE" and r["truncate_skipped"]
+        assert r["elapsed_ms"] < 1000                    # no busy_timeout wait under the writer lock
+        assert db_maintenance.stats()["truncates_skipped"] == 1
+        reader.execute("COMMIT")
+        reader.close()
+        r = db_maintenance.checkpoint(truncate_bytes=1024)       # next tick
+        assert r["mode"] == "TRUNCATE" and r["wal_bytes_after"] == 0
+
+    def test_truncate_waits_short_busy_timeout(self, file_db, tmp_path):
+        _fill(file_db, rows=10)
+        reader = sqlite3.connect(str(tmp_path / "nm.db"), isolation_level=None)
+        reader.execute("BEGIN")
+        reader.execute("SELECT COUNT(*) FROM camera_events").fetchone()
+        t0 = time.monotonic()
+        r = db_maintenance._wal_checkpoint("TRUNCATE", busy_timeout_ms=100)
+        assert r["busy"] == 1
+        assert time.monotonic() - t0 < 2                # not the profile's 5000 ms
+        reader.execute("COMMIT")
+        reader.close()
+        with file_db.connect() as conn:                 # pooled connection keeps the profile timeout
+            assert conn.execute(text("PRAGMA busy_timeout")).scalar() == 5000
+
+
+class TestAnalyze:
+
+    def test_creates_planner_stats(self, file_db):
+        _fill(file_db)
+        db_maintenance.analyze(limit=100)
+        with file_db.connect() as conn:
+            tables = {r[0] for r in conn.execute(text("SELECT tbl FROM sqlite_stat1"))}
+            assert "camera_events" in tables
+            assert conn.execute(text("PRAGMA analysis_limit")).scalar() == 0
+        assert db_maintenance.stats()["analyzes"] == 1
+
+
+class TestStatus:
+
+    def test_reports_profile_and_sizes(self, file_db):
+        _fill(file_db, rows=10)
+        st = db_maintenance.storage_status()
+        assert st["profile"] == "balanced"
+        assert st["pragmas"]["journal_mode"] == "wal"
+        assert st["pragmas"]["synchronous"] == 1
+        assert st["wal_bytes"] > 0
+        assert st["db_bytes"] > 0
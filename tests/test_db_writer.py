@@ -0,0 +1,224 @@
+"""
+Tests for db_writer module.
+Covers: WriteQueue results / detached objects, group commit, per-job savepoint
+rollback, serialized() writers, stop() draining, concurrent writers without
+"database is locked".
+"""
+import pytest
+import threading
+import time
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import sessionmaker
+
+from database import Base, Site, Camera
+from db_writer import WriteQueue, make_writer_engine, serialized
+
+
+@pytest.fixture
+def url(tmp_path):
+    u = f"sqlite:///{tmp_path / 'w.db'}"
+    eng = create_engine(u)
+    Base.metadata.create_all(bind=eng)
+    with eng.begin() as conn:
+        conn.execute(Site.__table__.insert(), [{"id": 1, "name": "S"}])
+    eng.dispose()
+    return u
+
+
+@pytest.fixture
+def writer(url):
+    w = WriteQueue(make_writer_engine(url))
+    yield w
+    w.stop()
+    w.bind.dispose()
+
+
+def _count(url, model=Camera):
+    eng = create_engine(url)
+    try:
+        return sessionmaker(bind=eng)().query(model).count()
+    finally:
+        eng.dispose()
+
+
+def _add_camera(db, ch, **kw):
+    cam = Camera(site_id=1, channel=ch, name=f"CAM{ch}", **kw)
+    db.add(cam)
+    db.flush()
+    return cam
+
+
+def _block(writer):
+    """Occupy the writer until the returned event is set; jobs queued meanwhile form one group."""
+    gate = threading.Event()
+    started = threading.Event()
+
+    def blocker(db):
+        started.set()
+        gate.wait(5)
+
+    fut = writer.submit(blocker)
+    started.wait(5)
+    return gate, fut
+
+
+class TestJobs:
+
+    def test_result_is_detached_and_readable(self, writer, url):
+        cam = writer.call(_add_camera, 1)
+        assert cam.id is not None
+        assert cam.name == "CAM1"
+        assert cam.status_real == "unknown"             # Python-side default filled at flush
+        assert _count(url) == 1
+
+    def test_exception_is_raised_in_caller(self, writer):
+        def boom(db):
+            raise ValueError("nope")
+        with pytest.raises(ValueError):
+            writer.call(boom)
+        assert writer.stats()["failed"] == 1
+
+    @pytest.mark.asyncio
+    async def test_run_from_async(self, writer, url):
+        cam = await writer.run(_add_camera, 7)
+        assert cam.channel == 7
+        assert _count(url) == 1
+
+
+class TestGroupCommit:
+
+    def test_queued_jobs_share_one_commit(self, writer, url):
+        commits = []
+        event.listen(writer.bind, "commit", lambda conn: commits.append(1))
+        gate, first = _block(writer)
+        futures = [writer.submit(_add_camera, ch) for ch in range(1, 21)]
+        gate.set()
+        assert [f.result(5).channel for f in futures] == list(range(1, 21))
+        first.result(5)
+        assert _count(url) == 20
+        assert len(commits) <= 2                        # blocker's group + one for the 20
+        assert writer.stats()["max_group"] == 20
+
+    def test_failing_job_rolls_back_alone(self, writer, url):
+        def half_then_fail(db):
+            _add_camera(db, 99)
+            raise RuntimeError("fail after a write")
+
+        gate, _ = _block(writer)
+        ok1 = writer.submit(_add_camera, 1)
+        bad = writer.submit(half_then_fail)
+        ok2 = writer.submit(_add_camera, 2)
+        gate.set()
+        assert ok1.result(5).channel == 1
+        assert ok2.result(5).channel == 2
+        with pytest.raises(RuntimeError):
+            bad.result(5)
+        assert _count(url) == 2                         # channel 99 was rolled back
+
+    def test_integrity_error_reaches_caller(self, writer, url):
+        writer.call(_add_camera, 1, recorder_id=None)
+        eng = create_engine(url)
+        with eng.begin() as conn:
+            conn.exec_driver_sql("INSERT INTO recorders (id, site_id, name) VALUES (1, 1, 'NVR')")
+        eng.dispose()
+        writer.call(_add_camera, 5, recorder_id=1)
+        with pytest.raises(IntegrityError):
+            writer.call(_add_camera, 5, recorder_id=1)   # same (site, recorder, channel)
+        assert _count(url) == 2
+
+    def test_batch_max_splits_groups(self, url):
+        w = WriteQueue(make_writer_engine(url), batch_max=5)
+        try:
+            gate, _ = _block(w)
+            futures = [w.submit(_add_camera, ch) for ch in range(1, 13)]
+            gate.set()
+            for f in futures:
+                f.result(5)
+            assert w.stats()["groups"] == 1 + 3          # blocker + 5 + 5 + 2
+        finally:
+            w.stop()
+            w.bind.dispose()
+
+
+class TestLifecycle:
+
+    def test_stop_drains_queue(self, writer, url):
+        gate, _ = _block(writer)
+        futures = [writer.submit(_add_camera, ch) for ch in range(1, 6)]
+        threading.Timer(0.05, gate.set).start()
+        writer.stop()
+        assert all(f.done() for f in futures)
+        assert _count(url) == 5
+
+    def test_submit_from_writer_thread_is_rejected(self, writer):
+        def nested(db):
+            return writer.submit(lambda d: None)
+        with pytest.raises(RuntimeError):
+            writer.call(nested)
+
+
+class TestSerialized:
+
+    def test_serialized_writer_excludes_queue(self, writer, url):
+        order = []
+        inside = threading.Event()
+
+        @serialized
+        def direct():
+            inside.set()
+            time.sleep(0.2)
+            order.append("direct")
+
+        t = threading.Thread(target=direct)
+        t.start()
+        inside.wait(5)
+        writer.call(lambda db: order.append("queued"))
+        t.join()
+        assert order == ["direct", "queued"]
+
+    def test_concurrent_writers_never_see_lock_errors(self, writer, url):
+        """Many API writers through the queue + a bulk 'sync' writer on its own
+        connection, with a busy timeout far below the write time."""
+        sync_engine = create_engine(url, connect_args={"timeout": 0.01})
+        errors = []
+
+        def api_client(base):
+            for i in range(25):
+                try:
+                    writer.call(_add_camera, base + i)
+                except Exception as e:
+                    errors.append(e)
+
+        @serialized
+        def sync_commit(n):
+            db = sessionmaker(bind=sync_engine)()
+            try:
+                db.add_all([Camera(site_id=1, channel=10000 + n * 100 + ch, name="S") for ch in range(50)])
+                db.commit()
+            finally:
+                db.close()
+
+        def sync_worker():
+            for n in range(10):
+                try:
+                    sync_commit(n)
+                except Exception as e:
+                    errors.append(e)
+
+        threads = [threading.Thread(target=api_client, args=(k * 1000,)) for k in range(8)]
+        threads.append(threading.Thread(target=sync_worker))
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        sync_engine.dispose()
+
+        assert errors == []
+        assert _count(url) == 8 * 25 + 10 * 50
+        assert writer.stats()["groups"] < 8 * 25          # writes were grouped
@@ -0,0 +1,56 @@
+"""
+Tests for the global database error handlers in main.
+Covers: UNIQUE violations -> 409 naming the key, other integrity errors -> 400.
+"""
+import asyncio
+import json
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import sessionmaker
+from starlette.requests import Request
+
+import main
+from database import Base, Site, Recorder, Camera
+
+
+def _integrity_error(*objs) -> IntegrityError:
+    eng = create_engine("sqlite://")
+    event.listen(eng, "connect", lambda c, r: c.execute("PRAGMA foreign_keys=ON"))
+    Base.metadata.create_all(bind=eng)
+    db = sessionmaker(bind=eng)()
+    db.add_all([Site(id=1, name="A"), Recorder(id=1, site_id=1, name="NVR")])
+    db.commit()
+    try:
+        for o in objs:
+            db.add(o)
+            db.flush()
+    except IntegrityError as e:
+        return e
+    finally:
+        db.close()
+        eng.dispose()
+    raise AssertionError("no IntegrityError")
+
+
+def _handle(exc):
+    req = Request({"type": "http", "method": "POST", "path": "/api/cameras", "headers": [], "query_string": b""})
+    resp = asyncio.run(main.handle_db_integrity_error(req, exc))
+    return resp.status_code, json.loads(resp.body)
+
+
+def test_unique_violation_is_409_with_key():
+    exc = _integrity_error(Camera(site_id=1, recorder_id=1, channel=1), Camera(site_id=1, recorder_id=1, channel=1))
+    status, body = _handle(exc)
+    assert status == 409
+    assert body["key"] == "cameras.site_id, cameras.recorder_id, cameras.channel"
+
+
+def test_foreign_key_violation_is_400():
+    status, body = _handle(_integrity_error(Camera(site_id=99, name="X")))
+    assert status == 400
+    assert "FOREIGN KEY" in body["detail"]
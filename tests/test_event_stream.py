@@ -0,0 +1,156 @@
+"""
+Tests for event_stream module.
+Covers: cursor parsing, fan-out, backpressure (lagged subscriber catches up
+from the DB), Last-Event-ID replay and publishing from sync_site.
+"""
+import json
+import pytest
+import sys
+import os
+
+# Allow importing from parent dir
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+import camera_state
+import event_stream
+import nvr_sync_service
+from database import Base, Site, Recorder, NvrCredential, Camera, CameraEvent, CameraStatusInterval
+from event_stream import EventBus, parse_cursor, sse_stream, event_message
+
+
+@pytest.fixture
+def db(monkeypatch):
+    engine = create_engine("sqlite://", poolclass=StaticPool,
+                           connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine)
+    factory = sessionmaker(bind=engine)
+    monkeypatch.setattr(event_stream, "SessionLocal", factory)
+    session = factory()
+    session.add(Site(id=1, name="Test"))
+    session.add(Camera(id=1, site_id=1, channel=1))
+    session.commit()
+    yield session
+    session.close()
+
+
+def _add_event(db, n):
+    evt = CameraEvent(site_id=1, camera_id=1, channel=1, event_type="status_change",
+                      to_status="offline", severity="crit", message=f"e{n}")
+    db.add(evt)
+    db.commit()
+    return evt
+
+
+async def _never():
+    return False
+
+
+def _parse(frame):
+    fields = dict(line.split(": ", 1) for line in frame.strip().splitlines() if ": " in line)
+    return fields.get("id"), fields.get("event"), json.loads(fields["data"]) if "data" in fields else None
+
+
+class TestCursor:
+
+    def test_parse(self):
+        assert parse_cursor("12-3") == (12, 3)
+        assert parse_cursor("") is None
+        assert parse_cursor("garbage") is None
+
+
+class TestEventBus:
+
+    @pytest.mark.asyncio
+    async def test_fan_out_per_site(self):
+        bus = EventBus()
+        a, b, other = bus.subscribe(1), bus.subscribe(1), bus.subscribe(2)
+        bus.publish(1, [{"type": "sync", "data": {}}])
+        assert a.queue.qsize() == b.queue.qsize() == 1
+        assert other.queue.qsize() == 0
+        bus.unsubscribe(a)
+        assert bus.stats()["subscribers"] == 2
+
+    @pytest.mark.asyncio
+    async def test_overflow_marks_lagged_without_blocking(self):
+        bus = EventBus(queue_size=3)
+        sub = bus.subscribe(1)
+        bus.publish(1, [{"type": "sync", "data": {}}] * 10)
+        assert sub.lagged is True
+        assert sub.queue.qsize() == 1
+        assert sub.queue.get_nowait()["type"] == "_lagged"
+
+
+class TestSseStream:
+
+    @pytest.mark.asyncio
+    async def test_resume_replays_missed_events(self, db):
+        e1, e2, e3 = (_add_event(db, n) for n in range(3))
+        gen = sse_stream(1, f"{e1.id}-0", _never, event_bus=EventBus())
+        frames = [await gen.__anext__() for _ in range(3)]
+        await gen.aclose()
+        ids = [_parse(f)[0] for f in frames[:2]]
+        assert [_parse(f)[2]["message"] for f in frames[:2]] == ["e1", "e2"]
+        assert ids == [f"{e2.id}-0", f"{e3.id}-0"]
+        assert "event: hello" in frames[2]
+
+    @pytest.mark.asyncio
+    async def test_live_then_duplicate_skipped(self, db):
+        bus = EventBus()
+        gen = sse_stream(1, None, _never, event_bus=bus)
+        hello = await gen.__anext__()
+        assert _parse(hello)[0] == "0-0"
+        evt = _add_event(db, 1)
+        msg = event_message(evt)
+        bus.publish(1, [msg, msg])
+        bus.publish(1, [{"type": "sync", "data": {"ok": True}}])
+        frame = await gen.__anext__()
+        assert _parse(frame)[1] == "camera_event"
+        frame = await gen.__anext__()      # duplicate dropped, next is the summary
+        assert _parse(frame)[:2] == (None, "sync")
+        await gen.aclose()
+
+    @pytest.mark.asyncio
+    async def test_lagged_subscriber_catches_up_from_db(self, db):
+        bus = EventBus(queue_size=2)
+        gen = sse_stream(1, None, _never, event_bus=bus)
+        await gen.__anext__()
+        events = [_add_event(db, n) for n in range(5)]
+        bus.publish(1, [event_message(e) for e in events])
+        got = [_parse(await gen.__anext__())[2]["message"] for _ in range(5)]
+        assert got == [f"e{n}" for n in range(5)]
+        await gen.aclose()
+
+
+class TestSyncPublishes:
+
+    @pytest.mark.asyncio
+    async def test_sync_site_publishes_after_commit(self, db, monkeypatch):
+        camera_state.reset()
+        db.query(Camera).delete()
+        db.add(Recorder(id=1, site_id=1, name="NVR"))
+        db.add(NvrCredential(site_id=1, recorder_id=1, ip="10.0.0.250", password_enc="b64:eA=="))
+        db.commit()
+
+        async def fake_rpc(ip, port, user, password):
+            return {"ok": True, "cameras": [{"channel": 1, "name": "C1", "ip": "10.0.0.1"}]}
+
+        async def fake_probe(cameras):
+            return {1: "online"}
+
+        monkeypatch.setattr(nvr_sync_service, "_sync_nvr_rpc", fake_rpc)
+        monkeypatch.setattr(nvr_sync_service, "probe_many", fake_probe)
+        bus = EventBus()
+        monkeypatch.setattr(nvr_sync_service, "event_bus", bus)
+        sub = bus.subscribe(1)
+
+        await nvr_sync_service.sync_site(1, db)
+        msgs = [sub.queue.get_nowait() for _ in range(sub.queue.qsize())]
+        assert [m["type"] for m in msgs] == ["status", "sync"]
+        interval = db.query(CameraStatusInterval).one()
+        assert msgs[0]["interval_id"] == interval.id
+        assert msgs[1]["data"]["ok"] is True
+        camera_state.reset()
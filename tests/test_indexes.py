@@ -0,0 +1,188 @@
+"""
+Tests for the hot-path index set (database models + run_migrations).
+Covers: EXPLAIN QUERY PLAN of the queries behind the site endpoints, sync_site,
+event / sync log listing and site access checks; run_migrations adding the
+indexes to an existing database.
+"""
+import pytest
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, func, select, text
+from sqlalchemy.orm import sessionmaker
+
+import database
+import camera_state
+from database import (
+    Base, Camera, Switch, Router, Recorder, Rack, Building, PatchPanel,
+    CameraEvent, CameraSnapshot, SyncLog, UserSite, NvrCredential,
+)
+from camera_upsert import _cameras, EXISTING_COLUMNS
+
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
+    engine.dispose()
+
+
+def _plan(db, query) -> str:
+    """EXPLAIN QUERY PLAN of an ORM query / Core select, one detail per line."""
+    stmt = getattr(query, "statement", query)
+    compiled = stmt.compile(dialect=db.get_bind().dialect)
+    params = tuple(compiled.params[k] for k in compiled.positiontup)
+    rows = db.connection().exec_driver_sql("EXPLAIN QUERY PLAN " + str(compiled), params).fetchall()
+    return "\n".join(r[-1] for r in rows)
+
+
+def _assert_uses(plan: str, index: str, covering: bool = False, sorted_by_index: bool = True):
+    if covering:
+        assert f"USING COVERING INDEX {index}" in plan, plan
+    else:
+        assert f"INDEX {index}" in plan, plan
+    assert "SCAN" not in plan, plan
+    if sorted_by_index:
+        assert "TEMP B-TREE" not in plan, plan
+
+
+class TestCameraQueries:
+
+    def test_list_by_site_ordered_by_channel(self, db):
+        q = db.query(Camera).filter_by(site_id=1).order_by(Camera.channel)
+        _assert_uses(_plan(db, q), "ix_cameras_site_channel")
+
+    def test_list_filtered_by_status(self, db):
+        q = db.query(Camera).filter_by(site_id=1, status="offline").order_by(Camera.channel)
+        _assert_uses(_plan(db, q), "ix_cameras_site_channel")
+
+    def test_sync_load_per_recorder(self, db):
+        q = select(*[_cameras.c[c] for c in EXISTING_COLUMNS]).where(
+            _cameras.c.site_id == 1, _cameras.c.recorder_id == 2)
+        _assert_uses(_plan(db, q), "ix_cameras_site_recorder")
+
+    def test_sync_match_key(self, db):
+        q = db.query(Camera).filter_by(site_id=1, recorder_id=2, channel=3)
+        plan = _plan(db, q)
+        assert "ix_cameras_site_recorder" in plan or database.UPSERT_KEY_INDEX in plan, plan
+        assert "SCAN" not in plan, plan
+
+    def test_ip_lookup(self, db):
+        q = db.query(Camera.id).filter_by(site_id=1, ip="10.0.0.5")
+        _assert_uses(_plan(db, q), "ix_cameras_site_ip", covering=True)
+
+    def test_state_fingerprint(self, db):
+        c = camera_state._cameras.c
+        q = select(func.count(c.id), func.max(c.updated_at)).where(c.site_id == 1)
+        plan = _plan(db, q)
+        assert "ix_cameras_site" in plan and "SCAN" not in plan, plan
+
+
+class TestSiteChildren:
+
+    @pytest.mark.parametrize("model,index", [
+        (Switch, "ix_switches_site"),
+        (Router, "ix_routers_site"),
+        (Recorder, "ix_recorders_site"),
+        (Rack, "ix_racks_site"),
+        (Building, "ix_buildings_site"),
+        (PatchPanel, "ix_patch_panels_site"),
+        (NvrCredential, "ix_nvr_credentials_site"),
+    ])
+    def test_filter_by_site(self, db, model, index):
+        _assert_uses(_plan(db, db.query(model).filter_by(site_id=1)), index)
+
+    def test_count_by_site_is_covered(self, db):
+        _assert_uses(_plan(db, db.query(Switch).filter_by(site_id=1).with_entities(Switch.id)),
+                     "ix_switches_site", covering=True)
+
+
+class TestListings:
+
+    def test_events_newest_first(self, db):
+        q = db.query(CameraEvent).filter_by(site_id=1).order_by(CameraEvent.created_at.desc()).limit(100)
+        _assert_uses(_plan(db, q), "ix_events_site_created")
+
+    def test_events_by_severity_newest_first(self, db):
+        q = db.query(CameraEvent).filter_by(site_id=1, severity="crit").order_by(
+            CameraEvent.created_at.desc()).limit(100)
+        _assert_uses(_plan(db, q), "ix_events_site_created")
+
+    def test_event_counts_in_window_are_covered(self, db):
+        q = db.query(CameraEvent.severity, func.count(CameraEvent.id)).filter(
+            CameraEvent.site_id == 1, CameraEvent.created_at >= "2026-01-01",
+        ).group_by(CameraEvent.severity)
+        _assert_uses(_plan(db, q), "ix_events_site_created", covering=True, sorted_by_index=False)
+
+    def test_sync_logs_newest_first(self, db):
+        q = db.query(SyncLog).filter_by(site_id=1).order_by(SyncLog.created_at.desc()).limit(50)
+        _assert_uses(_plan(db, q), "ix_sync_logs_site_created")
+
+    def test_user_sites_is_covered(self, db):
+        q = db.query(UserSite).filter_by(user_id=1)
+        _assert_uses(_plan(db, q), "ix_user_sites_user_site", covering=True)
+
+    def test_site_access_check_is_covered(self, db):
+        q = db.query(UserSite).filter_by(user_id=1, site_id=2)
+        _assert_uses(_plan(db, q), "ix_user_sites_user_site", covering=True)
+
+
+class TestSnapshots:
+
+    def test_latest_for_site(self, db):
+        q = db.query(CameraSnapshot).filter_by(site_id=1).order_by(CameraSnapshot.id.desc()).limit(1)
+        _assert_uses(_plan(db, q), "ix_snapshots_site")
+
+    def test_by_run_id(self, db):
+        q = db.query(CameraSnapshot).filter_by(site_id=1, run_id="abc")
+        plan = _plan(db, q)
+        assert "ix_snapshots_run" in plan or "ix_snapshots_site" in plan, plan
+        assert "SCAN" not in plan, plan
+
+    def test_keyframe_chain(self, db):
+        q = db.query(CameraSnapshot).filter(
+            (CameraSnapshot.id == 5) |
+            ((CameraSnapshot.keyframe_id == 5) & (CameraSnapshot.id <= 9))
+        ).order_by(CameraSnapshot.id)
+        plan = _plan(db, q)
+        assert "ix_snapshots_keyframe" in plan, plan
+        assert "SCAN camera_snapshots" not in plan, plan
+
+
+class TestMigration:
+
+    @pytest.fixture
+    def old_engine(self, tmp_path, monkeypatch):
+        """A file DB created before the index set: tables only."""
+        eng = create_engine(f"sqlite:///{tmp_path / 'old.db'}")
+        Base.metadata.create_all(bind=eng)
+        with eng.begin() as conn:
+            for (name,) in conn.execute(text(
+                    "SELECT name FROM sqlite_master WHERE type='index' AND name LIKE 'ix\\_%' ESCAPE '\\'"
+            )).fetchall():
+                conn.execute(text(f"DROP INDEX {name}"))
+        monkeypatch.setattr(database, "engine", eng)
+        yield eng
+        eng.dispose()
+
+    def _indexes(self, eng):
+        with eng.connect() as conn:
+            return {n for (n,) in conn.execute(text(
+                "SELECT name FROM sqlite_master WHERE type='index'")).fetchall()}
+
+    def test_adds_missing_indexes(self, old_engine):
+        assert "ix_events_site_created" not in self._indexes(old_engine)
+        database.run_migrations()
+        declared = {i.name for t in Base.metadata.sorted_tables for i in t.indexes}
+        assert declared <= self._indexes(old_engine)
+
+    def test_idempotent(self, old_engine):
+        database.run_migrations()
+        before = self._indexes(old_engine)
+        database.run_migrations()
+        assert self._indexes(old_engine) == before
@@ -0,0 +1,171 @@
+"""
+Tests for the versioned schema migrations (database.run_migrations).
+Covers: new database stamped without running steps, pre-versioning database
+upgraded in place, one-SELECT fast path, rollback of a failing upgrade,
+concurrent starters, cached check_schema_ok.
+"""
+import pytest
+import threading
+import time
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, event, text
+
+import database
+from database import Base, run_migrations, check_schema_ok, latest_version, schema_version
+
+
+@pytest.fixture
+def db_url(tmp_path):
+    return f"sqlite:///{tmp_path / 'nm.db'}"
+
+
+@pytest.fixture
+def eng(db_url, monkeypatch):
+    e = create_engine(db_url)
+    monkeypatch.setattr(database, "engine", e)
+    monkeypatch.setattr(database, "_schema_status", None)
+    yield e
+    e.dispose()
+
+
+def _legacy(e):
+    """A database from before versioning: older columns and tables, one camera."""
+    Base.metadata.create_all(bind=e)
+    with e.begin() as conn:
+        conn.execute(text("DROP TABLE schema_version"))
+        conn.execute(text("DROP TABLE camera_status_intervals"))
+        conn.execute(text("DROP INDEX ix_events_site_created"))
+        conn.execute(text("ALTER TABLE sync_logs DROP COLUMN stage_timings_json"))
+        conn.execute(text("ALTER TABLE sync_logs DROP COLUMN cameras_skipped"))
+        conn.execute(text("ALTER TABLE cameras DROP COLUMN offline_streak"))
+        conn.execute(text("INSERT INTO sites (id, name) VALUES (1, 'S')"))
+        conn.execute(text("INSERT INTO cameras (site_id, channel, status_real) VALUES (1, 1, 'online')"))
+
+
+def _columns(e, table):
+    with e.connect() as conn:
+        return {r[1] for r in conn.execute(text(f"PRAGMA table_info({table})"))}
+
+
+def _version(e):
+    with e.connect() as conn:
+        return schema_version(conn)
+
+
+class TestUpgrade:
+
+    def test_new_database_is_stamped(self, eng, monkeypatch):
+        ran = []
+        monkeypatch.setattr(database, "MIGRATIONS",
+                            [(n, name, lambda conn, n=n: ran.append(n)) for n, name, _ in database.MIGRATIONS])
+        status = run_migrations()
+        assert status["ok"] is True
+        assert _version(eng) == latest_version()
+        assert ran == []                                   # create_all built the current schema
+        assert "stage_timings_json" in _columns(eng, "sync_logs")
+
+    def test_pre_versioning_database(self, eng):
+        _legacy(eng)
+        assert _version(eng) is None
+        status = run_migrations()
+        assert status == {"ok": True, "missing": [], "version": latest_version(), "expected": latest_version()}
+        assert {"stage_timings_json", "cameras_skipped"} <= _columns(eng, "sync_logs")
+        assert "offline_streak" in _columns(eng, "cameras")
+        with eng.connect() as conn:
+            assert conn.execute(text("SELECT COUNT(*) FROM camera_status_intervals")).scalar() == 1
+            assert conn.execute(text(
+                "SELECT 1 FROM sqlite_master WHERE name='ix_events_site_created'")).scalar() == 1
+            applied = [n for (n,) in conn.execute(text("SELECT version FROM schema_version ORDER BY version"))]
+        assert applied == [n for n, _, _ in database.MIGRATIONS]
+
+    def test_only_pending_steps_run(self, eng, monkeypatch):
+        run_migrations()
+        ran = []
+        monkeypatch.setattr(database, "MIGRATIONS", database.MIGRATIONS + [
+            (latest_version() + 1, "extra", lambda conn: ran.append("extra")),
+        ])
+        run_migrations()
+        assert ran == ["extra"]
+        assert _version(eng) == latest_version()
+
+    def test_up_to_date_costs_one_select(self, eng):
+        run_migrations()
+        statements = []
+        event.listen(eng, "before_cursor_execute", lambda *a: statements.append(a[2]))
+        run_migrations()
+        assert len(statements) == 2                        # schema_version exists? + MAX(version)
+        assert "MAX(version)" in statements[-1]
+
+    def test_failing_step_rolls_back_everything(self, eng, monkeypatch):
+        _legacy(eng)
+
+        def boom(conn):
+            raise RuntimeError("bad migration")
+
+        monkeypatch.setattr(database, "MIGRATIONS", database.MIGRATIONS + [(99, "boom", boom)])
+        with pytest.raises(RuntimeError):
+            run_migrations()
+        assert _version(eng) is None
+        assert "stage_timings_json" not in _columns(eng, "sync_logs")
+        assert _columns(eng, "camera_status_intervals") == set()    # CREATE TABLE undone too
+
+
+class TestConcurrentStartup:
+
+    def test_one_process_migrates_the_others_wait(self, db_url, eng, monkeypatch):
+        _legacy(eng)
+        calls = []
+
+        def slow(conn):
+            calls.append(threading.current_thread().name)
+            time.sleep(0.3)
+
+        monkeypatch.setattr(database, "MIGRATIONS", database.MIGRATIONS + [(latest_version() + 1, "slow", slow)])
+        engines = [create_engine(db_url) for _ in range(3)]     # one per "worker process"
+        results, errors = [], []
+
+        def start(e):
+            try:
+                results.append(run_migrations(bind=e))
+            except Exception as ex:
+                errors.append(ex)
+
+        threads = [threading.Thread(target=start, args=(e,)) for e in engines]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        for e in engines:
+            e.dispose()
+
+        assert errors == []
+        assert len(calls) == 1
+        assert all(r["ok"] for r in results)
+        assert _version(eng) == latest_version()
+
+
+class TestCheckSchemaOk:
+
+    def test_reads_cached_status(self, eng):
+        run_migrations()
+        statements = []
+        event.listen(eng, "before_cursor_execute", lambda *a: statements.append(a[2]))
+        assert check_schema_ok()["ok"] is True
+        assert statements == []
+
+    def test_reports_pending_migrations(self, eng):
+        _legacy(eng)
+        status = check_schema_ok()
+        assert status["ok"] is False
+        assert status["version"] == 0
+        assert status["missing"][0].startswith("migration 001_")
+
+    def test_refresh_rereads_version(self, eng, monkeypatch):
+        run_migrations()
+        monkeypatch.setattr(database, "MIGRATIONS", database.MIGRATIONS + [(latest_version() + 1, "x", lambda c: None)])
+        assert check_schema_ok()["ok"] is True
+        assert check_schema_ok(refresh=True)["ok"] is False
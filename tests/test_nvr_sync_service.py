@@ -1,22 +1,48 @@
 """
 Tests for nvr_sync_service module.
-Covers: SyncRunResult, _detect_inventory_changes, anti-jitter logic.
+Covers: SyncRunResult, _detect_inventory_changes, anti-jitter logic, event dedup,
+sync_site end-to-end (NVR RPC + probe stubbed).
 """
 import pytest
 import json
 import sys
 import os
+from datetime import datetime, timedelta
 
 # Allow importing from parent dir
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+
+import nvr_sync_service
+import camera_state
+import camera_upsert
+from database import Base, Site, Recorder, NvrCredential, Camera, CameraEvent, SyncLog, UPSERT_KEY_INDEX
 from nvr_sync_service import (
+    sync_site,
     SyncRunResult,
     _detect_inventory_changes,
+    _filter_duplicate_events,
+    _load_recent_event_keys,
     OFFLINE_STRIKES_THRESHOLD,
+    EVENT_DEDUP_WINDOW_S,
 )
 
 
+@pytest.fixture
+def db():
+    """Fresh in-memory SQLite session with all tables."""
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(bind=engine)()
+    session.add(Site(id=1, name="Test"))
+    session.commit()
+    yield session
+    session.close()
+    engine.dispose()
+
+
 # ============================================
 # SyncRunResult
 # ============================================
@@ -234,3 +260,169 @@ class TestAntiJitterLogic:
 
         assert current_status == "offline"
         assert offline_streak == 3
+
+
+# ============================================
+# Event deduplication
+# ============================================
+class TestEventDedup:
+    """Set-based dedup of generated events."""
+
+    def _evt(self, ch, event_type="status_change", to_status="offline", created_at=None, severity="crit"):
+        return CameraEvent(site_id=1, channel=ch, event_type=event_type,
+                           to_status=to_status, severity=severity, created_at=created_at)
+
+    def test_window_is_five_minutes_by_default(self):
+        assert EVENT_DEDUP_WINDOW_S == 300
+
+    def test_known_key_is_dropped(self):
+        kept = _filter_duplicate_events([self._evt(1)], {(1, "status_change", "offline", "crit")})
+        assert kept == []
+
+    def test_different_to_status_is_kept(self):
+        kept = _filter_duplicate_events([self._evt(1, to_status="online")],
+                                        {(1, "status_change", "offline", "crit")})
+        assert len(kept) == 1
+
+    def test_crit_after_first_strike_warn_is_kept(self):
+        kept = _filter_duplicate_events([self._evt(1)], {(1, "status_change", "offline", "warn")})
+        assert len(kept) == 1
+
+    def test_duplicates_within_batch_are_dropped(self):
+        kept = _filter_duplicate_events([self._evt(3), self._evt(3), self._evt(4)], set())
+        assert [e.channel for e in kept] == [3, 4]
+
+    def test_load_recent_keys_respects_window(self, db):
+        now = datetime.utcnow()
+        db.add_all([
+            self._evt(1, created_at=now - timedelta(minutes=2)),
+            self._evt(2, created_at=now - timedelta(minutes=10)),
+        ])
+        db.commit()
+        keys = _load_recent_event_keys(db, 1, now - timedelta(minutes=5))
+        assert keys == {(1, "status_change", "offline", "crit")}
+
+    def test_load_recent_keys_across_hour_boundary(self, db):
+        """Window must span the hour boundary (e.g. 10:02 looks back to 09:57)."""
+        now = datetime(2024, 1, 1, 10, 2)
+        db.add(self._evt(7, created_at=datetime(2024, 1, 1, 9, 58)))
+        db.commit()
+        keys = _load_recent_event_keys(db, 1, now - timedelta(seconds=EVENT_DEDUP_WINDOW_S))
+        assert (7, "status_change", "offline", "crit") in keys
+
+
+# ============================================
+# sync_site end-to-end (stubbed NVR + probe)
+# ============================================
+def _nvr_cams(n):
+    return [{"channel": ch, "name": f"CAM{ch}", "ip": f"10.0.0.{ch}",
+             "mac": "", "model": "M", "serial": ""} for ch in range(1, n + 1)]
+
+
+@pytest.fixture(autouse=True)
+def _fresh_camera_state():
+    camera_state.reset()
+    yield
+    camera_state.reset()
+
+
+@pytest.fixture
+def site_with_nvr(db, monkeypatch):
+    """Site 1 with recorder 1 and an active credential; returns a probe-status dict to mutate."""
+    db.add(Recorder(id=1, site_id=1, name="NVR"))
+    db.add(NvrCredential(site_id=1, recorder_id=1, ip="10.0.0.250", password_enc="b64:eA=="))
+    db.commit()
+    inventory = _nvr_cams(4)
+    status = {ch: "online" for ch in range(1, 5)}
+
+    async def fake_rpc(ip, port, user, password):
+        return {"ok": True, "cameras": inventory}
+
+    async def fake_probe(cameras):
+        return dict(status)
+
+    monkeypatch.setattr(nvr_sync_service, "_sync_nvr_rpc", fake_rpc)
+    monkeypatch.setattr(nvr_sync_service, "probe_many", fake_probe)
+    return {"inventory": inventory, "status": status}
+
+
+class TestSyncSite:
+
+    @pytest.mark.asyncio
+    async def test_first_run_adds_cameras(self, db, site_with_nvr):
+        r = await sync_site(1, db)
+        assert r.ok is True
+        assert r.added == 4
+        assert db.query(Camera).filter_by(site_id=1, recorder_id=1).count() == 4
+
+    @pytest.mark.asyncio
+    async def test_second_run_updates_in_place(self, db, site_with_nvr):
+        await sync_site(1, db)
+        site_with_nvr["inventory"][0]["name"] = "RENAMED"
+        r = await sync_site(1, db)
+        assert r.added == 0
+        assert r.updated == 4
+        assert r.inventory_changes == 1
+        assert db.query(Camera).count() == 4
+        assert db.query(Camera).filter_by(channel=1).one().name == "RENAMED"
+
+    @pytest.mark.asyncio
+    async def test_without_upsert_key_does_not_duplicate(self, db, site_with_nvr, monkeypatch):
+        db.execute(text(f"DROP INDEX {UPSERT_KEY_INDEX}"))     # migration 002 found duplicates
+        db.commit()
+        monkeypatch.setattr(camera_upsert, "_upsert_key_ok", False)
+        await sync_site(1, db)
+        site_with_nvr["inventory"][0]["name"] = "RENAMED"
+        camera_state.reset()                                   # reload from the database
+        r = await sync_site(1, db)
+        assert r.added == 0
+        assert db.query(Camera).count() == 4
+        assert db.query(Camera).filter_by(channel=1).one().name == "RENAMED"
+
+    @pytest.mark.asyncio
+    async def test_unchanged_cameras_are_not_rewritten(self, db, site_with_nvr):
+        await sync_site(1, db)
+        stamps = {c.id: c.updated_at for c in db.query(Camera)}
+        site_with_nvr["inventory"][0]["name"] = "RENAMED"
+        r = await sync_site(1, db)
+        assert r.skipped_writes == 3
+        db.expire_all()
+        changed = [c.channel for c in db.query(Camera) if c.updated_at != stamps[c.id]]
+        assert changed == [1]
+        log = db.query(SyncLog).order_by(SyncLog.id.desc()).first()
+        assert log.cameras_skipped == 3
+
+        r = await sync_site(1, db)
+        assert r.skipped_writes == 4
+
+    @pytest.mark.asyncio
+    async def test_offline_needs_two_strikes(self, db, site_with_nvr):
+        await sync_site(1, db)
+        site_with_nvr["status"][2] = "offline"
+        await sync_site(1, db)
+        cam = db.query(Camera).filter_by(channel=2).one()
+        assert cam.status_real == "online"
+        # first strike is not a transition — kept in the in-memory state only
+        assert camera_state._states[1].rows[cam.id]["offline_streak"] == 1
+        await sync_site(1, db)
+        db.expire_all()
+        cam = db.query(Camera).filter_by(channel=2).one()
+        assert cam.status_real == "offline"
+        assert cam.offline_streak == 2
+
+    @pytest.mark.asyncio
+    async def test_crit_offline_not_swallowed_by_first_strike_warn(self, db, site_with_nvr):
+        await sync_site(1, db)
+        site_with_nvr["status"][2] = "offline"
+        await sync_site(1, db)                       # first strike: warn offline
+        await sync_site(1, db)                       # second strike, inside the dedup window: crit offline
+        events = db.query(CameraEvent).filter_by(channel=2, to_status="offline").order_by(CameraEvent.id).all()
+        assert [e.severity for e in events] == ["warn", "crit"]
+        await sync_site(1, db)                       # still offline — no repeat
+        assert db.query(CameraEvent).filter_by(channel=2, to_status="offline").count() == 2
+
+    @pytest.mark.asyncio
+    async def test_no_credentials(self, db):
+        r = await sync_site(1, db)
+        assert r.ok is False
+        assert r.error_code == "NO_CREDENTIALS"
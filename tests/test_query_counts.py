@@ -0,0 +1,139 @@
+"""
+Query counts of the site / user listing endpoints and auth helpers.
+Each endpoint is called at several data sizes and must issue the same
+number of statements (no per-row query). Also checks the utility itself
+catches an N+1.
+"""
+import pytest
+import sys
+import os
+from typing import List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pydantic import TypeAdapter
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+import main
+from auth import get_user_site_ids, check_site_access
+from database import Base, Site, User, UserSite, Recorder, Rack, Camera
+from schemas import RecorderOut
+from tests.query_count import count_queries, assert_constant_queries
+
+
+@pytest.fixture
+def engine():
+    eng = create_engine("sqlite://")
+    event.listen(eng, "connect", lambda c, r: c.execute("PRAGMA foreign_keys=ON"))
+    Base.metadata.create_all(bind=eng)
+    yield eng
+    eng.dispose()
+
+
+@pytest.fixture
+def db(engine):
+    session = sessionmaker(bind=engine)()
+    session.add_all([User(id=1, username="admin", password_hash="x", role="admin"),
+                     User(id=2, username="viewer", password_hash="x", role="viewer")])
+    session.commit()
+    yield session
+    session.close()
+
+
+def _grow_sites(db, viewer_sites=True):
+    def grow(n):
+        for sid in range(db.query(Site).count() + 1, n + 1):
+            db.add(Site(id=sid, name=f"S{sid}"))
+            db.add_all([Recorder(id=sid, site_id=sid, name=f"NVR{sid}",
+                                 nics=[{"label": "LAN", "ip": f"10.0.{sid}.1"}], disks=[{"size": "4TB"}]),
+                        Rack(site_id=sid, name=f"R{sid}")])
+            db.flush()
+            db.add_all([Camera(site_id=sid, recorder_id=sid, channel=ch) for ch in range(1, sid + 1)])
+            if viewer_sites:
+                db.add(UserSite(user_id=2, site_id=sid))
+        db.commit()
+    return grow
+
+
+class TestEndpoints:
+
+    @pytest.mark.parametrize("user_id", [1, 2])
+    def test_list_sites(self, engine, db, user_id):
+        user = db.get(User, user_id)
+        assert_constant_queries(engine, lambda: main.list_sites(user, db), _grow_sites(db))
+        assert len(main.list_sites(user, db)) == 25
+
+    def test_list_users(self, engine, db):
+        admin = db.get(User, 1)
+
+        def grow(n):
+            _grow_sites(db, viewer_sites=False)(5)
+            for uid in range(db.query(User).count() + 1, n + 3):
+                db.add(User(id=uid, username=f"u{uid}", password_hash="x"))
+                db.add_all([UserSite(user_id=uid, site_id=s) for s in (1, 2, 3)])
+            db.commit()
+            db.expire_all()
+
+        assert assert_constant_queries(engine, lambda: main.list_users(admin, db), grow) == 2
+        assert main.list_users(admin, db)[-1].site_ids == [1, 2, 3]
+
+    @pytest.mark.parametrize("user_id", [1, 2])
+    def test_auth_helpers(self, engine, db, user_id):
+        user = db.get(User, user_id)
+
+        def run():
+            get_user_site_ids(user, db)
+            check_site_access(user, 1, db)
+
+        assert_constant_queries(engine, run, _grow_sites(db))
+
+    def test_recorders_and_full_export(self, engine, db):
+        user = db.get(User, 1)
+        grow = _grow_sites(db)
+        grow(1)
+
+        def run():
+            db.expire_all()
+            TypeAdapter(List[RecorderOut]).validate_python(main.list_recorders(1, user, db))
+            main.get_site_full(1, user, db)
+
+        def grow_site1(n):                          # more recorders on the same site
+            for i in range(db.query(Recorder).filter_by(site_id=1).count(), n):
+                db.add(Recorder(site_id=1, name=f"X{i}", nics=[{"ip": f"10.9.0.{i}"}], disks=[{"size": "1TB"}] * 2))
+            db.commit()
+
+        assert_constant_queries(engine, run, grow_site1)
+
+    def test_dashboard_and_segments(self, engine, db):
+        user = db.get(User, 1)
+        grow = _grow_sites(db)
+
+        def run():
+            main.get_dashboard(1, user, db)
+            main.get_network_segments(1, user, db)
+
+        def grow_site1(n):
+            grow(1)
+            db.add_all([Camera(site_id=1, channel=100 + i, ip=f"10.0.1.{i}") for i in range(n)])
+            db.commit()
+
+        assert_constant_queries(engine, run, grow_site1)
+
+
+class TestUtility:
+
+    def test_detects_n_plus_one(self, engine, db):
+        grow = _grow_sites(db)
+
+        def per_site():
+            for s in db.query(Site).all():
+                db.query(Camera).filter_by(site_id=s.id).count()
+
+        with pytest.raises(pytest.fail.Exception, match="grows with data size"):
+            assert_constant_queries(engine, per_site, grow)
+
+    def test_count_queries(self, engine, db):
+        with count_queries(engine) as stmts:
+            db.query(Site).count()
+        assert len(stmts) == 1 and "count" in stmts[0].lower()
@@ -0,0 +1,116 @@
+"""
+Tests for recorder NIC / disk child tables.
+Covers: disk size parsing, list assignment from dicts, capacity on edit,
+cascade on recorder delete, SQL aggregates, migration from the JSON columns.
+"""
+import pytest
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, event, func, text
+from sqlalchemy.orm import sessionmaker
+
+import database
+from database import Base, Site, Recorder, RecorderNic, RecorderDisk, disk_capacity_gb
+from schemas import RecorderOut
+
+
+@pytest.fixture
+def db():
+    eng = create_engine("sqlite://")
+    event.listen(eng, "connect", lambda c, r: c.execute("PRAGMA foreign_keys=ON"))
+    Base.metadata.create_all(bind=eng)
+    session = sessionmaker(bind=eng)()
+    session.add(Site(id=1, name="A"))
+    session.commit()
+    yield session
+    session.close()
+    eng.dispose()
+
+
+def _recorder(db, **kw):
+    rec = Recorder(site_id=1, name="NVR", **kw)
+    db.add(rec)
+    db.commit()
+    return rec
+
+
+class TestCapacity:
+
+    @pytest.mark.parametrize("size,gb", [
+        ("4TB", 4000), ("4 tb", 4000), ("3,5TB", 3500), ("2.5T", 2500),
+        ("500GB", 500), ("500 G", 500), ("", None), ("4", None), ("big", None), (None, None),
+    ])
+    def test_parse(self, size, gb):
+        assert disk_capacity_gb(size) == gb
+
+    def test_capacity_follows_size(self, db):
+        rec = _recorder(db, disks=[{"size": "2TB", "status": "ok"}])
+        rec.disks[0].size = "6TB"
+        db.commit()
+        assert db.query(RecorderDisk.capacity_gb).scalar() == 6000
+
+
+class TestChildRows:
+
+    def test_dicts_round_trip(self, db):
+        nics = [{"label": "NIC1", "ip": "192.168.1.250"}, {"label": "NIC2", "ip": "10.1.1.200"}]
+        disks = [{"size": "4TB", "status": "ok"}, {"size": "500GB", "status": "degraded"}]
+        rec = _recorder(db, nics=nics, disks=disks)
+        out = RecorderOut.model_validate(rec)
+        assert [n.model_dump() for n in out.nics] == nics
+        assert [d.model_dump() for d in out.disks] == disks
+
+    def test_assignment_replaces(self, db):
+        rec = _recorder(db, nics=[{"label": "a", "ip": "10.0.0.1"}], disks=[{"size": "1TB"}] * 3)
+        rec.nics = [{"label": "b", "ip": "10.0.0.2"}]
+        rec.disks = []
+        db.commit()
+        assert db.query(RecorderNic.label, RecorderNic.ip).all() == [("b", "10.0.0.2")]
+        assert db.query(RecorderDisk).count() == 0
+
+    def test_recorder_delete_cascades(self, db):
+        rec = _recorder(db, nics=[{"ip": "10.0.0.1"}], disks=[{"size": "1TB"}])
+        db.execute(text("DELETE FROM recorders WHERE id = :id"), {"id": rec.id})
+        db.commit()
+        assert db.query(RecorderNic).count() == 0 and db.query(RecorderDisk).count() == 0
+
+    def test_aggregates(self, db):
+        _recorder(db, disks=[{"size": "4TB"}, {"size": "4TB", "status": "degraded"}])
+        _recorder(db, disks=[{"size": "500GB", "status": "failed"}, {"size": "?"}])
+        total, bad = db.query(func.sum(RecorderDisk.capacity_gb),
+                              func.count().filter(RecorderDisk.status != "ok")).one()
+        assert (total, bad) == (8500, 2)
+
+
+class TestMigration:
+
+    def test_moves_json_to_tables(self, tmp_path, monkeypatch):
+        eng = create_engine(f"sqlite:///{tmp_path / 'nm.db'}")
+        monkeypatch.setattr(database, "engine", eng)
+        monkeypatch.setattr(database, "_schema_status", None)
+        database.run_migrations()
+        with eng.begin() as conn:                       # back to the version 5 shape
+            conn.execute(text("DROP TABLE recorder_nics"))
+            conn.execute(text("DROP TABLE recorder_disks"))
+            conn.execute(text("ALTER TABLE recorders ADD COLUMN nics JSON"))
+            conn.execute(text("ALTER TABLE recorders ADD COLUMN disks JSON"))
+            conn.execute(text("DELETE FROM schema_version WHERE version >= 6"))
+            conn.execute(text("INSERT INTO sites (id, name) VALUES (1, 'S')"))
+            conn.execute(text(
+                "INSERT INTO recorders (id, site_id, name, nics, disks) VALUES "
+                "(1, 1, 'A', '[{\"label\": \"LAN\", \"ip\": \"10.1.1.201\"}]', "
+                "'[{\"size\": \"2TB\", \"status\": \"ok\"}, {\"size\": \"2TB\", \"status\": \"degraded\"}]'), "
+                "(2, 1, 'B', NULL, 'not json')"))
+        assert database.run_migrations()["ok"]
+
+        db = sessionmaker(bind=eng)()
+        assert db.query(RecorderNic.recorder_id, RecorderNic.label, RecorderNic.ip).all() == [(1, "LAN", "10.1.1.201")]
+        assert db.query(RecorderDisk.capacity_gb, RecorderDisk.status).all() == [(2000, "ok"), (2000, "degraded")]
+        with eng.connect() as conn:
+            assert not database._table_has_column(conn, "recorders", "nics")
+        assert db.get(Recorder, 2).disks == []
+        db.close()
+        eng.dispose()
@@ -0,0 +1,138 @@
+"""
+Tests for retention module.
+Covers: batched pruning of sync_logs / camera_events / camera_snapshots,
+hourly + daily rollups (hourly pruned, daily kept), keyframe-group safety
+for snapshots.
+"""
+import pytest
+import sys
+import os
+from datetime import datetime, timedelta
+
+# Allow importing from parent dir
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+import snapshot_store
+from database import (
+    Base, Site, NvrCredential, SyncLog, CameraEvent, CameraSnapshot, MonitoringRollup,
+)
+from retention import (
+    prune_sync_logs,
+    prune_camera_events,
+    prune_camera_snapshots,
+    prune_hourly_rollups,
+    run_retention,
+)
+from snapshot_store import save_snapshot, load_snapshot
+
+NOW = datetime(2024, 6, 1, 12, 0)
+OLD = datetime(2024, 5, 1, 10, 15)
+
+
+@pytest.fixture
+def db(monkeypatch):
+    monkeypatch.setattr(snapshot_store, "_last", {})
+    monkeypatch.setattr(snapshot_store, "SNAPSHOT_KEYFRAME_EVERY", 3)
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(bind=engine)()
+    session.add(Site(id=1, name="Test"))
+    session.add(NvrCredential(id=1, site_id=1, ip="10.0.0.1"))
+    session.commit()
+    yield session
+    session.close()
+    engine.dispose()
+
+
+def _rollup(db, period, bucket):
+    return db.query(MonitoringRollup).filter_by(site_id=1, period=period, bucket_start=bucket).one()
+
+
+class TestSyncLogs:
+
+    def test_old_rows_rolled_up_and_deleted(self, db):
+        for i, (status, online) in enumerate([("ok", 10), ("ok", 8), ("error", 0)]):
+            db.add(SyncLog(credential_id=1, site_id=1, status=status, cameras_online=online,
+                           cameras_offline=2, created_at=OLD + timedelta(minutes=i)))
+        db.add(SyncLog(credential_id=1, site_id=1, status="ok", created_at=NOW))
+        db.commit()
+
+        assert prune_sync_logs(db, NOW - timedelta(days=7)) == 3
+        assert db.query(SyncLog).count() == 1
+        hour = _rollup(db, "hour", datetime(2024, 5, 1, 10))
+        assert hour.sync_runs == 3
+        assert hour.sync_errors == 1
+        assert hour.cameras_online_sum == 18
+        assert hour.cameras_online_min == 8
+        assert _rollup(db, "day", datetime(2024, 5, 1)).sync_runs == 3
+
+    def test_batches_accumulate_into_same_bucket(self, db):
+        for i in range(5):
+            db.add(SyncLog(credential_id=1, site_id=1, status="ok", cameras_online=10 - i,
+                           created_at=OLD + timedelta(minutes=i)))
+        db.commit()
+        assert prune_sync_logs(db, NOW, batch=2) == 2
+        assert prune_sync_logs(db, NOW, batch=2) == 2
+        assert prune_sync_logs(db, NOW, batch=2) == 1
+        hour = _rollup(db, "hour", datetime(2024, 5, 1, 10))
+        assert hour.sync_runs == 5
+        assert hour.cameras_online_min == 6
+
+
+class TestEvents:
+
+    def test_counts_by_severity(self, db):
+        for sev in ("info", "crit", "crit", "warn"):
+            db.add(CameraEvent(site_id=1, severity=sev, created_at=OLD))
+        db.commit()
+        assert prune_camera_events(db, NOW) == 4
+        hour = _rollup(db, "hour", datetime(2024, 5, 1, 10))
+        assert (hour.events_total, hour.events_info, hour.events_warn, hour.events_crit) == (4, 1, 1, 2)
+
+
+class TestSnapshots:
+
+    def _snap(self, db, run_id, when):
+        snap = save_snapshot(db, 1, run_id, [{"channel": 1, "status_real": run_id}])
+        snap.collected_at = when
+        db.commit()
+
+    def test_group_straddling_cutoff_is_kept(self, db):
+        # group A: r0..r2 (all old), group B: r3 (old), r4 (new)
+        for i in range(4):
+            self._snap(db, f"r{i}", OLD + timedelta(minutes=i))
+        self._snap(db, "r4", NOW)
+        assert prune_camera_snapshots(db, NOW - timedelta(days=7)) == 3
+        assert {s.run_id for s in db.query(CameraSnapshot)} == {"r3", "r4"}
+        assert load_snapshot(db, "r4") == [{"channel": 1, "status_real": "r4"}]
+        assert _rollup(db, "hour", datetime(2024, 5, 1, 10)).snapshots == 3
+
+
+class TestRollups:
+
+    def test_prune_hourly_keeps_daily(self, db):
+        cutoff = NOW - timedelta(days=90)
+        db.add_all([MonitoringRollup(site_id=1, period="hour", bucket_start=cutoff - timedelta(hours=1)),
+                    MonitoringRollup(site_id=1, period="hour", bucket_start=cutoff),
+                    MonitoringRollup(site_id=1, period="day", bucket_start=cutoff - timedelta(days=30))])
+        db.commit()
+        assert prune_hourly_rollups(db, cutoff) == 1
+        left = db.query(MonitoringRollup.period, MonitoringRollup.bucket_start).order_by(MonitoringRollup.period).all()
+        assert left == [("day", cutoff - timedelta(days=30)), ("hour", cutoff)]
+
+
+class TestRunRetention:
+
+    def test_full_pass(self, db):
+        db.add(SyncLog(credential_id=1, site_id=1, status="ok", created_at=OLD))
+        db.add(CameraEvent(site_id=1, created_at=NOW - timedelta(days=100)))
+        db.add(MonitoringRollup(site_id=1, period="hour", bucket_start=NOW - timedelta(days=400)))
+        db.commit()
+        stats = run_retention(db, now=NOW, batch=10, vacuum=False)
+        assert stats["sync_logs"] == 1
+        assert stats["camera_events"] == 1
+        assert stats["hourly_rollups"] == 1
+        assert db.query(MonitoringRollup).filter_by(period="day").count() == 2
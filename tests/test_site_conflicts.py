@@ -0,0 +1,200 @@
+"""
+Tests for site_conflicts module (conflict index).
+Covers: same result as rebuilding the maps over all cameras (after edits,
+deletes and bulk sync upserts), conflicts introduced by a write, partial
+index use, migration backfill.
+"""
+import random
+import pytest
+import sys
+import os
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.orm import sessionmaker
+
+import database
+from database import Base, Site, Recorder, Switch, PatchPanel, Camera
+from camera_upsert import upsert_cameras, INSERT_FIELDS
+from site_conflicts import validate, introduced, camera_keys
+
+
+@pytest.fixture
+def db():
+    eng = create_engine("sqlite://")
+    event.listen(eng, "connect", lambda c, r: c.execute("PRAGMA foreign_keys=ON"))
+    Base.metadata.create_all(bind=eng)
+    session = sessionmaker(bind=eng)()
+    session.add_all([Site(id=1, name="A"), Site(id=2, name="B")])
+    session.add_all([Recorder(id=1, site_id=1, name="NVR1"), Recorder(id=2, site_id=1, name="NVR2"),
+                     Switch(id=1, site_id=1, name="SW1", ports=3), Switch(id=2, site_id=1, name="SW2", ports=8),
+                     PatchPanel(id=1, site_id=1, name="PP1")])
+    session.commit()
+    yield session
+    session.close()
+    eng.dispose()
+
+
+def _rebuild(db, site_id):
+    """Conflicts the way /validate computed them before the index: maps over every camera."""
+    cams = db.query(Camera).filter_by(site_id=site_id).order_by(Camera.id).all()
+    errors, warnings = [], []
+    ip_map, ch_map, pp_map = {}, {}, {}
+    for c in cams:
+        if c.ip:
+            ip_map.setdefault(c.ip, []).append(c)
+        if c.channel and c.recorder_id:
+            ch_map.setdefault((c.recorder_id, c.channel), []).append(c)
+        if c.patch_panel_id and c.patch_panel_port:
+            pp_map.setdefault((c.patch_panel_id, c.patch_panel_port), []).append(c)
+    for ip, g in ip_map.items():
+        if len(g) > 1:
+            names = ", ".join(c.name or f"CH{c.channel}" for c in g)
+            if all(c.cam_type == g[0].cam_type for c in g):
+                errors.append({"type": "ip_duplicate", "msg": f"IP {ip} duplicada: {names}", "ids": [c.id for c in g]})
+            else:
+                warnings.append({"type": "ip_cross_segment", "msg": f"IP {ip} en segmentos diferentes: {names}",
+                                 "ids": [c.id for c in g]})
+    for (_, ch), g in ch_map.items():
+        if len(g) > 1:
+            names = ", ".join(c.name or c.ip or f"ID{c.id}" for c in g)
+            errors.append({"type": "channel_duplicate", "msg": f"Canal {ch} duplicado: {names}", "ids": [c.id for c in g]})
+    for (ppid, port), g in pp_map.items():
+        if len(g) > 1:
+            pp = db.get(PatchPanel, ppid)
+            names = ", ".join(c.name or c.ip or f"ID{c.id}" for c in g)
+            errors.append({"type": "pp_port_duplicate", "msg": f"Puerto {port} de {pp.name if pp else 'PP'} duplicado: {names}",
+                           "ids": [c.id for c in g]})
+    for sw in db.query(Switch).filter_by(site_id=site_id).order_by(Switch.id):
+        count = sum(1 for c in cams if c.switch_id == sw.id)
+        if count > sw.ports:
+            warnings.append({"type": "switch_overload", "msg": f"{sw.name}: {count} cámaras exceden {sw.ports} puertos",
+                             "ids": []})
+    return {"errors": errors, "warnings": warnings, "total": len(errors) + len(warnings)}
+
+
+def _random_cameras(rnd, n):
+    return [Camera(site_id=1, name=rnd.choice(["", f"C{i}"]), channel=rnd.choice([None, 0, 1, 2, 3]),
+                   recorder_id=rnd.choice([None, 1, 2]), ip=rnd.choice(["", None, "10.0.0.1", "10.0.0.2", f"10.1.0.{i}"]),
+                   cam_type=rnd.choice(["ip-net", "analog"]), switch_id=rnd.choice([None, 1, 2]),
+                   patch_panel_id=rnd.choice([None, 1]), patch_panel_port=rnd.choice([None, 1, 2]))
+            for i in range(n)]
+
+
+class TestValidate:
+
+    def test_empty(self, db):
+        assert validate(db, 1) == {"errors": [], "warnings": [], "total": 0}
+
+    def test_matches_rebuild(self, db):
+        db.execute(text(f"DROP INDEX {database.UPSERT_KEY_INDEX}"))     # databases where 002 found duplicates
+        rnd = random.Random(3)
+        db.add_all(_random_cameras(rnd, 40))
+        db.commit()
+        assert validate(db, 1) == _rebuild(db, 1)
+        assert validate(db, 1)["total"] > 0
+
+        cams = db.query(Camera).all()
+        for c in rnd.sample(cams, 15):
+            c.ip, c.channel, c.switch_id = rnd.choice(["10.0.0.1", "", "10.9.9.9"]), rnd.choice([1, 4]), 1
+        for c in rnd.sample(cams, 5):
+            db.delete(c)
+        db.get(Switch, 2).ports = 1                  # overload follows the switch's ports
+        db.commit()
+        assert validate(db, 1) == _rebuild(db, 1)
+
+    def test_bulk_upsert(self, db):
+        def row(ch, **kw):
+            r = {f: None for f in INSERT_FIELDS}
+            r.update(site_id=1, recorder_id=1, channel=ch, name=f"C{ch}", status="online",
+                     configured=True, offline_streak=0, updated_at=datetime(2024, 1, 1), ip=f"10.0.0.{ch}")
+            r.update(kw)
+            return r
+
+        upsert_cameras(db, [row(ch) for ch in range(1, 11)])
+        db.commit()
+        upsert_cameras(db, [row(ch, ip="10.0.0.1") for ch in range(2, 4)])
+        db.commit()
+        res = validate(db, 1)
+        assert [e["type"] for e in res["errors"]] == ["ip_duplicate"]
+        assert res == _rebuild(db, 1)
+
+    def test_other_site_not_mixed(self, db):
+        db.add_all([Camera(site_id=1, ip="10.0.0.1"), Camera(site_id=2, ip="10.0.0.1")])
+        db.commit()
+        assert validate(db, 1)["total"] == 0
+
+    def test_uses_partial_index(self, db):
+        plan = db.execute(text(
+            "EXPLAIN QUERY PLAN SELECT dim, key FROM site_counters "
+            "WHERE site_id = 1 AND dim IN ('ip', 'channel', 'pp_port') AND site_counters.n > 1 AND key != ''"
+        )).all()
+        assert "ix_site_counters_conflicts" in " ".join(str(r[-1]) for r in plan)
+
+
+class TestIntroduced:
+
+    def test_new_camera(self, db):
+        db.add(Camera(site_id=1, name="A", ip="10.0.0.1", recorder_id=1, channel=1))
+        db.commit()
+        cam = Camera(site_id=1, name="B", ip="10.0.0.1", recorder_id=1, channel=2)
+        db.add(cam)
+        db.flush()
+        new = introduced(db, [cam])[cam.id]
+        assert [c["type"] for c in new] == ["ip_duplicate"]
+
+    def test_only_keys_the_write_entered(self, db):
+        a = Camera(site_id=1, name="A", ip="10.0.0.1", recorder_id=1, channel=1, switch_id=1)
+        b = Camera(site_id=1, name="B", ip="10.0.0.1", recorder_id=1, channel=2, switch_id=1)
+        db.add_all([a, b])
+        db.commit()
+
+        before = {b.id: camera_keys(b)}
+        b.name = "renamed"                           # already a duplicate IP: nothing new
+        db.flush()
+        assert introduced(db, [b], before) == {b.id: []}
+
+        a.patch_panel_id, a.patch_panel_port = 1, 5
+        db.flush()
+        before = {b.id: camera_keys(b)}
+        b.patch_panel_id, b.patch_panel_port = 1, 5
+        db.flush()
+        assert [c["type"] for c in introduced(db, [b], before)[b.id]] == ["pp_port_duplicate"]
+
+    def test_switch_overload_and_bulk(self, db):
+        cams = [Camera(site_id=1, name=f"C{i}", switch_id=1) for i in range(3)]
+        db.add_all(cams)
+        db.commit()
+        extra = [Camera(site_id=1, name="X", switch_id=1), Camera(site_id=1, name="Y", switch_id=2)]
+        db.add_all(extra)
+        db.flush()
+        new = introduced(db, extra)
+        assert [c["msg"] for c in new[extra[0].id]] == ["SW1: 4 cámaras exceden 3 puertos"]
+        assert new[extra[1].id] == []
+
+
+class TestMigration:
+
+    def test_backfills_index(self, tmp_path, monkeypatch):
+        eng = create_engine(f"sqlite:///{tmp_path / 'nm.db'}")
+        monkeypatch.setattr(database, "engine", eng)
+        monkeypatch.setattr(database, "_schema_status", None)
+        database.run_migrations()
+        with eng.begin() as conn:                       # version 6: no conflict dims, old triggers
+            conn.execute(text("DELETE FROM schema_version WHERE version >= 7"))
+            conn.execute(text("DROP INDEX ix_site_counters_conflicts"))
+            conn.execute(text("DROP TRIGGER trg_cameras_counters_upd_ip"))
+            conn.execute(text("INSERT INTO sites (id, name) VALUES (1, 'S')"))
+            conn.execute(text("INSERT INTO cameras (site_id, name, ip) VALUES (1, 'A', '10.0.0.1'), (1, 'B', '10.0.0.1')"))
+            conn.execute(text("DELETE FROM site_counters WHERE dim = 'ip'"))
+        assert database.run_migrations()["ok"]
+        db = sessionmaker(bind=eng)()
+        assert [e["type"] for e in validate(db, 1)["errors"]] == ["ip_duplicate"]
+        cam = db.query(Camera).filter_by(name="B").one()
+        cam.ip = "10.0.0.2"                            # triggers back in place
+        db.commit()
+        assert validate(db, 1)["total"] == 0
+        db.close()
+        eng.dispose()
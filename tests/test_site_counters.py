@@ -0,0 +1,214 @@
+"""
+Tests for site_counters module and the counter triggers.
+Covers: ORM create / update / move / delete, bulk sync upserts, FK cascades,
+recorder types, reconcile (drift report + repair, concurrent commits not
+reported as drift), migration backfill.
+"""
+import pytest
+import sys
+import os
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.orm import sessionmaker
+
+import database
+from database import Base, Site, Recorder, Rack, Switch, Camera, SiteCounter, counter_truth_select
+from camera_upsert import upsert_cameras, INSERT_FIELDS
+from site_counters import read, camera_counts, reconcile
+
+
+@pytest.fixture
+def engine():
+    eng = create_engine("sqlite://")
+    event.listen(eng, "connect", lambda c, r: c.execute("PRAGMA foreign_keys=ON"))
+    Base.metadata.create_all(bind=eng)
+    yield eng
+    eng.dispose()
+
+
+@pytest.fixture
+def db(engine):
+    session = sessionmaker(bind=engine)()
+    session.add_all([Site(id=1, name="A"), Site(id=2, name="B")])
+    session.add_all([Recorder(id=1, site_id=1, name="NVR1", type="NVR"),
+                     Recorder(id=2, site_id=1, name="DVR1", type="DVR"),
+                     Rack(id=1, site_id=1, name="R1")])
+    session.commit()
+    yield session
+    session.close()
+
+
+def _stored(db):
+    return {(s, d, k): n for s, d, k, n in
+            db.query(SiteCounter.site_id, SiteCounter.dim, SiteCounter.key, SiteCounter.n).filter(SiteCounter.n != 0)}
+
+
+def _truth(db):
+    return {(s, d, k): n for s, d, k, n in db.execute(text(counter_truth_select())) if n}
+
+
+def _cam(ch, **kw):
+    return Camera(site_id=1, recorder_id=1, rack_id=1, channel=ch, cam_type="ip", status="online",
+                  status_real="online", **kw)
+
+
+class TestTriggers:
+
+    def test_insert(self, db):
+        db.add_all([_cam(1), _cam(2), Camera(site_id=1, channel=3, status="offline")])
+        db.commit()
+        c = read(db, [1])[1]
+        assert c["device"] == {"cameras": 3, "recorders": 2, "racks": 1}
+        assert c["status"] == {"online": 2, "offline": 1}
+        assert c["recorder"] == {"1": 2, "": 1}
+        assert c["rack"] == {"1": 2, "": 1}
+        assert c["recorder_type"] == {"NVR": 1, "DVR": 1}
+        assert _stored(db) == _truth(db)
+
+    def test_update_moves_only_changed_dims(self, db):
+        cam = _cam(1)
+        db.add(cam)
+        db.commit()
+        cam.status_real = "offline"
+        cam.recorder_id = 2
+        cam.name = "renamed"
+        db.commit()
+        c = read(db, [1])[1]
+        assert c["status_real"] == {"offline": 1}
+        assert c["recorder"] == {"2": 1}
+        assert c["status"] == {"online": 1}
+        assert _stored(db) == _truth(db)
+
+    def test_move_to_other_site(self, db):
+        cam = _cam(1)
+        db.add(cam)
+        db.commit()
+        cam.site_id = 2
+        db.commit()
+        assert camera_counts(db, [1, 2]) == {1: 0, 2: 1}
+        assert read(db, [2])[2]["status"] == {"online": 1}
+        assert _stored(db) == _truth(db)
+
+    def test_delete(self, db):
+        cam = _cam(1)
+        db.add_all([cam, Switch(site_id=1, name="SW")])
+        db.commit()
+        db.delete(cam)
+        db.commit()
+        c = read(db, [1])[1]
+        assert "cameras" not in c["device"]
+        assert c["device"]["switches"] == 1
+        assert _stored(db) == _truth(db)
+
+    def test_bulk_upsert(self, db):
+        def row(ch, **kw):
+            r = {f: None for f in INSERT_FIELDS}
+            r.update(site_id=1, recorder_id=1, channel=ch, name=f"C{ch}", status="online",
+                     status_real="online", configured=True, offline_streak=0, updated_at=datetime(2024, 1, 1))
+            r.update(kw)
+            return r
+
+        upsert_cameras(db, [row(ch) for ch in range(1, 51)])
+        db.commit()
+        upsert_cameras(db, [row(ch, status_real="offline") for ch in range(1, 11)] + [row(51)])
+        db.commit()
+        assert read(db, [1])[1]["status_real"] == {"online": 41, "offline": 10}
+        assert _stored(db) == _truth(db)
+
+    def test_fk_cascades(self, db):
+        db.add_all([_cam(1), _cam(2)])
+        db.commit()
+        db.execute(text("DELETE FROM racks WHERE id = 1"))          # SET NULL on cameras.rack_id
+        db.commit()
+        assert read(db, [1])[1]["rack"] == {"": 2}
+        db.execute(text("DELETE FROM sites WHERE id = 1"))          # CASCADE to everything
+        db.commit()
+        assert db.query(SiteCounter).filter_by(site_id=1).count() == 0
+
+
+class TestReads:
+
+    def test_sites_without_rows(self, db):
+        assert camera_counts(db, []) == {}
+        assert camera_counts(db, [2]) == {}
+        assert read(db, [2])[2]["device"] == {}
+
+    def test_dims_filter(self, db):
+        db.add(_cam(1))
+        db.commit()
+        assert set(read(db, [1], dims=["device"])[1]) == {"device"}
+
+
+class TestReconcile:
+
+    def test_reports_and_repairs_drift(self, db):
+        db.add_all([_cam(1), _cam(2)])
+        db.commit()
+        db.execute(text("UPDATE site_counters SET n = 99 WHERE dim = 'device' AND key = 'cameras'"))
+        db.execute(text("DELETE FROM site_counters WHERE dim = 'rack'"))
+        db.commit()
+        res = reconcile(db)
+        assert {(d["dim"], d["key"], d["stored"], d["actual"]) for d in res["drift"]} == {
+            ("device", "cameras", 99, 2), ("rack", "1", 0, 2)}
+        assert _stored(db) == _truth(db)
+        assert reconcile(db)["drift"] == []
+
+    def test_single_site(self, db):
+        db.add(_cam(1))
+        db.add(Camera(site_id=2, channel=1))
+        db.commit()
+        db.execute(text("UPDATE site_counters SET n = 5"))
+        db.commit()
+        res = reconcile(db, site_id=2)
+        assert {d["site_id"] for d in res["drift"]} == {2}
+        assert camera_counts(db, [1, 2]) == {1: 5, 2: 1}
+
+    def test_concurrent_commit_is_not_drift(self, tmp_path):
+        url = f"sqlite:///{tmp_path / 'nm.db'}"
+        eng, other = create_engine(url), create_engine(url)
+        Base.metadata.create_all(bind=eng)
+        db = sessionmaker(bind=eng)()
+        db.add_all([Site(id=1, name="A"), _cam(1)])
+        db.commit()
+        fired = []
+
+        def commit_elsewhere(conn, cursor, statement, *args):
+            if statement.startswith("DELETE FROM site_counters") and not fired:
+                fired.append(True)                  # another writer commits right before the rebuild
+                with other.begin() as c:
+                    c.execute(Camera.__table__.insert(), {"site_id": 1, "channel": 2, "status": "online"})
+
+        event.listen(eng, "before_cursor_execute", commit_elsewhere)
+        res = reconcile(db)
+        assert fired and res["drift"] == []
+        assert _stored(db) == _truth(db)
+        db.close()
+        eng.dispose()
+        other.dispose()
+
+
+class TestMigration:
+
+    def test_backfills_existing_rows(self, tmp_path, monkeypatch):
+        eng = create_engine(f"sqlite:///{tmp_path / 'nm.db'}")
+        monkeypatch.setattr(database, "engine", eng)
+        monkeypatch.setattr(database, "_schema_status", None)
+        database.run_migrations()
+        with eng.begin() as conn:
+            conn.execute(text("DROP TABLE site_counters"))
+            for (name,) in conn.execute(text("SELECT name FROM sqlite_master WHERE type = 'trigger'")).all():
+                conn.execute(text(f"DROP TRIGGER {name}"))
+            conn.execute(text("DELETE FROM schema_version WHERE version >= 5"))
+            conn.execute(text("INSERT INTO sites (id, name) VALUES (1, 'S')"))
+            conn.execute(text("INSERT INTO cameras (site_id, channel, status) VALUES (1, 1, 'online'), (1, 2, 'offline')"))
+        assert database.run_migrations()["ok"]
+        db = sessionmaker(bind=eng)()
+        assert read(db, [1])[1]["status"] == {"online": 1, "offline": 1}
+        db.add(Camera(site_id=1, channel=3))                       # triggers installed
+        db.commit()
+        assert camera_counts(db, [1]) == {1: 3}
+        db.close()
+        eng.dispose()
@@ -0,0 +1,87 @@
+"""
+Tests for snapshot_codec module.
+Covers: encode_frame/Frame round trip, types and None handling, sections,
+single-cell lookups, size vs JSON.
+"""
+import pytest
+import json
+import sys
+import os
+import zlib
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from snapshot_codec import Frame, encode_frame, is_columnar, MAGIC
+
+
+def _cams(n):
+    return [{"channel": ch, "name": f"CAM{ch}", "ip": f"10.0.0.{ch}", "mac": "",
+             "model": "DH-IPC", "serial": "", "configured": True, "status_config": "enabled",
+             "status_real": "online" if ch % 3 else "offline"} for ch in range(1, n + 1)]
+
+
+class TestRoundTrip:
+
+    def test_rows(self):
+        cams = _cams(16)
+        assert Frame(encode_frame(cams)).rows() == cams
+
+    def test_none_values(self):
+        rows = [{"channel": 1, "name": None, "configured": None, "extra": None},
+                {"channel": None, "name": "x", "configured": False, "extra": None}]
+        assert Frame(encode_frame(rows)).rows() == rows
+
+    def test_mixed_types_fall_back_to_json(self):
+        rows = [{"channel": 1, "meta": {"a": 1}}, {"channel": 2, "meta": [1, "b"]},
+                {"channel": 3, "meta": 2.5}]
+        assert Frame(encode_frame(rows)).rows() == rows
+
+    def test_unicode(self):
+        rows = [{"channel": 1, "name": "Cámara Pasillo Ñ"}]
+        assert Frame(encode_frame(rows)).rows() == rows
+
+    def test_empty(self):
+        f = Frame(encode_frame([], {"del": [4, 5]}))
+        assert f.n_rows == 0
+        assert f.rows() == []
+        assert f.section("del") == [4, 5]
+
+
+class TestLookups:
+
+    def test_find_and_value(self):
+        f = Frame(encode_frame(_cams(32)))
+        i = f.find(9)
+        assert i == 8
+        assert f.value("status_real", i) == "offline"
+        assert f.value("configured", i) is True
+        assert f.value("no_such_column", i) is None
+        assert f.find(99) == -1
+
+    def test_sections(self):
+        f = Frame(encode_frame(_cams(2), {"chg": [2], "order": [2, 1]}))
+        assert f.section("chg") == [2]
+        assert f.section("order") == [2, 1]
+        assert f.section("del") is None
+        assert "chg" not in f.columns and "_chg" not in f.columns
+
+    def test_not_columnar(self):
+        blob = zlib.compress(json.dumps(_cams(1)).encode())
+        assert not is_columnar(blob)
+        with pytest.raises(ValueError):
+            Frame(blob)
+
+
+class TestSize:
+
+    def test_strings_are_dictionary_encoded(self):
+        blob = encode_frame(_cams(64))
+        assert blob.startswith(MAGIC)
+        raw = zlib.decompress(blob[len(MAGIC):])
+        assert raw.count(b"enabled") == 1
+        assert raw.count(b"DH-IPC") == 1
+
+    def test_smaller_than_compressed_json(self):
+        cams = _cams(256)
+        as_json = zlib.compress(json.dumps(cams, separators=(",", ":")).encode(), 6)
+        assert len(encode_frame(cams)) < len(as_json)
@@ -0,0 +1,216 @@
+"""
+Tests for snapshot_store module.
+Covers: compute_delta/apply_delta, save_snapshot keyframe cadence, load_snapshot, storage_stats,
+channel_history, changed_between
+"""
+import pytest
+import json
+import sys
+import os
+
+# Allow importing from parent dir
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+import snapshot_store
+from database import Base, Site, CameraSnapshot
+from snapshot_store import (
+    compute_delta,
+    apply_delta,
+    save_snapshot,
+    load_snapshot,
+    storage_stats,
+    channel_history,
+    changed_between,
+    _pack,
+    ENC_KEY,
+    ENC_DELTA,
+)
+
+
+@pytest.fixture
+def db(monkeypatch):
+    monkeypatch.setattr(snapshot_store, "_last", {})
+    monkeypatch.setattr(snapshot_store, "SNAPSHOT_KEYFRAME_EVERY", 4)
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(bind=engine)()
+    session.add(Site(id=1, name="Test"))
+    session.commit()
+    yield session
+    session.close()
+    engine.dispose()
+
+
+def _cams(n, status="online"):
+    return [{"channel": ch, "name": f"CAM{ch}", "ip": f"10.0.0.{ch}",
+             "status_real": status} for ch in range(1, n + 1)]
+
+
+# ============================================
+# compute_delta / apply_delta
+# ============================================
+class TestDelta:
+
+    def test_identical_is_empty(self):
+        assert compute_delta(_cams(5), _cams(5)) == {}
+
+    def test_changed_camera_only(self):
+        cur = _cams(5)
+        cur[2]["status_real"] = "offline"
+        d = compute_delta(_cams(5), cur)
+        assert d == {"set": [cur[2]]}
+        assert apply_delta(_cams(5), d) == cur
+
+    def test_added_and_removed(self):
+        prev = _cams(3)
+        cur = _cams(2) + [{"channel": 9, "name": "NEW", "ip": "", "status_real": "unknown"}]
+        d = compute_delta(prev, cur)
+        assert d["del"] == [3]
+        assert apply_delta(prev, d) == cur
+
+    def test_reordered(self):
+        prev = _cams(3)
+        cur = list(reversed(prev))
+        assert apply_delta(prev, compute_delta(prev, cur)) == cur
+
+
+# ============================================
+# save_snapshot / load_snapshot
+# ============================================
+class TestSaveLoad:
+
+    def test_first_snapshot_is_keyframe(self, db):
+        snap = save_snapshot(db, 1, "r0", _cams(3))
+        assert snap.encoding == ENC_KEY
+        assert snap.seq == 0
+
+    def test_keyframe_cadence(self, db):
+        encs = [save_snapshot(db, 1, f"r{i}", _cams(3)).encoding for i in range(9)]
+        assert encs == [ENC_KEY, ENC_DELTA, ENC_DELTA, ENC_DELTA] * 2 + [ENC_KEY]
+
+    def test_roundtrip_every_run(self, db):
+        payloads = []
+        for i in range(7):
+            cams = _cams(4)
+            cams[i % 4]["status_real"] = "offline"
+            payloads.append(cams)
+            save_snapshot(db, 1, f"r{i}", cams)
+        db.commit()
+        for i, expected in enumerate(payloads):
+            assert load_snapshot(db, f"r{i}") == expected
+
+    def test_roundtrip_without_cache(self, db):
+        save_snapshot(db, 1, "a", _cams(3))
+        db.commit()
+        snapshot_store._last.clear()
+        cams = _cams(3, status="offline")
+        snap = save_snapshot(db, 1, "b", cams)
+        db.commit()
+        assert snap.encoding == ENC_DELTA
+        assert load_snapshot(db, "b") == cams
+
+    def test_legacy_json_row_is_readable(self, db):
+        db.add(CameraSnapshot(site_id=1, run_id="old", payload_json=json.dumps(_cams(2))))
+        db.commit()
+        assert load_snapshot(db, "old") == _cams(2)
+        snap = save_snapshot(db, 1, "new", _cams(3))
+        db.commit()
+        assert snap.encoding == ENC_DELTA
+        assert load_snapshot(db, "new") == _cams(3)
+
+    def test_missing_run(self, db):
+        assert load_snapshot(db, "nope") is None
+
+
+# ============================================
+# storage_stats
+# ============================================
+class TestStorageStats:
+
+    def test_reports_savings(self, db):
+        for i in range(8):
+            save_snapshot(db, 1, f"r{i}", _cams(64))
+        db.commit()
+        stats = storage_stats(db, 1)
+        assert stats["snapshots"] == 8
+        assert stats["keyframes"] == 2
+        assert stats["deltas"] == 6
+        assert stats["stored_bytes"] < stats["raw_bytes"] / 10
+        assert stats["saved_bytes"] == stats["raw_bytes"] - stats["stored_bytes"]
+
+
+# ============================================
+# channel_history / changed_between
+# ============================================
+def _with(cams, **by_channel):
+    out = [dict(c) for c in cams]
+    for c in out:
+        c.update(by_channel.get(f"ch{c['channel']}", {}))
+    return out
+
+
+class TestQueries:
+
+    def _runs(self, db, payloads):
+        for i, cams in enumerate(payloads):
+            save_snapshot(db, 1, f"r{i}", cams)
+        db.commit()
+
+    def test_blobs_are_columnar(self, db):
+        self._runs(db, [_cams(3), _cams(3, status="offline")])
+        assert all(r.payload_blob.startswith(b"NMC1") for r in db.query(CameraSnapshot))
+
+    def test_channel_history_across_keyframes(self, db):
+        statuses = ["online", "online", "offline", "offline", "online", "unknown", "online"]
+        self._runs(db, [_with(_cams(3), ch2={"status_real": s}) for s in statuses])
+        hist = channel_history(db, 1, 2, last=5)
+        assert [h["run_id"] for h in hist] == ["r2", "r3", "r4", "r5", "r6"]
+        assert [h["status_real"] for h in hist] == statuses[2:]
+        assert all(h["present"] for h in hist)
+
+    def test_channel_history_removed_and_readded(self, db):
+        self._runs(db, [_cams(3), _cams(2), _cams(2), _cams(3)])
+        hist = channel_history(db, 1, 3, last=4, fields=["name", "status_real"])
+        assert [h["present"] for h in hist] == [True, False, False, True]
+        assert hist[0]["name"] == "CAM3" and hist[1]["name"] is None
+
+    def test_channel_history_reads_older_blobs(self, db):
+        db.add(CameraSnapshot(site_id=1, run_id="legacy", payload_json=json.dumps(_cams(2))))
+        db.add(CameraSnapshot(site_id=1, run_id="zjson", encoding=ENC_KEY,
+                              payload_blob=_pack(_cams(2, status="offline"))))
+        db.commit()
+        assert [h["status_real"] for h in channel_history(db, 1, 1)] == ["online", "offline"]
+
+    def test_changed_between(self, db):
+        base = _cams(4)
+        self._runs(db, [
+            base,
+            _with(base, ch1={"status_real": "offline"}),
+            _with(base, ch1={"status_real": "offline"}, ch3={"ip": "10.0.0.99"}),
+            _with(base, ch3={"ip": "10.0.0.99"})[:3] + [{"channel": 5, "name": "NEW", "ip": "", "status_real": "online"}],
+            _with(base, ch3={"ip": "10.0.0.99"})[:3] + [{"channel": 5, "name": "NEW", "ip": "", "status_real": "online"}],
+        ])
+        diff = changed_between(db, 1, "r0", "r4")
+        assert diff["runs_between"] == 4
+        by_ch = {c["channel"]: c for c in diff["changed"]}
+        assert set(by_ch) == {3, 4, 5}            # ch1 went offline and back: no net change
+        assert by_ch[3]["change"] == "modified" and by_ch[3]["fields"] == ["ip"]
+        assert by_ch[4]["change"] == "removed"
+        assert by_ch[5]["change"] == "added"
+        assert changed_between(db, 1, "r4", "r0")["run_a"] == "r0"     # order-insensitive
+        assert changed_between(db, 1, "r0", "r1")["changed"][0]["fields"] == ["status_real"]
+        assert changed_between(db, 1, "r3", "r4")["changed"] == []
+
+    def test_changed_between_with_older_rows_in_range(self, db):
+        db.add(CameraSnapshot(site_id=1, run_id="legacy", payload_json=json.dumps(_cams(2))))
+        db.commit()
+        self._runs(db, [_cams(2, status="offline")])
+        diff = changed_between(db, 1, "legacy", "r0")
+        assert [c["channel"] for c in diff["changed"]] == [1, 2]
+
+    def test_missing_run(self, db):
+        self._runs(db, [_cams(1)])
+        assert changed_between(db, 1, "r0", "nope") is None
@@ -0,0 +1,117 @@
+"""
+Tests for sync_jobs module.
+Covers: SyncJob.to_dict, SyncJobRunner submit/progress/results, duplicate suppression, failures.
+"""
+import pytest
+import asyncio
+import sys
+import os
+
+# Allow importing from parent dir
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sync_jobs import SyncJob, SyncJobRunner, JOB_QUEUED, JOB_DONE
+
+
+def _runner(gate: asyncio.Event = None, fail=()):
+    calls = []
+
+    async def fake_sync(site_id):
+        calls.append(site_id)
+        if gate:
+            await gate.wait()
+        if site_id in fail:
+            raise RuntimeError("boom")
+        return {"site_id": site_id, "ok": True}
+
+    return SyncJobRunner(sync_fn=fake_sync, workers=2), calls
+
+
+# ============================================
+# SyncJob
+# ============================================
+class TestSyncJob:
+
+    def test_defaults(self):
+        job = SyncJob("all", [1, 2, 3])
+        d = job.to_dict()
+        assert d["status"] == JOB_QUEUED
+        assert d["done"] == 0
+        assert d["total"] == 3
+        assert len(d["job_id"]) == 12
+
+    def test_progress_counts(self):
+        job = SyncJob("all", [1, 2])
+        job.results[1] = {"site_id": 1, "ok": True}
+        d = job.to_dict()
+        assert (d["done"], d["ok_count"], d["failed_count"]) == (1, 1, 0)
+
+
+# ============================================
+# SyncJobRunner
+# ============================================
+class TestSyncJobRunner:
+
+    @pytest.mark.asyncio
+    async def test_submit_returns_immediately_and_completes(self):
+        runner, calls = _runner()
+        job, dedup = runner.submit("all", [1, 2])
+        assert job.status == JOB_QUEUED
+        assert dedup == {}
+        await runner.wait(job.id, timeout=2)
+        assert job.status == JOB_DONE
+        assert [r["site_id"] for r in job.to_dict()["results"]] == [1, 2]
+        await runner.stop()
+
+    @pytest.mark.asyncio
+    async def test_duplicate_site_is_suppressed(self):
+        gate = asyncio.Event()
+        runner, calls = _runner(gate)
+        first, _ = runner.submit("site", [5])
+        again, dedup = runner.submit("site", [5])
+        assert again is first
+        assert dedup == {5: first.id}
+
+        other, dedup = runner.submit("all", [5, 6])
+        assert other.site_ids == [6]
+        assert dedup == {5: first.id}
+
+        gate.set()
+        await runner.wait(first.id, timeout=2)
+        await runner.wait(other.id, timeout=2)
+        assert calls.count(5) == 1
+        await runner.stop()
+
+    @pytest.mark.asyncio
+    async def test_site_can_be_queued_again_after_finishing(self):
+        runner, calls = _runner()
+        job, _ = runner.submit("site", [1])
+        await runner.wait(job.id, timeout=2)
+        job2, dedup = runner.submit("site", [1])
+        assert job2 is not job
+        assert dedup == {}
+        await runner.wait(job2.id, timeout=2)
+        await runner.stop()
+
+    @pytest.mark.asyncio
+    async def test_all_sites_covered_returns_none(self):
+        gate = asyncio.Event()
+        runner, _ = _runner(gate)
+        first, _ = runner.submit("all", [1, 2])
+        job, dedup = runner.submit("all", [1, 2])
+        assert job is None
+        assert dedup == {1: first.id, 2: first.id}
+        gate.set()
+        await runner.wait(first.id, timeout=2)
+        await runner.stop()
+
+    @pytest.mark.asyncio
+    async def test_failed_site_recorded(self):
+        runner, _ = _runner(fail=(2,))
+        job, _ = runner.submit("all", [1, 2, 3])
+        await runner.wait(job.id, timeout=2)
+        d = job.to_dict()
+        assert d["status"] == JOB_DONE
+        assert d["failed_count"] == 1
+        assert d["results"][1]["error_code"] == "INTERNAL_ERROR"
+        await runner.stop()
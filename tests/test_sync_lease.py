@@ -0,0 +1,193 @@
+"""
+Tests for sync_lease module.
+Covers: exclusive acquire, takeover after expiry, renew/lost detection,
+release, commit fencing, and sync_site skipping/discarding runs when the
+lease is not held.
+"""
+import pytest
+import sys
+import os
+from datetime import datetime, timedelta
+
+# Allow importing from parent dir
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+import nvr_sync_service
+from database import Base, Site, Recorder, NvrCredential, Camera, SyncLease, SyncLog
+from sync_lease import SiteLease, list_leases
+
+NOW = datetime(2024, 6, 1, 12, 0, 0)
+
+
+@pytest.fixture
+def engine():
+    eng = create_engine("sqlite://", poolclass=StaticPool,
+                        connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=eng)
+    s = sessionmaker(bind=eng)()
+    s.add(Site(id=1, name="Test"))
+    s.commit()
+    s.close()
+    return eng
+
+
+@pytest.fixture
+def db(engine):
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
+
+
+class TestSiteLease:
+
+    def test_second_holder_is_refused(self, engine):
+        a = SiteLease(engine, 1, ttl_s=60)
+        b = SiteLease(engine, 1, ttl_s=60)
+        assert a.acquire(NOW) is True
+        assert b.acquire(NOW + timedelta(seconds=30)) is False
+        assert b.current_holder == a.holder
+
+    def test_expired_lease_is_taken_over(self, engine):
+        a = SiteLease(engine, 1, ttl_s=60)
+        b = SiteLease(engine, 1, ttl_s=60)
+        a.acquire(NOW)
+        assert b.acquire(NOW + timedelta(seconds=61)) is True
+        # the previous holder notices on its next renewal
+        assert a.renew(NOW + timedelta(seconds=62)) is False
+        assert a.lost is True
+
+    def test_fence_fails_once_expired_or_taken(self, engine, db):
+        a = SiteLease(engine, 1, ttl_s=60)
+        a.acquire(NOW)
+        assert a.fence(db, NOW + timedelta(seconds=30)) is True
+        assert a.fence(db, NOW + timedelta(seconds=61)) is False     # expired, even if nobody took it
+        a.lost = False
+        SiteLease(engine, 1, ttl_s=60).acquire(NOW + timedelta(seconds=61))
+        assert a.fence(db, NOW + timedelta(seconds=62)) is False
+        assert a.lost is True
+
+    def test_renew_extends_expiry(self, engine, db):
+        a = SiteLease(engine, 1, ttl_s=60)
+        a.acquire(NOW)
+        assert a.renew(NOW + timedelta(seconds=50)) is True
+        assert db.get(SyncLease, 1).expires_at == NOW + timedelta(seconds=110)
+        b = SiteLease(engine, 1, ttl_s=60)
+        assert b.acquire(NOW + timedelta(seconds=90)) is False
+
+    @pytest.mark.asyncio
+    async def test_release_frees_site(self, engine, db):
+        a = SiteLease(engine, 1)
+        a.acquire()
+        assert len(list_leases(db)) == 1
+        await a.release()
+        assert list_leases(db) == []
+        assert SiteLease(engine, 1).acquire() is True
+
+    @pytest.mark.asyncio
+    async def test_release_does_not_drop_foreign_lease(self, engine, db):
+        a = SiteLease(engine, 1, ttl_s=60)
+        b = SiteLease(engine, 1, ttl_s=60)
+        a.acquire(NOW)
+        b.acquire(NOW + timedelta(seconds=61))
+        await a.release()
+        assert db.get(SyncLease, 1).holder == b.holder
+
+
+# ============================================
+# sync_site integration
+# ============================================
+
+@pytest.fixture
+def site_with_nvr(db, monkeypatch):
+    db.add(Recorder(id=1, site_id=1, name="NVR"))
+    db.add(NvrCredential(site_id=1, recorder_id=1, ip="10.0.0.250", password_enc="b64:eA=="))
+    db.commit()
+    hooks = {"during_probe": None}
+
+    async def fake_rpc(ip, port, user, password):
+        return {"ok": True, "cameras": [
+            {"channel": 1, "name": "CAM1", "ip": "10.0.0.1", "mac": "", "model": "M", "serial": ""},
+        ]}
+
+    async def fake_probe(cameras):
+        if hooks["during_probe"]:
+            hooks["during_probe"]()
+        return {1: "online"}
+
+    monkeypatch.setattr(nvr_sync_service, "_sync_nvr_rpc", fake_rpc)
+    monkeypatch.setattr(nvr_sync_service, "probe_many", fake_probe)
+    return hooks
+
+
+class TestSyncSiteLease:
+
+    @pytest.mark.asyncio
+    async def test_skipped_when_lease_held(self, engine, db, site_with_nvr):
+        other = SiteLease(engine, 1)
+        other.acquire()
+        r = await nvr_sync_service.sync_site(1, db)
+        assert r.ok is False
+        assert r.error_code == "LEASE_HELD"
+        assert db.query(Camera).count() == 0
+        assert db.query(SyncLog).count() == 0
+
+    @pytest.mark.asyncio
+    async def test_lease_released_after_run(self, engine, db, site_with_nvr):
+        r = await nvr_sync_service.sync_site(1, db)
+        assert r.ok is True
+        assert db.query(SyncLease).count() == 0
+
+    @pytest.mark.asyncio
+    async def test_lost_lease_discards_run(self, engine, db, site_with_nvr, monkeypatch):
+        ours = []
+
+        class TrackedLease(SiteLease):
+            def __init__(self, *a, **kw):
+                super().__init__(*a, **kw)
+                ours.append(self)
+
+        def expire_and_steal():
+            # our lease expires mid-run, another replica takes it, then our renewal fails
+            s = sessionmaker(bind=engine)()
+            s.query(SyncLease).update({"expires_at": datetime(2000, 1, 1)})
+            s.commit()
+            s.close()
+            assert SiteLease(engine, 1).acquire() is True
+            assert ours[0].renew() is False
+
+        monkeypatch.setattr(nvr_sync_service, "SiteLease", TrackedLease)
+        site_with_nvr["during_probe"] = expire_and_steal
+        r = await nvr_sync_service.sync_site(1, db)
+        assert r.ok is False
+        assert r.error_code == "LEASE_LOST"
+        assert db.query(Camera).count() == 0
+        assert db.query(SyncLease).one().holder != ours[0].holder
+
+    @pytest.mark.asyncio
+    async def test_stolen_lease_fenced_before_commit(self, engine, db, site_with_nvr, monkeypatch):
+        ours = []
+
+        class TrackedLease(SiteLease):
+            def __init__(self, *a, **kw):
+                super().__init__(*a, **kw)
+                ours.append(self)
+
+        def expire_and_steal():
+            # the run stalls past expiry and another replica takes over — before our renewal notices
+            s = sessionmaker(bind=engine)()
+            s.query(SyncLease).update({"expires_at": datetime(2000, 1, 1)})
+            s.commit()
+            s.close()
+            assert SiteLease(engine, 1).acquire() is True
+
+        monkeypatch.setattr(nvr_sync_service, "SiteLease", TrackedLease)
+        site_with_nvr["during_probe"] = expire_and_steal
+        r = await nvr_sync_service.sync_site(1, db)
+        assert r.error_code == "LEASE_LOST"
+        assert ours[0].lost is True
+        assert db.query(Camera).count() == 0
+        assert db.query(SyncLog).count() == 0
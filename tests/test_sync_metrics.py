@@ -0,0 +1,168 @@
+"""
+Tests for sync_metrics module.
+Covers: StageTimer, stage_percentiles, stage timings persisted by sync_site
+(commit stage added by the next run).
+"""
+import pytest
+import json
+import sys
+import os
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+import nvr_sync_service
+import camera_state
+import sync_metrics
+from database import Base, Site, Recorder, NvrCredential, SyncLog
+from sync_metrics import StageTimer, SYNC_STAGES, stage_percentiles, _percentile
+
+
+@pytest.fixture
+def db(monkeypatch):
+    monkeypatch.setattr(sync_metrics, "_deferred_commits", {})
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(bind=engine)()
+    session.add(Site(id=1, name="Test"))
+    session.add(Site(id=2, name="Other"))
+    session.commit()
+    camera_state.reset()
+    yield session
+    camera_state.reset()
+    session.close()
+    engine.dispose()
+
+
+def _log(db, site_id, stages, created_at=None, action="hybrid_sync"):
+    db.add(SyncLog(credential_id=1, site_id=site_id, action=action, status="ok",
+                   stage_timings_json=json.dumps(stages),
+                   created_at=created_at or datetime.utcnow()))
+
+
+class TestStageTimer:
+
+    def test_records_ms_and_count(self):
+        t = StageTimer()
+        with t.stage("probe") as st:
+            st.count = 16
+        d = t.to_dict()
+        assert d["probe"]["count"] == 16
+        assert d["probe"]["ms"] >= 0
+
+    def test_same_stage_accumulates(self):
+        t = StageTimer()
+        for _ in range(3):
+            with t.stage("upsert") as st:
+                st.count = 2
+        assert t.to_dict()["upsert"]["count"] == 6
+
+    def test_recorded_on_exception(self):
+        t = StageTimer()
+        with pytest.raises(RuntimeError):
+            with t.stage("nvr_fetch"):
+                raise RuntimeError("boom")
+        assert "nvr_fetch" in t.to_dict()
+
+    def test_json_round_trip(self):
+        t = StageTimer()
+        with t.stage("events") as st:
+            st.count = 1
+        assert json.loads(t.to_json()) == t.to_dict()
+
+
+class TestPercentiles:
+
+    def test_nearest_rank(self):
+        vals = [float(v) for v in range(1, 101)]
+        assert _percentile(vals, 50) == 50
+        assert _percentile(vals, 99) == 99
+        assert _percentile(vals, 100) == 100
+        assert _percentile([], 50) is None
+
+    def test_per_stage_over_runs(self, db):
+        for ms in range(1, 101):
+            _log(db, 1, {"probe": {"ms": float(ms), "count": 10}, "commit": {"ms": 1.0, "count": 0}})
+        db.commit()
+        out = stage_percentiles(db, datetime.utcnow() - timedelta(hours=1))
+        assert out["runs"] == 100
+        probe = out["stages"]["probe"]
+        assert probe["runs"] == 100
+        assert probe["p50_ms"] == 50
+        assert probe["p90_ms"] == 90
+        assert probe["p99_ms"] == 99
+        assert probe["max_ms"] == 100
+        assert probe["count_p50"] == 10
+        assert list(out["stages"]) == ["probe", "commit"]      # pipeline order
+
+    def test_window_site_and_action_filters(self, db):
+        old = datetime.utcnow() - timedelta(days=3)
+        _log(db, 1, {"probe": {"ms": 1.0, "count": 1}})
+        _log(db, 1, {"probe": {"ms": 500.0, "count": 1}}, created_at=old)
+        _log(db, 2, {"probe": {"ms": 900.0, "count": 1}})
+        _log(db, 1, {"probe": {"ms": 700.0, "count": 1}}, action="sync")
+        db.add(SyncLog(credential_id=1, site_id=1, action="hybrid_sync", status="ok"))  # pre-migration row
+        db.commit()
+        since = datetime.utcnow() - timedelta(hours=24)
+        assert stage_percentiles(db, since)["stages"]["probe"]["max_ms"] == 900
+        site1 = stage_percentiles(db, since, site_id=1)
+        assert site1["runs"] == 1
+        assert site1["stages"]["probe"]["max_ms"] == 1
+
+
+class TestSyncSitePersistsStages:
+
+    @pytest.fixture
+    def nvr(self, db, monkeypatch):
+        db.add(Recorder(id=1, site_id=1, name="NVR"))
+        db.add(NvrCredential(site_id=1, recorder_id=1, ip="10.0.0.250", password_enc="b64:eA=="))
+        db.commit()
+        inventory = [{"channel": ch, "name": f"CAM{ch}", "ip": f"10.0.0.{ch}"} for ch in range(1, 4)]
+        reply = {"ok": True, "cameras": inventory}
+
+        async def fake_rpc(ip, port, user, password):
+            return reply
+
+        async def fake_probe(cameras):
+            return {ch: "online" for ch in range(1, 4)}
+
+        monkeypatch.setattr(nvr_sync_service, "_sync_nvr_rpc", fake_rpc)
+        monkeypatch.setattr(nvr_sync_service, "probe_many", fake_probe)
+        return reply
+
+    @pytest.mark.asyncio
+    async def test_every_stage_on_the_log_row(self, db, nvr):
+        r = await nvr_sync_service.sync_site(1, db)
+        assert r.ok is True
+        assert list(r.stages) == SYNC_STAGES
+        log = db.query(SyncLog).filter_by(site_id=1).one()
+        stages = log.stage_timings
+        assert set(stages) == set(SYNC_STAGES) - {"commit"}       # written in the committed transaction
+        assert nvr_sync_service.write_stats()["commit_ms"] >= r.stages["commit"]["ms"]
+
+        await nvr_sync_service.sync_site(1, db)                     # adds the first run's commit
+        db.expire_all()
+        first, second = db.query(SyncLog).filter_by(site_id=1).order_by(SyncLog.id).all()
+        assert list(first.stage_timings) == SYNC_STAGES
+        assert first.stage_timings["commit"] == r.stages["commit"]
+        assert "commit" not in second.stage_timings
+        out = stage_percentiles(db, datetime.utcnow() - timedelta(hours=1), site_id=1)
+        assert out["stages"]["commit"]["runs"] == 1
+        assert out["stages"]["probe"]["runs"] == 2
+        assert stages["nvr_fetch"]["count"] == 3
+        assert stages["probe"]["count"] == 3
+        assert stages["upsert"]["count"] == 3
+        assert stages["snapshot"]["count"] == 3
+        assert "stages" not in r.to_dict()
+
+    @pytest.mark.asyncio
+    async def test_nvr_error_logs_fetch_stage(self, db, nvr):
+        nvr.clear()
+        nvr.update({"ok": False, "error": "timeout", "error_code": "NVR_TIMEOUT"})
+        r = await nvr_sync_service.sync_site(1, db)
+        assert r.ok is False
+        log = db.query(SyncLog).filter_by(site_id=1, status="error").one()
+        assert list(log.stage_timings) == ["nvr_fetch"]
@@ -0,0 +1,173 @@
+"""
+Tests for sync_scheduler module.
+Covers: initial spreading, catch-up after downtime, jitter bounds, overlap skip,
+per-tick start limit, interval changes, site removal, and slots skipped
+when another process runs the site.
+"""
+import random
+import sys
+import os
+from datetime import datetime, timedelta
+
+# Allow importing from parent dir
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+import sync_scheduler
+from database import Base, Site, NvrCredential, SyncLease
+from sync_scheduler import SyncScheduler, SYNC_MIN_INTERVAL_S, load_site_activity
+
+NOW = datetime(2024, 6, 1, 12, 0, 0)
+
+
+class FakeRunner:
+    """Stands in for SyncJobRunner: records submissions, exposes active sites."""
+    def __init__(self):
+        self.submitted = []
+        self.active = {}
+
+    def active_sites(self):
+        return dict(self.active)
+
+    def submit(self, kind, site_ids, requested_by=""):
+        self.submitted.extend(site_ids)
+
+        class _Job:
+            id = f"job{len(self.submitted)}"
+        return _Job(), {}
+
+
+def _sched(**kw):
+    runner = FakeRunner()
+    kw.setdefault("rng", random.Random(42))
+    return SyncScheduler(runner=runner, **kw), runner
+
+
+class TestApply:
+
+    def test_never_synced_spread_within_interval(self):
+        s, _ = _sched()
+        s.apply([(i, 300, None) for i in range(1, 51)], NOW)
+        offsets = [(e.next_run_at - NOW).total_seconds() for e in s.entries.values()]
+        assert all(0 <= o <= 300 for o in offsets)
+        assert len({int(o) for o in offsets}) > 10   # not all at the same instant
+
+    def test_overdue_runs_once_within_catchup_spread(self):
+        s, _ = _sched(catchup_spread_s=60)
+        s.apply([(1, 300, NOW - timedelta(hours=6))], NOW)
+        assert 0 <= (s.entries[1].next_run_at - NOW).total_seconds() <= 60
+
+    def test_not_yet_due_keeps_cadence_with_jitter(self):
+        s, _ = _sched(jitter_fraction=0.1)
+        s.apply([(1, 600, NOW - timedelta(seconds=100))], NOW)
+        offset = (s.entries[1].next_run_at - NOW).total_seconds()
+        assert 500 - 60 <= offset <= 500 + 60
+
+    def test_interval_floor(self):
+        s, _ = _sched()
+        s.apply([(1, 1, None)], NOW)
+        assert s.entries[1].interval_s == SYNC_MIN_INTERVAL_S
+
+    def test_removed_site_dropped(self):
+        s, _ = _sched()
+        s.apply([(1, 300, None), (2, 300, None)], NOW)
+        s.apply([(2, 300, None)], NOW)
+        assert list(s.entries) == [2]
+
+
+class TestTick:
+
+    def test_due_site_submitted_and_rescheduled(self):
+        s, runner = _sched(jitter_fraction=0.1)
+        s.apply([(1, 300, None)], NOW)
+        s.entries[1].next_run_at = NOW
+        assert s.tick(NOW) == [1]
+        assert runner.submitted == [1]
+        offset = (s.entries[1].next_run_at - NOW).total_seconds()
+        assert 270 <= offset <= 330
+
+    def test_overlap_skips_slot(self):
+        s, runner = _sched()
+        s.apply([(1, 300, None)], NOW)
+        s.entries[1].next_run_at = NOW
+        runner.active = {1: "busy"}
+        assert s.tick(NOW) == []
+        assert runner.submitted == []
+        assert s.entries[1].skipped_overlap == 1
+        assert s.entries[1].next_run_at > NOW
+
+    def test_max_starts_per_tick(self):
+        s, runner = _sched(max_starts_per_tick=3)
+        s.apply([(i, 300, None) for i in range(1, 11)], NOW)
+        for e in s.entries.values():
+            e.next_run_at = NOW
+        assert len(s.tick(NOW)) == 3
+        assert len(s.tick(NOW)) == 3
+        assert len(runner.submitted) == 6
+
+    def test_no_replay_after_downtime(self):
+        """A site overdue by many intervals runs once, not once per missed slot."""
+        s, runner = _sched()
+        s.apply([(1, 60, NOW - timedelta(days=1))], NOW)
+        later = NOW + timedelta(minutes=5)
+        s.tick(later)
+        s.tick(later)
+        assert runner.submitted == [1]
+
+    def test_skips_site_run_elsewhere(self):
+        s, runner = _sched(jitter_fraction=0.1)
+        s.apply([(1, 300, None), (2, 300, None), (3, 300, None)], NOW)
+        for e in s.entries.values():
+            e.next_run_at = NOW
+        other_run = NOW - timedelta(seconds=20)
+        activity = {1: (other_run, False), 2: (None, True), 3: (NOW - timedelta(seconds=290), False)}
+        assert s.tick(NOW, activity) == [3]               # 3: our own run, one interval ago
+        assert s.entries[1].skipped_elsewhere == 1 and s.entries[2].skipped_elsewhere == 1
+        assert s.entries[1].last_run_at == other_run
+        assert 270 <= (s.entries[1].next_run_at - other_run).total_seconds() <= 330   # re-based on that run
+        assert s.entries[2].next_run_at > NOW
+
+    def test_processes_share_one_run_per_interval(self):
+        """Two schedulers over the same sites: after the first run each interval, the other skips."""
+        a, ra = _sched(rng=random.Random(1))
+        b, rb = _sched(rng=random.Random(2))
+        last_sync = {}
+        for s in (a, b):
+            s.apply([(i, 300, None) for i in range(1, 21)], NOW)
+        t = NOW
+        while t < NOW + timedelta(hours=1):
+            for s in (a, b):
+                for sid in s.tick(t, {sid: (last_sync.get(sid), False) for sid in s.due_sites(t)}):
+                    last_sync[sid] = t                      # the job runs right away
+            t += timedelta(seconds=5)
+        runs = len(ra.submitted) + len(rb.submitted)
+        assert runs <= 20 * 13                              # ~12 intervals an hour, not twice that
+
+    def test_upcoming_sorted(self):
+        s, _ = _sched()
+        s.apply([(1, 300, None), (2, 300, None), (3, 300, None)], NOW)
+        up = s.upcoming()
+        assert [u["next_run_at"] for u in up] == sorted(u["next_run_at"] for u in up)
+
+
+class TestSiteActivity:
+
+    def test_reads_last_sync_and_leases(self, monkeypatch):
+        eng = create_engine("sqlite://")
+        Base.metadata.create_all(bind=eng)
+        Session = sessionmaker(bind=eng)
+        monkeypatch.setattr(sync_scheduler, "SessionLocal", Session)
+        db = Session()
+        db.add_all([Site(id=i, name=f"S{i}") for i in (1, 2, 3)])
+        db.add_all([NvrCredential(site_id=1, ip="a", last_sync=NOW - timedelta(seconds=30)),
+                    NvrCredential(site_id=1, ip="b", last_sync=NOW - timedelta(hours=1)),
+                    NvrCredential(site_id=2, ip="c")])
+        db.add_all([SyncLease(site_id=2, holder="h", acquired_at=NOW, expires_at=NOW + timedelta(minutes=2)),
+                    SyncLease(site_id=3, holder="h", acquired_at=NOW, expires_at=NOW - timedelta(minutes=1))])
+        db.commit()
+        db.close()
+        assert load_site_activity([1, 2, 3], NOW) == {
+            1: (NOW - timedelta(seconds=30), False), 2: (None, True), 3: (None, False)}
+        eng.dispose()
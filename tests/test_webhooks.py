@@ -0,0 +1,204 @@
+"""
+Tests for webhooks module.
+Covers: outbox rows written by sync_site for crit events, batching per
+destination, HMAC signature, retry with backoff, dead-lettering and stats —
+delivered to a real local HTTP receiver.
+"""
+import json
+import threading
+import pytest
+import sys
+import os
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+# Allow importing from parent dir
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+import camera_state
+import nvr_sync_service
+import webhooks
+from database import Base, Site, Recorder, NvrCredential, CameraEvent, WebhookDestination, WebhookOutbox
+from webhooks import WebhookDispatcher, enqueue_events, sign
+
+
+class Receiver:
+    """Local HTTP endpoint recording POSTs; `fail` makes it answer 500."""
+    def __init__(self):
+        self.requests = []
+        self.fail = False
+        rec = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers["Content-Length"]))
+                rec.requests.append((dict(self.headers), body))
+                self.send_response(500 if rec.fail else 204)
+                self.end_headers()
+
+            def log_message(self, *a):
+                pass
+
+        self.server = HTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}/hook"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def receiver():
+    r = Receiver()
+    yield r
+    r.close()
+
+
+@pytest.fixture
+def db(monkeypatch):
+    engine = create_engine("sqlite://", poolclass=StaticPool,
+                           connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine)
+    factory = sessionmaker(bind=engine)
+    monkeypatch.setattr(webhooks, "SessionLocal", factory)
+    session = factory()
+    session.add(Site(id=1, name="Test"))
+    session.commit()
+    yield session
+    session.close()
+
+
+def _events(db, severities):
+    evts = [CameraEvent(site_id=1, channel=i + 1, event_type="status_change",
+                        to_status="offline", severity=sev, message=f"e{i}")
+            for i, sev in enumerate(severities)]
+    db.add_all(evts)
+    db.flush()
+    return evts
+
+
+class TestEnqueue:
+
+    def test_only_matching_severity_and_site(self, db):
+        db.add_all([
+            WebhookDestination(id=1, url="http://a", min_severity="crit"),
+            WebhookDestination(id=2, url="http://b", min_severity="warn", site_id=1),
+            WebhookDestination(id=3, url="http://c", min_severity="info", site_id=99),
+            WebhookDestination(id=4, url="http://d", min_severity="info", active=False),
+        ])
+        db.flush()
+        n = enqueue_events(db, 1, _events(db, ["info", "warn", "crit"]))
+        assert n == 3   # crit → 1 and 2, warn → 2
+        assert sorted(r.destination_id for r in db.query(WebhookOutbox)) == [1, 2, 2]
+
+    def test_no_destinations_no_rows(self, db):
+        assert enqueue_events(db, 1, _events(db, ["crit"])) == 0
+
+
+class TestDispatcher:
+
+    @pytest.mark.asyncio
+    async def test_batches_per_destination_and_signs(self, db, receiver):
+        db.add(WebhookDestination(id=1, url=receiver.url, secret="s3cr3t"))
+        db.flush()
+        enqueue_events(db, 1, _events(db, ["crit"] * 5))
+        db.commit()
+
+        d = WebhookDispatcher()
+        assert await d.run_once() == 5
+        assert len(receiver.requests) == 1
+        headers, body = receiver.requests[0]
+        payload = json.loads(body)
+        assert payload["count"] == 5
+        assert headers["X-NetManager-Signature"] == sign("s3cr3t", body)
+        assert db.query(WebhookOutbox).filter_by(status="sent").count() == 5
+        stats = d.stats(db)
+        assert stats["queue_depth"] == 0
+        assert stats["delivered"] == 5
+        assert stats["latency_p95_s"] is not None
+
+    @pytest.mark.asyncio
+    async def test_failure_backs_off_then_succeeds(self, db, receiver):
+        db.add(WebhookDestination(id=1, url=receiver.url))
+        db.flush()
+        enqueue_events(db, 1, _events(db, ["crit"]))
+        db.commit()
+        receiver.fail = True
+
+        d = WebhookDispatcher()
+        await d.run_once()
+        row = db.query(WebhookOutbox).one()
+        db.refresh(row)
+        assert row.status == "pending"
+        assert row.attempts == 1
+        assert row.last_error == "HTTP 500"
+        assert row.next_attempt_at > datetime.utcnow()
+        assert await d.run_once() == 0            # not due yet
+        assert d.stats(db)["queue_depth"] == 1
+
+        receiver.fail = False
+        row.next_attempt_at = datetime.utcnow() - timedelta(seconds=1)
+        db.commit()
+        assert await d.run_once() == 1
+        db.refresh(row)
+        assert row.status == "sent"
+
+    @pytest.mark.asyncio
+    async def test_dead_after_max_attempts(self, db, receiver, monkeypatch):
+        monkeypatch.setattr(webhooks, "WEBHOOK_MAX_ATTEMPTS", 2)
+        db.add(WebhookDestination(id=1, url=receiver.url))
+        db.flush()
+        enqueue_events(db, 1, _events(db, ["crit"]))
+        db.commit()
+        receiver.fail = True
+        d = WebhookDispatcher()
+        for _ in range(2):
+            db.query(WebhookOutbox).update({"next_attempt_at": datetime.utcnow() - timedelta(seconds=1)})
+            db.commit()
+            await d.run_once()
+        db.expire_all()
+        assert db.query(WebhookOutbox).one().status == "dead"
+
+    @pytest.mark.asyncio
+    async def test_claimed_rows_not_claimed_twice(self, db):
+        db.add(WebhookDestination(id=1, url="http://127.0.0.1:9/none"))
+        db.flush()
+        enqueue_events(db, 1, _events(db, ["crit"] * 3))
+        db.commit()
+        now = datetime.utcnow()
+        assert sum(len(v) for v in webhooks.claim_due(db, now).values()) == 3
+        assert webhooks.claim_due(db, now) == {}
+
+
+class TestSyncEnqueues:
+
+    @pytest.mark.asyncio
+    async def test_crit_offline_event_lands_in_outbox(self, db, monkeypatch):
+        camera_state.reset()
+        db.add(Recorder(id=1, site_id=1, name="NVR"))
+        db.add(NvrCredential(site_id=1, recorder_id=1, ip="10.0.0.250", password_enc="b64:eA=="))
+        db.add(WebhookDestination(id=1, url="http://example.invalid/hook"))
+        db.commit()
+        status = {1: "online"}
+
+        async def fake_rpc(ip, port, user, password):
+            return {"ok": True, "cameras": [{"channel": 1, "name": "C1", "ip": "10.0.0.1"}]}
+
+        async def fake_probe(cameras):
+            return dict(status)
+
+        monkeypatch.setattr(nvr_sync_service, "_sync_nvr_rpc", fake_rpc)
+        monkeypatch.setattr(nvr_sync_service, "probe_many", fake_probe)
+        await nvr_sync_service.sync_site(1, db)
+        status[1] = "offline"
+        await nvr_sync_service.sync_site(1, db)    # warn — below min_severity
+        assert db.query(WebhookOutbox).count() == 0
+        await nvr_sync_service.sync_site(1, db)    # crit
+        row = db.query(WebhookOutbox).one()
+        assert json.loads(row.payload_json)["severity"] == "crit"
+        camera_state.reset()
@@ -0,0 +1,318 @@
+"""
+NetManager — Webhook Dispatcher
+Outbound notifications for camera events (by default only crit).
+
+    sync_site ── enqueue_events() ──> webhook_outbox   (same transaction, no I/O)
+                       notify() ──> dispatcher wakes, waits WEBHOOK_BATCH_WINDOW_S,
+                                    claims due rows, POSTs one batch per destination
+
+Rows are claimed by pushing next_attempt_at forward (WEBHOOK_CLAIM_S), so a
+crashed worker's batch simply becomes due again. Failed batches are retried
+with exponential backoff + jitter; after WEBHOOK_MAX_ATTEMPTS they are "dead".
+
+Body:    {"source": "netmanager", "count": N, "events": [...]}
+Header:  X-NetManager-Signature: sha256=<hmac(secret, body)>   (if secret set)
+
+Usage:
+    enqueue_events(db, site_id, events)      # before commit
+    dispatcher.notify()                       # after commit
+    asyncio.create_task(dispatcher.run())
+"""
+import asyncio
+import hashlib
+import hmac
+import json
+import logging
+import os
+import random
+import time
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Any, Deque, Dict, List, Optional
+
+import httpx
+from sqlalchemy import func, select, update, or_
+from sqlalchemy.orm import Session
+
+from database import SessionLocal, WebhookDestination, WebhookOutbox, CameraEvent
+
+logger = logging.getLogger("netmanager.webhooks")
+
+WEBHOOK_BATCH_WINDOW_S = float(os.getenv("WEBHOOK_BATCH_WINDOW_S", "2"))
+WEBHOOK_BATCH_MAX = int(os.getenv("WEBHOOK_BATCH_MAX", "100"))
+WEBHOOK_POLL_S = float(os.getenv("WEBHOOK_POLL_S", "15"))
+WEBHOOK_TIMEOUT_S = float(os.getenv("WEBHOOK_TIMEOUT_S", "10"))
+WEBHOOK_CLAIM_S = int(os.getenv("WEBHOOK_CLAIM_S", "60"))
+WEBHOOK_MAX_ATTEMPTS = int(os.getenv("WEBHOOK_MAX_ATTEMPTS", "8"))
+WEBHOOK_BACKOFF_BASE_S = float(os.getenv("WEBHOOK_BACKOFF_BASE_S", "5"))
+WEBHOOK_BACKOFF_MAX_S = float(os.getenv("WEBHOOK_BACKOFF_MAX_S", "900"))
+WEBHOOK_SENT_RETENTION_DAYS = int(os.getenv("WEBHOOK_SENT_RETENTION_DAYS", "7"))
+
+SEVERITY_RANK = {"info": 0, "warn": 1, "crit": 2}
+
+OUTBOX_PENDING = "pending"
+OUTBOX_SENT = "sent"
+OUTBOX_DEAD = "dead"
+
+_outbox = WebhookOutbox.__table__
+
+
+# ============================================
+# ENQUEUE (inside the sync transaction)
+# ============================================
+
+def event_payload(evt: CameraEvent) -> Dict[str, Any]:
+    return {
+        "id": evt.id,
+        "site_id": evt.site_id,
+        "camera_id": evt.camera_id,
+        "channel": evt.channel,
+        "event_type": evt.event_type,
+        "from_status": evt.from_status,
+        "to_status": evt.to_status,
+        "severity": evt.severity,
+        "message": evt.message,
+        "created_at": evt.created_at.isoformat() if evt.created_at else None,
+    }
+
+
+def enqueue_events(db: Session, site_id: int, events: List[CameraEvent]) -> int:
+    """
+    Add outbox rows for every active destination interested in `events`
+    (flushed, so they have ids). Only inserts — no network I/O.
+    """
+    if not events:
+        return 0
+    top = max(SEVERITY_RANK.get(e.severity or "info", 0) for e in events)
+    dests = [d for d in db.query(WebhookDestination).filter(
+        WebhookDestination.active == True,  # noqa: E712
+        or_(WebhookDestination.site_id.is_(None), WebhookDestination.site_id == site_id),
+    ).all() if SEVERITY_RANK.get(d.min_severity or "crit", 2) <= top]
+    if not dests:
+        return 0
+    now = datetime.utcnow()
+    rows = []
+    for d in dests:
+        floor = SEVERITY_RANK.get(d.min_severity or "crit", 2)
+        for e in events:
+            if SEVERITY_RANK.get(e.severity or "info", 0) >= floor:
+                rows.append({"destination_id": d.id, "site_id": site_id, "event_id": e.id,
+                             "payload_json": json.dumps(event_payload(e)),
+                             "status": OUTBOX_PENDING, "attempts": 0,
+                             "next_attempt_at": now, "created_at": now})
+    if rows:
+        db.execute(_outbox.insert(), rows)
+    return len(rows)
+
+
+# ============================================
+# DELIVERY
+# ============================================
+
+def sign(secret: str, body: bytes) -> str:
+    return "sha256=" + hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+
+
+def backoff_s(attempts: int, rng: random.Random = random) -> float:
+    """Exponential backoff with ±20% jitter for the n-th failed attempt."""
+    base = min(WEBHOOK_BACKOFF_MAX_S, WEBHOOK_BACKOFF_BASE_S * (2 ** max(0, attempts - 1)))
+    return base * rng.uniform(0.8, 1.2)
+
+
+def claim_due(db: Session, now: datetime, limit: int = WEBHOOK_BATCH_MAX) -> Dict[int, List[Dict[str, Any]]]:
+    """
+    Claim due pending rows (up to `limit` per destination) by pushing their
+    next_attempt_at WEBHOOK_CLAIM_S ahead. Commits. Returns {destination_id: rows}.
+    """
+    ranked = select(
+        _outbox.c.id,
+        func.row_number().over(partition_by=_outbox.c.destination_id, order_by=_outbox.c.id).label("rn"),
+    ).where(_outbox.c.status == OUTBOX_PENDING, _outbox.c.next_attempt_at <= now).subquery()
+    ids = select(ranked.c.id).where(ranked.c.rn <= limit)
+    rows = db.execute(
+        update(_outbox).where(_outbox.c.id.in_(ids))
+        .values(next_attempt_at=now + timedelta(seconds=WEBHOOK_CLAIM_S))
+        .returning(_outbox.c.id, _outbox.c.destination_id, _outbox.c.payload_json,
+                   _outbox.c.attempts, _outbox.c.created_at)
+    ).mappings().all()
+    db.commit()
+    batches: Dict[int, List[Dict[str, Any]]] = {}
+    for r in sorted(rows, key=lambda r: r["id"]):
+        batches.setdefault(r["destination_id"], []).append(dict(r))
+    return batches
+
+
+class WebhookDispatcher:
+    """Background loop delivering the outbox; exposes queue depth and latency."""
+
+    def __init__(self, batch_window_s: float = WEBHOOK_BATCH_WINDOW_S,
+                 poll_s: float = WEBHOOK_POLL_S, transport: Optional[httpx.AsyncBaseTransport] = None):
+        self.batch_window_s = batch_window_s
+        self.poll_s = poll_s
+        self.transport = transport
+        self._wake: Optional[asyncio.Event] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._latencies: Deque[float] = deque(maxlen=1000)   # created → delivered, seconds
+        self.delivered = 0
+        self.failed_attempts = 0
+        self.last_error = ""
+        self.last_cycle_at: Optional[datetime] = None
+        self._last_prune = 0.0
+
+    def notify(self):
+        """Wake the loop early (new rows were committed). Safe from any thread."""
+        if self._wake is None or self._loop is None or self._loop.is_closed():
+            return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is self._loop:
+            self._wake.set()
+        else:
+            self._loop.call_soon_threadsafe(self._wake.set)
+
+    # ---- one cycle ----
+
+    def _claim(self) -> Dict[int, List[Dict[str, Any]]]:
+        db = SessionLocal()
+        try:
+            return claim_due(db, datetime.utcnow())
+        finally:
+            db.close()
+
+    def _destinations(self, ids: List[int]) -> Dict[int, Dict[str, Any]]:
+        db = SessionLocal()
+        try:
+            return {d.id: {"url": d.url, "secret": d.secret or "", "active": d.active}
+                    for d in db.query(WebhookDestination).filter(WebhookDestination.id.in_(ids))}
+        finally:
+            db.close()
+
+    def _finish(self, sent_ids: List[int], failed: List[Dict[str, Any]], error: str):
+        """Mark a batch sent, or schedule its retry / mark it dead."""
+        now = datetime.utcnow()
+        db = SessionLocal()
+        try:
+            if sent_ids:
+                db.execute(update(_outbox).where(_outbox.c.id.in_(sent_ids))
+                           .values(status=OUTBOX_SENT, sent_at=now, last_error=""))
+            for r in failed:
+                attempts = r["attempts"] + 1
+                db.execute(update(_outbox).where(_outbox.c.id == r["id"]).values(
+                    attempts=attempts, last_error=error[:500],
+                    status=OUTBOX_DEAD if attempts >= WEBHOOK_MAX_ATTEMPTS else OUTBOX_PENDING,
+                    next_attempt_at=now + timedelta(seconds=backoff_s(attempts)),
+                ))
+            db.commit()
+        finally:
+            db.close()
+
+    async def _deliver(self, client: httpx.AsyncClient, dest: Dict[str, Any], rows: List[Dict[str, Any]]):
+        events = [json.loads(r["payload_json"]) for r in rows]
+        body = json.dumps({"source": "netmanager", "count": len(events), "events": events},
+                          separators=(",", ":")).encode()
+        headers = {"Content-Type": "application/json"}
+        if dest["secret"]:
+            headers["X-NetManager-Signature"] = sign(dest["secret"], body)
+        error = ""
+        try:
+            resp = await client.post(dest["url"], content=body, headers=headers)
+            if resp.status_code >= 300:
+                error = f"HTTP {resp.status_code}"
+        except httpx.HTTPError as e:
+            error = f"{type(e).__name__}: {e}"
+
+        if error:
+            self.failed_attempts += 1
+            self.last_error = f"{dest['url']}: {error}"
+            logger.warning("Webhook %s failed (%d events): %s", dest["url"], len(rows), error)
+            await asyncio.to_thread(self._finish, [], rows, error)
+        else:
+            now = datetime.utcnow()
+            self._latencies.extend((now - r["created_at"]).total_seconds() for r in rows)
+            self.delivered += len(rows)
+            await asyncio.to_thread(self._finish, [r["id"] for r in rows], [], "")
+
+    async def run_once(self) -> int:
+        """Claim due rows and deliver them, one POST per destination. Returns rows handled."""
+        batches = await asyncio.to_thread(self._claim)
+        self.last_cycle_at = datetime.utcnow()
+        if not batches:
+            return 0
+        dests = await asyncio.to_thread(self._destinations, list(batches))
+        async with httpx.AsyncClient(timeout=WEBHOOK_TIMEOUT_S, transport=self.transport) as client:
+            jobs = []
+            for dest_id, rows in batches.items():
+                dest = dests.get(dest_id)
+                if not dest or not dest["active"]:
+                    await asyncio.to_thread(self._finish, [], rows, "destination inactive")
+                    continue
+                jobs.append(self._deliver(client, dest, rows))
+            await asyncio.gather(*jobs)
+        return sum(len(r) for r in batches.values())
+
+    async def run(self):
+        """Background loop: wake on notify() or every poll_s, batch for batch_window_s, deliver."""
+        self._loop = asyncio.get_running_loop()
+        self._wake = asyncio.Event()
+        logger.info("Webhook dispatcher started (window=%.1fs, poll=%.0fs)", self.batch_window_s, self.poll_s)
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.poll_s)
+                await asyncio.sleep(self.batch_window_s)     # let the batch fill up
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            try:
+                while await self.run_once() >= WEBHOOK_BATCH_MAX:
+                    pass
+                if time.monotonic() - self._last_prune > 3600:
+                    self._last_prune = time.monotonic()
+                    await asyncio.to_thread(prune_sent)
+            except Exception as e:
+                logger.error("Webhook cycle failed: %s: %s", type(e).__name__, e)
+
+    # ---- metrics ----
+
+    def stats(self, db: Session) -> Dict[str, Any]:
+        by_status = dict(db.query(WebhookOutbox.status, func.count(WebhookOutbox.id))
+                         .group_by(WebhookOutbox.status).all())
+        oldest = db.query(func.min(WebhookOutbox.created_at)).filter(
+            WebhookOutbox.status == OUTBOX_PENDING).scalar()
+        lat = sorted(self._latencies)
+
+        def pct(p):
+            return round(lat[min(len(lat) - 1, int(p * len(lat)))], 3) if lat else None
+
+        return {
+            "queue_depth": by_status.get(OUTBOX_PENDING, 0),
+            "oldest_pending_age_s": (datetime.utcnow() - oldest).total_seconds() if oldest else 0,
+            "sent": by_status.get(OUTBOX_SENT, 0),
+            "dead": by_status.get(OUTBOX_DEAD, 0),
+            "delivered": self.delivered,
+            "failed_attempts": self.failed_attempts,
+            "latency_p50_s": pct(0.50),
+            "latency_p95_s": pct(0.95),
+            "latency_max_s": round(lat[-1], 3) if lat else None,
+            "last_error": self.last_error,
+            "last_cycle_at": self.last_cycle_at,
+        }
+
+
+def prune_sent(days: int = WEBHOOK_SENT_RETENTION_DAYS) -> int:
+    """Delete delivered rows older than `days`."""
+    db = SessionLocal()
+    try:
+        n = db.query(WebhookOutbox).filter(
+            WebhookOutbox.status == OUTBOX_SENT,
+            WebhookOutbox.sent_at < datetime.utcnow() - timedelta(days=days),
+        ).delete(synchronize_session=False)
+        db.commit()
+        return n
+    finally:
+        db.close()
+
+
+# Process-wide dispatcher used by sync_site and the API
+dispatcher = WebhookDispatcher()